@@ -100,6 +100,26 @@ def create_app():
             'task': 'tasks.sync_batidas_completa',
             'schedule': crontab(minute='*/5'),  # verifica a cada 5 min, self-limita por config
         },
+        'limpar-escala-alteracoes-daily': {
+            'task': 'tasks.limpar_escala_alteracoes',
+            'schedule': crontab(hour=3, minute=30),
+        },
+        'consumir-eventos-batidas': {
+            'task': 'tasks.consumir_eventos_batidas',
+            'schedule': crontab(minute='*'),
+        },
+        'limpar-eventos-batidas-daily': {
+            'task': 'tasks.limpar_eventos_batidas',
+            'schedule': crontab(hour=3, minute=50),
+        },
+        'limpar-sync-runs-daily': {
+            'task': 'tasks.limpar_sync_runs',
+            'schedule': crontab(hour=3, minute=40),
+        },
+        'previsao-demanda-daily': {
+            'task': 'tasks.previsao_demanda',
+            'schedule': crontab(hour=3, minute=0),  # 03:00 – presença de ontem + previsão por dia da semana
+        },
     }
     celery.conf.timezone = 'America/Sao_Paulo'
     app.extensions['celery'] = celery
@@ -145,6 +165,18 @@ def create_app():
         import models  # noqa: garante que os models estão registrados
         db.create_all()
 
+    # Versão da escala: log de alterações p/ ETag e modo delta do calendário
+    from services.escala_versao import init_escala_versao
+    init_escala_versao(app)
+
+    # Consultas SQL por requisição/task (log, X-SQL-* e detecção de N+1)
+    from services.perfil_sql import init_perfil_sql
+    init_perfil_sql(app)
+
+    # Métricas Prometheus (/metrics)
+    from services.metricas import init_metricas
+    init_metricas(app)
+
     # ── Auto-sync de batidas (APScheduler – roda no mesmo processo) ───────────
     from services.auto_sync import init_scheduler
     init_scheduler(app)
@@ -0,0 +1,247 @@
+"""
+Benchmark dos caminhos quentes sobre uma base sintética (gerar_dataset.py).
+Cria um banco SQLite temporário com N funcionários e MESES meses de escala e
+batidas e mede, para cada caminho:
+
+- escalas.eventos, cobertura_dados, quadro_dados (mês corrente, todos e 1 dept);
+- tasks.calcular_banco_horas_todos;
+- processar_regras_evento('EVENT_SYNC');
+- inconsistencias.analisar, relatorios (tela e exportação .xlsx);
+- gerar_espelho_pdf (/espelho/pdf), se o ReportLab estiver instalado.
+
+Cada repetição começa com uma versão nova da escala (sem caches por versão).
+Tempo: mediana e mínimo de R repetições; consultas SQL, N+1 prováveis
+(services/perfil_sql.py) e pico de memória (tracemalloc) numa execução à parte.
+
+ORCAMENTOS limita as consultas de cada caminho (fixo + por funcionário da
+base); estourar o orçamento ou ter N+1 fora de N1_TOLERADO termina com código 1.
+
+--salvar=arq.json grava o resultado; --comparar=arq.json compara com uma
+execução anterior e termina com código 1 se algum caminho ficou mais lento
+que --limite (padrão 25%) ou passou a fazer mais consultas.
+
+Usage: python bench_endpoints.py [N] [MESES] [R] [--semente=42] [--so=eventos,relatorios]
+                                 [--salvar=arq.json] [--comparar=arq.json] [--limite=25]
+"""
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time as _time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+_db_path = os.path.join(tempfile.mkdtemp(), 'bench_endpoints.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ.setdefault('WERKZEUG_RUN_MAIN', 'false')   # não sobe o APScheduler
+for _var in ('MEGAAPI_TOKEN', 'MEGAAPI_INSTANCE', 'GESTOR_CELULAR'):
+    os.environ[_var] = ''                             # regras não enviam WhatsApp de verdade
+
+MIN_DIFERENCA_MS = 5   # variações menores que isso não contam como regressão
+
+# {caminho: (consultas fixas, consultas por funcionário)}
+ORCAMENTOS = {
+    'eventos':                    (15, 0),
+    'eventos_dept':               (20, 0),
+    'cobertura_dados':            (10, 0),
+    'cobertura_dados_dept':       (12, 0),
+    'quadro_dados':               (12, 0),
+    'quadro_dados_dept':          (15, 0),
+    'calcular_banco_horas_todos': (15, 0.01),   # ~5 consultas a cada 900 funcionários (IN em lotes)
+    'processar_regras_evento':    (20, 0),
+    'inconsistencias_analisar':   (10, 0),
+    'relatorios':                 (15, 0),
+    'relatorios_exportar':        (5, 0),
+    'gerar_espelho_pdf':          (30, 0),
+}
+# Caminhos que ainda trabalham funcionário a funcionário (N+1 não reprova)
+N1_TOLERADO = set()
+
+
+def caminhos(app, client, hoje: date) -> dict:
+    """{nome: callable} — cada callable levanta se o caminho falhar. As
+    requisições levam o próprio contexto; as tarefas rodam num app_context novo."""
+    from models import Funcionario
+    mes = hoje.strftime('%Y-%m')
+    ini = hoje.replace(day=1)
+    fim = (ini + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    dept = 'UNIDADE 01'
+    with app.app_context():
+        func_id = Funcionario.query.filter_by(departamento=dept).order_by(Funcionario.id).first().id
+
+    def get(url):
+        def f():
+            r = client.get(url)
+            if r.status_code != 200:
+                raise RuntimeError(f'{url} → HTTP {r.status_code}')
+            return len(r.data)
+        return f
+
+    def banco_horas():
+        with app.app_context():
+            return app.extensions['celery'].tasks['tasks.calcular_banco_horas_todos'].run()
+
+    def regras():
+        from services.notification_processor import processar_regras_evento
+        with app.app_context():
+            return processar_regras_evento('EVENT_SYNC')
+
+    periodo = f'data_inicio={ini}&data_fim={fim}'
+    c = {
+        'eventos':               get(f'/escalas/eventos?start={ini}&end={fim + timedelta(days=1)}'),
+        'eventos_dept':          get(f'/escalas/eventos?start={ini}&end={fim + timedelta(days=1)}&dept={dept}'),
+        'cobertura_dados':       get(f'/escalas/cobertura/dados?mes_ano={mes}'),
+        'cobertura_dados_dept':  get(f'/escalas/cobertura/dados?mes_ano={mes}&dept={dept}'),
+        'quadro_dados':          get(f'/escalas/quadro/dados?mes_ano={mes}'),
+        'quadro_dados_dept':     get(f'/escalas/quadro/dados?mes_ano={mes}&dept={dept}'),
+        'calcular_banco_horas_todos': banco_horas,
+        'processar_regras_evento':    regras,
+        'inconsistencias_analisar':   get(f'/inconsistencias/analisar?{periodo}'),
+        'relatorios':                 get(f'/relatorios?{periodo}'),
+        'relatorios_exportar':        get(f'/relatorios/exportar-pontos?{periodo}'),
+    }
+    try:
+        import reportlab  # noqa: F401
+        c['gerar_espelho_pdf'] = get(f'/espelho/pdf?funcionario_id={func_id}&{periodo}')
+    except ImportError:
+        print('ReportLab não instalado: gerar_espelho_pdf fica de fora.')
+    return c
+
+
+def _nova_versao(app):
+    """Grava uma alteração de escala (invalida os caches por versão)."""
+    from extensions import db
+    from models import EscalaAlteracao
+    with app.app_context():
+        db.session.add(EscalaAlteracao(entidade='lote', operacao='bench'))
+        db.session.commit()
+
+
+def medir(app, nome, fn, repeticoes: int, n: int) -> dict:
+    from services.perfil_sql import OrcamentoExcedido, orcamento_consultas
+    fixo, por_func = ORCAMENTOS.get(nome, (10 ** 6, 0))
+    _nova_versao(app)
+    estouro = None
+    tracemalloc.start()
+    try:
+        with orcamento_consultas(int(fixo + por_func * n), nome, n1=nome not in N1_TOLERADO) as m:
+            fn()
+    except OrcamentoExcedido as e:
+        estouro = str(e)
+    pico = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+
+    tempos = []
+    for _ in range(repeticoes):
+        _nova_versao(app)
+        t0 = _time.perf_counter()
+        fn()
+        tempos.append((_time.perf_counter() - t0) * 1000)
+    return {'mediana_ms': round(statistics.median(tempos), 2), 'min_ms': round(min(tempos), 2),
+            'consultas': m.consultas, 'n1': len(m.n1()), 'pico_mb': round(pico, 2), 'estouro': estouro}
+
+
+def comparar(atual: dict, base: dict, limite: float) -> list:
+    """Linhas do relatório + lista de regressões."""
+    regressoes = []
+    print(f'\n{"caminho":<28} {"base ms":>9} {"agora ms":>9} {"Δ%":>7} {"SQL base":>9} {"SQL agora":>9}')
+    for nome, r in atual['resultados'].items():
+        b = base['resultados'].get(nome)
+        if not b:
+            print(f'{nome:<28} {"—":>9} {r["mediana_ms"]:9.1f}')
+            continue
+        delta = (r['mediana_ms'] / b['mediana_ms'] - 1) * 100 if b['mediana_ms'] else 0.0
+        marca = ''
+        if delta > limite and r['mediana_ms'] - b['mediana_ms'] > MIN_DIFERENCA_MS:
+            regressoes.append(f'{nome}: {b["mediana_ms"]:.1f} → {r["mediana_ms"]:.1f} ms ({delta:+.0f}%)')
+            marca = '  ← mais lento'
+        if r['consultas'] > b['consultas']:
+            regressoes.append(f'{nome}: {b["consultas"]} → {r["consultas"]} consultas')
+            marca += '  ← mais SQL'
+        print(f'{nome:<28} {b["mediana_ms"]:9.1f} {r["mediana_ms"]:9.1f} {delta:+7.1f} '
+              f'{b["consultas"]:9d} {r["consultas"]:9d}{marca}')
+    if (base.get('meta') or {}).get('dataset') != atual['meta']['dataset']:
+        print('Atenção: bases diferentes (N/MESES/semente) — comparação pouco útil.')
+    return regressoes
+
+
+def _commit_atual() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except Exception:
+        return ''
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    opts = dict(a[2:].split('=', 1) if '=' in a else (a[2:], '1') for a in sys.argv[1:] if a.startswith('--'))
+    n = int(args[0]) if args else 300
+    meses = int(args[1]) if len(args) > 1 else 3
+    repeticoes = int(args[2]) if len(args) > 2 else 5
+    semente = int(opts.get('semente', 42))
+    so = set(opts['so'].split(',')) if opts.get('so') else None
+
+    from app import app
+    from gerar_dataset import gerar
+    logging.getLogger('perfil_sql').setLevel(logging.ERROR)   # N+1 já sai na tabela
+
+    hoje = date.today()
+    with app.app_context():
+        t0 = _time.perf_counter()
+        info = gerar(n, meses, semente)
+        print(f'Base: {info} em {_time.perf_counter() - t0:.1f} s')
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'bench@local', 'senha': 'bench'})
+
+    resultados, estouros = {}, []
+    print(f'\n{"caminho":<28} {"mediana ms":>10} {"mín ms":>9} {"SQL":>6} {"N+1":>4} {"pico MB":>8}')
+    for nome, fn in caminhos(app, client, hoje).items():
+        if so and nome not in so:
+            continue
+        try:
+            r = medir(app, nome, fn, repeticoes, n)
+        except Exception as e:
+            print(f'{nome:<28} ERRO: {e}')
+            continue
+        resultados[nome] = r
+        print(f'{nome:<28} {r["mediana_ms"]:10.1f} {r["min_ms"]:9.1f} {r["consultas"]:6d} {r["n1"]:4d} '
+              f'{r["pico_mb"]:8.1f}' + ('  ← orçamento' if r['estouro'] else ''))
+        if r['estouro']:
+            estouros.append(r['estouro'])
+
+    atual = {
+        'meta': {'dataset': {'n': n, 'meses': meses, 'semente': semente}, 'repeticoes': repeticoes,
+                 'data': hoje.isoformat(), 'gerado_em': datetime.now().isoformat(timespec='seconds'),
+                 'commit': _commit_atual(), 'python': sys.version.split()[0]},
+        'resultados': resultados,
+    }
+    if opts.get('salvar'):
+        with open(opts['salvar'], 'w') as f:
+            json.dump(atual, f, indent=2)
+        print(f'\nResultado salvo em {opts["salvar"]}')
+    regressoes = []
+    if opts.get('comparar'):
+        with open(opts['comparar']) as f:
+            base = json.load(f)
+        regressoes = comparar(atual, base, float(opts.get('limite', 25)))
+    if estouros:
+        print('\nOrçamentos de consultas:')
+        for e in estouros:
+            print(f'  - {e}')
+    if regressoes:
+        print('\nRegressões:')
+        for r in regressoes:
+            print(f'  - {r}')
+    if estouros or regressoes:
+        sys.exit(1)
+    if opts.get('comparar'):
+        print('\nSem regressões.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark da escala em bits (services/escala_bits.EscalaBits).
+Cria um banco SQLite temporário com N funcionários e ~2 meses de alocações e
+mede, para todas as células (funcionário × dia) do mês:
+
+- DSR (6+ dias em [d-6, d]) e domingo anterior: consultas do motor_clt
+  (validar_dsr + validar_domingos_consecutivos por célula) × varredura do
+  dict em memória × EscalaBits.regras_dia;
+- escalados por dia e "7 dias seguidos sem folga": laço Python × bits.
+
+Os resultados das três formas são comparados.
+
+Usage: python bench_escala_bits.py [N] [--sem-legado]
+"""
+import os
+import random
+import sys
+import tempfile
+import time as _time
+from datetime import date, time, timedelta
+
+_db_path = os.path.join(tempfile.mkdtemp(), 'bench_escala_bits.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ.setdefault('WERKZEUG_RUN_MAIN', 'false')   # não sobe o APScheduler
+
+from app import create_app
+from extensions import db
+from models import AlocacaoDiaria, Funcionario, Turno
+
+
+def popular(n: int, data_ini: date, data_fim: date):
+    random.seed(42)
+    turno = Turno(nome='Manhã', hora_inicio=time(7), hora_fim=time(15), dias_semana='0,1,2,3,4',
+                  intervalo_minutos=60, departamento='BENCH')
+    db.session.add(turno)
+    db.session.flush()
+    for i in range(n):
+        db.session.add(Funcionario(id=f'B{i:05d}', nome=f'Funcionário {i:05d}', departamento='BENCH',
+                                   funcao='Recepcionista', sexo='F' if i % 2 else 'M', ativo=True))
+    db.session.flush()
+    linhas = []
+    for i in range(n):
+        p = random.uniform(0.5, 0.95)
+        d = data_ini
+        while d <= data_fim:
+            if random.random() < p:
+                linhas.append({'funcionario_id': f'B{i:05d}', 'data': d, 'turno_id': turno.id})
+            d += timedelta(days=1)
+    db.session.bulk_insert_mappings(AlocacaoDiaria, linhas)
+    db.session.commit()
+    return len(linhas)
+
+
+def _cronometrar(fn, repeticoes=3):
+    melhor, res = None, None
+    for _ in range(repeticoes):
+        t0 = _time.perf_counter()
+        res = fn()
+        dt = _time.perf_counter() - t0
+        melhor = dt if melhor is None else min(melhor, dt)
+    return melhor, res
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 300
+    hoje = date.today()
+    mes_ini = date(hoje.year, hoje.month, 1)
+    mes_fim = (mes_ini + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    janela_ini = mes_ini - timedelta(days=7)
+
+    app = create_app()
+    with app.app_context():
+        print(f'Populando {n} funcionários...')
+        total = popular(n, mes_ini - timedelta(days=31), mes_fim)
+        print(f'{total} alocações')
+
+        from services.escala_bits import EscalaBits
+        from services.motor_clt import carregar_escala, validar_dsr, validar_domingos_consecutivos
+
+        funcs = {f.id: f for f in Funcionario.query.all()}
+        func_ids = sorted(funcs)
+        datas = [mes_ini + timedelta(days=i) for i in range((mes_fim - mes_ini).days + 1)]
+        itens = [(fid, d) for fid in func_ids for d in datas]
+        escala = carregar_escala(func_ids, janela_ini, mes_fim)
+        print(f'{len(itens)} células no mês')
+
+        dias_janela = (mes_fim - janela_ini).days + 1
+        t_build, bits = _cronometrar(lambda: EscalaBits.de_escala(escala, janela_ini, dias_janela, func_ids))
+        print(f'montagem do EscalaBits:  {t_build * 1000:8.1f} ms (uma vez por janela)')
+
+        # ── DSR + domingo anterior ────────────────────────────────────────────
+        def _dict():
+            res = []
+            for fid, d in itens:
+                dias = escala.get(fid, {})
+                dsr = sum(1 for i in range(7) if (d - timedelta(days=i)) in dias) >= 6
+                dom = d.weekday() == 6 and funcs[fid].sexo == 'F' and (d - timedelta(days=7)) in dias
+                res.append((dsr, dom))
+            return res
+
+        def _bits():
+            dsr, dom = bits.regras_dia([bits.linha(fid) for fid, _ in itens], [d for _, d in itens])
+            dom &= [d.weekday() == 6 and funcs[fid].sexo == 'F' for fid, d in itens]
+            return list(zip(dsr.tolist(), dom.tolist()))
+
+        t_dict, r_dict = _cronometrar(_dict)
+        t_bits, r_bits = _cronometrar(_bits)
+        print(f'DSR + domingo anterior   dict: {t_dict * 1000:8.1f} ms   bits: {t_bits * 1000:8.1f} ms'
+              f'   ({t_dict / t_bits:.0f}x)  iguais={r_dict == r_bits}')
+
+        if '--sem-legado' not in sys.argv:
+            amostra = itens[:min(len(itens), 2000)]
+            db.session.expire_all()
+            t0 = _time.perf_counter()
+            r_sql = [(validar_dsr(fid, d) is not None, validar_domingos_consecutivos(fid, d) is not None)
+                     for fid, d in amostra]
+            t_sql = (_time.perf_counter() - t0) * len(itens) / len(amostra)
+            print(f'motor_clt (consultas):   {t_sql * 1000:8.1f} ms (estimado a partir de {len(amostra)} células)'
+                  f'   iguais={r_sql == r_bits[:len(amostra)]}')
+
+        # ── Escalados por dia ─────────────────────────────────────────────────
+        def _dia_dict():
+            return [sum(1 for fid in func_ids if d in escala.get(fid, {})) for d in datas]
+
+        def _dia_bits():
+            return bits.por_dia()[7:].tolist()
+
+        t_a, r_a = _cronometrar(_dia_dict)
+        t_b, r_b = _cronometrar(_dia_bits)
+        print(f'escalados por dia        dict: {t_a * 1000:8.1f} ms   bits: {t_b * 1000:8.1f} ms'
+              f'   ({t_a / t_b:.0f}x)  iguais={r_a == r_b}')
+
+        # ── 7 dias seguidos ───────────────────────────────────────────────────
+        def _seq_dict():
+            res = []
+            for fid in func_ids:
+                dias, corrida, achou = escala.get(fid, {}), 0, None
+                d = janela_ini
+                while d <= mes_fim and achou is None:
+                    corrida = corrida + 1 if d in dias else 0
+                    if corrida >= 7 and d >= mes_ini:
+                        achou = d - timedelta(days=6)
+                    d += timedelta(days=1)
+                res.append(achou)
+            return res
+
+        def _seq_bits():
+            return bits.sem_folga(7, desde=mes_ini)[1]
+
+        t_a, r_a = _cronometrar(_seq_dict)
+        t_b, r_b = _cronometrar(_seq_bits)
+        print(f'7 dias sem folga         dict: {t_a * 1000:8.1f} ms   bits: {t_b * 1000:8.1f} ms'
+              f'   ({t_a / t_b:.0f}x)  iguais={r_a == r_b}')
+
+
+if __name__ == '__main__':
+    main()
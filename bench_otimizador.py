@@ -0,0 +1,112 @@
+"""
+Benchmark do otimizador de escala (services/otimizador_escala.py).
+Cria um banco SQLite temporário com N funcionários sem horário base, quatro
+turnos e metas de cobertura por faixa, otimiza um mês de 31 dias e confere
+cada alocação gerada com o motor_clt (validar_lote contra o restante da escala).
+
+Usage: python bench_otimizador.py [N] [--tempo=S] [--processos=P] [--reinicios=R]
+"""
+import os
+import random
+import sys
+import tempfile
+import time as _time
+from datetime import date, time, timedelta
+
+_db_path = os.path.join(tempfile.mkdtemp(), 'bench_otimizador.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ.setdefault('WERKZEUG_RUN_MAIN', 'false')   # não sobe o APScheduler
+
+from app import create_app
+from extensions import db
+from models import CoberturaMinima, Funcionario, Turno
+
+ANO, MES = 2026, 12   # 31 dias
+
+
+def _opcao(nome, padrao):
+    for a in sys.argv[1:]:
+        if a.startswith(f'--{nome}='):
+            return type(padrao)(a.split('=', 1)[1])
+    return padrao
+
+
+def popular(n: int):
+    random.seed(7)
+    db.session.add_all([
+        Turno(nome='Abertura', hora_inicio=time(6), hora_fim=time(14), intervalo_minutos=60,
+              dias_semana='0,1,2,3,4,5,6', departamento='BENCH', tipo_turno='A'),
+        Turno(nome='Intermediário', hora_inicio=time(10), hora_fim=time(18), intervalo_minutos=60,
+              dias_semana='0,1,2,3,4,5', departamento='BENCH'),
+        Turno(nome='Fechamento', hora_inicio=time(14), hora_fim=time(22), intervalo_minutos=60,
+              dias_semana='0,1,2,3,4,5,6', departamento='BENCH', tipo_turno='B'),
+        Turno(nome='Curto', hora_inicio=time(17), hora_fim=time(21), intervalo_minutos=15,
+              dias_semana='0,1,2,3,4', departamento='BENCH', funcao='Professor'),
+    ])
+    for i in range(n):
+        db.session.add(Funcionario(
+            id=f'B{i:05d}', nome=f'Funcionário {i:05d}', departamento='BENCH', ativo=True,
+            funcao='Professor' if i % 3 else 'Recepcionista', sexo=random.choice(['M', 'F']),
+        ))
+    escala = max(1, n // 40)
+    db.session.add_all([
+        CoberturaMinima(departamento='BENCH', funcao='Recepcionista', hora_inicio=time(6), hora_fim=time(22),
+                        minimo=2 * escala),
+        CoberturaMinima(departamento='BENCH', funcao='Professor', hora_inicio=time(6), hora_fim=time(10),
+                        minimo=3 * escala),
+        CoberturaMinima(departamento='BENCH', funcao='Professor', hora_inicio=time(17), hora_fim=time(21),
+                        minimo=6 * escala),
+        CoberturaMinima(departamento='BENCH', funcao='Professor', dia_semana=6, hora_inicio=time(8),
+                        hora_fim=time(14), minimo=2 * escala),
+    ])
+    db.session.commit()
+
+
+def verificar(problema, resultado) -> int:
+    """Cada célula gerada, validada pelo motor_clt contra o restante da escala."""
+    from services.motor_clt import carregar_escala, validar_lote
+    ids = [f['id'] for f in problema.funcs]
+    escala = carregar_escala(ids, problema.datas[0], problema.datas[-1])
+    funcs = {f.id: f for f in Funcionario.query.filter(Funcionario.id.in_(ids))}
+    violacoes = 0
+    for fid, d, _ in resultado['alocacoes']:
+        turno = escala[fid].pop(d)
+        for infr in validar_lote([(fid, d, turno)], escala, funcs).get((fid, d), []):
+            violacoes += 1
+            print(f'  {fid} {d}: {infr["error"]} – {infr["message"]}')
+        escala[fid][d] = turno
+    return violacoes
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 200
+    tempo = _opcao('tempo', 20.0)
+    processos = _opcao('processos', min(4, os.cpu_count() or 1))
+    reinicios = _opcao('reinicios', processos)
+
+    app = create_app()
+    with app.app_context():
+        popular(n)
+        from services.otimizador_escala import avaliar, gravar_resultado, montar_problema, otimizar
+
+        t0 = _time.perf_counter()
+        problema = montar_problema(ANO, MES, 'BENCH')
+        print(f'{n} funcionários × {problema.mes_fim - problema.mes_ini} dias, '
+              f'{len(problema.demandas)} metas – montagem {(_time.perf_counter() - t0) * 1000:.0f} ms')
+        print(f'escala vazia: {avaliar(problema, problema.inicial)}')
+
+        r = otimizar(problema, tempo_limite=tempo, reinicios=reinicios, processos=processos, semente=1)
+        print(f'otimizada ({r["reinicios"]} reinícios, {processos} processo(s), {r["tempo"]}s, '
+              f'{r["iteracoes"]} iterações):')
+        print(f'  custo {r["custo"]}  faltas {r["faltas"]}  excesso {r["excesso"]}  '
+              f'dias descobertos {r["dias_descobertos"]}  horas {r["horas_min"]}–{r["horas_max"]}')
+
+        t0 = _time.perf_counter()
+        gravadas = gravar_resultado(problema, r)
+        print(f'gravação: {gravadas} alocações em {(_time.perf_counter() - t0) * 1000:.0f} ms')
+        print(f'violações CLT: {verificar(problema, r)}')
+
+
+if __name__ == '__main__':
+    main()
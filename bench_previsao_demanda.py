@@ -0,0 +1,135 @@
+"""
+Benchmark da previsão de demanda (services/previsao_demanda.py).
+Cria um banco SQLite temporário com N funcionários em alguns
+departamentos/funções e um ano de batidas (2 ou 4 por dia trabalhado) e mede:
+
+- carga inicial das curvas de presença (um ano de batidas → PresencaDiaria);
+- execução incremental da tarefa noturna (últimos dias);
+- recálculo da previsão por dia da semana (percentil das últimas semanas);
+- leitura em cache (previsao / metas_previstas).
+
+A curva de um dia é conferida contra uma contagem direta em Python.
+
+Usage: python bench_previsao_demanda.py [N] [DIAS]
+"""
+import os
+import random
+import sys
+import tempfile
+import time as _time
+from datetime import date, datetime, timedelta
+
+_db_path = os.path.join(tempfile.mkdtemp(), 'bench_previsao_demanda.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ.setdefault('WERKZEUG_RUN_MAIN', 'false')   # não sobe o APScheduler
+
+from app import create_app
+from extensions import db
+from models import Batida, Funcionario
+
+DEPTS = ['BENCH A', 'BENCH B', 'BENCH C']
+FUNCOES = ['Recepcionista', 'Professor', 'Limpeza']
+INICIOS = [6 * 60, 7 * 60, 12 * 60, 14 * 60, 22 * 60]   # minuto de entrada por perfil
+
+
+def popular(n: int, data_ini: date, data_fim: date):
+    random.seed(42)
+    for i in range(n):
+        db.session.add(Funcionario(id=f'B{i:05d}', nome=f'Funcionário {i:05d}',
+                                   departamento=DEPTS[i % len(DEPTS)],
+                                   funcao=FUNCOES[i // len(DEPTS) % len(FUNCOES)], ativo=True))
+    db.session.flush()
+    total, linhas = 0, []
+    for i in range(n):
+        fid = f'B{i:05d}'
+        inicio = INICIOS[i % len(INICIOS)]
+        d = data_ini
+        while d <= data_fim:
+            if d.weekday() != 6 or i % 3 == 0:
+                ent = inicio + random.randint(-10, 10)
+                marcas = [ent, ent + 240, ent + 300, ent + 540] if i % 2 else [ent, ent + 360]
+                base = datetime.combine(d, datetime.min.time())
+                for k, m in enumerate(marcas):
+                    dh = base + timedelta(minutes=m)
+                    linhas.append({'funcionario_id': fid, 'data': d, 'hora': dh.strftime('%H:%M'),
+                                   'data_hora': dh, 'tipo': 'Entrada' if k % 2 == 0 else 'Saída'})
+            d += timedelta(days=1)
+        if len(linhas) > 20000:
+            db.session.bulk_insert_mappings(Batida, linhas)
+            total += len(linhas)
+            linhas = []
+    db.session.bulk_insert_mappings(Batida, linhas)
+    db.session.commit()
+    return total + len(linhas)
+
+
+def _contar_direto(d: date):
+    """Presença de d por (departamento, função) × faixa, batida a batida."""
+    from services.cobertura_intradiaria import FAIXA_MIN, FAIXAS_DIA
+    origem = datetime.combine(d, datetime.min.time())
+    res = {}
+    funcs = {f.id: f for f in Funcionario.query.all()}
+    por_func = {}
+    for b in Batida.query.filter(Batida.data.between(d - timedelta(days=1), d)).order_by(Batida.data_hora):
+        por_func.setdefault((b.funcionario_id, b.data), []).append(b.data_hora)
+    for (fid, _), marcas in por_func.items():
+        f = funcs[fid]
+        curva = res.setdefault((f.departamento, f.funcao), [0] * FAIXAS_DIA)
+        for ent, sai in zip(marcas[::2], marcas[1::2]):
+            for k in range(FAIXAS_DIA):
+                t = origem + timedelta(minutes=k * FAIXA_MIN)
+                if ent <= t < sai:
+                    curva[k] += 1
+    return {g: c for g, c in res.items() if any(c)}
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 300
+    dias = int(args[1]) if len(args) > 1 else 365
+    ontem = date.today() - timedelta(days=1)
+    data_ini = ontem - timedelta(days=dias - 1)
+
+    app = create_app()
+    with app.app_context():
+        print(f'Populando {n} funcionários × {dias} dias...')
+        t0 = _time.perf_counter()
+        total = popular(n, data_ini, ontem)
+        print(f'{total} batidas em {_time.perf_counter() - t0:.1f} s')
+
+        from services.previsao_demanda import (
+            atualizar_presencas, recalcular_previsao, curvas_presenca, previsao, metas_previstas,
+        )
+
+        t0 = _time.perf_counter()
+        r = atualizar_presencas(ontem, historico=dias)
+        print(f'carga inicial presenças:  {_time.perf_counter() - t0:8.2f} s   '
+              f'({r["dias"]} dias, {r["linhas"]} linhas)')
+
+        t0 = _time.perf_counter()
+        r = atualizar_presencas(ontem, historico=dias)
+        print(f'incremental (noturna):    {_time.perf_counter() - t0:8.2f} s   '
+              f'({r["dias"]} dias, {r["linhas"]} linhas)')
+
+        t0 = _time.perf_counter()
+        r = recalcular_previsao(ontem)
+        print(f'recálculo da previsão:    {_time.perf_counter() - t0:8.2f} s   '
+              f'({r["grupos"]} grupos, {r["linhas"]} linhas)')
+
+        t0 = _time.perf_counter()
+        previsao('BENCH A')
+        t1 = _time.perf_counter()
+        for _ in range(100):
+            previsao('BENCH A')
+            metas = metas_previstas('BENCH A')
+        t2 = _time.perf_counter()
+        print(f'previsão (1ª leitura):    {(t1 - t0) * 1000:8.1f} ms   '
+              f'em cache: {(t2 - t1) * 10:.2f} ms   ({len(metas)} metas)')
+
+        grupos, contagem = curvas_presenca(ontem, ontem)
+        vetorizado = {g: contagem[i, 0].tolist() for i, g in enumerate(grupos) if contagem[i, 0].any()}
+        print(f'curva de {ontem} igual à contagem direta: {vetorizado == _contar_direto(ontem)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark do ranking de substitutos (services/solver_escala.ranquear_substitutos).
+Cria um banco SQLite temporário com N candidatos na mesma função/departamento,
+escala de ±3 semanas e histórico de banco de horas, e mede o tempo do ranking
+em lote contra o laço antigo (validar_alocacao + saldo + folga por candidato).
+
+Usage: python bench_substituto.py [N] [--sem-legado]
+"""
+import os
+import random
+import sys
+import tempfile
+import time as _time
+from datetime import date, time, timedelta
+
+_db_path = os.path.join(tempfile.mkdtemp(), 'bench_substituto.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ.setdefault('WERKZEUG_RUN_MAIN', 'false')   # não sobe o APScheduler
+
+from app import create_app
+from extensions import db
+from models import AlocacaoDiaria, BancoHorasSaldo, Funcionario, Turno
+
+
+def popular(n: int, data_ref: date):
+    random.seed(42)
+    manha = Turno(nome='Manhã', hora_inicio=time(6), hora_fim=time(14), dias_semana='0,1,2,3,4',
+                  intervalo_minutos=60, departamento='BENCH')
+    tarde = Turno(nome='Tarde', hora_inicio=time(14), hora_fim=time(22), dias_semana='0,1,2,3,4',
+                  intervalo_minutos=60, departamento='BENCH')
+    db.session.add_all([manha, tarde])
+    db.session.flush()
+    for i in range(n):
+        db.session.add(Funcionario(
+            id=f'B{i:05d}', nome=f'Candidato {i:05d}', departamento='BENCH', funcao='Recepcionista',
+            sexo=random.choice(['M', 'F']), ativo=True,
+            horario_base_id=manha.id if i % 4 == 0 else None,
+        ))
+    db.session.flush()
+    for i in range(n):
+        fid = f'B{i:05d}'
+        for k in range(-21, 21):
+            if k and random.random() < 0.45:
+                db.session.add(AlocacaoDiaria(funcionario_id=fid, data=data_ref + timedelta(days=k),
+                                              turno_id=random.choice([manha.id, tarde.id])))
+        acumulado = 0.0
+        for k in range(-30, 0, 3):
+            acumulado += random.uniform(-2, 2)
+            db.session.add(BancoHorasSaldo(funcionario_id=fid, data=data_ref + timedelta(days=k),
+                                           saldo_acumulado=round(acumulado, 2)))
+    db.session.commit()
+
+
+def legado(data_ref: date, funcao: str, dept: str):
+    """Laço anterior: uma validação e duas consultas por candidato."""
+    from services.motor_clt import validar_alocacao
+    candidatos = (Funcionario.query.filter_by(ativo=True, departamento=dept, funcao=funcao)
+                  .order_by(Funcionario.nome).all())
+    ja_alocados = {a.funcionario_id for a in AlocacaoDiaria.query.filter_by(data=data_ref).all()}
+    turno = Turno.query.filter(Turno.departamento == dept).order_by(Turno.id).first()
+    melhores = []
+    for f in candidatos:
+        if f.id in ja_alocados:
+            continue
+        infr = validar_alocacao(f.id, data_ref, turno)
+        if any(i.get('severity', 'error') == 'error' for i in infr):
+            continue
+        row = (BancoHorasSaldo.query.filter_by(funcionario_id=f.id)
+               .order_by(BancoHorasSaldo.data.desc()).first())
+        melhores.append((float(row.saldo_acumulado) if row else 0.0, f))
+    melhores.sort(key=lambda x: x[0])
+    return melhores[:5]
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 1000
+    data_ref = date.today() + timedelta(days=(5 - date.today().weekday()) % 7)   # próximo sábado
+
+    app = create_app()
+    with app.app_context():
+        print(f'Populando {n} candidatos...')
+        popular(n, data_ref)
+
+        from services.solver_escala import ranquear_substitutos
+        tempos = []
+        for _ in range(3):
+            db.session.expire_all()
+            t0 = _time.perf_counter()
+            ranking = ranquear_substitutos(data_ref, funcao='Recepcionista', dept='BENCH', k=5)
+            tempos.append(_time.perf_counter() - t0)
+        print(f'ranquear_substitutos: melhor {min(tempos) * 1000:.0f} ms  ({len(ranking)} no top-k)')
+        for c in ranking:
+            print(f"  {c['score']:5.1f}  {c['func_nome']}  saldo {c['saldo_banco']:+.1f}h  semana {c['horas_semana']}h")
+
+        if '--sem-legado' not in sys.argv:
+            db.session.expire_all()
+            t0 = _time.perf_counter()
+            legado(data_ref, 'Recepcionista', 'BENCH')
+            print(f'laço por candidato:   {(_time.perf_counter() - t0) * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
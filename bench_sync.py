@@ -0,0 +1,150 @@
+"""
+Benchmark do sync com a API Secullum falsa (fake_secullum.py) servida por
+HTTP local — passa por SecullumAPI/requests como em produção.
+Cria um banco SQLite temporário (ou usa DATABASE_URL com --banco-atual) e roda
+ciclos completos:
+
+- sync_funcionarios + sync_horarios;
+- carga do histórico de batidas (DIAS dias, em blocos de 31, como um backfill);
+- nova passada do mesmo período (tudo já existe → só atualizações);
+- CICLOS syncs incrementais (sync_batidas_incremental).
+
+Para cada fase: tempo total, tempo na API (HTTP), tempo no banco (execução
+de SQL), registros/s, batidas novas e requisições/erros; no fim, o RSS máximo
+do processo. --tracemalloc mede também o pico de memória Python por fase
+(deixa o sync umas 3–4× mais lento).
+
+Usage: python bench_sync.py [N] [DIAS] [CICLOS] [--latencia-ms=20] [--erro=0.02]
+                            [--tracemalloc] [--banco-atual]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time as _time
+import tracemalloc
+from datetime import date, timedelta
+
+_opts = dict(a[2:].split('=', 1) if '=' in a else (a[2:], '1') for a in sys.argv[1:] if a.startswith('--'))
+if 'banco-atual' not in _opts:
+    _db_path = os.path.join(tempfile.mkdtemp(), 'bench_sync.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ.setdefault('WERKZEUG_RUN_MAIN', 'false')   # não sobe o APScheduler
+
+import requests
+from sqlalchemy import event
+
+from fake_secullum import FakeSecullum, iniciar
+
+
+class Medidor:
+    """Acumula tempo de HTTP (requests) e de SQL (cursor) durante uma fase."""
+
+    def __init__(self, engine):
+        self.api = self.sql = 0.0
+        self.consultas = 0
+        event.listen(engine, 'before_cursor_execute', self._antes)
+        event.listen(engine, 'after_cursor_execute', self._depois)
+        original = requests.sessions.Session.request
+
+        def request(sessao, *args, **kwargs):
+            t0 = _time.perf_counter()
+            try:
+                return original(sessao, *args, **kwargs)
+            finally:
+                self.api += _time.perf_counter() - t0
+        requests.sessions.Session.request = request
+
+    def _antes(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('t0', []).append(_time.perf_counter())
+
+    def _depois(self, conn, cursor, statement, parameters, context, executemany):
+        self.sql += _time.perf_counter() - conn.info['t0'].pop()
+        self.consultas += 1
+
+    def zerar(self):
+        self.api = self.sql = 0.0
+        self.consultas = 0
+
+
+def fase(nome, medidor, fake, fn, memoria=True):
+    from extensions import db
+    from models import Batida
+    antes_reg, antes_req, antes_err = fake.stats['registros'], fake.stats['requisicoes'], fake.stats['erros']
+    antes_bat = db.session.query(db.func.count(Batida.id)).scalar()
+    medidor.zerar()
+    if memoria:
+        tracemalloc.start()
+    t0 = _time.perf_counter()
+    falhas = fn()
+    total = _time.perf_counter() - t0
+    pico = tracemalloc.get_traced_memory()[1] / 2 ** 20 if memoria else 0.0
+    if memoria:
+        tracemalloc.stop()
+    registros = fake.stats['registros'] - antes_reg
+    novas = db.session.query(db.func.count(Batida.id)).scalar() - antes_bat
+    print(f'{nome:<22} {total:8.2f} s  api {medidor.api:7.2f} s  banco {medidor.sql:7.2f} s '
+          f'({medidor.consultas:6d} SQL)  {registros:7d} reg  {registros / total if total else 0:8.0f} reg/s  '
+          f'+{novas:6d} batidas  req {fake.stats["requisicoes"] - antes_req:3d} '
+          f'(erros {fake.stats["erros"] - antes_err})  falhas {falhas}'
+          + (f'  pico {pico:6.1f} MB' if memoria else ''))
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 500
+    dias = int(args[1]) if len(args) > 1 else 31
+    ciclos = int(args[2]) if len(args) > 2 else 5
+    memoria = 'tracemalloc' in _opts
+
+    fake = FakeSecullum(n, latencia_ms=float(_opts.get('latencia-ms', 0)), erro=float(_opts.get('erro', 0)))
+    servidor, url = iniciar(fake)
+    os.environ['SECULLUM_AUTH_URL'] = url
+    os.environ['SECULLUM_BASE_URL'] = f'{url}/IntegracaoExterna'
+    for var in ('SECULLUM_EMAIL', 'SECULLUM_PASSWORD', 'SECULLUM_BANCO'):
+        os.environ.setdefault(var, 'bench')
+
+    from app import create_app
+    from extensions import db
+    from services import sync_service as ss
+
+    app = create_app()
+    with app.app_context():
+        medidor = Medidor(db.engine)
+        print(f'{n} funcionários, {dias} dias de histórico, {ciclos} ciclos incrementais '
+              f'(latência {fake.latencia_ms:g} ms, erro {fake.erro:.0%})')
+
+        def cadastro():
+            ok_f, msg_f = ss.sync_funcionarios()
+            ok_h, msg_h = ss.sync_horarios()
+            return (not ok_f) + (not ok_h)
+        fase('funcionarios+horarios', medidor, fake, cadastro, memoria)
+
+        ontem = date.today() - timedelta(days=1)
+        ini = ontem - timedelta(days=dias - 1)
+
+        def historico():
+            falhas, d = 0, ini
+            while d <= ontem:
+                fim = min(ontem, d + timedelta(days=30))
+                ok, _ = ss.sync_batidas(d.isoformat(), fim.isoformat())
+                falhas += not ok
+                d = fim + timedelta(days=1)
+            return falhas
+        fase('histórico (carga)', medidor, fake, historico, memoria)
+        fase('histórico (de novo)', medidor, fake, historico, memoria)
+
+        def incrementais():
+            falhas = 0
+            for _ in range(ciclos):
+                ok, _ = ss.sync_batidas_incremental()
+                falhas += not ok
+            return falhas
+        fase(f'incremental ×{ciclos}', medidor, fake, incrementais, memoria)
+
+    servidor.shutdown()
+    print(f'RSS máximo do processo: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
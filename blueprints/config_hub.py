@@ -31,14 +31,8 @@ def _somente_gestor(f):
 def index():
     usuarios = Usuario.query.order_by(Usuario.nome).all()
     # Departamentos únicos presentes no banco
-    depts = (
-        db.session.query(Funcionario.departamento)
-        .filter(Funcionario.ativo == True, Funcionario.departamento.isnot(None))
-        .distinct()
-        .order_by(Funcionario.departamento)
-        .all()
-    )
-    departamentos = [d[0] for d in depts if d[0]]
+    from services.facetas import facetas
+    departamentos = facetas()['departamentos']
     unidades = {u.departamento: u for u in UnidadeLider.query.all()}
     # Funcionários sem escala nos próximos 7 dias
     hoje = date.today()
@@ -58,13 +52,18 @@ def index():
     todos_func = Funcionario.query.filter_by(ativo=True).order_by(Funcionario.nome).all()
     import os
 
+    configs = {c.chave: c.valor for c in Configuracao.query.filter(Configuracao.chave.like('sync_%'))}
+
     def _cfg(chave, default=''):
-        row = Configuracao.query.filter_by(chave=chave).first()
-        return row.valor if row and row.valor is not None else default
+        valor = configs.get(chave)
+        return valor if valor is not None else default
 
     sync_cfg = {
         'rapida_ativo':           _cfg('sync_rapida_ativo', '1') == '1',
         'rapida_intervalo_min':   _cfg('sync_rapida_intervalo_min', '10'),
+        'rapida_adaptativo':      _cfg('sync_rapida_adaptativo', '1') == '1',
+        'rapida_pico_min':        _cfg('sync_rapida_intervalo_pico_min', '3'),
+        'rapida_ocioso_min':      _cfg('sync_rapida_intervalo_ocioso_min', '30'),
         'completa_ativo':         _cfg('sync_completa_ativo', '1') == '1',
         'completa_intervalo_min': _cfg('sync_completa_intervalo_min', '60'),
         'completa_janela_horas':  _cfg('sync_completa_janela_horas', '12'),
@@ -337,7 +336,9 @@ def escalas_importar():
     except ValueError:
         return jsonify({'error': 'Datas inválidas.'}), 400
 
-    turnos_criados = alocacoes_criadas = erros = 0
+    from services.gerador_escala import celulas_dias_semana, planejar, aplicar_plano, INSERIR
+    turnos_criados = erros = 0
+    alvo = {}
 
     for h in horarios:
         nome_turno = (h.get('nome_horario') or 'Sem nome').strip()
@@ -366,20 +367,21 @@ def escalas_importar():
             db.session.flush()
             turnos_criados += 1
 
-        cur = d_inicio
-        while cur <= d_fim:
-            if cur.weekday() in dias_python:
-                existe = AlocacaoDiaria.query.filter_by(funcionario_id=func_id, data=cur).first()
-                if not existe:
-                    db.session.add(AlocacaoDiaria(funcionario_id=func_id, turno_id=turno.id, data=cur))
-                    alocacoes_criadas += 1
-            cur += timedelta(days=1)
-
-    db.session.commit()
+        # Primeiro horário do funcionário no dia prevalece
+        for chave, tid in celulas_dias_semana(func_id, d_inicio, d_fim, turno.id, dias_python).items():
+            alvo.setdefault(chave, tid)
+
+    plano = planejar(alvo, data_ini=d_inicio, data_fim=d_fim, modo=INSERIR)
+    if dados.get('previa'):
+        db.session.rollback()   # descarta os turnos criados na prévia
+        return jsonify({'ok': True, 'previa': True, 'turnos_criados': turnos_criados,
+                        'alocacoes_criadas': len(plano.inserir), 'existentes': plano.inalteradas,
+                        'erros': erros})
+    aplicar_plano(plano)
     return jsonify({
         'ok': True,
         'turnos_criados': turnos_criados,
-        'alocacoes_criadas': alocacoes_criadas,
+        'alocacoes_criadas': len(plano.inserir),
         'erros': erros,
     })
 
@@ -401,20 +403,28 @@ def sync_batidas_salvar():
     """Salva parâmetros do sync automático de batidas."""
     rapida_ativo           = '1' if request.form.get('rapida_ativo') else '0'
     rapida_intervalo_min   = request.form.get('rapida_intervalo_min', '10').strip()
+    rapida_adaptativo      = '1' if request.form.get('rapida_adaptativo') else '0'
+    rapida_pico_min        = request.form.get('rapida_pico_min', '3').strip()
+    rapida_ocioso_min      = request.form.get('rapida_ocioso_min', '30').strip()
     completa_ativo         = '1' if request.form.get('completa_ativo') else '0'
     completa_intervalo_min = request.form.get('completa_intervalo_min', '60').strip()
     completa_janela_horas  = request.form.get('completa_janela_horas', '12').strip()
 
     try:
         assert 1 <= int(rapida_intervalo_min) <= 1440
+        assert 1 <= int(rapida_pico_min) <= int(rapida_intervalo_min)
+        assert int(rapida_intervalo_min) <= int(rapida_ocioso_min) <= 1440
         assert 1 <= int(completa_intervalo_min) <= 1440
         assert 1 <= int(completa_janela_horas) <= 168
     except (ValueError, AssertionError):
-        flash('Valores inválidos. Verifique os intervalos informados.', 'danger')
+        flash('Valores inválidos. Verifique os intervalos informados (pico ≤ intervalo ≤ ocioso).', 'danger')
         return redirect(url_for('config_hub.index') + '#tab-sync')
 
     _salvar_cfg('sync_rapida_ativo',           rapida_ativo)
     _salvar_cfg('sync_rapida_intervalo_min',   rapida_intervalo_min)
+    _salvar_cfg('sync_rapida_adaptativo',      rapida_adaptativo)
+    _salvar_cfg('sync_rapida_intervalo_pico_min',   rapida_pico_min)
+    _salvar_cfg('sync_rapida_intervalo_ocioso_min', rapida_ocioso_min)
     _salvar_cfg('sync_completa_ativo',         completa_ativo)
     _salvar_cfg('sync_completa_intervalo_min', completa_intervalo_min)
     _salvar_cfg('sync_completa_janela_horas',  completa_janela_horas)
@@ -424,6 +434,25 @@ def sync_batidas_salvar():
     return redirect(url_for('config_hub.index') + '#tab-sync')
 
 
+@config_hub_bp.route('/sync-batidas/agenda')
+@login_required
+@_somente_gestor
+def sync_batidas_agenda():
+    """Faixas da cadência adaptativa de hoje (services/cadencia_sync)."""
+    from services.cadencia_sync import agenda
+    return jsonify(agenda())
+
+
+@config_hub_bp.route('/sync-runs/dados')
+@login_required
+@_somente_gestor
+def sync_runs_dados():
+    """Percentis e últimas execuções de sync (histórico em sync_runs)."""
+    from services.sync_runs import estatisticas
+    dias = max(1, min(request.args.get('dias', 7, type=int), 90))
+    return jsonify(estatisticas(dias))
+
+
 @config_hub_bp.route('/sync-batidas/executar', methods=['POST'])
 @login_required
 @_somente_gestor
@@ -1,56 +1,28 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required
 from datetime import date
-from models import Funcionario, Batida, AlocacaoDiaria
+from models import Funcionario, Batida
 from extensions import db
 from sqlalchemy import func
+from services.snapshot_service import snapshot_do_dia, alteracoes_desde, totais
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+POLL_SEG = 15   # intervalo de consulta do dashboard a /dashboard/alteracoes
+
 
 @dashboard_bp.route('/')
 @login_required
 def index():
     today = date.today()
-    total_funcionarios = Funcionario.query.filter_by(ativo=True).count()
-    batidas_hoje = Batida.query.filter_by(data=today).count()
-    inconsistencias = Batida.query.filter_by(data=today, inconsistente=True).count()
-
-    # Funcionários em jornada: têm batida de entrada hoje sem batida de saída correspondente
-    # (número ímpar de batidas = alguém ainda dentro)
-    subq = (
-        db.session.query(Batida.funcionario_id, func.count(Batida.id).label('total'))
-        .filter(Batida.data == today)
-        .group_by(Batida.funcionario_id)
-        .subquery()
-    )
-    em_jornada = db.session.query(subq).filter(subq.c.total % 2 == 1).count()
 
-    # Ausências: escalados hoje sem nenhuma batida
-    escalados_hoje = (
-        AlocacaoDiaria.query
-        .filter(AlocacaoDiaria.data == today)
-        .with_entities(AlocacaoDiaria.funcionario_id)
-        .subquery()
-    )
-    func_com_batida = (
-        Batida.query
-        .filter(Batida.data == today)
-        .with_entities(Batida.funcionario_id)
-        .distinct()
-        .subquery()
-    )
-    ausencias = (
-        Funcionario.query
-        .filter(
-            Funcionario.id.in_(db.session.query(escalados_hoje)),
-            Funcionario.id.notin_(db.session.query(func_com_batida)),
-            Funcionario.ativo == True,
-        )
-        .order_by(Funcionario.nome)
-        .limit(10)
-        .all()
-    )
+    # Indicadores vêm do snapshot por unidade (mantido pelo sync)
+    unidades = snapshot_do_dia(today)
+    tot = totais(unidades)
+    ausencias = sorted(
+        (a for s in unidades for a in s.ausentes_lista),
+        key=lambda a: a['nome'],
+    )[:10]
 
     # Últimas 10 batidas do dia
     ultimas_batidas = (
@@ -62,19 +34,38 @@ def index():
         .all()
     )
 
-    ultima_sync = (
-        db.session.query(func.max(Funcionario.data_ultima_sincronizacao))
-        .scalar()
+    from services.sync_service import get_ultima_sync_batidas
+    ultima_sync = get_ultima_sync_batidas() or (
+        db.session.query(func.max(Funcionario.data_ultima_sincronizacao)).scalar()
     )
     last_sync = ultima_sync.strftime('%d/%m %H:%M') if ultima_sync else 'Nunca'
 
     return render_template(
         'index.html',
-        total_funcionarios=total_funcionarios,
-        batidas_hoje=batidas_hoje,
-        inconsistencias=inconsistencias,
-        em_jornada=em_jornada,
+        total_funcionarios=tot['ativos'],
+        batidas_hoje=tot['batidas'],
+        inconsistencias=tot['inconsistencias'],
+        em_jornada=tot['em_jornada'],
         ausencias=ausencias,
+        total_ausencias=tot['ausentes'],
+        atrasados=tot['atrasados'],
+        unidades=unidades,
+        versao_snapshot=max((s.versao for s in unidades), default=0),
+        poll_seg=POLL_SEG,
         batidas=ultimas_batidas,
         last_sync=last_sync,
     )
+
+
+@dashboard_bp.route('/dashboard/alteracoes')
+@login_required
+def alteracoes():
+    """Unidades cujo snapshot mudou desde a versão vista pelo cliente (?versao=).
+    Responde na hora — o dashboard consulta a cada POLL_SEG segundos, sem
+    prender um worker do gunicorn entre as leituras."""
+    versao = request.args.get('versao', 0, type=int)
+    alteradas = alteracoes_desde(versao, date.today())
+    return jsonify({
+        'versao': max((a['versao'] for a in alteradas), default=versao),
+        'unidades': alteradas,
+    })
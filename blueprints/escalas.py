@@ -5,6 +5,13 @@ from flask_login import login_required, current_user
 from extensions import db
 from models import Turno, AlocacaoDiaria, Funcionario, Batida, PadraoTurno, GrupoDepartamento
 from services.motor_clt import validar_alocacao
+from services.escala_versao import cache_por_versao, dia_corrente
+# Dropdowns e filtros de departamento/grupo/função (em cache, ver services/facetas.py)
+from services.facetas import (
+    facetas, invalidar_facetas,
+    lista_departamentos as _departamentos, funcoes as _funcoes,
+    resolver_departamentos as _resolver_depts, filtrar_departamento as _filtrar_dept,
+)
 
 escalas_bp = Blueprint('escalas', __name__, url_prefix='/escalas')
 
@@ -61,12 +68,6 @@ def turno_novo():
                            departamentos=_departamentos(), funcoes=_funcoes())
 
 
-def _funcoes():
-    """Retorna lista de todas as funções (cargos) únicas dos funcionários."""
-    res = db.session.query(Funcionario.funcao).filter(Funcionario.funcao.isnot(None)).distinct().all()
-    return sorted([r[0] for r in res if r[0]])
-
-
 @escalas_bp.route('/turno/<int:turno_id>/editar', methods=['GET', 'POST'])
 @login_required
 def turno_editar(turno_id):
@@ -120,20 +121,12 @@ def turno_excluir(turno_id):
 def _aplicar_escala_futuro(func_id, turno_id: int, dias_semana: list, data_inicio, dias_frente: int = 60) -> int:
     """Substitui todas as alocações futuras do funcionário pelo novo turno,
     apenas nos dias da semana configurados no turno."""
+    from services.gerador_escala import celulas_dias_semana, planejar, aplicar_plano, SUBSTITUIR
     data_fim = data_inicio + timedelta(days=dias_frente)
-    AlocacaoDiaria.query.filter(
-        AlocacaoDiaria.funcionario_id == func_id,
-        AlocacaoDiaria.data >= data_inicio,
-        AlocacaoDiaria.data <= data_fim,
-    ).delete()
-    gerados = 0
-    d = data_inicio
-    while d <= data_fim:
-        if d.weekday() in dias_semana:
-            db.session.add(AlocacaoDiaria(funcionario_id=func_id, turno_id=turno_id, data=d))
-            gerados += 1
-        d += timedelta(days=1)
-    return gerados
+    alvo = celulas_dias_semana(func_id, data_inicio, data_fim, turno_id, dias_semana)
+    plano = planejar(alvo, [func_id], data_inicio, data_fim, modo=SUBSTITUIR)
+    aplicar_plano(plano, commit=False)
+    return len(alvo)
 
 
 @escalas_bp.route('/alocar', methods=['GET', 'POST'])
@@ -203,8 +196,10 @@ def divergencias():
     data_str = request.args.get('data', date.today().strftime('%Y-%m-%d'))
     data_ref = datetime.strptime(data_str, '%Y-%m-%d').date()
 
-    # Funcionários com alocação hoje
-    alocacoes = AlocacaoDiaria.query.filter_by(data=data_ref).all()
+    # Funcionários escalados no dia (exceção ou horário base)
+    from services.escala_efetiva import escalados_no_dia
+    funcs = {f.id: f for f in Funcionario.query.filter_by(ativo=True)}
+    escalados = escalados_no_dia(data_ref, funcs.keys())
 
     # Quais têm batida?
     func_com_batida = {
@@ -214,14 +209,14 @@ def divergencias():
 
     ausentes = [
         {
-            'funcionario': a.funcionario.nome,
-            'funcionario_id': a.funcionario_id,
-            'turno': a.turno.nome,
-            'hora_inicio': a.turno.hora_inicio.strftime('%H:%M'),
-            'celular': a.funcionario.celular,
+            'funcionario': funcs[fid].nome,
+            'funcionario_id': fid,
+            'turno': cel.turno.nome,
+            'hora_inicio': cel.inicio.strftime('%H:%M'),
+            'celular': funcs[fid].celular,
         }
-        for a in alocacoes
-        if a.funcionario_id not in func_com_batida
+        for fid, cel in sorted(escalados.items(), key=lambda x: funcs[x[0]].nome)
+        if fid not in func_com_batida
     ]
 
     if request.args.get('fmt') == 'json':
@@ -236,18 +231,11 @@ def divergencias():
 @escalas_bp.route('/calendario')
 @login_required
 def calendario():
-    departamentos = (
-        db.session.query(Funcionario.departamento)
-        .filter(Funcionario.ativo == True, Funcionario.departamento.isnot(None))
-        .distinct()
-        .order_by(Funcionario.departamento)
-        .all()
-    )
     turnos = Turno.query.order_by(Turno.nome).all()
     funcionarios = Funcionario.query.filter_by(ativo=True).order_by(Funcionario.nome).all()
     return render_template(
         'escalas/calendario.html',
-        departamentos=[d[0] for d in departamentos],
+        departamentos=facetas()['departamentos'],
         turnos=turnos,
         funcionarios=funcionarios,
     )
@@ -255,13 +243,27 @@ def calendario():
 
 @escalas_bp.route('/eventos')
 @login_required
+@cache_por_versao()
 def eventos():
-    """JSON endpoint para FullCalendar — retorna AlocacaoDiarias como eventos."""
+    """JSON endpoint para FullCalendar.
+
+    - Exceções (AlocacaoDiaria) viram eventos concretos.
+    - O horário base vira eventos recorrentes (daysOfWeek/startTime/endTime com
+      startRecur/endRecur) que o calendário expande no cliente; a recorrência é
+      interrompida nos dias com exceção ou com infração CLT, que são enviados
+      como eventos concretos.
+    - As infrações são calculadas em lote (validar_lote), sem consultas por dia.
+    - ?since_version=N (modo delta): devolve só os eventos dos funcionários com
+      alocações alteradas desde a versão N, ou `recarregar: true` quando a
+      mudança não é localizável (turno, cadastro, grupo, escrita em massa).
+    """
+    from services.escala_versao import versao_atual, alteracoes_desde
     start_str = request.args.get('start', '')
     end_str   = request.args.get('end', '')
     dept      = request.args.get('dept', '').strip()
     func_id   = request.args.get('func_id', '').strip()
     funcao    = request.args.get('funcao', '').strip()
+    since     = request.args.get('since_version', '').strip()
 
     try:
         d_ini = date.fromisoformat(start_str[:10])
@@ -274,71 +276,151 @@ def eventos():
     funcs_q = _filtrar_dept(funcs_q, dept)
     if func_id: funcs_q = funcs_q.filter(Funcionario.id == func_id)
     if funcao: funcs_q = funcs_q.filter(Funcionario.funcao == funcao)
-    
-    funcionarios = funcs_q.all()
-    func_ids = [f.id for f in funcionarios]
 
-    # Pegamos as alocações (exceções) no período
-    alocacoes_raw = (
-        AlocacaoDiaria.query
-        .filter(AlocacaoDiaria.data >= d_ini, AlocacaoDiaria.data <= d_fim)
-        .filter(AlocacaoDiaria.funcionario_id.in_(func_ids))
-        .all()
-    )
-    # Mapa de exceções {data_iso: {func_id: aloc}}
-    excecoes_map = {}
-    for aloc in alocacoes_raw:
-        data_str = aloc.data.isoformat()
-        excecoes_map.setdefault(data_str, {})[aloc.funcionario_id] = aloc
+    if not since.isdigit():
+        return jsonify(_montar_eventos(funcs_q, d_ini, d_fim))
+
+    # ── Modo delta ──
+    versao = versao_atual()
+    alteracoes = alteracoes_desde(int(since))
+    if alteracoes is None or any(a.entidade != 'alocacao' for a in alteracoes):
+        return jsonify({'versao': versao, 'recarregar': True, 'funcionarios': [], 'eventos': []})
+
+    # Infrações olham ±7 dias de contexto: alterações nessa margem também contam
+    ctx_ini, ctx_fim = d_ini - timedelta(days=7), d_fim + timedelta(days=7)
+    afetados = {a.funcionario_id for a in alteracoes
+                if a.funcionario_id and a.data and ctx_ini <= a.data <= ctx_fim}
+    if not afetados:
+        return jsonify({'versao': versao, 'recarregar': False, 'funcionarios': [], 'eventos': []})
+
+    funcs_q = funcs_q.filter(Funcionario.id.in_(list(afetados)))
+    return jsonify({
+        'versao': versao,
+        'recarregar': False,
+        # O cliente remove os eventos destes funcionários e insere os novos
+        'funcionarios': sorted(afetados),
+        'eventos': _montar_eventos(funcs_q, d_ini, d_fim),
+    })
+
+
+def _montar_eventos(funcs_q, d_ini, d_fim) -> list:
+    """Eventos FullCalendar (concretos + recorrentes) dos funcionários da query."""
+    from services.escala_efetiva import resolver
+    from services.motor_clt import escala_de_efetivos, validar_lote
+    from sqlalchemy.orm import joinedload
+    funcionarios = funcs_q.options(joinedload(Funcionario.horario_base)).all()
+    funcs_map = {f.id: f for f in funcionarios}
+
+    # Escala efetiva (exceção ou horário base) do período + contexto para as
+    # regras CLT (semana/DSR/vizinhos) — a mesma do validar_plano e do sandbox
+    efetivos = resolver(funcs_map.keys(), d_ini - timedelta(days=7), d_fim + timedelta(days=7))
+    escala = escala_de_efetivos(efetivos)
+    celulas = {k: cel for k, cel in efetivos.items() if d_ini <= k[1] <= d_fim}
+    infracoes_map = validar_lote(((fid, d, cel.turno) for (fid, d), cel in celulas.items()), escala, funcs_map)
+
+    def _titulo(f):
+        nome_parts = f.nome.split()
+        return nome_parts[0] + (f' {nome_parts[1][0]}.' if len(nome_parts) > 1 else '')
 
     events = []
-    curr_d = d_ini
-    while curr_d <= d_fim:
-        data_iso = curr_d.isoformat()
-        for f in funcionarios:
-            aloc = excecoes_map.get(data_iso, {}).get(f.id)
-            turno = None
-            is_excecao = False
-            
-            if aloc:
-                turno = aloc.turno
-                is_excecao = True
-            elif f.horario_base:
-                # Fallback para o Horário Base se estiver no dia da semana configurado
-                if curr_d.weekday() in f.horario_base.dias_semana_list:
-                    turno = f.horario_base
-            
-            if not turno:
-                continue
+    # Dias que interrompem a recorrência do horário base: {func_id: set(datas)}
+    quebras: dict[str, set] = {}
+
+    for (fid, d), cel in sorted(celulas.items()):
+        infracoes = infracoes_map.get((fid, d), [])
+        is_excecao = cel.is_excecao
+        if not is_excecao and not infracoes:
+            continue  # coberto pelo evento recorrente
+        quebras.setdefault(fid, set()).add(d)
+        f = funcs_map[fid]
+        turno = cel.turno
+        data_iso = d.isoformat()
+        aloc_id = cel.alocacao_id
+        base_color = turno.color or '#4f46e5'
+        events.append({
+            'id': aloc_id if aloc_id else f"base_{fid}_{data_iso}",
+            'resourceId': str(fid),
+            'title': _titulo(f),
+            'start': cel.inicio.strftime('%Y-%m-%dT%H:%M'),
+            'end':   cel.fim.strftime('%Y-%m-%dT%H:%M'),
+            'backgroundColor': '#ef4444' if infracoes else base_color,
+            'borderColor':     '#000000' if is_excecao else base_color, # Borda preta p/ exceção
+            'classNames':      (['fc-evento-clt'] if infracoes else []) + (['fc-excecao'] if is_excecao else []),
+            'extendedProps': {
+                'func_id':     str(fid),
+                'func_nome':   f.nome,
+                'turno_id':    turno.id,
+                'turno_nome':  turno.nome,
+                'hora_inicio': cel.inicio.strftime('%H:%M'),
+                'hora_fim':    cel.fim.strftime('%H:%M'),
+                'is_excecao':  is_excecao,
+                'infracoes':   [i['message'] for i in infracoes],
+                'aloc_id':     aloc_id,
+            },
+        })
 
-            infracoes = validar_alocacao(f.id, curr_d, turno)
-            h_ini_t, h_fim_t, _ = turno.get_horario_dia(curr_d.weekday())
-            
-            nome_parts = f.nome.split()
-            titulo = nome_parts[0] + (f' {nome_parts[1][0]}.' if len(nome_parts) > 1 else '')
-            
-            base_color = turno.color or '#4f46e5'
-            events.append({
-                'id': aloc.id if aloc else f"base_{f.id}_{data_iso}",
-                'resourceId': str(f.id),
-                'title': titulo,
-                'start': f"{data_iso}T{h_ini_t.strftime('%H:%M')}",
-                'end':   f"{data_iso}T{h_fim_t.strftime('%H:%M')}",
-                'backgroundColor': '#ef4444' if infracoes else base_color,
-                'borderColor':     '#000000' if is_excecao else base_color, # Borda preta p/ exceção
-                'classNames':      (['fc-evento-clt'] if infracoes else []) + (['fc-excecao'] if is_excecao else []),
-                'extendedProps': {
-                    'func_id':    str(f.id),
-                    'func_nome':  f.nome,
-                    'turno_id':   turno.id,
-                    'turno_nome': turno.nome,
-                    'is_excecao': is_excecao,
-                    'infracoes':   [i['message'] for i in infracoes],
-                    'aloc_id':     aloc.id if aloc else None,
-                },
-            })
-        curr_d += timedelta(days=1)
-    return jsonify(events)
+    # Horário base → eventos recorrentes, agrupando dias da semana com o mesmo horário
+    for f in funcionarios:
+        base = f.horario_base
+        if not base:
+            continue
+        grupos: dict[tuple, list] = {}
+        for wd in base.dias_semana_list:
+            h_ini_t, h_fim_t, _ = base.get_horario_dia(wd)
+            grupos.setdefault((h_ini_t, h_fim_t), []).append(wd)
+
+        base_color = base.color or '#4f46e5'
+        quebras_f = quebras.get(f.id, set())
+        for (h_ini_t, h_fim_t), dias_wd in grupos.items():
+            fim_h = h_fim_t.hour + (24 if h_fim_t < h_ini_t else 0)   # turno noturno: "30:00"
+            for seg_ini, seg_fim in _segmentos_recorrencia(d_ini, d_fim, set(dias_wd), quebras_f):
+                events.append({
+                    'id': f"base_{f.id}_{seg_ini.isoformat()}_{h_ini_t.strftime('%H%M')}",
+                    'groupId': f"base_{f.id}",
+                    'resourceId': str(f.id),
+                    'title': _titulo(f),
+                    # FullCalendar: 0=Domingo … 6=Sábado
+                    'daysOfWeek': sorted((wd + 1) % 7 for wd in dias_wd),
+                    'startTime': h_ini_t.strftime('%H:%M'),
+                    'endTime':   f"{fim_h:02d}:{h_fim_t.minute:02d}",
+                    'startRecur': seg_ini.isoformat(),
+                    'endRecur':   seg_fim.isoformat(),   # exclusivo
+                    'backgroundColor': base_color,
+                    'borderColor':     base_color,
+                    'classNames':      [],
+                    'extendedProps': {
+                        'func_id':     str(f.id),
+                        'func_nome':   f.nome,
+                        'turno_id':    base.id,
+                        'turno_nome':  base.nome,
+                        'hora_inicio': h_ini_t.strftime('%H:%M'),
+                        'hora_fim':    h_fim_t.strftime('%H:%M'),
+                        'is_excecao':  False,
+                        'infracoes':   [],
+                        'aloc_id':     None,
+                    },
+                })
+    return events
+
+
+def _segmentos_recorrencia(d_ini, d_fim, dias_wd: set, quebras: set):
+    """Divide [d_ini, d_fim] em intervalos [inicio, fim_exclusivo) sem dias de quebra.
+    Só contam como quebra as datas cujo dia da semana pertence à recorrência."""
+    seg_ini = d_ini
+    tem_dia = False
+    d = d_ini
+    while d <= d_fim:
+        if d.weekday() in dias_wd:
+            if d in quebras:
+                if tem_dia:
+                    yield seg_ini, d
+                seg_ini = d + timedelta(days=1)
+                tem_dia = False
+            else:
+                tem_dia = True
+        d += timedelta(days=1)
+    if tem_dia:
+        yield seg_ini, d_fim + timedelta(days=1)
 
 
 @escalas_bp.route('/alocar/<int:aloc_id>/mover', methods=['PATCH'])
@@ -491,8 +573,26 @@ def gantt():
                            func_sel=func_id)
 
 
+def _assinatura_batidas_gantt():
+    """Componente extra da ETag do Gantt: muda quando as batidas do dia mudam
+    (inclusão, exclusão ou edição de hora)."""
+    from sqlalchemy import func, cast, Integer
+    try:
+        data_ref = date.fromisoformat(request.args.get('data', date.today().strftime('%Y-%m-%d')))
+    except ValueError:
+        return None
+    minutos = (cast(func.substr(Batida.hora, 1, 2), Integer) * 60
+               + cast(func.substr(Batida.hora, 4, 2), Integer))
+    return tuple(
+        db.session.query(func.count(Batida.id), func.max(Batida.id), func.sum(minutos))
+        .filter(Batida.data == data_ref)
+        .one()
+    )
+
+
 @escalas_bp.route('/gantt/dados')
 @login_required
+@cache_por_versao(extra=_assinatura_batidas_gantt)
 def gantt_dados():
     """JSON: linhas do Gantt para a data e filtros selecionados."""
     data_str = request.args.get('data', date.today().strftime('%Y-%m-%d'))
@@ -544,60 +644,6 @@ def gantt_dados():
 _DIAS_PT = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
 
 
-def _departamentos():
-    """Lista de departamentos individuais + grupos (para dropdowns em todo o sistema)."""
-    rows = (
-        db.session.query(Funcionario.departamento)
-        .filter(Funcionario.ativo == True, Funcionario.departamento.isnot(None))
-        .distinct()
-        .order_by(Funcionario.departamento)
-        .all()
-    )
-    depts = [r[0] for r in rows]
-    grupos = [g.nome for g in GrupoDepartamento.query.order_by(GrupoDepartamento.nome).all()]
-    # Grupos primeiro, depois departamentos individuais
-    return grupos + depts
-
-
-def _resolver_depts(dept_str: str) -> list:
-    """Converte um nome de departamento OU grupo em lista de departamentos reais.
-    Ex: 'Praia do Canto' → ['PRAIA FITNESS', 'FUNCIONAL DA PRAIA']
-        'PRAIA FITNESS'  → ['PRAIA FITNESS']
-        ''               → []   (sem filtro)
-    """
-    if not dept_str:
-        return []
-    grupo = GrupoDepartamento.query.filter_by(nome=dept_str).first()
-    if grupo:
-        return grupo.departamentos
-    return [dept_str]
-
-
-def _filtrar_dept(q, dept_str: str):
-    """Aplica filtro de departamento a uma query de Funcionario, suportando grupos."""
-    depts = _resolver_depts(dept_str)
-    if not depts:
-        return q
-    if len(depts) == 1:
-        return q.filter(Funcionario.departamento == depts[0])
-    return q.filter(Funcionario.departamento.in_(depts))
-
-
-def _funcoes(departamento=None):
-    """Lista de funções (cargo) distintas, opcionalmente filtradas por departamento."""
-    q = (
-        db.session.query(Funcionario.funcao)
-        .filter(Funcionario.ativo == True, Funcionario.funcao.isnot(None))
-    )
-    if departamento:
-        depts = _resolver_depts(departamento)
-        if len(depts) == 1:
-            q = q.filter(Funcionario.departamento == depts[0])
-        elif depts:
-            q = q.filter(Funcionario.departamento.in_(depts))
-    return [r[0] for r in q.distinct().order_by(Funcionario.funcao).all()]
-
-
 @escalas_bp.route('/cargo-mensal', methods=['GET', 'POST'])
 @login_required
 def cargo_mensal():
@@ -637,25 +683,19 @@ def cargo_mensal():
         funcionarios = q.all()
 
         if not funcionarios:
+            if request.form.get('previa'):
+                return jsonify({'error': 'Nenhum funcionário encontrado com os critérios informados.'}), 400
             flash('Nenhum funcionário encontrado com os critérios informados.', 'warning')
             return redirect(url_for('escalas.cargo_mensal'))
 
-        gerados = 0
-        for func in funcionarios:
-            d = data_ini
-            while d <= data_fim:
-                if d.weekday() in dias_turno:
-                    aloc = AlocacaoDiaria.query.filter_by(
-                        funcionario_id=func.id, data=d).first()
-                    if aloc:
-                        aloc.turno_id = turno_id
-                    else:
-                        db.session.add(AlocacaoDiaria(
-                            funcionario_id=func.id, turno_id=turno_id, data=d))
-                    gerados += 1
-                d += timedelta(days=1)
-        db.session.commit()
+        from services.gerador_escala import celulas_padrao
+        alvo = celulas_padrao([f.id for f in funcionarios], data_ini, data_fim, turno_id, dias_semana=dias_turno)
+        resposta = _aplicar_plano_form(alvo, [f.id for f in funcionarios], data_ini, data_fim,
+                                       'escalas.cargo_mensal')
+        if resposta is not None:
+            return resposta
 
+        gerados = len(alvo)
         flash(
             f'Escala aplicada! {len(funcionarios)} funcionário(s) × {gerados // len(funcionarios)} dias '
             f'= {gerados} alocações geradas/atualizadas.',
@@ -702,38 +742,18 @@ def cargo_mensal_preview():
 @login_required
 def proximos_turnos(func_id):
     """Próximos dias de escala — usa AlocacaoDiaria (exceção) ou horario_base (padrão)."""
+    from services.escala_efetiva import resolver
     func = Funcionario.query.get_or_404(func_id)
     hoje = date.today()
-
-    # Exceções explícitas dos próximos 10 dias
-    excecoes = {
-        a.data: a.turno
-        for a in AlocacaoDiaria.query
-        .filter(
-            AlocacaoDiaria.funcionario_id == func_id,
-            AlocacaoDiaria.data >= hoje,
-            AlocacaoDiaria.data <= hoje + timedelta(days=10),
-        )
-        .join(Turno)
-        .all()
-    }
-
-    def _turno_efetivo(d):
-        """Retorna (turno, is_excecao) para o dia d, ou (None, False) se folga."""
-        if d in excecoes:
-            return excecoes[d], True
-        if func.horario_base and d.weekday() in func.horario_base.dias_semana_list:
-            return func.horario_base, False
-        return None, False
+    efetivos = resolver([func.id], hoje, hoje + timedelta(days=10))
 
     # Turno de hoje
-    turno_hoje, _ = _turno_efetivo(hoje)
-    if turno_hoje:
-        h_ini, h_fim, _ = turno_hoje.get_horario_dia(hoje.weekday())
+    cel_hoje = efetivos.get((func.id, hoje))
+    if cel_hoje:
         turno_hoje_data = {
-            'nome':   turno_hoje.nome,
-            'inicio': h_ini.strftime('%H:%M'),
-            'fim':    h_fim.strftime('%H:%M'),
+            'nome':   cel_hoje.turno.nome,
+            'inicio': cel_hoje.inicio.strftime('%H:%M'),
+            'fim':    cel_hoje.fim.strftime('%H:%M'),
         }
     else:
         turno_hoje_data = None
@@ -742,7 +762,7 @@ def proximos_turnos(func_id):
     proxima_folga = None
     for i in range(1, 11):
         d = hoje + timedelta(days=i)
-        if _turno_efetivo(d)[0] is None:
+        if (func.id, d) not in efetivos:
             proxima_folga = f"{_DIAS_PT[d.weekday()]} {d.strftime('%d/%m')}"
             break
 
@@ -750,16 +770,15 @@ def proximos_turnos(func_id):
     proximos = []
     for i in range(1, 8):
         d = hoje + timedelta(days=i)
-        t, is_exc = _turno_efetivo(d)
-        if t:
-            h_ini, h_fim, _ = t.get_horario_dia(d.weekday())
+        cel = efetivos.get((func.id, d))
+        if cel:
             proximos.append({
                 'data':      d.strftime('%d/%m'),
                 'dia':       _DIAS_PT[d.weekday()],
-                'turno':     t.nome,
-                'inicio':    h_ini.strftime('%H:%M'),
-                'fim':       h_fim.strftime('%H:%M'),
-                'excecao':   is_exc,
+                'turno':     cel.turno.nome,
+                'inicio':    cel.inicio.strftime('%H:%M'),
+                'fim':       cel.fim.strftime('%H:%M'),
+                'excecao':   cel.is_excecao,
             })
 
     return jsonify({
@@ -792,9 +811,11 @@ def cobertura():
 
 @escalas_bp.route('/cobertura/dados')
 @login_required
+@cache_por_versao(extra=dia_corrente)   # mes_ano padrão = mês corrente
 def cobertura_dados():
     """AJAX: retorna matriz de cobertura para o mês/filtros solicitados."""
     import calendar as cal_mod
+    from services.cobertura_engine import matriz_cobertura
     mes_ano = request.args.get('mes_ano', date.today().strftime('%Y-%m'))
     dept    = request.args.get('dept', '').strip()
     funcao  = request.args.get('funcao', '').strip()
@@ -805,87 +826,165 @@ def cobertura_dados():
         return jsonify({'error': 'mes_ano inválido'}), 400
 
     _, dias_no_mes = cal_mod.monthrange(ano, mes)
-    data_ini = date(ano, mes, 1)
-    data_fim = date(ano, mes, dias_no_mes)
 
-    # Funcionários filtrados
-    q_func = Funcionario.query.filter_by(ativo=True)
-    q_func = _filtrar_dept(q_func, dept)
-    if funcao: q_func = q_func.filter(Funcionario.funcao == funcao)
-    funcionarios = q_func.order_by(Funcionario.nome).all()
-    func_ids = [f.id for f in funcionarios]
-
-    if not func_ids:
+    # Matriz funcionários × dias (exceções + horário base), em cache por versão da escala
+    matriz = matriz_cobertura(ano, mes, dept, funcao)
+    if not matriz.funcs:
         return jsonify({'funcionarios': [], 'cobertura': {}, 'dias_no_mes': dias_no_mes, 'ano': ano, 'mes': mes})
 
-    # Alocações do mês
-    alocacoes = (
-        AlocacaoDiaria.query
-        .filter(
-            AlocacaoDiaria.funcionario_id.in_(func_ids),
-            AlocacaoDiaria.data >= data_ini,
-            AlocacaoDiaria.data <= data_fim,
-        )
-        .join(Turno)
-        .all()
-    )
-
-    # Indexar por func_id → dia → turno
-    aloc_map: dict[str, dict[int, dict]] = {}
-    for aloc in alocacoes:
-        d = aloc.data.day
-        aloc_map.setdefault(aloc.funcionario_id, {})[d] = {
-            'turno': aloc.turno.nome,
-            'color': aloc.turno.color or '#4f46e5',
-            'warning': bool(aloc.compliance_warning),
-        }
-
-    # Mapear dias de domingo para highlight
-    domingos = {d for d in range(1, dias_no_mes + 1)
-                if date(ano, mes, d).weekday() == 6}
+    dias_range = range(1, dias_no_mes + 1)
+    turno_idx = matriz.turno_idx[:, :dias_no_mes].tolist()
+    warning   = matriz.warning[:, :dias_no_mes].tolist()
 
     resultado_funcs = []
-    for f in funcionarios:
+    for f, linha_t, linha_w in zip(matriz.funcs, turno_idx, warning):
         dias = {}
-        for d in range(1, dias_no_mes + 1):
-            aloc_data = aloc_map.get(f.id, {}).get(d)
-            if aloc_data:
-                dias[d] = aloc_data               # exceção explícita
-            elif f.horario_base:
-                data_ref = date(ano, mes, d)
-                if data_ref.weekday() in f.horario_base.dias_semana_list:
-                    dias[d] = {                   # padrão do horario_base
-                        'turno': f.horario_base.nome,
-                        'color': f.horario_base.color or '#4f46e5',
-                        'warning': False,
-                    }
-                else:
-                    dias[d] = None
-            else:
+        for d, ti, w in zip(dias_range, linha_t, linha_w):
+            if ti < 0:
                 dias[d] = None
+                continue
+            t = matriz.turnos[ti]
+            dias[d] = {'turno': t['nome'], 'color': t['color'], 'warning': w}
         resultado_funcs.append({
-            'id':    f.id,
-            'nome':  f.nome,
-            'funcao': f.funcao or '',
+            'id':    f['id'],
+            'nome':  f['nome'],
+            'funcao': f['funcao'] or '',
             'dias':  dias,
         })
 
-    # Cobertura por dia (contagem de funcionários escalados, incluindo horario_base)
-    cobertura = {
-        d: sum(1 for f in resultado_funcs if f['dias'].get(d) is not None)
-        for d in range(1, dias_no_mes + 1)
+    # Cobertura por dia e por função (contagem de funcionários escalados, incluindo horario_base)
+    colunas = slice(0, dias_no_mes)   # dias do mês são as primeiras colunas
+    cobertura = dict(zip(dias_range, matriz.por_dia(colunas).tolist()))
+    cobertura_funcao = {
+        fn: dict(zip(dias_range, cont.tolist()))
+        for fn, cont in matriz.por_funcao(colunas).items()
     }
+    domingos = [d for d, dt in zip(dias_range, matriz.datas) if dt.weekday() == 6]
 
     return jsonify({
         'funcionarios': resultado_funcs,
         'cobertura':    cobertura,
+        'cobertura_funcao': cobertura_funcao,
         'dias_no_mes':  dias_no_mes,
-        'domingos':     list(domingos),
+        'domingos':     domingos,
         'ano':  ano,
         'mes':  mes,
     })
 
 
+# ── Cobertura intradiária (faixas de 15 min) ──────────────────────────────────
+
+@escalas_bp.route('/cobertura/intradiaria')
+@login_required
+def cobertura_intradiaria():
+    """Heatmap dia × hora de pessoas escaladas, com mínimos configuráveis."""
+    from models import CoberturaMinima
+    mes_ano  = request.args.get('mes_ano', date.today().strftime('%Y-%m'))
+    dept_sel = request.args.get('dept', '')
+    func_sel = request.args.get('funcao', '')
+    return render_template(
+        'escalas/cobertura_intradiaria.html',
+        mes_ano=mes_ano,
+        dept_sel=dept_sel,
+        func_sel=func_sel,
+        departamentos=_departamentos(),
+        funcoes=_funcoes(dept_sel or None),
+        minimos=CoberturaMinima.query.order_by(CoberturaMinima.departamento, CoberturaMinima.hora_inicio).all(),
+        dias_semana=DIAS_SEMANA,
+    )
+
+
+def _assinatura_minimos():
+    """Componente extra da ETag: regras de cobertura mínima (não mudam a versão da escala)."""
+    from sqlalchemy import func
+    from models import CoberturaMinima
+    return tuple(db.session.query(func.count(CoberturaMinima.id),
+                                  func.max(CoberturaMinima.atualizado_em)).one())
+
+
+def _versao_previsao():
+    from services.previsao_demanda import versao_previsao
+    return versao_previsao()
+
+
+@escalas_bp.route('/cobertura/intradiaria/dados')
+@login_required
+@cache_por_versao(extra=lambda: (dia_corrente(), _assinatura_minimos(), _versao_previsao()))
+def cobertura_intradiaria_dados():
+    """AJAX: escalados por faixa de 15 min (e mínimo por hora) no mês + lacunas
+    + mínimo previsto pelas batidas (previsão de demanda)."""
+    from services.cobertura_intradiaria import (
+        cobertura_intradiaria as _cobertura, regras_aplicaveis, minimos_por_faixa, lacunas,
+        FAIXAS_DIA,
+    )
+    from services.previsao_demanda import previsao, previsto_por_hora
+    mes_ano = request.args.get('mes_ano', date.today().strftime('%Y-%m'))
+    dept    = request.args.get('dept', '').strip()
+    funcao  = request.args.get('funcao', '').strip()
+    try:
+        ano, mes = int(mes_ano[:4]), int(mes_ano[5:7])
+    except (ValueError, IndexError):
+        return jsonify({'error': 'mes_ano inválido'}), 400
+
+    cob = _cobertura(ano, mes, dept, funcao)
+    faixas = cob.total()
+    exigido = minimos_por_faixa(cob, regras_aplicaveis(dept, funcao), dept, funcao)
+    por_hora = FAIXAS_DIA // 24
+    previsto = previsto_por_hora(cob.datas, dept, funcao)
+    gerada_em = (previsao(dept, funcao) or {}).get('gerado_em')
+    return jsonify({
+        'ano': ano,
+        'mes': mes,
+        'datas':        [d.isoformat() for d in cob.datas],
+        'faixa_min':    24 * 60 // FAIXAS_DIA,
+        'faixas':       faixas.tolist(),                     # n_dias × 96
+        'horas':        cob.por_hora().tolist(),             # n_dias × 24 (pior faixa da hora)
+        'exigido_hora': exigido.reshape(len(cob.datas), 24, por_hora).max(axis=2).tolist(),
+        'lacunas':      lacunas(ano, mes, dept, funcao),
+        'previsto_hora': previsto.tolist() if previsto is not None else None,
+        'previsao_gerada_em': gerada_em.isoformat() if gerada_em else None,
+    })
+
+
+@escalas_bp.route('/cobertura/minimos/novo', methods=['POST'])
+@login_required
+def cobertura_minimo_novo():
+    from models import CoberturaMinima
+    try:
+        h_ini = datetime.strptime(request.form['hora_inicio'], '%H:%M').time()
+        h_fim = datetime.strptime(request.form['hora_fim'], '%H:%M').time()
+        minimo = int(request.form.get('minimo', 1))
+    except (KeyError, ValueError):
+        flash('Informe horário de início, fim e mínimo válidos.', 'danger')
+        return redirect(url_for('escalas.cobertura_intradiaria'))
+    dia = request.form.get('dia_semana', '')
+    regra = CoberturaMinima(
+        departamento=request.form.get('departamento', '').strip() or None,
+        funcao=request.form.get('funcao', '').strip() or None,
+        dia_semana=int(dia) if dia.isdigit() else None,
+        hora_inicio=h_ini,
+        hora_fim=h_fim,
+        minimo=max(minimo, 1),
+    )
+    db.session.add(regra)
+    db.session.commit()
+    flash('Cobertura mínima cadastrada.', 'success')
+    return redirect(url_for('escalas.cobertura_intradiaria',
+                            dept=request.form.get('departamento', ''),
+                            funcao=request.form.get('funcao', '')))
+
+
+@escalas_bp.route('/cobertura/minimos/<int:regra_id>/excluir', methods=['POST'])
+@login_required
+def cobertura_minimo_excluir(regra_id):
+    from models import CoberturaMinima
+    regra = CoberturaMinima.query.get_or_404(regra_id)
+    db.session.delete(regra)
+    db.session.commit()
+    flash('Cobertura mínima excluída.', 'success')
+    return redirect(url_for('escalas.cobertura_intradiaria'))
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # Etapa 3 – Padrões de Revezamento
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -933,42 +1032,55 @@ def padrao_excluir(padrao_id):
 @escalas_bp.route('/padroes/<int:padrao_id>/aplicar', methods=['POST'])
 @login_required
 def padrao_aplicar(padrao_id):
-    """Aplica o ciclo do padrão a um funcionário em um intervalo de datas."""
+    """Aplica o ciclo do padrão a um ou mais funcionários em um intervalo de datas.
+    Com 'defasagem', cada funcionário seguinte começa o ciclo N dias depois."""
+    from services.gerador_escala import celulas_padrao
     p = PadraoTurno.query.get_or_404(padrao_id)
 
-    func_id    = request.form['funcionario_id']
+    func_ids   = [f for f in request.form.getlist('funcionario_id') if f]
     data_ini   = date.fromisoformat(request.form['data_inicio'])
     data_fim   = date.fromisoformat(request.form['data_fim'])
     turno_id   = int(request.form.get('turno_id') or p.turno_id or 0)
+    defasagem  = request.form.get('defasagem', 0, type=int) or 0
 
-    if not turno_id:
-        flash('Selecione um turno para aplicar o padrão.', 'danger')
+    if not turno_id or not func_ids:
+        msg = 'Selecione o funcionário e o turno para aplicar o padrão.'
+        if request.form.get('previa'):
+            return jsonify({'error': msg}), 400
+        flash(msg, 'danger')
         return redirect(url_for('escalas.padroes'))
 
     turno = Turno.query.get_or_404(turno_id)
     ciclo = p.dias_trabalho + p.dias_folga
-    gerados = 0
-    d = data_ini
-    pos = 0  # posição no ciclo
-    while d <= data_fim:
-        if pos < p.dias_trabalho:   # dia de trabalho no ciclo
-            if d.weekday() in turno.dias_semana_list:
-                aloc = AlocacaoDiaria.query.filter_by(
-                    funcionario_id=func_id, data=d).first()
-                if aloc:
-                    aloc.turno_id = turno_id
-                else:
-                    db.session.add(AlocacaoDiaria(
-                        funcionario_id=func_id, turno_id=turno_id, data=d))
-                gerados += 1
-        pos = (pos + 1) % ciclo
-        d += timedelta(days=1)
-
-    db.session.commit()
-    flash(f'Padrão aplicado: {gerados} alocações geradas/atualizadas.', 'success')
+    posicoes = [(-i * defasagem) % ciclo for i in range(len(func_ids))]
+    alvo = celulas_padrao(func_ids, data_ini, data_fim, turno_id, dias_semana=turno.dias_semana_list,
+                          dias_trabalho=p.dias_trabalho, dias_folga=p.dias_folga, posicoes=posicoes)
+    resposta = _aplicar_plano_form(alvo, func_ids, data_ini, data_fim, 'escalas.padroes')
+    if resposta is not None:
+        return resposta
+
+    flash(f'Padrão aplicado: {len(alvo)} alocações geradas/atualizadas.', 'success')
     return redirect(url_for('escalas.padroes'))
 
 
+def _aplicar_plano_form(alvo: dict, func_ids, data_ini, data_fim, endpoint_volta: str):
+    """Diff + (validação CLT opcional) + gravação em lote para os formulários de
+    aplicação em massa. Com 'previa' responde o resumo em JSON sem gravar; com
+    'validar' não grava se houver infração bloqueante. Retorna None se gravou."""
+    from services.gerador_escala import planejar, validar_plano, aplicar_plano, UPSERT
+    plano = planejar(alvo, func_ids, data_ini, data_fim, modo=UPSERT)
+    if request.form.get('validar') or request.form.get('previa'):
+        validar_plano(plano)
+    if request.form.get('previa'):
+        return jsonify(plano.resumo())
+    if request.form.get('validar') and plano.bloqueantes:
+        flash(f'Nada foi gravado: {len(plano.bloqueantes)} alocação(ões) com infração CLT bloqueante. '
+              'Use a pré-visualização para ver os detalhes.', 'danger')
+        return redirect(url_for(endpoint_volta))
+    aplicar_plano(plano)
+    return None
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # Etapa 4 – Auto-Solver & Alertas de Conflito
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -976,31 +1088,43 @@ def padrao_aplicar(padrao_id):
 @escalas_bp.route('/alertas')
 @login_required
 def alertas():
-    """AJAX: dias descobertos + violações Art. 386 no mês."""
-    from services.solver_escala import alertas_cobertura, violacoes_art386
+    """AJAX: dias descobertos + violações Art. 386 / DSR + equidade de domingos
+    + lacunas intradiárias no mês."""
+    from services.solver_escala import alertas_cobertura, equidade_domingos, violacoes_art386, violacoes_dsr
     mes_ano = request.args.get('mes_ano', date.today().strftime('%Y-%m'))
     dept    = request.args.get('dept', '').strip() or None
     funcao  = request.args.get('funcao', '').strip() or None
 
+    from services.cobertura_intradiaria import lacunas
     descobertos = alertas_cobertura(mes_ano, dept=dept, funcao=funcao)
     art386      = violacoes_art386(mes_ano, dept=dept, funcao=funcao)
-    return jsonify({'descobertos': descobertos, 'art386': art386})
+    dsr         = violacoes_dsr(mes_ano, dept=dept, funcao=funcao)
+    domingos    = equidade_domingos(mes_ano, dept=dept, funcao=funcao)
+    try:
+        lacunas_dia = lacunas(int(mes_ano[:4]), int(mes_ano[5:7]), dept or '', funcao or '')
+    except (ValueError, IndexError):
+        lacunas_dia = []
+    return jsonify({'descobertos': descobertos, 'art386': art386, 'dsr': dsr, 'domingos': domingos,
+                    'lacunas': lacunas_dia})
 
 
 @escalas_bp.route('/sugerir-cobertura')
 @login_required
 def sugerir_cobertura_view():
-    """AJAX: sugere o melhor substituto para cobrir um dia/função."""
-    from services.solver_escala import sugerir_substituto
+    """AJAX: sugere o melhor substituto para cobrir um dia/função (+ ranking top-k)."""
+    from services.solver_escala import ranquear_substitutos
     data_str = request.args.get('data', '')
     funcao   = request.args.get('funcao', '').strip()
     dept     = request.args.get('dept', '').strip() or None
+    k        = min(max(request.args.get('k', 5, type=int), 1), 50)
     try:
         data_ref = date.fromisoformat(data_str)
     except ValueError:
         return jsonify({'error': 'data inválida'}), 400
-    sugestao = sugerir_substituto(data_ref, funcao=funcao, dept=dept)
-    return jsonify(sugestao or {'error': 'Nenhum candidato disponível'})
+    ranking = ranquear_substitutos(data_ref, funcao=funcao, dept=dept, k=k)
+    if not ranking:
+        return jsonify({'error': 'Nenhum candidato disponível'})
+    return jsonify({**ranking[0], 'ranking': ranking})
 
 
 @escalas_bp.route('/aplicar-sugestao', methods=['POST'])
@@ -1040,18 +1164,12 @@ def aplicar_sugestao():
 @login_required
 def grupos():
     """Gerenciar grupos de unidades (ex: Praia do Canto → PRAIA FITNESS + FUNCIONAL)."""
-    lista = GrupoDepartamento.query.order_by(GrupoDepartamento.nome).all()
+    from sqlalchemy.orm import selectinload
+    lista = (GrupoDepartamento.query.options(selectinload(GrupoDepartamento.membros))
+             .order_by(GrupoDepartamento.nome).all())
     # Departamentos individuais disponíveis
-    rows = (
-        db.session.query(Funcionario.departamento)
-        .filter(Funcionario.ativo == True, Funcionario.departamento.isnot(None))
-        .distinct()
-        .order_by(Funcionario.departamento)
-        .all()
-    )
-    depts_individuais = [r[0] for r in rows]
     return render_template('escalas/grupos.html',
-                           grupos=lista, depts=depts_individuais)
+                           grupos=lista, depts=facetas()['departamentos'])
 
 
 @escalas_bp.route('/grupos/novo', methods=['POST'])
@@ -1068,6 +1186,7 @@ def grupo_novo():
     g = GrupoDepartamento(nome=nome)
     g.departamentos = depts
     db.session.add(g)
+    invalidar_facetas()
     db.session.commit()
     flash(f'Grupo "{nome}" criado com {len(depts)} unidade(s).', 'success')
     return redirect(url_for('escalas.grupos'))
@@ -1079,6 +1198,7 @@ def grupo_editar(grupo_id):
     g = GrupoDepartamento.query.get_or_404(grupo_id)
     g.nome = request.form.get('nome', g.nome).strip()
     g.departamentos = request.form.getlist('departamentos')
+    invalidar_facetas()
     db.session.commit()
     flash(f'Grupo "{g.nome}" atualizado.', 'success')
     return redirect(url_for('escalas.grupos'))
@@ -1089,6 +1209,7 @@ def grupo_editar(grupo_id):
 def grupo_excluir(grupo_id):
     g = GrupoDepartamento.query.get_or_404(grupo_id)
     db.session.delete(g)
+    invalidar_facetas()
     db.session.commit()
     flash('Grupo excluído.', 'success')
     return redirect(url_for('escalas.grupos'))
@@ -1098,11 +1219,10 @@ def grupo_excluir(grupo_id):
 @login_required
 def grupos_api():
     """AJAX: retorna todos os grupos com seus departamentos (para uso em outros formulários)."""
-    grupos = GrupoDepartamento.query.order_by(GrupoDepartamento.nome).all()
     return jsonify([{
-        'nome': g.nome,
-        'departamentos': g.departamentos,
-    } for g in grupos])
+        'nome': nome,
+        'departamentos': depts,
+    } for nome, depts in facetas()['grupos'].items()])
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -1125,9 +1245,11 @@ def quadro():
 
 @escalas_bp.route('/quadro/dados')
 @login_required
+@cache_por_versao(extra=dia_corrente)
 def quadro_dados():
     """AJAX: dados de um painel (funcionários × dias) com turno_id para drag-and-drop."""
     import calendar as cal_mod
+    from services.cobertura_engine import matriz_cobertura
     mes_ano = request.args.get('mes_ano', date.today().strftime('%Y-%m'))
     dept    = request.args.get('dept', '').strip()
     funcao  = request.args.get('funcao', '').strip()
@@ -1138,142 +1260,88 @@ def quadro_dados():
         return jsonify({'error': 'mes_ano inválido'}), 400
 
     _, dias_no_mes = cal_mod.monthrange(ano, mes)
-    data_ini = date(ano, mes, 1)
-    data_fim = date(ano, mes, dias_no_mes)
 
     func_id_param = request.args.get('func_id', '').strip()
 
-    # Sempre busca TODOS os funcionários do dept/funcao (para cobertura_tipos global).
-    # Quando func_id_param passado, o resultado de 'funcionarios' é filtrado,
-    # mas cobertura_tipos usa todos.
-    q_todos = Funcionario.query.filter_by(ativo=True)
-    q_todos = _filtrar_dept(q_todos, dept)
-    if funcao:
-        q_todos = q_todos.filter(Funcionario.funcao == funcao)
-    todos_funcionarios = q_todos.order_by(Funcionario.nome).all()
-    todos_ids = [f.id for f in todos_funcionarios]
-
-    if func_id_param:
-        funcionarios = [f for f in todos_funcionarios if f.id == func_id_param]
-    else:
-        funcionarios = todos_funcionarios
-    func_ids = [f.id for f in funcionarios]
-
-    if not todos_ids:
+    # Uma matriz com TODOS os funcionários do dept/funcao (para cobertura_tipos global).
+    # Quando func_id_param é passado, só 'funcionarios' é filtrado; cobertura e
+    # cobertura_tipos usam todos.
+    matriz = matriz_cobertura(ano, mes, dept, funcao)
+    if not matriz.funcs:
         return jsonify({
             'funcionarios': [], 'cobertura': {}, 'cobertura_tipos': {},
             'domingo_counts': {}, 'dias_no_mes': dias_no_mes,
             'ano': ano, 'mes': mes, 'sabados': [], 'domingos': [],
         })
 
-    # Busca alocações para TODOS do dept/funcao (para cobertura_tipos)
-    alocacoes_todas = (
-        AlocacaoDiaria.query
-        .filter(
-            AlocacaoDiaria.funcionario_id.in_(todos_ids),
-            AlocacaoDiaria.data >= data_ini,
-            AlocacaoDiaria.data <= data_fim,
-        )
-        .join(Turno)
-        .all()
-    )
-
-    aloc_map: dict = {}  # {func_id: {day_int: info_dict}}
-    for aloc in alocacoes_todas:
-        d = aloc.data.day
-        aloc_map.setdefault(aloc.funcionario_id, {})[d] = {
-            'turno_id':   aloc.turno_id,
-            'turno':      aloc.turno.nome,
-            'color':      aloc.turno.color or '#4f46e5',
-            'warning':    bool(aloc.compliance_warning),
-            'tipo_turno': aloc.turno.tipo_turno,
-        }
+    if func_id_param:
+        linhas = [i for i, f in enumerate(matriz.funcs) if f['id'] == func_id_param]
+    else:
+        linhas = list(range(len(matriz.funcs)))
 
-    sabados  = [d for d in range(1, dias_no_mes + 1) if date(ano, mes, d).weekday() == 5]
-    domingos = [d for d in range(1, dias_no_mes + 1) if date(ano, mes, d).weekday() == 6]
+    dias_range = range(1, dias_no_mes + 1)
+    datas_mes = matriz.datas[:dias_no_mes]
+    sabados  = [d for d, dt in zip(dias_range, datas_mes) if dt.weekday() == 5]
+    domingos = [d for d, dt in zip(dias_range, datas_mes) if dt.weekday() == 6]
 
     # ── resultado_funcs (apenas os funcionários solicitados) ──────────────────
+    celula_base = [{
+        'turno_id':   t['id'],
+        'turno':      t['nome'],
+        'color':      t['color'],
+        'warning':    False,
+        'base':       True,
+        'tipo_turno': t['tipo_turno'],
+    } for t in matriz.turnos]
+    turno_idx = matriz.turno_idx[linhas, :dias_no_mes].tolist()
+    excecao   = matriz.excecao[linhas, :dias_no_mes].tolist()
+    warning   = matriz.warning[linhas, :dias_no_mes].tolist()
+
     resultado_funcs = []
-    for f in funcionarios:
+    for i, linha_t, linha_e, linha_w in zip(linhas, turno_idx, excecao, warning):
+        f = matriz.funcs[i]
         dias = {}
-        for d in range(1, dias_no_mes + 1):
-            aloc_data = aloc_map.get(f.id, {}).get(d)
-            if aloc_data:
-                dias[str(d)] = aloc_data
-            elif f.horario_base:
-                data_ref = date(ano, mes, d)
-                if data_ref.weekday() in f.horario_base.dias_semana_list:
-                    dias[str(d)] = {
-                        'turno_id':   f.horario_base.id,
-                        'turno':      f.horario_base.nome,
-                        'color':      f.horario_base.color or '#4f46e5',
-                        'warning':    False,
-                        'base':       True,
-                        'tipo_turno': f.horario_base.tipo_turno,
-                    }
-                else:
-                    dias[str(d)] = None
-            else:
+        for d, ti, exc, w in zip(dias_range, linha_t, linha_e, linha_w):
+            if ti < 0:
                 dias[str(d)] = None
-
+            elif exc:
+                t = matriz.turnos[ti]
+                dias[str(d)] = {
+                    'turno_id':   t['id'],
+                    'turno':      t['nome'],
+                    'color':      t['color'],
+                    'warning':    w,
+                    'tipo_turno': t['tipo_turno'],
+                }
+            else:
+                dias[str(d)] = dict(celula_base[ti])
         resultado_funcs.append({
-            'id':     f.id,
-            'nome':   f.nome,
-            'funcao': f.funcao or '',
-            'sexo':   f.sexo or '',
+            'id':     f['id'],
+            'nome':   f['nome'],
+            'funcao': f['funcao'] or '',
+            'sexo':   f['sexo'] or '',
             'dias':   dias,
         })
 
-    # ── cobertura (contagem por dia, todos do dept) ───────────────────────────
-    def _dia_info(f, d):
-        aloc = aloc_map.get(f.id, {}).get(d)
-        if aloc:
-            return aloc
-        if f.horario_base and date(ano, mes, d).weekday() in f.horario_base.dias_semana_list:
-            return {'tipo_turno': f.horario_base.tipo_turno}
-        return None
-
-    cobertura = {
-        str(d): sum(1 for f in todos_funcionarios if _dia_info(f, d) is not None)
-        for d in range(1, dias_no_mes + 1)
+    # ── cobertura (contagem por dia) e cobertura_tipos (tipos A/B/C presentes) ──
+    colunas = slice(0, dias_no_mes)   # dias do mês são as primeiras colunas
+    cobertura = {str(d): n for d, n in zip(dias_range, matriz.por_dia(colunas).tolist())}
+    por_tipo = {tp: cont.tolist() for tp, cont in matriz.por_tipo(colunas).items()}
+    cobertura_tipos = {
+        str(d): [tp for tp in sorted(por_tipo) if por_tipo[tp][j] > 0]
+        for j, d in enumerate(dias_range)
     }
 
-    # ── cobertura_tipos: quais tipos A/B/C cobrem cada dia ───────────────────
-    cobertura_tipos = {}
-    for d in range(1, dias_no_mes + 1):
-        tipos = set()
-        for f in todos_funcionarios:
-            info = _dia_info(f, d)
-            if info and info.get('tipo_turno'):
-                tipos.add(info['tipo_turno'])
-        cobertura_tipos[str(d)] = sorted(tipos)
-
-    # ── domingo_counts: domingos consecutivos por funcionário ─────────────────
-    today = date.today()
-    days_back_to_sunday = (today.weekday() + 1) % 7  # 0 se hoje é domingo
-    last_sunday = today - timedelta(days=days_back_to_sunday)
-    sundays_12 = [last_sunday - timedelta(weeks=i) for i in range(12)]
-
-    aloc_sundays_map = {}
-    if func_ids:
-        for a in AlocacaoDiaria.query.filter(
-            AlocacaoDiaria.funcionario_id.in_(func_ids),
-            AlocacaoDiaria.data.in_(sundays_12),
-        ).all():
-            aloc_sundays_map.setdefault(a.funcionario_id, set()).add(a.data)
-
+    # ── domingo_counts: domingos consecutivos nas últimas 12 semanas ──────────
+    # (a partir do último domingo; mesmos funcionários da matriz)
+    from services.rotacao_domingos import analisar_semanas
+    rotacao = analisar_semanas(date.today(), dept=dept, funcao=funcao)
+    seq = rotacao.sequencia()
     domingo_counts = {}
-    for f in funcionarios:
-        count = 0
-        for sun in sundays_12:
-            worked = sun in aloc_sundays_map.get(f.id, set())
-            if not worked and f.horario_base:
-                worked = 6 in f.horario_base.dias_semana_list
-            if worked:
-                count += 1
-            else:
-                break
-        domingo_counts[f.id] = count
+    for i in linhas:
+        fid = matriz.funcs[i]['id']
+        r = rotacao.linha(fid)
+        domingo_counts[fid] = int(seq[r]) if r is not None else 0
 
     return jsonify({
         'funcionarios':   resultado_funcs,
@@ -1288,77 +1356,120 @@ def quadro_dados():
     })
 
 
+_RODADAS_BULK = 8   # passadas de recusa/revalidação no bulk-update
+
+
 @escalas_bp.route('/quadro/bulk-update', methods=['POST'])
 @login_required
 def quadro_bulk_update():
-    """Salva múltiplas alocações de uma vez (resultado do drag-and-drop)."""
+    """Salva múltiplas alocações de uma vez (resultado do drag-and-drop).
+
+    Todas as mudanças são aplicadas sobre a escala carregada uma única vez
+    (última mudança de cada célula prevalece), a escala resultante é validada
+    em uma passada e o que passou é gravado em lote numa única transação.
+    Mudanças com infração bloqueante são recusadas (a não ser com 'force');
+    com 'atomico', qualquer recusa cancela tudo.
+    Retorna o resultado de cada mudança em 'resultados' (mesma ordem de 'changes').
+    """
+    from services.gerador_escala import planejar, validar_plano, aplicar_plano, UPSERT
     data = request.get_json(force=True) or {}
     changes = data.get('changes', [])
+    force = bool(data.get('force'))
 
-    saved = 0
     errors = []
     warnings_out = []
+    resultados = [None] * len(changes)
 
-    for change in changes:
+    # 1. Normaliza: última mudança de cada célula vale; as anteriores são substituídas
+    celulas = {}     # (func_id, data) → (índice, turno_id | None)
+    for i, change in enumerate(changes):
         try:
             func_id   = str(change['func_id'])
             data_str  = change['data']
             action    = change.get('action', 'set')
             data_aloc = date.fromisoformat(data_str)
-        except (KeyError, ValueError) as e:
+        except (KeyError, ValueError, TypeError) as e:
             errors.append(str(e))
+            resultados[i] = {'status': 'erro', 'message': str(e)}
             continue
-
         if action == 'delete':
-            AlocacaoDiaria.query.filter_by(
-                funcionario_id=func_id, data=data_aloc
-            ).delete()
-            saved += 1
-            continue
-
-        turno_id = change.get('turno_id')
-        if not turno_id:
-            continue
-
-        turno = Turno.query.get(turno_id)
-        if not turno:
-            errors.append(f'Turno {turno_id} não encontrado')
-            continue
-
-        infracoes   = validar_alocacao(func_id, data_aloc, turno)
-        bloqueantes = [i for i in infracoes if i.get('severity', 'error') == 'error']
-        avisos      = [i for i in infracoes if i.get('severity') != 'error']
-
-        if bloqueantes and not data.get('force'):
-            errors.append(f'{data_str}: {bloqueantes[0]["message"]}')
-            continue
-
-        compliance_warn = '; '.join(i['message'] for i in avisos) or None
-        if avisos:
-            warnings_out.append({
-                'data': data_str, 'func_id': func_id, 'message': compliance_warn,
-            })
-
-        aloc = AlocacaoDiaria.query.filter_by(
-            funcionario_id=func_id, data=data_aloc
-        ).first()
-        if aloc:
-            aloc.turno_id = turno_id
-            aloc.compliance_warning = compliance_warn
+            turno_id = None
+        else:
+            turno_id = change.get('turno_id')
+            if not turno_id:
+                resultados[i] = {'status': 'ignorado', 'message': 'Sem turno'}
+                continue
+            try:
+                turno_id = int(turno_id)
+            except (TypeError, ValueError):
+                resultados[i] = {'status': 'erro', 'message': f'Turno {turno_id} inválido'}
+                errors.append(resultados[i]['message'])
+                continue
+        anterior = celulas.get((func_id, data_aloc))
+        if anterior is not None:
+            resultados[anterior[0]] = {'status': 'substituido', 'message': 'Substituída por mudança posterior'}
+        celulas[(func_id, data_aloc)] = (i, turno_id)
+
+    turnos_ok = {t_id for (t_id,) in db.session.query(Turno.id).filter(
+        Turno.id.in_({tid for _, tid in celulas.values() if tid}))}
+    for chave, (i, tid) in list(celulas.items()):
+        if tid and tid not in turnos_ok:
+            resultados[i] = {'status': 'erro', 'message': f'Turno {tid} não encontrado'}
+            errors.append(resultados[i]['message'])
+            del celulas[chave]
+
+    # 2. Diff contra a escala atual + validação da escala resultante (overlay)
+    alvo = {c: tid for c, (_, tid) in celulas.items() if tid}
+    remover = [c for c, (_, tid) in celulas.items() if not tid]
+    plano = planejar(alvo, modo=UPSERT, remover=remover)
+    # Como no salvamento sequencial, quem perde é a mudança mais recente: a cada
+    # passada recusa a última mudança bloqueada de cada funcionário e revalida
+    bloqueios = {}
+    for rodada in range(_RODADAS_BULK):
+        validar_plano(plano)
+        bloq = {} if force else plano.bloqueantes
+        if not bloq:
+            break
+        ultima = {}
+        for (fid, d) in bloq:
+            if (fid, d) not in celulas:
+                continue
+            if fid not in ultima or celulas[(fid, d)][0] > celulas[ultima[fid]][0]:
+                ultima[fid] = (fid, d)
+        escolhidas = set(bloq) if rodada == _RODADAS_BULK - 1 else set(ultima.values())
+        for chave in escolhidas:
+            bloqueios[chave] = bloq[chave][0]['message']
+        plano.inserir = [x for x in plano.inserir if (x[0], x[1]) not in bloqueios]
+        plano.atualizar = [x for x in plano.atualizar if (x[1], x[2]) not in bloqueios]
+    recusadas = set(bloqueios)
+    infracoes = {k: v for k, v in plano.infracoes.items() if k not in recusadas}
+
+    for (fid, d), (i, tid) in celulas.items():
+        if (fid, d) in recusadas:
+            resultados[i] = {'status': 'erro', 'message': bloqueios[(fid, d)]}
+            errors.append(f'{d.isoformat()}: {bloqueios[(fid, d)]}')
+        elif infracoes.get((fid, d)):
+            msg = '; '.join(x['message'] for x in infracoes[(fid, d)])
+            resultados[i] = {'status': 'aviso', 'message': msg}
+            warnings_out.append({'data': d.isoformat(), 'func_id': fid, 'message': msg})
         else:
-            db.session.add(AlocacaoDiaria(
-                funcionario_id=func_id, turno_id=turno_id,
-                data=data_aloc, compliance_warning=compliance_warn,
-            ))
-        saved += 1
+            resultados[i] = {'status': 'ok'}
 
+    if recusadas and data.get('atomico'):
+        return jsonify({'ok': False, 'saved': 0, 'error': 'Nenhuma alteração gravada: há infrações bloqueantes.',
+                        'errors': errors, 'warnings': warnings_out, 'resultados': resultados}), 422
+
+    # 3. Gravação em lote, uma transação
+    plano.infracoes = infracoes
     try:
-        db.session.commit()
+        aplicar_plano(plano)
     except Exception as e:
         db.session.rollback()
         return jsonify({'ok': False, 'error': str(e)}), 500
 
-    return jsonify({'ok': True, 'saved': saved, 'errors': errors, 'warnings': warnings_out})
+    saved = sum(1 for r in resultados if r and r['status'] in ('ok', 'aviso'))
+    return jsonify({'ok': True, 'saved': saved, 'errors': errors, 'warnings': warnings_out,
+                    'resultados': resultados})
 
 
 # ── Grade Mestra (configuração de tipos A/B/C por turno) ─────────────────────
@@ -1386,6 +1497,172 @@ def grade_mestra_setar_tipo():
     return jsonify({'ok': True, 'turno_id': turno_id, 'tipo_turno': tipo})
 
 
+# ── Otimizador de escala mensal ───────────────────────────────────────────────
+
+# Tempo de busca máximo na requisição: fica bem abaixo do --timeout 120 do
+# gunicorn, com folga para montar o problema e gravar o resultado.
+_OTIMIZAR_TEMPO_MAX = 30
+
+@escalas_bp.route('/otimizar', methods=['GET', 'POST'])
+@login_required
+def otimizar():
+    """Gera a escala do mês com o otimizador (metas de CoberturaMinima + CLT)."""
+    dept_sel = request.form.get('departamento', '').strip()
+    resultado = None
+    if request.method == 'POST':
+        from services.otimizador_escala import montar_problema, otimizar as otimizar_escala, gravar_resultado
+        funcao     = request.form.get('funcao', '').strip()
+        mes_ano    = request.form.get('mes_ano', '')
+        substituir = bool(request.form.get('substituir'))
+        simular    = bool(request.form.get('simular'))
+        usar_previsao = bool(request.form.get('usar_previsao'))
+        tempo      = min(max(request.form.get('tempo', 20, type=int), 5), _OTIMIZAR_TEMPO_MAX)
+        try:
+            ano, mes = int(mes_ano[:4]), int(mes_ano[5:7])
+        except (ValueError, IndexError):
+            flash('Mês inválido.', 'danger')
+            return redirect(url_for('escalas.otimizar'))
+
+        problema = montar_problema(ano, mes, dept_sel, funcao, substituir=substituir,
+                                   usar_previsao=usar_previsao)
+        if not problema.funcs:
+            flash('Nenhum funcionário encontrado com os critérios informados.', 'warning')
+            return redirect(url_for('escalas.otimizar'))
+        # Um processo só: no worker web não se abre pool de processos
+        resultado = otimizar_escala(problema, tempo_limite=tempo, processos=1)
+        resultado['funcionarios'] = len(problema.funcs)
+        if simular:
+            flash(f'Simulação: {len(resultado["alocacoes"])} alocações seriam geradas.', 'info')
+        else:
+            gravadas = gravar_resultado(problema, resultado)
+            msg = f'Escala otimizada! {gravadas} alocações geradas.'
+            if resultado['faltas']:
+                msg += f' Cobertura ainda insuficiente em {resultado["dias_descobertos"]} dia(s).'
+            flash(msg, 'warning' if resultado['faltas'] else 'success')
+
+    return render_template('escalas/otimizar.html',
+                           departamentos=_departamentos(),
+                           funcoes=_funcoes(dept_sel or None),
+                           mes_atual=request.form.get('mes_ano') or date.today().strftime('%Y-%m'),
+                           dept_sel=dept_sel,
+                           func_sel=request.form.get('funcao', ''),
+                           tempo_max=_OTIMIZAR_TEMPO_MAX,
+                           resultado=resultado)
+
+
+# ── Sandbox de escala ("e se?") ───────────────────────────────────────────────
+
+@escalas_bp.route('/sandbox', methods=['GET', 'POST'])
+@login_required
+def sandbox_lista():
+    """Rascunhos abertos + criação de um novo sandbox para um mês/escopo."""
+    from models import SandboxEscala
+    if request.method == 'POST':
+        from services.sandbox_escala import criar_sandbox
+        mes_ano = request.form.get('mes_ano', '')
+        try:
+            ano, mes = int(mes_ano[:4]), int(mes_ano[5:7])
+        except (ValueError, IndexError):
+            flash('Mês inválido.', 'danger')
+            return redirect(url_for('escalas.sandbox_lista'))
+        sandbox = criar_sandbox(ano, mes,
+                                request.form.get('departamento', '').strip(),
+                                request.form.get('funcao', '').strip(),
+                                request.form.get('nome', '').strip(),
+                                usuario_id=current_user.id)
+        return redirect(url_for('escalas.sandbox_ver', sandbox_id=sandbox.id))
+
+    sandboxes = (SandboxEscala.query.filter_by(status='aberto')
+                 .order_by(SandboxEscala.atualizado_em.desc()).all())
+    return render_template('escalas/sandbox_lista.html',
+                           sandboxes=sandboxes,
+                           departamentos=_departamentos(),
+                           funcoes=_funcoes(),
+                           mes_atual=date.today().strftime('%Y-%m'))
+
+
+def _sandbox_ou_404(sandbox_id):
+    from models import SandboxEscala
+    return SandboxEscala.query.get_or_404(sandbox_id)
+
+
+@escalas_bp.route('/sandbox/<int:sandbox_id>')
+@login_required
+def sandbox_ver(sandbox_id):
+    from models import PadraoTurno
+    sandbox = _sandbox_ou_404(sandbox_id)
+    q = Funcionario.query.filter_by(ativo=True)
+    q = _filtrar_dept(q, sandbox.departamento)
+    if sandbox.funcao:
+        q = q.filter(Funcionario.funcao == sandbox.funcao)
+    return render_template('escalas/sandbox.html',
+                           sandbox=sandbox,
+                           funcionarios=q.order_by(Funcionario.nome).all(),
+                           turnos=Turno.query.order_by(Turno.nome).all(),
+                           padroes=PadraoTurno.query.filter_by(ativo=True).order_by(PadraoTurno.nome).all())
+
+
+@escalas_bp.route('/sandbox/<int:sandbox_id>/estado')
+@login_required
+def sandbox_estado(sandbox_id):
+    """AJAX: infrações, cobertura e impacto em horas/custo do sandbox."""
+    from services.sandbox_escala import painel
+    sandbox = _sandbox_ou_404(sandbox_id)
+    return jsonify({'ok': True, 'status': sandbox.status, 'edicoes': sandbox.edicoes, **painel(sandbox)})
+
+
+@escalas_bp.route('/sandbox/<int:sandbox_id>/editar', methods=['POST'])
+@login_required
+def sandbox_editar(sandbox_id):
+    """AJAX: aplica uma operação (definir | trocar | padrao) só em memória."""
+    from services.sandbox_escala import editar
+    sandbox = _sandbox_ou_404(sandbox_id)
+    op = request.get_json(force=True, silent=True) or {}
+    try:
+        resultado = editar(sandbox, op)
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    painel = resultado.pop('painel')
+    return jsonify({'ok': True, 'status': sandbox.status, 'edicoes': sandbox.edicoes,
+                    'operacao': resultado, **painel})
+
+
+@escalas_bp.route('/sandbox/<int:sandbox_id>/desfazer', methods=['POST'])
+@login_required
+def sandbox_desfazer(sandbox_id):
+    from services.sandbox_escala import desfazer
+    sandbox = _sandbox_ou_404(sandbox_id)
+    try:
+        painel = desfazer(sandbox)
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    return jsonify({'ok': True, 'status': sandbox.status, 'edicoes': sandbox.edicoes, **painel})
+
+
+@escalas_bp.route('/sandbox/<int:sandbox_id>/gravar', methods=['POST'])
+@login_required
+def sandbox_gravar(sandbox_id):
+    """AJAX: grava o sandbox na escala como um único lote.
+    409 = conflito com alterações feitas depois da abertura (reenviar com forcar);
+    422 = infração CLT bloqueante (reenviar sem validar para gravar mesmo assim)."""
+    from services.sandbox_escala import gravar
+    sandbox = _sandbox_ou_404(sandbox_id)
+    data = request.get_json(force=True, silent=True) or {}
+    resultado = gravar(sandbox, validar=data.get('validar', True), forcar=bool(data.get('forcar')))
+    if resultado['ok']:
+        return jsonify(resultado)
+    return jsonify(resultado), 409 if resultado.get('conflitos') else 422
+
+
+@escalas_bp.route('/sandbox/<int:sandbox_id>/descartar', methods=['POST'])
+@login_required
+def sandbox_descartar(sandbox_id):
+    from services.sandbox_escala import descartar
+    descartar(_sandbox_ou_404(sandbox_id))
+    flash('Sandbox descartado.', 'info')
+    return redirect(url_for('escalas.sandbox_lista'))
+
+
 # ── Gerar Rotação de Domingos ─────────────────────────────────────────────────
 
 @escalas_bp.route('/gerar-domingos', methods=['GET', 'POST'])
@@ -1416,64 +1693,58 @@ def gerar_domingos():
         _, dias_no_mes = cal_mod.monthrange(ano, mes)
         domingos = [d for d in range(1, dias_no_mes + 1) if date(ano, mes, d).weekday() == 6]
 
-        turno_a = Turno.query.get(turno_a_id)
-        turno_b = Turno.query.get(turno_b_id)
+        if not Turno.query.get(turno_a_id) or not Turno.query.get(turno_b_id):
+            flash('Turno não encontrado.', 'danger')
+            return redirect(url_for('escalas.gerar_domingos'))
         turno_c = Turno.query.get(int(turno_c_id)) if turno_c_id else None
 
-        saved   = 0
-        avisos  = []
-        # Alterna: par começa com quem foi escolhido
-        seq = [(func_a_id, turno_a), (func_b_id, turno_b)]
+        # Plano do mês inteiro: domingos alternados A/B e, com C, a sexta antes
+        # de cada domingo de A (folga para A, C cobre com o turno de A)
+        from services.gerador_escala import planejar, validar_plano, aplicar_plano, UPSERT
+        from services.rotacao_domingos import analisar_domingos
+        seq = [(func_a_id, turno_a_id), (func_b_id, turno_b_id)]
         if comeca_com == 'B':
             seq = seq[::-1]
-
+        alvo, folgas = {}, []
         for i, domingo_dia in enumerate(domingos):
-            func_id, turno = seq[i % 2]
+            func_id, turno_id = seq[i % 2]
             data_dom = date(ano, mes, domingo_dia)
-
-            infracoes = validar_alocacao(func_id, data_dom, turno)
-            warn_msgs = '; '.join(x['message'] for x in infracoes) or None
-
-            aloc = AlocacaoDiaria.query.filter_by(
-                funcionario_id=func_id, data=data_dom
-            ).first()
-            if aloc:
-                aloc.turno_id = turno.id
-                aloc.compliance_warning = warn_msgs
-            else:
-                db.session.add(AlocacaoDiaria(
-                    funcionario_id=func_id, turno_id=turno.id,
-                    data=data_dom, compliance_warning=warn_msgs,
-                ))
-            saved += 1
-            if warn_msgs:
-                avisos.append(f'{data_dom.strftime("%d/%m")}: {warn_msgs}')
-
-            # Compensação: se turno é A e há funcionário C → folga A na sexta + C cobre
+            alvo[(func_id, data_dom)] = turno_id
             if func_id == func_a_id and func_c_id and turno_c:
                 sexta = data_dom - timedelta(days=2)
-                # Folga para A na sexta
-                aloc_sexta_a = AlocacaoDiaria.query.filter_by(
-                    funcionario_id=func_a_id, data=sexta
-                ).first()
-                if aloc_sexta_a:
-                    db.session.delete(aloc_sexta_a)
-
-                # C cobre a sexta com turno_a
-                aloc_sexta_c = AlocacaoDiaria.query.filter_by(
-                    funcionario_id=func_c_id, data=sexta
-                ).first()
-                if aloc_sexta_c:
-                    aloc_sexta_c.turno_id = turno_a_id
-                else:
-                    db.session.add(AlocacaoDiaria(
-                        funcionario_id=func_c_id, turno_id=turno_a_id,
-                        data=sexta,
-                    ))
+                folgas.append((func_a_id, sexta))
+                alvo[(func_c_id, sexta)] = turno_a_id
+        plano = planejar(alvo, modo=UPSERT, remover=folgas)
+        validar_plano(plano)
+
+        # Art. 386 também contra o horário base: rotação de A/B com o plano sobreposto
+        rotacao = analisar_domingos(date(ano, mes, 1), date(ano, mes, dias_no_mes),
+                                    func_ids=[func_a_id, func_b_id])
+        for (fid, d) in alvo:
+            rotacao.marcar(fid, d)
+        for v in rotacao.violacoes():
+            chave = (v['func_id'], date.fromisoformat(v['data']))
+            if chave not in alvo:
+                continue
+            infracoes = plano.infracoes.setdefault(chave, [])
+            if not any(x['error'] == 'DOMINGO_CONSECUTIVO' for x in infracoes):
+                anterior = date.fromisoformat(v['domingo_anterior'])
+                infracoes.append({
+                    'error': 'DOMINGO_CONSECUTIVO',
+                    'message': (
+                        f'Art. 386 CLT: {v["func_nome"]} trabalhou no domingo anterior '
+                        f'({anterior.strftime("%d/%m")}). '
+                        'O revezamento quinzenal é obrigatório para mulheres.'
+                    ),
+                    'severity': 'warning',
+                })
+        avisos = [f'{d.strftime("%d/%m")}: ' + '; '.join(x['message'] for x in infracoes)
+                  for (_, d), infracoes in sorted(plano.infracoes.items(), key=lambda kv: kv[0][1])
+                  if infracoes]
 
         try:
-            db.session.commit()
-            msg = f'{saved} domingo(s) gerado(s) com sucesso!'
+            aplicar_plano(plano)
+            msg = f'{len(domingos)} domingo(s) gerado(s) com sucesso!'
             if avisos:
                 msg += f' — {len(avisos)} aviso(s) CLT.'
             flash(msg, 'success' if not avisos else 'warning')
@@ -1483,8 +1754,20 @@ def gerar_domingos():
 
         return redirect(url_for('escalas.gerar_domingos'))
 
+    # Domingos trabalhados nas últimas 12 semanas e próximo domingo elegível
+    # (próximas 8 semanas) de cada funcionário, para escolher A/B/C
+    from services.rotacao_domingos import analisar_semanas, domingo_ate
+    hoje = date.today()
+    rot = analisar_semanas(hoje, futuras=8)
+    trabalhados = rot.trabalhados(ate=domingo_ate(hoje)).tolist()
+    proximos = rot.proximo_elegivel(hoje)
+    rotacao = {f['id']: {'domingos': trabalhados[i],
+                         'proximo': proximos[i].strftime('%d/%m') if proximos[i] else None}
+               for i, f in enumerate(rot.funcs)}
+
     return render_template('escalas/gerar_domingos.html',
         funcionarios=funcionarios,
+        rotacao=rotacao,
         turnos_a=turnos_a, turnos_b=turnos_b,
         todos_turnos=Turno.query.order_by(Turno.nome).all(),
         mes_atual=date.today().strftime('%Y-%m'),
@@ -4,7 +4,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required
 from extensions import db
 from models import Funcionario, BancoHorasSaldo, AlocacaoDiaria
-from services.banco_horas_service import calcular_saldo, salvar_saldos, get_config, set_config
+from services.banco_horas_service import calcular_saldo, salvar_saldos, recalcular_saldos, get_config, set_config
 
 financeiro_bp = Blueprint('financeiro', __name__)
 
@@ -149,14 +149,9 @@ def recalcular_banco_horas():
         return jsonify({'ok': True, 'message': f'Saldos salvos para {func.nome}'})
 
     # Recalcular todos com alocações no período
-    ids = {a.funcionario_id for a in
-           AlocacaoDiaria.query.filter(AlocacaoDiaria.data >= d_ini).all()}
-    erros = 0
-    for fid in ids:
-        try:
-            salvar_saldos(fid, d_ini, d_fim)
-        except Exception:
-            erros += 1
+    ids = {fid for fid, in db.session.query(AlocacaoDiaria.funcionario_id)
+           .filter(AlocacaoDiaria.data >= d_ini).distinct()}
+    erros = recalcular_saldos(ids, d_ini, d_fim)
     return jsonify({'ok': True, 'message': f'{len(ids)} funcionários recalculados ({erros} erros)'})
 
 
@@ -215,18 +210,45 @@ def dashboard_financeiro():
 @financeiro_bp.route('/api/simular-escala')
 @login_required
 def simular_escala():
-    """Simula impacto financeiro de alterar turno de um funcionário."""
+    """Simula impacto financeiro de alterar turno de um funcionário.
+
+    Com funcionario_id + turno_id + data: conta os dias reais em que o turno
+    vale (só a data, ou os próximos 60 dias com aplicar_futuro) contra a escala
+    efetiva atual, incluindo as horas acima de 44h/semana. Sem eles, usa
+    horas_novo/horas_atual × dias úteis do mês corrente.
+    Para simular várias alterações juntas, use o sandbox de escala.
+    """
     func_id = request.args.get('funcionario_id')
-    turno_novo_horas = float(request.args.get('horas_novo', 0))
-    turno_atual_horas = float(request.args.get('horas_atual', 0))
+    turno_id = request.args.get('turno_id', type=int)
     valor_hora = float(get_config('banco_horas_valor_hora', '0'))
-    dias_mes = 22  # dias úteis estimados
 
-    delta_horas = (turno_novo_horas - turno_atual_horas) * dias_mes
-    delta_custo = delta_horas * valor_hora
+    if func_id and turno_id:
+        from models import Turno
+        from services.sandbox_escala import simular_funcionario
+        turno = Turno.query.get_or_404(turno_id)
+        try:
+            data_ini = date.fromisoformat(request.args.get('data', ''))
+        except ValueError:
+            data_ini = date.today()
+        futuro = request.args.get('aplicar_futuro') in ('1', 'true')
+        data_fim = data_ini + timedelta(days=60) if futuro else data_ini
+        sim = simular_funcionario(func_id, turno, data_ini, data_fim, substituir=futuro)
+        delta_horas, dias, delta_extras = sim['delta_horas'], sim['dias'], sim['delta_extras']
+    else:
+        import calendar as cal_mod
+        turno_novo_horas = float(request.args.get('horas_novo', 0))
+        turno_atual_horas = float(request.args.get('horas_atual', 0))
+        hoje = date.today()
+        _, dias_no_mes = cal_mod.monthrange(hoje.year, hoje.month)
+        dias = sum(1 for d in range(1, dias_no_mes + 1) if date(hoje.year, hoje.month, d).weekday() < 5)
+        delta_horas = (turno_novo_horas - turno_atual_horas) * dias
+        delta_extras = 0.0
 
     return jsonify({
+        'dias': dias,
         'delta_horas': round(delta_horas, 1),
-        'delta_custo': round(delta_custo, 2),
+        'delta_custo': round(delta_horas * valor_hora, 2),
+        'delta_horas_extras': round(delta_extras, 1),
+        'custo_horas_extras': round(delta_extras * valor_hora, 2),
         'valor_hora': valor_hora,
     })
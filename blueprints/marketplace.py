@@ -16,8 +16,10 @@ marketplace_bp = Blueprint('marketplace', __name__, url_prefix='/marketplace')
 @marketplace_bp.route('/')
 @login_required
 def index():
+    from sqlalchemy.orm import joinedload
     vagas = (
         MarketplaceTurno.query
+        .options(joinedload(MarketplaceTurno.turno))
         .filter(MarketplaceTurno.data >= date.today(), MarketplaceTurno.status != 'cancelado')
         .order_by(MarketplaceTurno.data)
         .all()
@@ -31,10 +33,21 @@ def index():
             for c in Candidatura.query.filter_by(funcionario_id=func.id).all():
                 candidaturas_usuario[c.marketplace_id] = c.status
 
+    # Candidaturas pendentes de todas as vagas numa consulta (gestor)
+    pendentes = {}
+    if current_user.nivel_acesso == 'gestor' and vagas:
+        for c in (Candidatura.query
+                  .options(joinedload(Candidatura.funcionario))
+                  .filter(Candidatura.marketplace_id.in_([v.id for v in vagas]),
+                          Candidatura.status == 'pendente')
+                  .order_by(Candidatura.id)):
+            pendentes.setdefault(c.marketplace_id, []).append(c)
+
     return render_template(
         'marketplace/index.html',
         vagas=vagas,
         candidaturas_usuario=candidaturas_usuario,
+        pendentes_por_vaga=pendentes,
         is_gestor=current_user.nivel_acesso == 'gestor',
     )
 
@@ -23,6 +23,7 @@ CONDITION_LABELS = {
     'ABSENCE':      'Ausência (sem ponto)',
     'OVERTIME':     'Hora extra na saída',
     'INTERJORNADA': 'Violação de interjornada',
+    'INCONSISTENCIA': 'Batidas inconsistentes',
     'ESCALA_ENVIO': 'Envio de escala ao funcionário',
 }
 
@@ -48,6 +49,10 @@ _DEFAULTS = {
         'manager':  '{full_name} possui intervalo de interjornada abaixo de 11h (CLT art. 66).',
         'employee': '',
     },
+    'INCONSISTENCIA': {
+        'manager':  '{full_name} tem {minutes} inconsistência(s) de ponto em {data}. Verifique em Inconsistências.',
+        'employee': 'Olá, {name}! Há {minutes} inconsistência(s) no seu ponto de {data}. Procure seu gestor para regularizar.',
+    },
     'ESCALA_ENVIO': {
         'manager':  '',
         'employee': 'Olá, {name}! Sua escala: {turno} — {inicio} às {fim} ({data}).',
@@ -11,10 +11,12 @@ DIAS_PT = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo
 
 
 def _query_batidas(data_inicio, data_fim, dept=None, func_id=None):
+    from sqlalchemy.orm import contains_eager
     q = (
         Batida.query
         .filter(Batida.data >= data_inicio, Batida.data <= data_fim)
         .join(Funcionario)
+        .options(contains_eager(Batida.funcionario))
         .filter(Funcionario.ativo == True)
     )
     if dept:
@@ -54,10 +56,8 @@ def relatorios():
     ranking = sorted(por_funcionario.values(), key=lambda x: x['batidas'], reverse=True)[:10]
 
     # Para dropdowns de filtro
-    departamentos = [r[0] for r in
-        db.session.query(Funcionario.departamento)
-        .filter(Funcionario.ativo == True, Funcionario.departamento.isnot(None))
-        .distinct().order_by(Funcionario.departamento).all()]
+    from services.facetas import facetas
+    departamentos = facetas()['departamentos']
     funcionarios = Funcionario.query.filter_by(ativo=True).order_by(Funcionario.nome).all()
 
     return render_template(
@@ -11,6 +11,17 @@ trocas_bp = Blueprint('trocas', __name__, url_prefix='/trocas')
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
+def _com_relacoes(q):
+    """Carrega junto solicitante, candidato e alocações (com turno) das trocas."""
+    from sqlalchemy.orm import joinedload
+    return q.options(
+        joinedload(SolicitacaoTroca.solicitante),
+        joinedload(SolicitacaoTroca.candidato),
+        joinedload(SolicitacaoTroca.alocacao_origem).joinedload(AlocacaoDiaria.turno),
+        joinedload(SolicitacaoTroca.alocacao_destino).joinedload(AlocacaoDiaria.turno),
+    )
+
+
 def _get_funcionario_atual():
     """Retorna o Funcionario vinculado ao usuário logado (por nome)."""
     return Funcionario.query.filter(
@@ -25,7 +36,7 @@ def _get_funcionario_atual():
 @login_required
 def index():
     trocas = (
-        SolicitacaoTroca.query
+        _com_relacoes(SolicitacaoTroca.query)
         .order_by(SolicitacaoTroca.criado_em.desc())
         .limit(200)
         .all()
@@ -39,6 +50,7 @@ def index():
 @login_required
 def minha_escala():
     from datetime import date, timedelta
+    from sqlalchemy.orm import contains_eager
     hoje = date.today()
     fim  = hoje + timedelta(days=30)
     func = _get_funcionario_atual()
@@ -52,11 +64,12 @@ def minha_escala():
                 AlocacaoDiaria.data <= fim,
             )
             .join(Turno)
+            .options(contains_eager(AlocacaoDiaria.turno))
             .order_by(AlocacaoDiaria.data)
             .all()
         )
     trocas_abertas = (
-        SolicitacaoTroca.query
+        _com_relacoes(SolicitacaoTroca.query)
         .filter_by(status='PENDENTE')
         .all()
     )
@@ -178,7 +191,7 @@ def rejeitar(troca_id):
 @trocas_bp.route('/api/abertas')
 @login_required
 def api_abertas():
-    trocas = SolicitacaoTroca.query.filter_by(status='PENDENTE').all()
+    trocas = _com_relacoes(SolicitacaoTroca.query).filter_by(status='PENDENTE').all()
     return jsonify([{
         'id':           t.id,
         'solicitante':  t.solicitante.nome,
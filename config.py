@@ -12,11 +12,26 @@ class Config:
         'pool_recycle': 300,
     }
 
+    # Espera no checkout do pool vira métrica (services/metricas.py)
+    if SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+        from services.metricas import PoolMedido
+        SQLALCHEMY_ENGINE_OPTIONS['poolclass'] = PoolMedido
+
     # Redis / Celery
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
     CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
+    # Perfil SQL (services/perfil_sql.py): log acima de PERFIL_SQL_LIMITE consultas
+    # por requisição/task e cabeçalhos X-SQL-* (sempre ligados em debug)
+    PERFIL_SQL = os.getenv('PERFIL_SQL', 'true').lower() == 'true'
+    PERFIL_SQL_LIMITE = int(os.getenv('PERFIL_SQL_LIMITE', 50))
+    PERFIL_SQL_HEADER = os.getenv('PERFIL_SQL_HEADER', 'false').lower() == 'true'
+
+    # Métricas Prometheus em /metrics; com METRICAS_TOKEN exige 'Authorization: Bearer <token>'
+    METRICAS = os.getenv('METRICAS', 'true').lower() == 'true'
+    METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+
     # Secullum API
     SECULLUM_EMAIL = os.getenv('SECULLUM_EMAIL')
     SECULLUM_PASSWORD = os.getenv('SECULLUM_PASSWORD')
@@ -15,7 +15,9 @@ def make_celery(app):
         broker=app.config['CELERY_BROKER_URL'],
         backend=app.config['CELERY_RESULT_BACKEND'],
     )
-    celery.conf.update(app.config)
+    # Broker/backend já vão no construtor; as chaves antigas CELERY_* junto com
+    # as novas (beat_schedule, timezone) fazem o Celery 5 recusar a configuração.
+    celery.conf.update({k: v for k, v in app.config.items() if not k.startswith('CELERY_')})
 
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
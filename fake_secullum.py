@@ -0,0 +1,330 @@
+"""
+Servidor local que imita a API Secullum (Autenticador + Integração Externa)
+para testar SecullumAPI / sync_funcionarios / sync_horarios / sync_batidas
+sem tocar na produção.
+
+Rotas:
+  POST /Token                          → {"access_token", "token_type", "expires_in"}
+  GET  /IntegracaoExterna/Funcionarios → ($top opcional)
+  GET  /IntegracaoExterna/Horarios
+  GET  /IntegracaoExterna/Batidas      → dataInicio, dataFim, horaInicio, horaFim,
+                                         funcionarioCpf, funcionarioPis
+  GET  /__stats                        → contadores do servidor
+
+Os funcionários usam api_example.json como molde (mesmos campos); horários e
+batidas são gerados de forma determinística a partir da semente — o mesmo
+(funcionário, dia) devolve sempre as mesmas marcações, em qualquer período
+pedido. Latência e taxa de erro (HTTP 500/503) são configuráveis.
+
+Usage: python fake_secullum.py [--porta 8099] [--funcionarios 500] [--horarios 12]
+                               [--latencia-ms 0] [--erro 0.0] [--semente 42]
+Depois: SECULLUM_AUTH_URL=http://127.0.0.1:8099
+        SECULLUM_BASE_URL=http://127.0.0.1:8099/IntegracaoExterna
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import threading
+import time as _time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEPARTAMENTOS = ['MAPLE BEAR', 'ACADEMIA CENTRO', 'ACADEMIA NORTE', 'ADMINISTRATIVO', 'LIMPEZA', 'RECEPCAO']
+FUNCOES = ['PROFESSOR', 'PROFESSOR DE EDUCACAO FISICA', 'RECEPCIONISTA', 'AUXILIAR DE LIMPEZA',
+           'COORDENADOR', 'ASSISTENTE ADMINISTRATIVO']
+NOMES = ['ANA', 'BRUNO', 'CARLA', 'DIEGO', 'EDUARDA', 'FELIPE', 'GABRIELA', 'HUGO', 'ISABELA',
+         'JOAO', 'KARINA', 'LUCAS', 'MARIANA', 'NICOLAS', 'OLIVIA', 'PEDRO', 'RAFAELA', 'SAMUEL']
+SOBRENOMES = ['SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'LIMA', 'PEREIRA', 'COSTA', 'RODRIGUES',
+              'ALMEIDA', 'NASCIMENTO', 'CARVALHO', 'GOMES']
+
+# Secullum DiaSemana: 0=Dom … 6=Sab (ver config_hub._SECULLUM_TO_PYTHON)
+_PYTHON_TO_SECULLUM = {0: 1, 1: 2, 2: 3, 3: 4, 4: 5, 5: 6, 6: 0}
+
+_ORIGENS = [1] * 85 + [6] * 8 + [5] * 4 + [2] * 3   # RelogioPonto, App, Web, Manual
+
+
+def _hhmm(minutos: int) -> str:
+    minutos %= 24 * 60
+    return f'{minutos // 60:02d}:{minutos % 60:02d}'
+
+
+def _minutos(hhmm: str) -> int:
+    h, m = hhmm.replace('-', ':').split(':')[:2]
+    return int(h) * 60 + int(m)
+
+
+class FakeSecullum:
+    """Dados sintéticos + contadores. Independe do HTTP (dá para usar direto)."""
+
+    def __init__(self, funcionarios: int = 500, horarios: int = 12, semente: int = 42,
+                 latencia_ms: float = 0, erro: float = 0.0, demitidos: float = 0.03):
+        self.semente = semente
+        self.latencia_ms = latencia_ms
+        self.erro = erro
+        self._rng_erro = random.Random(semente)
+        self._lock = threading.Lock()
+        self.stats = {'requisicoes': 0, 'erros': 0, 'bytes': 0, 'registros': 0, 'por_rota': {}}
+        self._horarios = self._gerar_horarios(horarios)
+        self._funcionarios = self._gerar_funcionarios(funcionarios, demitidos)
+        self._por_cpf = {f['Cpf']: f for f in self._funcionarios}
+        self._por_pis = {f['NumeroPis']: f for f in self._funcionarios}
+
+    # ── Geração ───────────────────────────────────────────────────────────────
+
+    def _gerar_horarios(self, n: int) -> list:
+        rng = random.Random(self.semente + 1)
+        horarios = []
+        for i in range(n):
+            inicio = rng.choice([6, 7, 8, 9, 12, 13, 14, 15]) * 60 + rng.choice([0, 0, 30])
+            carga = rng.choice([360, 440, 480])
+            almoco = 60 if carga > 360 else 0
+            folgas = rng.choice([{0, 6}, {0}, {0, 3}])   # DiaSemana de folga
+            dias = []
+            for dia in range(7):
+                d = {'HorarioId': i + 1, 'DiaSemana': dia, 'TipoDia': 2 if dia in folgas else 0}
+                for k in range(1, 6):
+                    d[f'Entrada{k}'] = d[f'Saida{k}'] = None
+                if dia not in folgas:
+                    if almoco:
+                        meio = inicio + carga // 2
+                        d.update(Entrada1=_hhmm(inicio), Saida1=_hhmm(meio),
+                                 Entrada2=_hhmm(meio + almoco), Saida2=_hhmm(inicio + carga + almoco))
+                    else:
+                        d.update(Entrada1=_hhmm(inicio), Saida1=_hhmm(inicio + carga))
+                dias.append(d)
+            horarios.append({
+                'Id': i + 1, 'Numero': 100 + i,
+                'Descricao': f'HORARIO {_hhmm(inicio)} {carga // 60}H',
+                'Desativar': False, 'Tipo': 0, 'Dias': dias,
+            })
+        return horarios
+
+    def _gerar_funcionarios(self, n: int, demitidos: float) -> list:
+        caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_example.json')
+        with open(caminho, encoding='utf-8') as f:
+            molde = json.load(f)
+        rng = random.Random(self.semente + 2)
+        funcionarios = []
+        for i in range(n):
+            fid = 1000 + i
+            item = copy.deepcopy(molde)
+            nome = f'{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}'
+            horario = self._horarios[i % len(self._horarios)]
+            d_id, f_id = i % len(DEPARTAMENTOS), rng.randrange(len(FUNCOES))
+            cpf = f'{fid:09d}'
+            admissao = date(2020, 1, 1) + timedelta(days=rng.randrange(1800))
+            item.update({
+                'Id': fid, 'Nome': nome, 'NumeroFolha': str(100000 + i), 'NumeroIdentificador': str(fid),
+                'NumeroPis': f'2{fid:010d}', 'Cpf': f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{fid % 100:02d}',
+                'Rg': str(fid), 'Carteira': str(700000000000 + fid),
+                'Email': f'{nome.split()[0].lower()}.{fid}@exemplo.com',
+                'Masculino': rng.random() < 0.5,
+                'Nascimento': f'{rng.randint(1960, 2004)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00',
+                'Admissao': admissao.strftime('%Y-%m-%dT00:00:00'),
+                'Demissao': (admissao + timedelta(days=rng.randrange(30, 900))).strftime('%Y-%m-%dT00:00:00')
+                            if rng.random() < demitidos else None,
+                'HorarioId': horario['Id'],
+                'DepartamentoId': d_id + 1, 'FuncaoId': f_id + 1,
+            })
+            if isinstance(item.get('Horario'), dict):
+                item['Horario'].update(Id=horario['Id'], Numero=horario['Numero'], Descricao=horario['Descricao'])
+            if isinstance(item.get('Departamento'), dict):
+                item['Departamento'].update(Id=d_id + 1, Descricao=DEPARTAMENTOS[d_id])
+            if isinstance(item.get('Funcao'), dict):
+                item['Funcao'].update(Id=f_id + 1, Descricao=FUNCOES[f_id])
+            funcionarios.append(item)
+        return funcionarios
+
+    def _marcacoes(self, func: dict, d: date) -> list:
+        """[(minuto, 'Entrada'|'Saida', origem)] do dia — ou [('FOLGA'|'FALTA', …)]."""
+        rng = random.Random(f'{self.semente}:{func["Id"]}:{d.toordinal()}')
+        if d < date.fromisoformat(func['Admissao'][:10]):
+            return []
+        if func['Demissao'] and d > date.fromisoformat(func['Demissao'][:10]):
+            return []
+        horario = self._horarios[(func['HorarioId'] - 1) % len(self._horarios)]
+        dia = horario['Dias'][_PYTHON_TO_SECULLUM[d.weekday()]]
+        if dia['TipoDia'] == 2:
+            return [('FOLGA', None, None)] if rng.random() < 0.1 else []
+        if rng.random() < 0.03:
+            return [('FALTA', None, None)]
+        previstas = []
+        for k in range(1, 6):
+            for tipo in ('Entrada', 'Saida'):
+                h = dia[f'{tipo}{k}']
+                if h:
+                    previstas.append((_minutos(h) + int(rng.gauss(0, 6)), tipo))
+        if rng.random() < 0.04 and len(previstas) > 1:      # esqueceu uma batida
+            previstas.pop(rng.randrange(len(previstas)))
+        if rng.random() < 0.02:                              # batida em dobro
+            m, tipo = previstas[-1]
+            previstas.append((m + rng.randint(1, 3), tipo))
+        return [(m, tipo, rng.choice(_ORIGENS)) for m, tipo in sorted(previstas)]
+
+    # ── Rotas ─────────────────────────────────────────────────────────────────
+
+    def funcionarios(self, top: int = None) -> list:
+        return self._funcionarios[:top] if top else self._funcionarios
+
+    def horarios(self) -> list:
+        return self._horarios
+
+    def batidas(self, data_inicio: date, data_fim: date, hora_inicio: str = None, hora_fim: str = None,
+                cpf: str = None, pis: str = None) -> list:
+        """Um registro por (funcionário, dia) com marcação. Com hora_inicio/hora_fim
+        só entram as marcações entre (data_inicio hora_inicio) e (data_fim hora_fim)."""
+        if cpf:
+            funcs = [self._por_cpf[cpf]] if cpf in self._por_cpf else []
+        elif pis:
+            funcs = [self._por_pis[pis]] if pis in self._por_pis else []
+        else:
+            funcs = self._funcionarios
+        ini = datetime.combine(data_inicio, datetime.min.time()) + \
+            timedelta(minutes=_minutos(hora_inicio) if hora_inicio else 0)
+        fim = datetime.combine(data_fim, datetime.min.time()) + \
+            timedelta(minutes=_minutos(hora_fim) + 1 if hora_fim else 24 * 60)
+        agora = datetime.now()
+        registros = []
+        d = data_inicio
+        while d <= data_fim:
+            base = datetime.combine(d, datetime.min.time())
+            for func in funcs:
+                marcas = self._marcacoes(func, d)
+                if not marcas:
+                    continue
+                reg = {'Id': func['Id'] * 100000 + d.toordinal() % 100000, 'FuncionarioId': func['Id'],
+                       'Data': d.strftime('%Y-%m-%dT00:00:00')}
+                for k in range(1, 6):
+                    for tipo in ('Entrada', 'Saida'):
+                        reg[f'{tipo}{k}'] = None
+                        reg[f'FonteDados{tipo}{k}'] = None
+                if marcas[0][1] is None:                     # FOLGA / FALTA
+                    if not hora_inicio and not hora_fim:
+                        reg['Entrada1'] = reg['Saida1'] = marcas[0][0]
+                        registros.append(reg)
+                    continue
+                n = {'Entrada': 0, 'Saida': 0}
+                for m, tipo, origem in marcas:
+                    dh = base + timedelta(minutes=m)
+                    if not (ini <= dh < fim) or dh > agora or n[tipo] >= 5:
+                        continue
+                    n[tipo] += 1
+                    reg[f'{tipo}{n[tipo]}'] = f'{m // 60:02d}:{m % 60:02d}'
+                    reg[f'FonteDados{tipo}{n[tipo]}'] = {'Tipo': 1 if origem == 2 else 0, 'Origem': origem}
+                if n['Entrada'] or n['Saida']:
+                    registros.append(reg)
+            d += timedelta(days=1)
+        return registros
+
+    def contar(self, rota: str, erro: bool = False, n_bytes: int = 0, registros: int = 0):
+        with self._lock:
+            self.stats['requisicoes'] += 1
+            self.stats['por_rota'][rota] = self.stats['por_rota'].get(rota, 0) + 1
+            self.stats['erros'] += erro
+            self.stats['bytes'] += n_bytes
+            self.stats['registros'] += registros
+
+    def sortear_erro(self) -> bool:
+        with self._lock:
+            return self.erro > 0 and self._rng_erro.random() < self.erro
+
+
+def _handler(fake: FakeSecullum):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, status: int, corpo, rota: str, registros: int = 0):
+            dados = corpo.encode() if isinstance(corpo, str) else json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8' if status == 200 else 'text/plain')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+            fake.contar(rota, status >= 500, len(dados), registros)
+
+        def _preparar(self, rota: str) -> bool:
+            if fake.latencia_ms:
+                _time.sleep(fake.latencia_ms / 1000)
+            if fake.sortear_erro():
+                self._responder(fake._rng_erro.choice([500, 503]), 'Erro simulado', rota)
+                return False
+            return True
+
+        def do_POST(self):
+            tamanho = int(self.headers.get('Content-Length') or 0)
+            self.rfile.read(tamanho)
+            if urlparse(self.path).path.rstrip('/') != '/Token':
+                return self._responder(404, 'Not found', 'outros')
+            if self._preparar('Token'):
+                self._responder(200, {'access_token': f'fake-{_time.time_ns()}', 'token_type': 'bearer',
+                                      'expires_in': 86400}, 'Token')
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            rota = url.path.rstrip('/').rsplit('/', 1)[-1]
+            if rota == '__stats':
+                with fake._lock:
+                    return self._responder(200, fake.stats, '__stats')
+            if rota not in ('Funcionarios', 'Horarios', 'Batidas'):
+                return self._responder(404, 'Not found', 'outros')
+            if not (self.headers.get('Authorization') or '').startswith('Bearer fake-'):
+                return self._responder(401, 'Token inválido', rota)
+            if not self._preparar(rota):
+                return
+            if rota == 'Funcionarios':
+                dados = fake.funcionarios(int(q['$top']) if q.get('$top') else None)
+            elif rota == 'Horarios':
+                dados = fake.horarios()
+            else:
+                try:
+                    dados = fake.batidas(date.fromisoformat(q['dataInicio']), date.fromisoformat(q['dataFim']),
+                                         q.get('horaInicio'), q.get('horaFim'),
+                                         q.get('funcionarioCpf'), q.get('funcionarioPis'))
+                except (KeyError, ValueError):
+                    return self._responder(400, 'dataInicio/dataFim obrigatórios (yyyy-MM-dd)', rota)
+            self._responder(200, dados, rota, len(dados))
+
+    return Handler
+
+
+def iniciar(fake: FakeSecullum, host: str = '127.0.0.1', porta: int = 0):
+    """Sobe o servidor numa thread daemon. Retorna (servidor, url_base)."""
+    servidor = ThreadingHTTPServer((host, porta), _handler(fake))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://{host}:{servidor.server_address[1]}'
+
+
+def main():
+    p = argparse.ArgumentParser(description='API Secullum falsa para testes de carga do sync.')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--porta', type=int, default=8099)
+    p.add_argument('--funcionarios', type=int, default=500)
+    p.add_argument('--horarios', type=int, default=12)
+    p.add_argument('--latencia-ms', type=float, default=0)
+    p.add_argument('--erro', type=float, default=0.0, help='fração de respostas 500/503 (0–1)')
+    p.add_argument('--demitidos', type=float, default=0.03)
+    p.add_argument('--semente', type=int, default=42)
+    a = p.parse_args()
+
+    fake = FakeSecullum(a.funcionarios, a.horarios, a.semente, a.latencia_ms, a.erro, a.demitidos)
+    servidor = ThreadingHTTPServer((a.host, a.porta), _handler(fake))
+    servidor.daemon_threads = True
+    print(f'Secullum falso em http://{a.host}:{a.porta} ({a.funcionarios} funcionários)')
+    print(f'  SECULLUM_AUTH_URL=http://{a.host}:{a.porta}')
+    print(f'  SECULLUM_BASE_URL=http://{a.host}:{a.porta}/IntegracaoExterna')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Gerador de base sintética reproduzível para benchmarks (bench_endpoints.py)
+e testes manuais. Popula o banco de DATABASE_URL com:
+
+- um gestor (bench@local / bench);
+- departamentos (UNIDADE 01…) agrupados de 3 em 3 em grupos (GRUPO A…);
+- turnos por departamento — manhã, tarde, intermediário com sábado reduzido
+  e domingo em dias_complexos_json — e turnos globais (inclusive noturno);
+- N funcionários com horário base, função e sexo;
+- exceções (AlocacaoDiaria) em ~8% dos dias de MESES meses até o fim do
+  mês que vem;
+- batidas até agora, a partir da escala efetiva, com ruído: atraso/adiantamento,
+  faltas, batida esquecida e batida em dobro;
+- regras de notificação EVENT_SYNC (atraso, hora extra, ausência, inconsistência);
+- achados de inconsistência (como o sync deixaria).
+
+A mesma semente e a mesma data geram a mesma base. Recusa banco com
+funcionários, salvo --forcar.
+
+Usage: python gerar_dataset.py [N] [MESES] [--semente=42] [--forcar]
+"""
+import calendar
+import json
+import random
+import sys
+from datetime import date, datetime, time, timedelta
+
+DEPTS_POR_FUNC = 40          # um departamento a cada ~40 funcionários (mínimo 3)
+FUNCOES = ['Recepcionista', 'Professor', 'Limpeza', 'Coordenador']
+PESOS_FUNCOES = [3, 5, 2, 1]
+TAXA_EXCECAO = 0.08
+TAXA_FALTA = 0.04
+TAXA_ESQUECIDA = 0.03
+TAXA_DOBRO = 0.015
+
+
+def _turnos_do_departamento(dept: str) -> list:
+    from models import Turno
+    sabado_curto = json.dumps({'5': {'inicio': '08:00', 'fim': '12:00', 'intervalo': 0}})
+    domingo = json.dumps({'6': {'inicio': '09:00', 'fim': '15:00', 'intervalo': 15}})
+    return [
+        Turno(nome=f'Manhã {dept}', hora_inicio=time(6), hora_fim=time(14), dias_semana='0,1,2,3,4,5',
+              intervalo_minutos=60, departamento=dept, tipo_turno='A', color='#0ea5e9',
+              dias_complexos_json=sabado_curto),
+        Turno(nome=f'Tarde {dept}', hora_inicio=time(14), hora_fim=time(22), dias_semana='0,1,2,3,4,6',
+              intervalo_minutos=60, departamento=dept, tipo_turno='B', color='#f59e0b',
+              dias_complexos_json=domingo),
+        Turno(nome=f'Intermediário {dept}', hora_inicio=time(10), hora_fim=time(18), dias_semana='0,1,2,3,4',
+              intervalo_minutos=15, departamento=dept, tipo_turno='C', color='#22c55e'),
+    ]
+
+
+def _janela(turno, d: date):
+    """(início, fim, intervalo) do turno em d, ou None se o turno não cobre o dia."""
+    dias = {int(x) for x in (turno.dias_semana or '').split(',') if x.strip().isdigit()}
+    complexos = json.loads(turno.dias_complexos_json) if turno.dias_complexos_json else {}
+    esp = complexos.get(str(d.weekday()))
+    if esp:
+        h_ini = datetime.strptime(esp['inicio'], '%H:%M').time()
+        h_fim = datetime.strptime(esp['fim'], '%H:%M').time()
+        intervalo = int(esp.get('intervalo') or 0)
+    elif d.weekday() in dias:
+        h_ini, h_fim, intervalo = turno.hora_inicio, turno.hora_fim, turno.intervalo_minutos or 0
+    else:
+        return None
+    ini = datetime.combine(d, h_ini)
+    fim = datetime.combine(d, h_fim)
+    if fim <= ini:
+        fim += timedelta(days=1)
+    return ini, fim, intervalo
+
+
+def _marcacoes(rng, janela, agora: datetime) -> list:
+    """Batidas (datetime) de um dia trabalhado, com ruído."""
+    ini, fim, intervalo = janela
+    if rng.random() < TAXA_FALTA:
+        return []
+    ent = ini + timedelta(minutes=int(rng.gauss(2, 7)))
+    sai = fim + timedelta(minutes=int(rng.gauss(4, 10)))
+    marcas = [ent, sai]
+    if intervalo >= 60:
+        meio = ini + (fim - ini) / 2 + timedelta(minutes=int(rng.gauss(0, 15)))
+        marcas = [ent, meio, meio + timedelta(minutes=intervalo + int(rng.gauss(0, 5))), sai]
+    if rng.random() < TAXA_ESQUECIDA:
+        marcas.pop(rng.randrange(len(marcas)))
+    if rng.random() < TAXA_DOBRO:
+        k = rng.randrange(len(marcas))
+        marcas.insert(k + 1, marcas[k] + timedelta(minutes=rng.randint(1, 3)))
+    return [m for m in marcas if m <= agora]
+
+
+def gerar(n: int = 300, meses: int = 3, semente: int = 42, hoje: date = None) -> dict:
+    """Popula o banco (dentro de um app_context). Retorna contagens."""
+    from extensions import db
+    from models import (AlocacaoDiaria, Batida, Funcionario, GrupoDepartamento, NotificationRule,
+                        Turno, Usuario)
+
+    rng = random.Random(semente)
+    hoje = hoje or date.today()
+    agora = datetime.now() if hoje == date.today() else datetime.combine(hoje, time(23, 59))
+
+    if not Usuario.query.filter_by(email='bench@local').first():
+        u = Usuario(nome='Gestor Bench', email='bench@local', nivel_acesso='gestor')
+        u.set_senha('bench')
+        db.session.add(u)
+
+    n_depts = max(3, n // DEPTS_POR_FUNC)
+    depts = [f'UNIDADE {i + 1:02d}' for i in range(n_depts)]
+    for k in range(0, n_depts, 3):
+        g = GrupoDepartamento(nome=f'GRUPO {chr(65 + k // 3)}')
+        g.departamentos = depts[k:k + 3]
+        db.session.add(g)
+
+    turnos_dept = {d: _turnos_do_departamento(d) for d in depts}
+    globais = [
+        Turno(nome='Comercial', hora_inicio=time(8), hora_fim=time(17), dias_semana='0,1,2,3,4',
+              intervalo_minutos=60, tipo_turno='A'),
+        Turno(nome='Noturno', hora_inicio=time(22), hora_fim=time(6), dias_semana='0,1,2,3,4',
+              intervalo_minutos=60, tipo_turno='C'),
+    ]
+    db.session.add_all([t for ts in turnos_dept.values() for t in ts] + globais)
+    db.session.flush()
+
+    funcs = []
+    for i in range(n):
+        dept = depts[i % n_depts]
+        opcoes = turnos_dept[dept] + globais
+        base = rng.choice(turnos_dept[dept] + [globais[0]]) if rng.random() < 0.9 else None
+        f = Funcionario(id=f'S{i:05d}', nome=f'Funcionário Sintético {i:05d}', departamento=dept,
+                        funcao=rng.choices(FUNCOES, PESOS_FUNCOES)[0], sexo=rng.choice(['M', 'F']),
+                        horario_base_id=base.id if base else None, ativo=True,
+                        celular=f'2799{i:07d}', cpf=f'{i:011d}', admissao=hoje - timedelta(days=400))
+        funcs.append((f, base, opcoes))
+        db.session.add(f)
+    db.session.flush()
+
+    # Período: MESES meses até o corrente + o próximo (exceções futuras)
+    primeiro = date(hoje.year, hoje.month, 1)
+    for _ in range(meses - 1):
+        primeiro = (primeiro - timedelta(days=1)).replace(day=1)
+    prox = (date(hoje.year, hoje.month, 28) + timedelta(days=4)).replace(day=1)
+    ultimo = prox.replace(day=calendar.monthrange(prox.year, prox.month)[1])
+
+    alocacoes, batidas = [], []
+    n_bat = 0
+    for f, base, opcoes in funcs:
+        d = primeiro
+        while d <= ultimo:
+            turno = base
+            if rng.random() < TAXA_EXCECAO:
+                turno = rng.choice(opcoes)
+                alocacoes.append({'funcionario_id': f.id, 'turno_id': turno.id, 'data': d,
+                                  'is_excecao': True, 'criado_em': agora})
+            janela = _janela(turno, d) if turno and d <= hoje else None
+            if janela:
+                for k, m in enumerate(_marcacoes(rng, janela, agora)):
+                    batidas.append({'funcionario_id': f.id, 'data': d, 'hora': m.strftime('%H:%M'),
+                                    'data_hora': datetime.combine(d, m.time()),
+                                    'tipo': 'Entrada' if k % 2 == 0 else 'Saida',
+                                    'origem': 'REP', 'data_sincronizacao': agora})
+            d += timedelta(days=1)
+        if len(batidas) > 20000:
+            db.session.bulk_insert_mappings(Batida, batidas)
+            n_bat += len(batidas)
+            batidas = []
+    db.session.bulk_insert_mappings(AlocacaoDiaria, alocacoes)
+    db.session.bulk_insert_mappings(Batida, batidas)
+    n_aloc, n_bat = len(alocacoes), n_bat + len(batidas)
+
+    for nome, condicao, limite in [('Atraso', 'LATE_ENTRY', 10), ('Hora extra', 'OVERTIME', 30),
+                                   ('Ausência', 'ABSENCE', 15), ('Inconsistência', 'INCONSISTENCIA', 1)]:
+        db.session.add(NotificationRule(
+            nome=f'{nome} (bench)', trigger_type='EVENT_SYNC', condition_type=condicao,
+            threshold_minutes=limite, dest_manager=True, only_working_hours=False,
+            template_manager='{full_name}: {minutes} min em {data}',
+        ))
+    db.session.commit()
+
+    from services.inconsistencias_batidas import reprocessar_periodo
+    inc = reprocessar_periodo(primeiro, hoje)
+    return {'funcionarios': n, 'departamentos': n_depts, 'turnos': sum(map(len, turnos_dept.values())) + 2,
+            'alocacoes': n_aloc, 'batidas': n_bat, 'inconsistencias': inc['abertas'],
+            'periodo': (primeiro.isoformat(), ultimo.isoformat())}
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    opts = dict(a[2:].split('=', 1) if '=' in a else (a[2:], '1') for a in sys.argv[1:] if a.startswith('--'))
+    n = int(args[0]) if args else 300
+    meses = int(args[1]) if len(args) > 1 else 3
+
+    from app import app
+    from models import Funcionario
+    with app.app_context():
+        if Funcionario.query.first() and 'forcar' not in opts:
+            print('O banco já tem funcionários; use um banco vazio (DATABASE_URL) ou --forcar.')
+            sys.exit(1)
+        print(gerar(n, meses, int(opts.get('semente', 42))))
+
+
+if __name__ == '__main__':
+    main()
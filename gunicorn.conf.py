@@ -0,0 +1,14 @@
+"""
+Hooks do gunicorn para as métricas multiprocess (services/metricas.py).
+Lido automaticamente quando o gunicorn sobe na raiz do projeto.
+"""
+
+
+def on_starting(server):
+    from services.metricas import limpar_diretorio
+    limpar_diretorio()
+
+
+def child_exit(server, worker):
+    from services.metricas import processo_encerrado
+    processo_encerrado(worker.pid)
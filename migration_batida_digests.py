@@ -0,0 +1,60 @@
+"""
+Migration: cria a tabela batida_digests (reconciliação com o Secullum por
+digest) e calcula o digest local dos dias que já têm batidas. O lado Secullum
+é preenchido pelos próximos syncs (ou por "Buscar no Secullum" na tela de
+inconsistências).
+Execute: python migration_batida_digests.py [AAAA-MM-DD inicial]
+"""
+import sys
+from datetime import date
+
+from app import app
+from extensions import db
+
+
+def run(desde: date = None):
+    with app.app_context():
+        conn = db.engine.connect()
+        trans = conn.begin()
+        try:
+            conn.execute(db.text("""
+                CREATE TABLE IF NOT EXISTS batida_digests (
+                    id                  SERIAL PRIMARY KEY,
+                    funcionario_id      VARCHAR(50) NOT NULL REFERENCES funcionarios(id),
+                    data                DATE NOT NULL,
+                    digest_local        VARCHAR(40),
+                    n_local             INTEGER NOT NULL DEFAULT 0,
+                    local_em            TIMESTAMP,
+                    digest_secullum     VARCHAR(40),
+                    n_secullum          INTEGER NOT NULL DEFAULT 0,
+                    horas_secullum_json TEXT NOT NULL DEFAULT '[]',
+                    secullum_em         TIMESTAMP,
+                    CONSTRAINT uq_batida_digest UNIQUE (funcionario_id, data)
+                )
+            """))
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS idx_batida_digest_data ON batida_digests (data)"
+            ))
+            trans.commit()
+            print("Tabela batida_digests pronta.")
+        except Exception as e:
+            trans.rollback()
+            print(f"Erro: {e}")
+            raise
+        finally:
+            conn.close()
+
+        # Digest local (commit por mês)
+        from models import Batida
+        from services.reconciliacao_batidas import atualizar_locais_periodo
+        ini, fim = db.session.query(db.func.min(Batida.data), db.func.max(Batida.data)).one()
+        if ini is None:
+            print("Nenhuma batida.")
+            return
+        ini = max(ini, desde) if desde else ini
+        n = atualizar_locais_periodo(ini, fim)
+        print(f"Digest local de {n} dia(s) de {ini} a {fim}.")
+
+
+if __name__ == '__main__':
+    run(date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,66 @@
+"""
+Migration: cria a tabela batida_inconsistencias e faz a carga inicial dos
+achados a partir das batidas já gravadas (marca também Batida.inconsistente).
+Execute: python migration_batida_inconsistencias.py [AAAA-MM-DD inicial]
+"""
+import sys
+from datetime import date
+
+from app import app
+from extensions import db
+
+
+def run(desde: date = None):
+    with app.app_context():
+        conn = db.engine.connect()
+        trans = conn.begin()
+        try:
+            conn.execute(db.text("""
+                CREATE TABLE IF NOT EXISTS batida_inconsistencias (
+                    id              SERIAL PRIMARY KEY,
+                    funcionario_id  VARCHAR(50) NOT NULL REFERENCES funcionarios(id),
+                    data            DATE NOT NULL,
+                    tipo            VARCHAR(20) NOT NULL,
+                    severidade      VARCHAR(10) NOT NULL,
+                    ordem           INTEGER NOT NULL DEFAULT 0,
+                    descricao       VARCHAR(300),
+                    batida_ids_json TEXT NOT NULL DEFAULT '[]',
+                    aberta          BOOLEAN NOT NULL DEFAULT TRUE,
+                    detectado_em    TIMESTAMP,
+                    resolvido_em    TIMESTAMP,
+                    resolvido_por   INTEGER REFERENCES usuarios(id),
+                    resolucao       VARCHAR(20)
+                )
+            """))
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS idx_inconsistencia_func_data "
+                "ON batida_inconsistencias (funcionario_id, data)"
+            ))
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS idx_inconsistencia_aberta_data "
+                "ON batida_inconsistencias (aberta, data)"
+            ))
+            trans.commit()
+            print("Tabela batida_inconsistencias pronta.")
+        except Exception as e:
+            trans.rollback()
+            print(f"Erro: {e}")
+            raise
+        finally:
+            conn.close()
+
+        # Carga inicial (commit por mês)
+        from models import Batida
+        from services.inconsistencias_batidas import reprocessar_periodo
+        ini, fim = db.session.query(db.func.min(Batida.data), db.func.max(Batida.data)).one()
+        if ini is None:
+            print("Nenhuma batida para analisar.")
+            return
+        ini = max(ini, desde) if desde else ini
+        res = reprocessar_periodo(ini, fim)
+        print(f"{res['dias']} dia(s) analisado(s) de {ini} a {fim}: "
+              f"{res['abertas']} inconsistência(s) aberta(s).")
+
+
+if __name__ == '__main__':
+    run(date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None)
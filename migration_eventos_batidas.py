@@ -0,0 +1,47 @@
+"""
+Migration: cria as tabelas eventos_batidas (outbox de batidas alteradas por
+funcionário/dia) e consumidores_eventos (offset de cada consumidor).
+Execute: python migration_eventos_batidas.py
+"""
+from app import app
+from extensions import db
+
+
+def run():
+    with app.app_context():
+        conn = db.engine.connect()
+        trans = conn.begin()
+        try:
+            conn.execute(db.text("""
+                CREATE TABLE IF NOT EXISTS eventos_batidas (
+                    id             SERIAL PRIMARY KEY,
+                    funcionario_id VARCHAR(50) NOT NULL,
+                    data           DATE NOT NULL,
+                    origem         VARCHAR(20) NOT NULL DEFAULT 'sync',
+                    criado_em      TIMESTAMP
+                )
+            """))
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS ix_eventos_batidas_criado_em ON eventos_batidas (criado_em)"
+            ))
+            conn.execute(db.text("""
+                CREATE TABLE IF NOT EXISTS consumidores_eventos (
+                    nome          VARCHAR(50) PRIMARY KEY,
+                    ultimo_id     INTEGER NOT NULL DEFAULT 0,
+                    processados   INTEGER NOT NULL DEFAULT 0,
+                    atualizado_em TIMESTAMP,
+                    erro          TEXT
+                )
+            """))
+            trans.commit()
+            print("Tabelas eventos_batidas e consumidores_eventos prontas.")
+        except Exception as e:
+            trans.rollback()
+            print(f"Erro: {e}")
+            raise
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    run()
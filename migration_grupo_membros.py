@@ -0,0 +1,65 @@
+"""
+Migration: cria a tabela grupo_departamento_membros (um departamento por linha)
+e preenche a partir de grupos_departamento.departamentos_json.
+Execute: python migration_grupo_membros.py
+"""
+import json
+import uuid
+from app import app
+from extensions import db
+
+
+def run():
+    with app.app_context():
+        conn = db.engine.connect()
+        trans = conn.begin()
+        try:
+            conn.execute(db.text("""
+                CREATE TABLE IF NOT EXISTS grupo_departamento_membros (
+                    id           SERIAL PRIMARY KEY,
+                    grupo_id     INTEGER NOT NULL REFERENCES grupos_departamento(id) ON DELETE CASCADE,
+                    departamento VARCHAR(200) NOT NULL,
+                    CONSTRAINT uq_grupo_departamento_membro UNIQUE (grupo_id, departamento)
+                )
+            """))
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS idx_grupo_membro_departamento "
+                "ON grupo_departamento_membros (departamento)"
+            ))
+
+            grupos = conn.execute(db.text(
+                "SELECT id, nome, departamentos_json FROM grupos_departamento"
+            )).fetchall()
+            for grupo_id, nome, depts_json in grupos:
+                try:
+                    depts = json.loads(depts_json or '[]')
+                except Exception:
+                    depts = []
+                existentes = {r[0] for r in conn.execute(db.text(
+                    "SELECT departamento FROM grupo_departamento_membros WHERE grupo_id = :g"
+                ), {'g': grupo_id})}
+                novos = [d for d in dict.fromkeys(depts) if d and d not in existentes]
+                for d in novos:
+                    conn.execute(db.text(
+                        "INSERT INTO grupo_departamento_membros (grupo_id, departamento) VALUES (:g, :d)"
+                    ), {'g': grupo_id, 'd': d})
+                print(f"Grupo '{nome}': {len(novos)} membro(s) inserido(s).")
+
+            # Força a reconstrução das facetas (dropdowns/filtros) nos workers
+            conn.execute(db.text("DELETE FROM configuracoes WHERE chave = 'facetas_versao'"))
+            conn.execute(db.text(
+                "INSERT INTO configuracoes (chave, valor) VALUES ('facetas_versao', :v)"
+            ), {'v': uuid.uuid4().hex})
+
+            trans.commit()
+            print("Migration concluída com sucesso.")
+        except Exception as e:
+            trans.rollback()
+            print(f"Erro: {e}")
+            raise
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    run()
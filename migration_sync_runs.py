@@ -0,0 +1,52 @@
+"""
+Migration: cria a tabela sync_runs (histórico das execuções de sync com o
+tempo de cada fase).
+Execute: python migration_sync_runs.py
+"""
+from app import app
+from extensions import db
+
+
+def run():
+    with app.app_context():
+        conn = db.engine.connect()
+        trans = conn.begin()
+        try:
+            conn.execute(db.text("""
+                CREATE TABLE IF NOT EXISTS sync_runs (
+                    id               SERIAL PRIMARY KEY,
+                    tipo             VARCHAR(20) NOT NULL,
+                    modo             VARCHAR(20),
+                    origem           VARCHAR(20) NOT NULL,
+                    iniciado_em      TIMESTAMP NOT NULL,
+                    janela_inicio    TIMESTAMP,
+                    janela_fim       TIMESTAMP,
+                    duracao_ms       INTEGER NOT NULL DEFAULT 0,
+                    api_ms           INTEGER NOT NULL DEFAULT 0,
+                    banco_ms         INTEGER NOT NULL DEFAULT 0,
+                    processamento_ms INTEGER NOT NULL DEFAULT 0,
+                    consultas        INTEGER NOT NULL DEFAULT 0,
+                    registros        INTEGER NOT NULL DEFAULT 0,
+                    novos            INTEGER NOT NULL DEFAULT 0,
+                    atualizados      INTEGER NOT NULL DEFAULT 0,
+                    ignorados        INTEGER NOT NULL DEFAULT 0,
+                    ok               BOOLEAN NOT NULL DEFAULT TRUE,
+                    erro             TEXT,
+                    memoria_mb       DOUBLE PRECISION
+                )
+            """))
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS idx_sync_runs_tipo_iniciado ON sync_runs (tipo, iniciado_em)"
+            ))
+            trans.commit()
+            print("Tabela sync_runs pronta.")
+        except Exception as e:
+            trans.rollback()
+            print(f"Erro: {e}")
+            raise
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    run()
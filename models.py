@@ -121,6 +121,150 @@ class Batida(db.Model):
         return f'<Batida {self.funcionario_id} em {self.data} as {self.hora}>'
 
 
+class BatidaInconsistencia(db.Model):
+    """Inconsistência de batidas de um funcionário em um dia, detectada na
+    ingestão (sync) e reavaliada a cada correção do gestor
+    (services/inconsistencias_batidas.py). Fica aberta até sumir numa
+    reavaliação; aí registra quando, por quem e como foi resolvida.
+    """
+    __tablename__ = 'batida_inconsistencias'
+    id = db.Column(db.Integer, primary_key=True)
+    funcionario_id = db.Column(db.String(50), db.ForeignKey('funcionarios.id'), nullable=False)
+    data = db.Column(db.Date, nullable=False)
+
+    tipo = db.Column(db.String(20), nullable=False)        # impares | duplicata | invertida | longa | curta
+    severidade = db.Column(db.String(10), nullable=False)  # alta | media | baixa
+    ordem = db.Column(db.Integer, nullable=False, default=0)  # posição na descrição do dia
+    descricao = db.Column(db.String(300))
+    batida_ids_json = db.Column(db.Text, nullable=False, default='[]')
+
+    aberta = db.Column(db.Boolean, nullable=False, default=True)
+    detectado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    resolvido_em = db.Column(db.DateTime, nullable=True)
+    resolvido_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    resolucao = db.Column(db.String(20), nullable=True)    # sync | edicao | inclusao | exclusao
+
+    funcionario = db.relationship('Funcionario')
+
+    __table_args__ = (
+        db.Index('idx_inconsistencia_func_data', 'funcionario_id', 'data'),
+        db.Index('idx_inconsistencia_aberta_data', 'aberta', 'data'),
+    )
+
+    @property
+    def batida_ids(self) -> list:
+        import json
+        try:
+            return json.loads(self.batida_ids_json or '[]')
+        except Exception:
+            return []
+
+    def __repr__(self):
+        return f'<BatidaInconsistencia {self.funcionario_id} {self.data} {self.tipo}>'
+
+
+class BatidaDigest(db.Model):
+    """Resumo (digest) do conjunto de horários de um funcionário num dia, nos
+    dois lados: o local, recalculado a cada ingestão/correção, e o do
+    Secullum, gravado no sync (services/reconciliacao_batidas.py). A
+    comparação com o Secullum confere os digests e só detalha os dias que
+    divergem.
+    """
+    __tablename__ = 'batida_digests'
+    id = db.Column(db.Integer, primary_key=True)
+    funcionario_id = db.Column(db.String(50), db.ForeignKey('funcionarios.id'), nullable=False)
+    data = db.Column(db.Date, nullable=False)
+
+    digest_local = db.Column(db.String(40), nullable=True)
+    n_local = db.Column(db.Integer, nullable=False, default=0)
+    local_em = db.Column(db.DateTime, nullable=True)
+
+    digest_secullum = db.Column(db.String(40), nullable=True)   # NULL = dia ainda não visto no Secullum
+    n_secullum = db.Column(db.Integer, nullable=False, default=0)
+    horas_secullum_json = db.Column(db.Text, nullable=False, default='[]')   # [["HH:MM", "Tipo"], ...]
+    secullum_em = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('funcionario_id', 'data', name='uq_batida_digest'),
+        db.Index('idx_batida_digest_data', 'data'),
+    )
+
+    @property
+    def horas_secullum(self) -> list:
+        import json
+        try:
+            return json.loads(self.horas_secullum_json or '[]')
+        except Exception:
+            return []
+
+    def __repr__(self):
+        return f'<BatidaDigest {self.funcionario_id} {self.data}>'
+
+
+class SyncRun(db.Model):
+    """Uma execução de sync (funcionarios, batidas, horarios, alocacoes) com o
+    tempo de cada fase: API, banco (SQL) e processamento (o resto).
+    Gravada por services/sync_runs.py."""
+    __tablename__ = 'sync_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)      # funcionarios / batidas / horarios / alocacoes
+    modo = db.Column(db.String(20), nullable=True)       # batidas: incremental / janela / periodo / dirigida
+    origem = db.Column(db.String(20), nullable=False)    # apscheduler / celery / manual / script
+    iniciado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    janela_inicio = db.Column(db.DateTime, nullable=True)
+    janela_fim = db.Column(db.DateTime, nullable=True)
+
+    duracao_ms = db.Column(db.Integer, nullable=False, default=0)
+    api_ms = db.Column(db.Integer, nullable=False, default=0)
+    banco_ms = db.Column(db.Integer, nullable=False, default=0)
+    processamento_ms = db.Column(db.Integer, nullable=False, default=0)
+    consultas = db.Column(db.Integer, nullable=False, default=0)
+
+    registros = db.Column(db.Integer, nullable=False, default=0)    # recebidos da API / processados
+    novos = db.Column(db.Integer, nullable=False, default=0)
+    atualizados = db.Column(db.Integer, nullable=False, default=0)
+    ignorados = db.Column(db.Integer, nullable=False, default=0)
+
+    ok = db.Column(db.Boolean, nullable=False, default=True)
+    erro = db.Column(db.Text, nullable=True)
+    memoria_mb = db.Column(db.Float, nullable=True)      # maior RSS amostrado na execução
+
+    __table_args__ = (
+        db.Index('idx_sync_runs_tipo_iniciado', 'tipo', 'iniciado_em'),
+    )
+
+    def __repr__(self):
+        return f'<SyncRun {self.tipo} {self.iniciado_em}>'
+
+
+class EventoBatida(db.Model):
+    """Outbox de "batidas mudaram para (funcionário, dia)". Gravado na mesma
+    transação das batidas (sync ou correção do gestor); o `id` é o offset
+    lido pelos consumidores (services/eventos_batidas.py)."""
+    __tablename__ = 'eventos_batidas'
+    id = db.Column(db.Integer, primary_key=True)
+    funcionario_id = db.Column(db.String(50), nullable=False)
+    data = db.Column(db.Date, nullable=False)
+    origem = db.Column(db.String(20), nullable=False, default='sync')   # sync / manual
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<EventoBatida #{self.id} {self.funcionario_id} {self.data}>'
+
+
+class ConsumidorEvento(db.Model):
+    """Offset de cada consumidor de eventos_batidas: último id processado."""
+    __tablename__ = 'consumidores_eventos'
+    nome = db.Column(db.String(50), primary_key=True)
+    ultimo_id = db.Column(db.Integer, nullable=False, default=0)
+    processados = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=True)
+    erro = db.Column(db.Text, nullable=True)             # última falha (limpa no próximo lote ok)
+
+    def __repr__(self):
+        return f'<ConsumidorEvento {self.nome} @{self.ultimo_id}>'
+
+
 class Configuracao(db.Model):
     __tablename__ = 'configuracoes'
     id = db.Column(db.Integer, primary_key=True)
@@ -337,7 +481,7 @@ class NotificationRule(db.Model):
     trigger_hour    = db.Column(db.Integer, nullable=True, default=8)     # hour for DAILY/WEEKLY
     trigger_weekday = db.Column(db.Integer, nullable=True, default=4)     # 0=Mon … 6=Sun
 
-    # Condition: LATE_ENTRY | EARLY_LEAVE | ABSENCE | OVERTIME | INTERJORNADA | ESCALA_ENVIO
+    # Condition: LATE_ENTRY | EARLY_LEAVE | ABSENCE | OVERTIME | INTERJORNADA | INCONSISTENCIA | ESCALA_ENVIO
     condition_type      = db.Column(db.String(50), nullable=False, default='LATE_ENTRY')
     threshold_minutes   = db.Column(db.Integer, nullable=True, default=15)
 
@@ -472,12 +616,18 @@ class GrupoDepartamento(db.Model):
     __tablename__ = 'grupos_departamento'
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(200), nullable=False, unique=True)
-    # JSON list de nomes de departamento que fazem parte do grupo
+    # JSON list de nomes de departamento (cópia legada; a fonte é `membros`)
     departamentos_json = db.Column(db.Text, nullable=False, default='[]')
     criado_em = db.Column(db.DateTime, default=datetime.utcnow)
 
+    membros = db.relationship('GrupoDepartamentoMembro', backref='grupo', cascade='all, delete-orphan',
+                              order_by='GrupoDepartamentoMembro.id')
+
     @property
     def departamentos(self) -> list:
+        if self.membros:
+            return [m.departamento for m in self.membros]
+        # Grupo ainda não migrado para a tabela de membros
         import json
         try:
             return json.loads(self.departamentos_json)
@@ -487,7 +637,221 @@ class GrupoDepartamento(db.Model):
     @departamentos.setter
     def departamentos(self, value: list):
         import json
+        value = list(dict.fromkeys(d for d in value if d))
+        # Mantém os membros que continuam (unique grupo+departamento) e troca o resto
+        atuais = {m.departamento: m for m in self.membros}
+        self.membros = [atuais.get(d) or GrupoDepartamentoMembro(departamento=d) for d in value]
         self.departamentos_json = json.dumps(value, ensure_ascii=False)
 
     def __repr__(self):
         return f'<GrupoDepartamento {self.nome}>'
+
+
+class GrupoDepartamentoMembro(db.Model):
+    """Departamento que faz parte de um grupo (um por linha, indexado por departamento)."""
+    __tablename__ = 'grupo_departamento_membros'
+    id = db.Column(db.Integer, primary_key=True)
+    grupo_id = db.Column(db.Integer, db.ForeignKey('grupos_departamento.id', ondelete='CASCADE'), nullable=False)
+    departamento = db.Column(db.String(200), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('grupo_id', 'departamento', name='uq_grupo_departamento_membro'),
+        db.Index('idx_grupo_membro_departamento', 'departamento'),
+    )
+
+    def __repr__(self):
+        return f'<GrupoDepartamentoMembro {self.grupo_id} {self.departamento}>'
+
+
+# ── Dashboard: Snapshot operacional do dia ────────────────────────────────────
+
+class SnapshotUnidade(db.Model):
+    """Resumo operacional de "hoje" por departamento, mantido pelo pipeline de sync.
+    O dashboard lê uma linha por unidade em vez de recalcular tudo a cada acesso.
+    `versao` é um contador global (maior versão da tabela + 1) usado nos deltas do dashboard.
+    """
+    __tablename__ = 'snapshot_unidades'
+    id = db.Column(db.Integer, primary_key=True)
+    departamento = db.Column(db.String(200), nullable=False)   # '' = sem departamento
+    data = db.Column(db.Date, nullable=False)
+
+    ativos      = db.Column(db.Integer, default=0)
+    escalados   = db.Column(db.Integer, default=0)
+    presentes   = db.Column(db.Integer, default=0)
+    em_jornada  = db.Column(db.Integer, default=0)
+    ausentes    = db.Column(db.Integer, default=0)
+    atrasados   = db.Column(db.Integer, default=0)
+    batidas     = db.Column(db.Integer, default=0)
+    inconsistencias = db.Column(db.Integer, default=0)
+    ultima_batida   = db.Column(db.String(10), nullable=True)  # HH:MM
+    # JSON list [{id, nome}] dos escalados sem batida (limitado)
+    ausentes_json = db.Column(db.Text, nullable=True)
+
+    versao = db.Column(db.Integer, default=0, nullable=False)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('departamento', 'data', name='uq_snapshot_unidade'),
+        db.Index('idx_snapshot_data_versao', 'data', 'versao'),
+    )
+
+    @property
+    def ausentes_lista(self) -> list:
+        import json
+        try:
+            return json.loads(self.ausentes_json or '[]')
+        except Exception:
+            return []
+
+    def to_dict(self) -> dict:
+        return {
+            'departamento':    self.departamento,
+            'data':            self.data.isoformat(),
+            'ativos':          self.ativos or 0,
+            'escalados':       self.escalados or 0,
+            'presentes':       self.presentes or 0,
+            'em_jornada':      self.em_jornada or 0,
+            'ausentes':        self.ausentes or 0,
+            'atrasados':       self.atrasados or 0,
+            'batidas':         self.batidas or 0,
+            'inconsistencias': self.inconsistencias or 0,
+            'ultima_batida':   self.ultima_batida,
+            'ausentes_lista':  self.ausentes_lista,
+            'versao':          self.versao,
+        }
+
+    def __repr__(self):
+        return f'<SnapshotUnidade {self.departamento or "—"} {self.data} v{self.versao}>'
+
+
+# ── Escalas: versão e log de alterações ───────────────────────────────────────
+
+class EscalaAlteracao(db.Model):
+    """Log de alterações da escala. O `id` é a versão global da escala: cada
+    escrita em alocação, turno, funcionário ou grupo gera uma linha (ver
+    services/escala_versao.py). Usado para ETag dos endpoints JSON e para o
+    modo delta (?since_version=) do calendário.
+    """
+    __tablename__ = 'escala_alteracoes'
+    id = db.Column(db.Integer, primary_key=True)
+    # 'alocacao' | 'turno' | 'funcionario' | 'grupo' | 'lote' (escrita em massa sem detalhe)
+    entidade = db.Column(db.String(20), nullable=False)
+    operacao = db.Column(db.String(10), nullable=False)   # insert | update | delete | bulk
+    funcionario_id = db.Column(db.String(50), nullable=True)
+    data = db.Column(db.Date, nullable=True)
+    referencia_id = db.Column(db.Integer, nullable=True)  # id da alocação/turno/grupo
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<EscalaAlteracao v{self.id} {self.entidade}/{self.operacao} {self.funcionario_id or ""} {self.data or ""}>'
+
+
+# ── Cobertura mínima intradiária ──────────────────────────────────────────────
+
+class CoberturaMinima(db.Model):
+    """Quantidade mínima de pessoas escaladas numa janela do dia.
+    Ex: "PRAIA FITNESS / Recepcionista, 19:00–22:00, mínimo 2".
+    Campos nulos valem para todos (departamento/grupo, função, dia da semana).
+    """
+    __tablename__ = 'coberturas_minimas'
+    id = db.Column(db.Integer, primary_key=True)
+    departamento = db.Column(db.String(200), nullable=True)   # departamento ou nome de grupo
+    funcao = db.Column(db.String(200), nullable=True)
+    dia_semana = db.Column(db.Integer, nullable=True)          # 0=seg..6=dom, None = todos
+    hora_inicio = db.Column(db.Time, nullable=False)
+    hora_fim = db.Column(db.Time, nullable=False)              # fim <= início → cruza meia-noite
+    minimo = db.Column(db.Integer, nullable=False, default=1)
+    ativo = db.Column(db.Boolean, default=True)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CoberturaMinima {self.departamento or "*"}/{self.funcao or "*"} {self.hora_inicio}-{self.hora_fim} ≥{self.minimo}>'
+
+
+# ── Previsão de demanda (presença real pelas batidas) ────────────────────────
+
+class PresencaDiaria(db.Model):
+    """Presença real de um dia por departamento/função, calculada das batidas:
+    pessoas com o ponto aberto no início de cada faixa de 15 min (96 valores).
+    Mantida incrementalmente pela tarefa noturna (services/previsao_demanda.py).
+    """
+    __tablename__ = 'presencas_diarias'
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Date, nullable=False, index=True)
+    departamento = db.Column(db.String(200), nullable=False, default='')
+    funcao = db.Column(db.String(200), nullable=False, default='')
+    curva_json = db.Column(db.Text, nullable=False)   # [96 inteiros]
+    pico = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('data', 'departamento', 'funcao', name='uq_presenca_diaria'),
+    )
+
+    def __repr__(self):
+        return f'<PresencaDiaria {self.data} {self.departamento}/{self.funcao} pico={self.pico}>'
+
+
+class PrevisaoDemanda(db.Model):
+    """Curva prevista por departamento/função × dia da semana, das últimas
+    semanas de PresencaDiaria: média e mínimo recomendado (percentil) por
+    faixa de 15 min. Recalculada inteira a cada execução da tarefa noturna.
+    """
+    __tablename__ = 'previsoes_demanda'
+    id = db.Column(db.Integer, primary_key=True)
+    departamento = db.Column(db.String(200), nullable=False, default='')
+    funcao = db.Column(db.String(200), nullable=False, default='')
+    dia_semana = db.Column(db.Integer, nullable=False)          # 0=seg..6=dom
+    media_json = db.Column(db.Text, nullable=False)             # [96 floats]
+    recomendado_json = db.Column(db.Text, nullable=False)       # [96 inteiros]
+    amostras = db.Column(db.Integer, nullable=False, default=0)  # dias usados
+    gerado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('departamento', 'funcao', 'dia_semana', name='uq_previsao_demanda'),
+    )
+
+    def __repr__(self):
+        return f'<PrevisaoDemanda {self.departamento}/{self.funcao} dia={self.dia_semana}>'
+
+
+# ── Escalas: sandbox "e se?" ──────────────────────────────────────────────────
+
+class SandboxEscala(db.Model):
+    """Rascunho da escala de um mês. As edições ficam em `edicoes_json` (lista
+    de operações) e são aplicadas em memória sobre a escala efetiva – nada vai
+    para AlocacaoDiaria até o sandbox ser gravado (services/sandbox_escala.py).
+    `versao_base` é a versão da escala quando o sandbox foi aberto, usada para
+    detectar conflitos com alterações feitas depois.
+    """
+    __tablename__ = 'sandboxes_escala'
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(200), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    ano = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    departamento = db.Column(db.String(200), nullable=True)   # departamento ou nome de grupo
+    funcao = db.Column(db.String(200), nullable=True)
+    versao_base = db.Column(db.Integer, nullable=False, default=0)
+    edicoes_json = db.Column(db.Text, nullable=False, default='[]')
+    status = db.Column(db.String(12), nullable=False, default='aberto')   # aberto | gravado | descartado
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    usuario = db.relationship('Usuario')
+
+    @property
+    def edicoes(self) -> list:
+        import json
+        try:
+            return json.loads(self.edicoes_json or '[]')
+        except Exception:
+            return []
+
+    @edicoes.setter
+    def edicoes(self, valor):
+        import json
+        self.edicoes_json = json.dumps(valor, ensure_ascii=False)
+
+    def __repr__(self):
+        return f'<SandboxEscala {self.id} {self.mes:02d}/{self.ano} [{self.status}]>'
@@ -1,9 +1,15 @@
+import os
+
 import requests
 
+from services.metricas import medir_api
+
 class SecullumAPI:
     def __init__(self, email, senha, banco):
-        self.auth_url = "https://autenticador.secullum.com.br"
-        self.base_url = "https://pontowebintegracaoexterna.secullum.com.br/IntegracaoExterna"
+        # SECULLUM_AUTH_URL / SECULLUM_BASE_URL apontam para outro servidor (ex.: fake_secullum.py)
+        self.auth_url = os.getenv('SECULLUM_AUTH_URL') or "https://autenticador.secullum.com.br"
+        self.base_url = (os.getenv('SECULLUM_BASE_URL')
+                         or "https://pontowebintegracaoexterna.secullum.com.br/IntegracaoExterna")
         self.email = email
         self.senha = senha
         self.banco = banco
@@ -21,7 +27,9 @@ class SecullumAPI:
         
         try:
             # Importante: deve ser x-www-form-urlencoded
-            response = requests.post(url, data=payload)
+            with medir_api('token') as chamada:
+                response = requests.post(url, data=payload)
+                chamada.status = response.status_code
             
             if response.status_code == 200:
                 self.token = response.json().get('access_token')
@@ -50,7 +58,9 @@ class SecullumAPI:
         if limite:
             params['$top'] = limite # Padrão OData comum no Secullum
             
-        response = requests.get(url, headers=self._get_headers(), params=params)
+        with medir_api('funcionarios') as chamada:
+            response = requests.get(url, headers=self._get_headers(), params=params)
+            chamada.status = response.status_code
         if response.status_code == 200:
             return response.json()
         else:
@@ -63,7 +73,9 @@ class SecullumAPI:
             if not self.autenticar():
                 return []
         try:
-            r = requests.get(f"{self.base_url}/Horarios", headers=self._get_headers(), timeout=30)
+            with medir_api('horarios') as chamada:
+                r = requests.get(f"{self.base_url}/Horarios", headers=self._get_headers(), timeout=30)
+                chamada.status = r.status_code
             if r.status_code == 200:
                 return r.json()
             print(f"Erro ao listar horários: {r.status_code} - {r.text[:200]}")
@@ -71,14 +83,17 @@ class SecullumAPI:
             print(f"Erro listar_horarios: {e}")
         return []
 
-    def buscar_batidas(self, data_inicio, data_fim, hora_inicio=None, hora_fim=None):
+    def buscar_batidas(self, data_inicio, data_fim, hora_inicio=None, hora_fim=None,
+                       funcionario_cpf=None, funcionario_pis=None):
         """
         Busca todas as batidas no período. 
         data_inicio/data_fim: YYYY-MM-DD
         hora_inicio/hora_fim: HH:mm (opcional)
+        funcionario_cpf/funcionario_pis: só as de um funcionário (opcional; a API prioriza o CPF)
+        Retorna None se a API responder com erro.
         """
         if not self.token:
-            if not self.autenticar(): return []
+            if not self.autenticar(): return None
             
         url = f"{self.base_url}/Batidas"
         params = {
@@ -89,10 +104,16 @@ class SecullumAPI:
             params["horaInicio"] = hora_inicio
         if hora_fim:
             params["horaFim"] = hora_fim
+        if funcionario_cpf:
+            params["funcionarioCpf"] = funcionario_cpf
+        if funcionario_pis:
+            params["funcionarioPis"] = funcionario_pis
             
-        response = requests.get(url, headers=self._get_headers(), params=params)
+        with medir_api('batidas') as chamada:
+            response = requests.get(url, headers=self._get_headers(), params=params)
+            chamada.status = response.status_code
         if response.status_code == 200:
             return response.json()
         else:
             print(f"Erro ao buscar batidas: {response.status_code} - {response.text}")
-            return []
+            return None
@@ -2,12 +2,16 @@
 Auto-sync de batidas via APScheduler (roda dentro do processo Flask).
 Não requer Celery Worker/Beat separado.
 
-Dois jobs:
+Três jobs:
   - job_rapida  : sync incremental (desde última sync até agora)
   - job_completa: sync com janela configurável (N horas atrás → agora)
+  - job_eventos : consumidores de eventos de batidas (services/eventos_batidas),
+                  a cada minuto, fora das rodadas de sync
 
 Os intervalos são lidos da tabela `configuracoes` a cada execução,
-então mudanças na config têm efeito no próximo ciclo sem restart.
+então mudanças na config têm efeito no próximo ciclo sem restart. Com a
+cadência adaptativa (services/cadencia_sync) o intervalo da sync rápida
+muda ao longo do dia conforme as entradas/saídas previstas na escala.
 """
 from datetime import datetime, timedelta
 import logging
@@ -41,11 +45,13 @@ def _set_cfg(chave, valor):
         logger.error(f'[auto_sync] Erro ao salvar {chave}: {e}')
 
 
-def _deve_rodar(chave_ativo, chave_intervalo, chave_ultimo_run, intervalo_default):
-    """Retorna True se o job deve rodar agora (ativo + intervalo atingido)."""
+def _deve_rodar(chave_ativo, chave_intervalo, chave_ultimo_run, intervalo_default, intervalo=None):
+    """Retorna True se o job deve rodar agora (ativo + intervalo atingido).
+    `intervalo` (minutos) substitui o configurado em `chave_intervalo`."""
     if _get_cfg(chave_ativo, '1') != '1':
         return False
-    intervalo = int(_get_cfg(chave_intervalo, str(intervalo_default)))
+    if intervalo is None:
+        intervalo = int(_get_cfg(chave_intervalo, str(intervalo_default)))
     ultimo_str = _get_cfg(chave_ultimo_run, '')
     if ultimo_str:
         try:
@@ -57,17 +63,34 @@ def _deve_rodar(chave_ativo, chave_intervalo, chave_ultimo_run, intervalo_defaul
     return True
 
 
+def _intervalo_rapida():
+    """(minutos, nível) da cadência adaptativa; (None, 'fixo') se falhar."""
+    try:
+        from services.cadencia_sync import intervalo_rapida
+        return intervalo_rapida()
+    except Exception as e:
+        logger.error(f'[sync_rapida] Erro na cadência adaptativa: {e}')
+        from extensions import db
+        db.session.rollback()
+        return None, 'fixo'
+
+
 def job_rapida(app):
-    """Sync incremental — roda a cada minuto, self-limita pelo intervalo configurado."""
+    """Sync incremental — roda a cada minuto, self-limita pelo intervalo da cadência."""
     with app.app_context():
+        intervalo, nivel = _intervalo_rapida()
         if not _deve_rodar('sync_rapida_ativo', 'sync_rapida_intervalo_min',
-                           'sync_rapida_ultimo_run', 10):
+                           'sync_rapida_ultimo_run', 10, intervalo):
             return
         try:
             _set_cfg('sync_rapida_ultimo_run', datetime.now().isoformat())
+            from services.perfil_sql import contar_consultas, registrar_no_log
+            from services.sync_runs import contexto_sync
             from services.sync_service import sync_batidas_incremental
-            ok, msg = sync_batidas_incremental()
-            logger.info(f'[sync_rapida] {msg}')
+            with contar_consultas('auto_sync.sync_rapida') as m, contexto_sync(origem='apscheduler'):
+                ok, msg = sync_batidas_incremental()
+            registrar_no_log(m)
+            logger.info(f'[sync_rapida] ({nivel}, {intervalo or "-"} min) {msg}')
         except Exception as e:
             logger.error(f'[sync_rapida] Erro: {e}')
 
@@ -81,19 +104,42 @@ def job_completa(app):
         try:
             janela = int(_get_cfg('sync_completa_janela_horas', '12'))
             _set_cfg('sync_completa_ultimo_run', datetime.now().isoformat())
+            from services.perfil_sql import contar_consultas, registrar_no_log
+            from services.sync_runs import contexto_sync
             from services.sync_service import sync_batidas
             agora = datetime.now()
-            ok, msg = sync_batidas(
-                (agora - timedelta(hours=janela)).strftime('%Y-%m-%d'),
-                agora.strftime('%Y-%m-%d'),
-                (agora - timedelta(hours=janela)).strftime('%H:%M'),
-                agora.strftime('%H:%M'),
-            )
+            with contar_consultas('auto_sync.sync_completa') as m, contexto_sync(origem='apscheduler'):
+                ok, msg = sync_batidas(
+                    (agora - timedelta(hours=janela)).strftime('%Y-%m-%d'),
+                    agora.strftime('%Y-%m-%d'),
+                    (agora - timedelta(hours=janela)).strftime('%H:%M'),
+                    agora.strftime('%H:%M'),
+                )
+            registrar_no_log(m)
             logger.info(f'[sync_completa] {msg}')
         except Exception as e:
             logger.error(f'[sync_completa] Erro: {e}')
 
 
+def job_eventos(app):
+    """Consumidores de eventos de batidas — a cada minuto. Com o Celery Beat
+    também rodando, a trava por consumidor evita rodadas simultâneas."""
+    with app.app_context():
+        try:
+            from services.eventos_batidas import consumir_todos
+            from services.perfil_sql import contar_consultas, registrar_no_log
+            with contar_consultas('auto_sync.eventos_batidas') as m:
+                result = consumir_todos()
+            tratados = {nome: r['eventos'] for nome, r in result.items() if r['eventos'] or r['erro']}
+            if tratados:
+                registrar_no_log(m)
+                logger.info(f'[eventos_batidas] {tratados}')
+        except Exception as e:
+            from extensions import db
+            db.session.rollback()
+            logger.error(f'[eventos_batidas] Erro: {e}')
+
+
 def init_scheduler(app):
     """Inicializa o APScheduler e registra os jobs. Chame uma vez em create_app()."""
     global _scheduler
@@ -128,8 +174,18 @@ def init_scheduler(app):
         max_instances=1,
     )
 
+    _scheduler.add_job(
+        func=job_eventos,
+        args=[app],
+        trigger=IntervalTrigger(minutes=1),
+        id='eventos_batidas',
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+    )
+
     _scheduler.start()
-    logger.info('[auto_sync] APScheduler iniciado (sync_rapida: 1min, sync_completa: 5min)')
+    logger.info('[auto_sync] APScheduler iniciado (sync_rapida: 1min, sync_completa: 5min, eventos_batidas: 1min)')
 
     # Garante shutdown limpo
     import atexit
@@ -4,29 +4,27 @@ Compara horas previstas (escala) x realizadas (batidas Secullum).
 """
 from datetime import datetime, timedelta, date
 from decimal import Decimal
+from sqlalchemy import and_, func
 from extensions import db
-from models import AlocacaoDiaria, Batida, BancoHorasSaldo
+from models import Batida, BancoHorasSaldo
 
+_LOTE_IN = 900   # funcionários por IN (limite de parâmetros do SQLite)
 
-def _horas_realizadas(func_id: str, data: date) -> float:
-    """Calcula horas trabalhadas num dia somando pares entrada/saída.
+
+def _horas_realizadas(batidas) -> float:
+    """Horas trabalhadas num dia somando pares entrada/saída.
+    `batidas`: [(hora, tipo)] do dia, em ordem de hora.
     Suporta turnos noturnos (ex: 22h-06h do dia seguinte).
     """
-    batidas = (
-        Batida.query
-        .filter_by(funcionario_id=func_id, data=data)
-        .order_by(Batida.hora)
-        .all()
-    )
-    entradas = [b for b in batidas if b.tipo == 'Entrada']
-    saidas = [b for b in batidas if b.tipo == 'Saida']
+    entradas = [hora for hora, tipo in batidas if tipo == 'Entrada']
+    saidas = [hora for hora, tipo in batidas if tipo == 'Saida']
 
     total = 0.0
     for i, entrada in enumerate(entradas):
         if i < len(saidas):
             try:
-                h_e = datetime.strptime(entrada.hora, '%H:%M')
-                h_s = datetime.strptime(saidas[i].hora, '%H:%M')
+                h_e = datetime.strptime(entrada, '%H:%M')
+                h_s = datetime.strptime(saidas[i], '%H:%M')
                 if h_s <= h_e:          # turno noturno: saída no dia seguinte
                     h_s += timedelta(hours=24)
                 diff = (h_s - h_e).seconds / 3600
@@ -37,62 +35,138 @@ def _horas_realizadas(func_id: str, data: date) -> float:
     return round(total, 2)
 
 
+def _lotes(func_ids):
+    func_ids = sorted(set(func_ids))
+    for i in range(0, len(func_ids), _LOTE_IN):
+        yield func_ids[i:i + _LOTE_IN]
+
+
+def _saldos_anteriores(func_ids, data_inicio: date) -> dict:
+    """{func_id: saldo acumulado do último registro antes de data_inicio}."""
+    ultimo = (
+        db.session.query(BancoHorasSaldo.funcionario_id, func.max(BancoHorasSaldo.data).label('data'))
+        .filter(BancoHorasSaldo.funcionario_id.in_(func_ids), BancoHorasSaldo.data < data_inicio)
+        .group_by(BancoHorasSaldo.funcionario_id)
+        .subquery()
+    )
+    return dict(
+        db.session.query(BancoHorasSaldo.funcionario_id, BancoHorasSaldo.saldo_acumulado)
+        .join(ultimo, and_(BancoHorasSaldo.funcionario_id == ultimo.c.funcionario_id,
+                           BancoHorasSaldo.data == ultimo.c.data))
+    )
+
+
+def calcular_saldos(func_ids, data_inicio: date, data_fim: date) -> dict:
+    """
+    Saldo diário e acumulado de vários funcionários no período, com as batidas,
+    a escala efetiva e o saldo anterior lidos uma vez para todos.
+    Retorna {func_id: [dicts com data, previsto, realizado, saldo_dia, saldo_acumulado]}.
+    """
+    from services.escala_efetiva import resolver
+    resultado = {}
+    for lote in _lotes(func_ids):
+        anteriores = _saldos_anteriores(lote, data_inicio)
+
+        # Previsto = escala efetiva (exceção ou horário base), com a duração do dia
+        efetivos = resolver(lote, data_inicio, data_fim)
+
+        batidas: dict[tuple, list] = {}
+        for fid, dia, hora, tipo in (
+            db.session.query(Batida.funcionario_id, Batida.data, Batida.hora, Batida.tipo)
+            .filter(Batida.funcionario_id.in_(lote), Batida.data.between(data_inicio, data_fim))
+            .order_by(Batida.hora)
+        ):
+            batidas.setdefault((fid, dia), []).append((hora, tipo))
+
+        for fid in lote:
+            saldo_acumulado = anteriores.get(fid) or Decimal('0')
+            linhas = resultado[fid] = []
+            for i in range((data_fim - data_inicio).days + 1):
+                dia = data_inicio + timedelta(days=i)
+                cel = efetivos.get((fid, dia))
+                previsto = Decimal(str(round(cel.horas, 2))) if cel else Decimal('0')
+                realizado = Decimal(str(_horas_realizadas(batidas.get((fid, dia), ()))))
+                saldo_dia = realizado - previsto
+                saldo_acumulado += saldo_dia
+
+                linhas.append({
+                    'data': dia,
+                    'previsto': float(previsto),
+                    'realizado': float(realizado),
+                    'saldo_dia': float(saldo_dia),
+                    'saldo_acumulado': float(saldo_acumulado),
+                })
+    return resultado
+
+
 def calcular_saldo(func_id: str, data_inicio: date, data_fim: date) -> list[dict]:
     """
     Calcula saldo diário e acumulado para um funcionário no período.
     Retorna lista de dicts com: data, previsto, realizado, saldo_dia, saldo_acumulado.
     """
-    resultados = []
-    saldo_acumulado = Decimal('0')
+    return calcular_saldos([func_id], data_inicio, data_fim)[func_id]
 
-    # Saldo acumulado anterior ao período
-    ultimo = (
-        BancoHorasSaldo.query
-        .filter(
-            BancoHorasSaldo.funcionario_id == func_id,
-            BancoHorasSaldo.data < data_inicio,
-        )
-        .order_by(BancoHorasSaldo.data.desc())
-        .first()
-    )
-    if ultimo:
-        saldo_acumulado = ultimo.saldo_acumulado or Decimal('0')
-
-    delta = data_fim - data_inicio
-    for i in range(delta.days + 1):
-        dia = data_inicio + timedelta(days=i)
-        aloc = AlocacaoDiaria.query.filter_by(funcionario_id=func_id, data=dia).first()
-        previsto = Decimal(str(round(aloc.turno.duracao_horas, 2))) if aloc else Decimal('0')
-        realizado = Decimal(str(_horas_realizadas(func_id, dia)))
-        saldo_dia = realizado - previsto
-        saldo_acumulado += saldo_dia
-
-        resultados.append({
-            'data': dia,
-            'previsto': float(previsto),
-            'realizado': float(realizado),
-            'saldo_dia': float(saldo_dia),
-            'saldo_acumulado': float(saldo_acumulado),
-        })
-
-    return resultados
-
-
-def salvar_saldos(func_id: str, data_inicio: date, data_fim: date):
+
+def salvar_saldos_lote(func_ids, data_inicio: date, data_fim: date, commit: bool = True):
+    """Persiste os saldos calculados de vários funcionários: uma leitura dos
+    registros do período e INSERT/UPDATE em lote só do que mudou."""
+    from sqlalchemy import insert, update
+    campos = ('horas_previstas', 'horas_realizadas', 'saldo_dia', 'saldo_acumulado')
+    saldos = calcular_saldos(func_ids, data_inicio, data_fim)
+    for lote in _lotes(saldos):
+        existentes = {
+            (fid, dia): (saldo_id, tuple(float(v) if v is not None else None for v in valores))
+            for saldo_id, fid, dia, *valores in db.session.query(
+                BancoHorasSaldo.id, BancoHorasSaldo.funcionario_id, BancoHorasSaldo.data,
+                *(getattr(BancoHorasSaldo, c) for c in campos),
+            ).filter(
+                BancoHorasSaldo.funcionario_id.in_(lote),
+                BancoHorasSaldo.data.between(data_inicio, data_fim),
+            )
+        }
+        novos, alterados = [], []
+        for fid in lote:
+            for s in saldos[fid]:
+                valores = (s['previsto'], s['realizado'], s['saldo_dia'], s['saldo_acumulado'])
+                atual = existentes.get((fid, s['data']))
+                if atual is None:
+                    novos.append({'funcionario_id': fid, 'data': s['data'], **dict(zip(campos, valores))})
+                elif atual[1] != tuple(round(v, 2) for v in valores):
+                    alterados.append({'id': atual[0], **dict(zip(campos, valores))})
+        if alterados:
+            db.session.execute(update(BancoHorasSaldo), alterados)
+        if novos:
+            db.session.execute(insert(BancoHorasSaldo), novos)
+    if commit:
+        db.session.commit()
+
+
+def salvar_saldos(func_id: str, data_inicio: date, data_fim: date, commit: bool = True):
     """Persiste os saldos calculados no banco."""
-    saldos = calcular_saldo(func_id, data_inicio, data_fim)
-    for s in saldos:
-        existing = BancoHorasSaldo.query.filter_by(
-            funcionario_id=func_id, data=s['data']
-        ).first()
-        if not existing:
-            existing = BancoHorasSaldo(funcionario_id=func_id, data=s['data'])
-            db.session.add(existing)
-        existing.horas_previstas = s['previsto']
-        existing.horas_realizadas = s['realizado']
-        existing.saldo_dia = s['saldo_dia']
-        existing.saldo_acumulado = s['saldo_acumulado']
-    db.session.commit()
+    salvar_saldos_lote([func_id], data_inicio, data_fim, commit=commit)
+
+
+def recalcular_saldos(func_ids, data_inicio: date, data_fim: date, logger=None) -> int:
+    """Recalcula e grava os saldos de todos em lote; se o lote falhar, refaz
+    funcionário a funcionário para isolar quem deu erro. Retorna os erros."""
+    func_ids = sorted(set(func_ids))
+    try:
+        salvar_saldos_lote(func_ids, data_inicio, data_fim)
+        return 0
+    except Exception as e:
+        db.session.rollback()
+        if logger:
+            logger.warning(f'[banco_horas] Lote falhou ({e}); recalculando um a um.')
+    erros = 0
+    for fid in func_ids:
+        try:
+            salvar_saldos(fid, data_inicio, data_fim)
+        except Exception as e:
+            db.session.rollback()
+            if logger:
+                logger.error(f'[banco_horas] Erro para {fid}: {e}')
+            erros += 1
+    return erros
 
 
 def get_config(chave: str, default=None):
@@ -0,0 +1,153 @@
+"""
+Cadência adaptativa do sync incremental de batidas.
+
+As batidas se concentram no início e no fim dos turnos. Em vez de um
+intervalo fixo o dia todo, o dia é dividido em faixas de 15 min e cada faixa
+recebe um nível a partir da escala efetiva de hoje (services/escala_efetiva):
+
+  - batidas previstas: uma na entrada e uma na saída de cada turno, espalhadas
+    de ANTES min antes até DEPOIS min depois do horário (adiantados e atrasados);
+  - pico   : faixas com pelo menos FRACAO_PICO da maior concentração do dia
+             → intervalo de pico (dados frescos para LATE_ENTRY e o dashboard);
+  - normal : alguma entrada/saída prevista, ou a janela de refeição de quem
+             tem intervalo de 1 h ou mais → intervalo configurado;
+  - ocioso : nenhuma batida prevista (meio de turno, madrugada, dias sem
+             expediente) → intervalo longo; o que escapar é pego pela sync
+             completa.
+
+Sem ninguém escalado no dia (escala não usada) vale o intervalo configurado.
+A curva é recalculada quando a data ou a versão da escala mudam.
+"""
+from datetime import date, datetime, timedelta
+
+FAIXA_MIN = 15
+FAIXAS_DIA = 24 * 60 // FAIXA_MIN
+ANTES = 15           # minutos antes do horário em que já se espera batida
+DEPOIS = 30          # minutos depois (atrasos, saídas tardias)
+FRACAO_PICO = 0.2
+REFEICAO_MIN = 60    # intervalo a partir do qual se esperam batidas de refeição
+FOLGA_REFEICAO = 60  # a refeição cai em meio ± FOLGA_REFEICAO min
+
+_PADROES = {
+    'sync_rapida_adaptativo': '1',
+    'sync_rapida_intervalo_min': '10',
+    'sync_rapida_intervalo_pico_min': '3',
+    'sync_rapida_intervalo_ocioso_min': '30',
+}
+
+_curva = {}          # {'chave': (data, versão), 'densidade': [...], 'refeicao': [...]}
+
+
+def _cfg() -> dict:
+    from models import Configuracao
+    valores = dict(_PADROES)
+    for chave, valor in (Configuracao.query.with_entities(Configuracao.chave, Configuracao.valor)
+                         .filter(Configuracao.chave.in_(_PADROES))):
+        if valor is not None:
+            valores[chave] = valor
+    return valores
+
+
+def intervalos() -> dict:
+    """{'adaptativo', 'pico', 'normal', 'ocioso'} — pico ≤ normal ≤ ocioso."""
+    c = _cfg()
+    normal = int(c['sync_rapida_intervalo_min'])
+    return {
+        'adaptativo': c['sync_rapida_adaptativo'] == '1',
+        'pico': min(int(c['sync_rapida_intervalo_pico_min']), normal),
+        'normal': normal,
+        'ocioso': max(int(c['sync_rapida_intervalo_ocioso_min']), normal),
+    }
+
+
+def _faixa(momento: datetime, dia: date) -> int:
+    """Índice da faixa de `momento` no `dia` (pode cair fora de 0..FAIXAS_DIA-1)."""
+    minutos = (momento - datetime.combine(dia, datetime.min.time())).total_seconds() // 60
+    return int(minutos // FAIXA_MIN)
+
+
+def curva_do_dia(dia: date) -> tuple:
+    """(densidade, refeicao): por faixa, entradas/saídas previstas e pessoas
+    na janela de refeição. Inclui os turnos noturnos de ontem que terminam hoje."""
+    from services.escala_efetiva import escalados_no_dia
+    from services.escala_versao import versao_atual
+    chave = (dia, versao_atual())
+    if _curva.get('chave') == chave:
+        return _curva['densidade'], _curva['refeicao']
+
+    densidade = [0] * FAIXAS_DIA
+    refeicao = [0] * FAIXAS_DIA
+
+    def marcar(curva, ini, fim):
+        for k in range(max(0, _faixa(ini, dia)), min(FAIXAS_DIA - 1, _faixa(fim, dia)) + 1):
+            curva[k] += 1
+
+    turnos = list(escalados_no_dia(dia).values())
+    turnos += [t for t in escalados_no_dia(dia - timedelta(days=1)).values() if t.fim.date() >= dia]
+    for t in turnos:
+        for momento in (t.inicio, t.fim):
+            marcar(densidade, momento - timedelta(minutes=ANTES), momento + timedelta(minutes=DEPOIS - 1))
+        if (t.intervalo or 0) >= REFEICAO_MIN:
+            meio = t.inicio + (t.fim - t.inicio - timedelta(minutes=t.intervalo)) / 2
+            marcar(refeicao, meio - timedelta(minutes=FOLGA_REFEICAO),
+                   meio + timedelta(minutes=t.intervalo + FOLGA_REFEICAO))
+
+    _curva.update(chave=chave, densidade=densidade, refeicao=refeicao)
+    return densidade, refeicao
+
+
+def _niveis(densidade, refeicao) -> list:
+    if not any(densidade):
+        return ['sem_escala'] * FAIXAS_DIA
+    corte = max(1, FRACAO_PICO * max(densidade))
+    return ['pico' if d >= corte else 'normal' if d or r else 'ocioso'
+            for d, r in zip(densidade, refeicao)]
+
+
+def intervalo_rapida(agora: datetime = None) -> tuple:
+    """(minutos, nível) que o sync incremental deve respeitar agora."""
+    cfg = intervalos()
+    if not cfg['adaptativo']:
+        return cfg['normal'], 'fixo'
+    agora = agora or datetime.now()
+    nivel = _niveis(*curva_do_dia(agora.date()))[_faixa(agora, agora.date())]
+    return cfg.get(nivel, cfg['normal']), nivel
+
+
+def agenda(dia: date = None) -> dict:
+    """Faixas do dia (níveis contíguos agrupados) e execuções previstas,
+    adaptativa × intervalo fixo — para a aba de sync do config hub."""
+    dia = dia or date.today()
+    cfg = intervalos()
+    densidade, refeicao = curva_do_dia(dia)
+    niveis = _niveis(densidade, refeicao)
+
+    faixas = []
+    for k, nivel in enumerate(niveis):
+        if faixas and faixas[-1]['nivel'] == nivel:
+            f = faixas[-1]
+            f['fim_faixa'] = k + 1
+            f['batidas_previstas'] = max(f['batidas_previstas'], densidade[k])
+            continue
+        faixas.append({'nivel': nivel, 'ini_faixa': k, 'fim_faixa': k + 1,
+                       'intervalo_min': cfg.get(nivel, cfg['normal']), 'batidas_previstas': densidade[k]})
+
+    previstas = 0.0
+    for f in faixas:
+        ini, fim = f.pop('ini_faixa') * FAIXA_MIN, f.pop('fim_faixa') * FAIXA_MIN
+        f['inicio'] = f'{ini // 60:02d}:{ini % 60:02d}'
+        f['fim'] = f'{fim // 60:02d}:{fim % 60:02d}'
+        f['minutos'] = fim - ini
+        previstas += f['minutos'] / f['intervalo_min']
+
+    agora = datetime.now()
+    return {
+        'data': dia.isoformat(),
+        'adaptativo': cfg['adaptativo'],
+        'intervalos': {k: cfg[k] for k in ('pico', 'normal', 'ocioso')},
+        'nivel_atual': intervalo_rapida(agora)[1] if dia == agora.date() else None,
+        'faixas': faixas,
+        'execucoes_previstas': round(previstas) if cfg['adaptativo'] else 1440 // cfg['normal'],
+        'execucoes_fixo': 1440 // cfg['normal'],
+        'pico_batidas': max(densidade),
+    }
@@ -0,0 +1,222 @@
+"""
+Motor de cobertura: matriz funcionários × dias da escala efetiva.
+
+Monta, a partir das exceções (AlocacaoDiaria) e do horário base de cada
+funcionário, uma matriz NumPy com o índice do turno de cada célula (-1 = folga)
+numa única passada, e deriva as contagens por dia, por função, por tipo de
+turno com reduções vetorizadas.
+
+Os resultados ficam em cache por (datas, dept, função, versão da escala) —
+qualquer escrita na escala muda a versão e invalida o cache. Além do mês
+(`matriz_cobertura`), a matriz pode ter colunas avulsas (`matriz_datas`, ex.:
+só os domingos usados por services/rotacao_domingos.py).
+"""
+import calendar as cal_mod
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import or_
+
+from extensions import db
+from models import AlocacaoDiaria, Funcionario, Turno
+from services.facetas import filtrar_departamento
+
+_CACHE_MAX = 32
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class MatrizCobertura:
+    """Escala efetiva de um conjunto de funcionários em um conjunto de datas.
+
+    - funcs:     [{'id', 'nome', 'funcao', 'sexo', 'departamento'}] (linhas, ordenadas por nome)
+    - datas:     [date] (colunas)
+    - turnos:    [{'id', 'nome', 'color', 'tipo_turno', 'horarios'}] (referenciados por índice;
+                 horarios = (inicio_min, fim_min, intervalo) por dia da semana)
+    - turno_idx: int32 (n_funcs × n_datas), -1 = sem turno
+    - excecao:   bool, célula vem de AlocacaoDiaria
+    - warning:   bool, alocação com compliance_warning
+    Só guarda dados simples (sem objetos ORM) para poder ficar em cache.
+    """
+
+    def __init__(self, funcs, datas, turnos, turno_idx, excecao, warning):
+        self.funcs = funcs
+        self.datas = datas
+        self.turnos = turnos
+        self.turno_idx = turno_idx
+        self.excecao = excecao
+        self.warning = warning
+        self._col = {d: i for i, d in enumerate(datas)}
+        self._lin = {f['id']: i for i, f in enumerate(funcs)}
+
+    @property
+    def escalado(self) -> np.ndarray:
+        return self.turno_idx >= 0
+
+    def colunas(self, datas) -> np.ndarray:
+        return np.array([self._col[d] for d in datas], dtype=np.intp)
+
+    def linha(self, func_id):
+        return self._lin.get(func_id)
+
+    def por_dia(self, colunas=None) -> np.ndarray:
+        """Funcionários escalados por coluna."""
+        m = self.escalado if colunas is None else self.escalado[:, colunas]
+        return m.sum(axis=0)
+
+    def por_funcao(self, colunas=None) -> dict[str, np.ndarray]:
+        """{funcao: escalados por coluna}."""
+        m = self.escalado if colunas is None else self.escalado[:, colunas]
+        funcoes = np.array([f['funcao'] or '' for f in self.funcs], dtype=object)
+        return {fn: m[funcoes == fn].sum(axis=0) for fn in sorted(set(funcoes))}
+
+    def por_tipo(self, colunas=None) -> dict[str, np.ndarray]:
+        """{tipo_turno: escalados por coluna} (turnos sem tipo são ignorados)."""
+        idx = self.turno_idx if colunas is None else self.turno_idx[:, colunas]
+        tipos = np.array([t['tipo_turno'] or '' for t in self.turnos] + [''], dtype=object)
+        tipo_cel = tipos[idx]   # idx = -1 cai no '' final
+        return {tp: (tipo_cel == tp).sum(axis=0) for tp in sorted(set(tipos) - {''})}
+
+
+def _condicao_datas(coluna, datas):
+    """Filtro SQL para um conjunto de datas: sequências contíguas viram BETWEEN
+    (o mês), datas avulsas (ex.: domingos anteriores) viram IN."""
+    conds, avulsas = [], []
+    ordenadas = sorted(set(datas))
+    ini = fim = ordenadas[0]
+    for d in ordenadas[1:] + [None]:
+        if d is not None and (d - fim).days == 1:
+            fim = d
+            continue
+        if (fim - ini).days >= 2:
+            conds.append(coluna.between(ini, fim))
+        else:
+            avulsas += [ini + timedelta(days=i) for i in range((fim - ini).days + 1)]
+        ini = fim = d
+    if avulsas:
+        conds.append(coluna.in_(avulsas))
+    return or_(*conds) if len(conds) > 1 else conds[0]
+
+
+def _horarios_semana(turno) -> list[tuple]:
+    """[(inicio_min, fim_min, intervalo_min)] por dia da semana (0=seg..6=dom)."""
+    horarios = []
+    for wd in range(7):
+        h_ini, h_fim, intervalo = turno.get_horario_dia(wd)
+        horarios.append((h_ini.hour * 60 + h_ini.minute, h_fim.hour * 60 + h_fim.minute,
+                         int(intervalo or 0)))
+    return horarios
+
+
+def _construir(func_rows, datas: list) -> MatrizCobertura:
+    """Uma consulta de exceções + padrões base vetorizados."""
+    n_f, n_d = len(func_rows), len(datas)
+    func_ids = [f.id for f in func_rows]
+    lin = {fid: i for i, fid in enumerate(func_ids)}
+    col = {d: i for i, d in enumerate(datas)}
+
+    turnos: list[dict] = []
+    turno_pos: dict[int, int] = {}
+    padroes: list[list[bool]] = []   # dias da semana de cada turno
+
+    def _idx_turno(t) -> int:
+        pos = turno_pos.get(t.id)
+        if pos is None:
+            pos = turno_pos[t.id] = len(turnos)
+            turnos.append({'id': t.id, 'nome': t.nome, 'color': t.color or '#4f46e5',
+                           'tipo_turno': t.tipo_turno, 'horarios': _horarios_semana(t)})
+            dias = set(t.dias_semana_list)
+            padroes.append([wd in dias for wd in range(7)])
+        return pos
+
+    # Horário base: padrão semanal do turno indexado pelo dia da semana de cada coluna
+    base_idx = np.array(
+        [_idx_turno(f.horario_base) if f.horario_base else -1 for f in func_rows],
+        dtype=np.int32,
+    )
+    turno_idx = np.full((n_f, n_d), -1, dtype=np.int32)
+    if n_f and n_d and padroes:
+        wd = np.array([d.weekday() for d in datas], dtype=np.intp)
+        tab = np.array(padroes, dtype=bool)                  # n_turnos × 7
+        com_base = base_idx >= 0
+        on = np.zeros((n_f, n_d), dtype=bool)
+        on[com_base] = tab[base_idx[com_base]][:, wd]
+        turno_idx = np.where(on, base_idx[:, None], -1).astype(np.int32)
+
+    # Exceções: uma consulta para todas as datas (mês + extras)
+    excecao = np.zeros((n_f, n_d), dtype=bool)
+    warning = np.zeros((n_f, n_d), dtype=bool)
+    if n_f and n_d:
+        cond = _condicao_datas(AlocacaoDiaria.data, datas)
+        linhas, colunas, valores, avisos = [], [], [], []
+        for aloc, turno in (
+            db.session.query(AlocacaoDiaria, Turno)
+            .join(Turno, Turno.id == AlocacaoDiaria.turno_id)
+            .filter(AlocacaoDiaria.funcionario_id.in_(func_ids), cond)
+        ):
+            c = col.get(aloc.data)
+            if c is None:
+                continue
+            linhas.append(lin[aloc.funcionario_id])
+            colunas.append(c)
+            valores.append(_idx_turno(turno))
+            avisos.append(bool(aloc.compliance_warning))
+        if linhas:
+            turno_idx[linhas, colunas] = valores
+            excecao[linhas, colunas] = True
+            warning[linhas, colunas] = avisos
+
+    funcs = [{'id': f.id, 'nome': f.nome, 'funcao': f.funcao, 'sexo': f.sexo,
+              'departamento': f.departamento} for f in func_rows]
+    return MatrizCobertura(funcs, list(datas), turnos, turno_idx, excecao, warning)
+
+
+def matriz_cobertura(ano: int, mes: int, dept: str = '', funcao: str = '',
+                     extras=()) -> MatrizCobertura:
+    """Matriz do mês (colunas = dias do mês + `extras`) para os funcionários
+    ativos do dept/grupo e função, em cache por versão da escala."""
+    _, dias_no_mes = cal_mod.monthrange(ano, mes)
+    datas = [date(ano, mes, d) for d in range(1, dias_no_mes + 1)]
+    datas += [d for d in sorted(set(extras)) if d.year != ano or d.month != mes]
+    return matriz_datas(datas, dept, funcao)
+
+
+def matriz_datas(datas, dept: str = '', funcao: str = '') -> MatrizCobertura:
+    """Matriz com as colunas em `datas` (na ordem dada; ex.: só os domingos de
+    um horizonte) para os funcionários ativos do dept/grupo e função, em cache
+    por versão da escala."""
+    from services.escala_versao import versao_atual
+    datas = tuple(datas)
+    chave = (datas, dept or '', funcao or '', versao_atual())
+    with _cache_lock:
+        matriz = _cache.get(chave)
+        if matriz is not None:
+            _cache.move_to_end(chave)
+            return matriz
+
+    from sqlalchemy.orm import joinedload
+    q = Funcionario.query.filter_by(ativo=True)
+    q = filtrar_departamento(q, dept)
+    if funcao:
+        q = q.filter(Funcionario.funcao == funcao)
+    func_rows = q.options(joinedload(Funcionario.horario_base)).order_by(Funcionario.nome).all()
+
+    matriz = _construir(func_rows, list(datas))
+    with _cache_lock:
+        _cache[chave] = matriz
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return matriz
+
+
+def matriz_funcionarios(func_ids, datas) -> MatrizCobertura:
+    """Matriz de funcionários escolhidos (sem cache; ex.: os do gerador de rotação)."""
+    from sqlalchemy.orm import joinedload
+    func_ids = list(dict.fromkeys(func_ids))
+    func_rows = (
+        Funcionario.query.filter(Funcionario.id.in_(func_ids))
+        .options(joinedload(Funcionario.horario_base)).order_by(Funcionario.nome).all()
+    ) if func_ids else []
+    return _construir(func_rows, list(datas))
@@ -0,0 +1,228 @@
+"""
+Cobertura intradiária: pessoas escaladas a cada 15 minutos, por departamento
+e função, para um mês inteiro.
+
+Cada célula efetiva da escala (exceção ou horário base — ver
+services/cobertura_engine.py) vira um intervalo na linha do tempo do mês,
+usando o horário do dia da semana (get_horario_dia), com o intervalo de
+descanso no meio do turno e turnos noturnos avançando para o dia seguinte.
+A contagem por faixa sai de uma varredura (sweep line) vetorizada: +1 no
+início, -1 no fim de cada intervalo e soma acumulada.
+
+As lacunas comparam essa contagem com as regras de CoberturaMinima.
+"""
+import calendar as cal_mod
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from models import CoberturaMinima
+from services.cobertura_engine import matriz_cobertura
+from services.facetas import resolver_departamentos
+
+FAIXA_MIN = 15                       # tamanho da faixa em minutos
+FAIXAS_DIA = 24 * 60 // FAIXA_MIN    # 96
+
+_CACHE_MAX = 16
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class CoberturaIntradiaria:
+    """Contagem de escalados por (departamento, função) × dia × faixa de 15 min.
+
+    - datas:    dias do mês
+    - grupos:   [(departamento, funcao)]
+    - contagem: int32 (n_grupos × n_dias × FAIXAS_DIA)
+    """
+
+    def __init__(self, datas, grupos, contagem):
+        self.datas = datas
+        self.grupos = grupos
+        self.contagem = contagem
+
+    def total(self, departamentos=None, funcao=None) -> np.ndarray:
+        """Soma dos grupos que batem com o filtro → (n_dias × FAIXAS_DIA)."""
+        sel = [i for i, (d, f) in enumerate(self.grupos)
+               if (not departamentos or d in departamentos) and (not funcao or f == funcao)]
+        if not sel:
+            return np.zeros((len(self.datas), FAIXAS_DIA), dtype=np.int32)
+        return self.contagem[sel].sum(axis=0)
+
+    def por_hora(self, departamentos=None, funcao=None) -> np.ndarray:
+        """Mínimo de escalados em cada hora (n_dias × 24) — o pior quarto de hora."""
+        t = self.total(departamentos, funcao)
+        return t.reshape(len(self.datas), 24, FAIXAS_DIA // 24).min(axis=2)
+
+
+def _calcular(ano: int, mes: int, dept: str, funcao: str) -> CoberturaIntradiaria:
+    _, dias_no_mes = cal_mod.monthrange(ano, mes)
+    data_ini = date(ano, mes, 1)
+    datas_mes = [date(ano, mes, d) for d in range(1, dias_no_mes + 1)]
+
+    # O dia anterior entra como coluna extra: turnos noturnos invadem o dia 1
+    matriz = matriz_cobertura(ano, mes, dept, funcao, extras=(data_ini - timedelta(days=1),))
+
+    grupos: list[tuple] = []
+    grupo_pos: dict[tuple, int] = {}
+    grupo_linha = np.empty(len(matriz.funcs), dtype=np.intp)
+    for i, f in enumerate(matriz.funcs):
+        chave = (f['departamento'] or '', f['funcao'] or '')
+        if chave not in grupo_pos:
+            grupo_pos[chave] = len(grupos)
+            grupos.append(chave)
+        grupo_linha[i] = grupo_pos[chave]
+
+    # Linha do tempo: [dia anterior | dias do mês | dia seguinte], em faixas
+    n_faixas = (dias_no_mes + 2) * FAIXAS_DIA
+    delta = np.zeros((max(len(grupos), 1), n_faixas + 1), dtype=np.int32)
+
+    linhas, colunas = np.nonzero(matriz.turno_idx >= 0)
+    if len(linhas) and matriz.turnos:
+        tab = np.array([t['horarios'] for t in matriz.turnos], dtype=np.int64)  # n_turnos × 7 × 3
+        wd_col = np.array([d.weekday() for d in matriz.datas], dtype=np.intp)
+        dia_col = np.array([(d - data_ini).days + 1 for d in matriz.datas], dtype=np.int64)
+
+        ti = matriz.turno_idx[linhas, colunas]
+        wd = wd_col[colunas]
+        ini, fim, intervalo = tab[ti, wd, 0], tab[ti, wd, 1], tab[ti, wd, 2]
+        fim = np.where(fim < ini, fim + 1440, fim)          # turno noturno
+        base = dia_col[colunas] * 1440
+        s, e = base + ini, base + fim
+        g = grupo_linha[linhas]
+
+        # Faixa conta se o turno cobre qualquer parte dela
+        np.add.at(delta, (g, s // FAIXA_MIN), 1)
+        np.add.at(delta, (g, -(-e // FAIXA_MIN)), -1)
+
+        # Intervalo no meio do turno: remove as faixas inteiramente dentro dele
+        dur = e - s
+        com_pausa = (intervalo > 0) & (intervalo < dur)
+        if com_pausa.any():
+            p_ini = s + dur // 2 - intervalo // 2
+            p_fim = p_ini + intervalo
+            fi = -(-p_ini // FAIXA_MIN)
+            ff = p_fim // FAIXA_MIN
+            ok = com_pausa & (ff > fi)
+            np.add.at(delta, (g[ok], fi[ok]), -1)
+            np.add.at(delta, (g[ok], ff[ok]), 1)
+
+    contagem = np.cumsum(delta[:, :n_faixas], axis=1)[:len(grupos)]
+    contagem = contagem[:, FAIXAS_DIA:FAIXAS_DIA * (dias_no_mes + 1)]
+    contagem = contagem.reshape(len(grupos), dias_no_mes, FAIXAS_DIA).astype(np.int32)
+    return CoberturaIntradiaria(datas_mes, grupos, contagem)
+
+
+def cobertura_intradiaria(ano: int, mes: int, dept: str = '', funcao: str = '') -> CoberturaIntradiaria:
+    """Cobertura por faixa do mês, em cache por versão da escala."""
+    from services.escala_versao import versao_atual
+    chave = (ano, mes, dept or '', funcao or '', versao_atual())
+    with _cache_lock:
+        cob = _cache.get(chave)
+        if cob is not None:
+            _cache.move_to_end(chave)
+            return cob
+    cob = _calcular(ano, mes, dept or '', funcao or '')
+    with _cache_lock:
+        _cache[chave] = cob
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return cob
+
+
+# ── Mínimos e lacunas ─────────────────────────────────────────────────────────
+
+def _faixa(hora) -> int:
+    return (hora.hour * 60 + hora.minute) // FAIXA_MIN
+
+
+def regras_aplicaveis(dept: str = '', funcao: str = '') -> list:
+    """Regras ativas que valem para o escopo filtrado (dept/grupo e função)."""
+    depts_filtro = set(resolver_departamentos(dept))
+    regras = []
+    for r in CoberturaMinima.query.filter_by(ativo=True).order_by(CoberturaMinima.id).all():
+        if funcao and r.funcao and r.funcao != funcao:
+            continue
+        if depts_filtro and r.departamento and not (set(resolver_departamentos(r.departamento)) & depts_filtro):
+            continue
+        regras.append(r)
+    return regras
+
+
+def minimos_por_faixa(cob: CoberturaIntradiaria, regras, dept: str = '', funcao: str = '') -> np.ndarray:
+    """Maior mínimo exigido em cada (dia × faixa) sobre o total do escopo filtrado.
+
+    Só entram as regras cujo escopo cobre o filtro inteiro (sem departamento ou
+    com todos os departamentos do filtro; sem função ou com a função filtrada):
+    uma regra de um só departamento vale para os escalados dele, não para o
+    total de todos — essas aparecem em lacunas(), comparadas regra a regra."""
+    depts_filtro = set(resolver_departamentos(dept))
+    n_dias = len(cob.datas)
+    exigido = np.zeros(n_dias * FAIXAS_DIA + FAIXAS_DIA, dtype=np.int32)
+    for r in regras:
+        if r.departamento and not (depts_filtro and depts_filtro <= set(resolver_departamentos(r.departamento))):
+            continue
+        if r.funcao and r.funcao != funcao:
+            continue
+        fi, ff = _faixa(r.hora_inicio), _faixa(r.hora_fim)
+        if ff <= fi:
+            ff += FAIXAS_DIA
+        for j, d in enumerate(cob.datas):
+            if r.dia_semana is not None and d.weekday() != r.dia_semana:
+                continue
+            seg = exigido[j * FAIXAS_DIA + fi: j * FAIXAS_DIA + ff]
+            np.maximum(seg, r.minimo, out=seg)
+    return exigido[:n_dias * FAIXAS_DIA].reshape(n_dias, FAIXAS_DIA)
+
+
+def lacunas(ano: int, mes: int, dept: str = '', funcao: str = '') -> list[dict]:
+    """Janelas do mês em que a cobertura fica abaixo de alguma regra de mínimo.
+    Faixas consecutivas da mesma regra são agrupadas em uma janela."""
+    regras = regras_aplicaveis(dept, funcao)
+    if not regras:
+        return []
+    cob = cobertura_intradiaria(ano, mes, dept, funcao)
+    n_dias = len(cob.datas)
+
+    resultado = []
+    for r in regras:
+        depts_regra = resolver_departamentos(r.departamento) if r.departamento else None
+        # Linha do tempo contínua (+1 dia) para regras que cruzam a meia-noite
+        total = cob.total(depts_regra, r.funcao or funcao or None).reshape(-1)
+        total = np.concatenate([total, np.zeros(FAIXAS_DIA, dtype=total.dtype)])
+        fi, ff = _faixa(r.hora_inicio), _faixa(r.hora_fim)
+        if ff <= fi:
+            ff += FAIXAS_DIA
+        for j, d in enumerate(cob.datas):
+            if r.dia_semana is not None and d.weekday() != r.dia_semana:
+                continue
+            if ff > FAIXAS_DIA and j == n_dias - 1:
+                ff_dia = FAIXAS_DIA   # madrugada seguinte fica fora do mês calculado
+            else:
+                ff_dia = ff
+            janela = total[j * FAIXAS_DIA + fi: j * FAIXAS_DIA + ff_dia]
+            abaixo = janela < r.minimo
+            if not abaixo.any():
+                continue
+            # Início/fim de cada sequência de faixas abaixo do mínimo
+            borda = np.diff(np.concatenate([[0], abaixo.astype(np.int8), [0]]))
+            for a, b in zip(np.flatnonzero(borda == 1), np.flatnonzero(borda == -1)):
+                m_ini = int(fi + a) * FAIXA_MIN
+                m_fim = int(fi + b) * FAIXA_MIN
+                # Janela que cruza a meia-noite: a lacuna pode começar no dia seguinte
+                d_lacuna = d + timedelta(days=m_ini // 1440)
+                resultado.append({
+                    'data':       d_lacuna.isoformat(),
+                    'dia_semana': d_lacuna.weekday(),
+                    'inicio':     f'{m_ini // 60 % 24:02d}:{m_ini % 60:02d}',
+                    'fim':        f'{m_fim // 60 % 24:02d}:{m_fim % 60:02d}',
+                    'dept':       r.departamento or dept or '',
+                    'funcao':     r.funcao or funcao or '',
+                    'minimo':     r.minimo,
+                    'escalados':  int(janela[a:b].min()),
+                    'regra_id':   r.id,
+                })
+    resultado.sort(key=lambda x: (x['data'], x['inicio'], x['dept'], x['funcao']))
+    return resultado
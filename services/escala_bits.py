@@ -0,0 +1,191 @@
+"""
+Escala em bits: um uint64 por funcionário, bit i = trabalha no dia `inicio + i`.
+
+A janela tem até 64 dias (dois meses corridos: o mês e o contexto do anterior)
+e é montada a partir da escala efetiva — matriz do cobertura_engine, resolver
+do escala_efetiva ou o dict {func_id: {data: Turno}} do motor_clt. As perguntas
+"trabalha no dia d", "7 dias seguidos sem folga", "trabalhou no domingo
+anterior" e "escalados por dia" viram operações de bits sobre todos os
+funcionários de uma vez, sem consultas nem laços por célula.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+JANELA_MAX = 64
+
+_UM = np.uint64(1)
+_TUDO = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+if hasattr(np, 'bitwise_count'):          # NumPy >= 2.0
+    def _popcount(x) -> np.ndarray:
+        return np.bitwise_count(x).astype(np.int64)
+else:
+    _POP8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+    def _popcount(x) -> np.ndarray:
+        x = np.ascontiguousarray(x, dtype=np.uint64)
+        return _POP8[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1)
+
+
+def _faixa(ini, fim) -> np.ndarray:
+    """Máscara com os bits ini..fim (inclusive), recortada a [0, 63]; vetorizada."""
+    ini = np.clip(np.asarray(ini, dtype=np.int64), 0, JANELA_MAX)
+    fim = np.clip(np.asarray(fim, dtype=np.int64) + 1, 0, JANELA_MAX)
+    ate_fim = np.where(fim >= JANELA_MAX, _TUDO,
+                       (_UM << np.minimum(fim, 63).astype(np.uint64)) - _UM)
+    antes_ini = np.where(ini >= JANELA_MAX, _TUDO,
+                         (_UM << np.minimum(ini, 63).astype(np.uint64)) - _UM)
+    return np.where(fim > ini, ate_fim & ~antes_ini, np.uint64(0)).astype(np.uint64)
+
+
+def _deslocar(bits, n: int) -> np.ndarray:
+    """bits >> n (n pode passar de 63)."""
+    return bits >> np.uint64(n) if n < JANELA_MAX else np.zeros_like(bits)
+
+
+class EscalaBits:
+    """Dias trabalhados de N funcionários numa janela de até 64 dias.
+
+    - func_ids: linhas (mesma ordem de `bits`)
+    - inicio:   data do bit 0
+    - dias:     tamanho da janela
+    - bits:     uint64 (n,)
+    """
+
+    def __init__(self, func_ids, inicio: date, dias: int, bits=None):
+        if not 0 < dias <= JANELA_MAX:
+            raise ValueError(f'Janela de {dias} dias: o limite é {JANELA_MAX}.')
+        self.func_ids = list(func_ids)
+        self.inicio = inicio
+        self.dias = dias
+        self.bits = (np.zeros(len(self.func_ids), dtype=np.uint64) if bits is None
+                     else np.asarray(bits, dtype=np.uint64))
+        self._lin = {fid: i for i, fid in enumerate(self.func_ids)}
+
+    # ── Construção ────────────────────────────────────────────────────────────
+
+    @classmethod
+    def de_celulas(cls, func_ids, inicio: date, dias: int, celulas) -> 'EscalaBits':
+        """A partir de células (func_id, data); as fora da janela são ignoradas."""
+        eb = cls(func_ids, inicio, dias)
+        linhas, offsets = [], []
+        for fid, d in celulas:
+            i = eb._lin.get(fid)
+            o = (d - inicio).days
+            if i is not None and 0 <= o < dias:
+                linhas.append(i)
+                offsets.append(o)
+        if linhas:
+            np.bitwise_or.at(eb.bits, np.array(linhas, dtype=np.intp),
+                             _UM << np.array(offsets, dtype=np.uint64))
+        return eb
+
+    @classmethod
+    def de_escala(cls, escala: dict, inicio: date, dias: int, func_ids=None) -> 'EscalaBits':
+        """A partir do contexto do motor_clt {func_id: {data: Turno}}."""
+        func_ids = list(escala) if func_ids is None else func_ids
+        return cls.de_celulas(func_ids, inicio, dias,
+                              ((fid, d) for fid, datas in escala.items() for d in datas))
+
+    @classmethod
+    def de_efetiva(cls, func_ids, inicio: date, dias: int) -> 'EscalaBits':
+        """A partir da escala efetiva (exceções + horário base)."""
+        from services.escala_efetiva import resolver
+        func_ids = list(func_ids)
+        return cls.de_celulas(func_ids, inicio, dias,
+                              resolver(func_ids, inicio, inicio + timedelta(days=dias - 1)))
+
+    @classmethod
+    def de_matriz(cls, matriz, datas) -> 'EscalaBits':
+        """A partir de uma MatrizCobertura, com `datas` contíguas entre as colunas."""
+        datas = list(datas)
+        m = matriz.escalado[:, matriz.colunas(datas)]
+        cheia = np.zeros((m.shape[0], JANELA_MAX), dtype=bool)
+        cheia[:, :m.shape[1]] = m
+        # 8 bytes little-endian por linha = um uint64 com o dia 0 no bit 0
+        bits = np.packbits(cheia, axis=1, bitorder='little').view('<u8').ravel()
+        return cls([f['id'] for f in matriz.funcs], datas[0], len(datas), bits.astype(np.uint64))
+
+    # ── Acesso ────────────────────────────────────────────────────────────────
+
+    def offset(self, d: date) -> int:
+        return (d - self.inicio).days
+
+    def linha(self, func_id):
+        return self._lin.get(func_id)
+
+    def marcar(self, func_id, d: date, trabalha: bool = True):
+        i, o = self._lin[func_id], self.offset(d)
+        if not 0 <= o < self.dias:
+            raise ValueError(f'{d} fora da janela.')
+        if trabalha:
+            self.bits[i] |= _UM << np.uint64(o)
+        else:
+            self.bits[i] &= ~(_UM << np.uint64(o))
+
+    def trabalha(self, d: date) -> np.ndarray:
+        """bool por funcionário: trabalha no dia d (fora da janela = False)."""
+        o = self.offset(d)
+        if not 0 <= o < self.dias:
+            return np.zeros(len(self.bits), dtype=bool)
+        return ((self.bits >> np.uint64(o)) & _UM).astype(bool)
+
+    def matriz(self) -> np.ndarray:
+        """bool (n × dias)."""
+        bytes_ = np.ascontiguousarray(self.bits.astype('<u8')).view(np.uint8).reshape(-1, 8)
+        return np.unpackbits(bytes_, axis=1, bitorder='little')[:, :self.dias].astype(bool)
+
+    def por_dia(self) -> np.ndarray:
+        """Escalados por dia da janela."""
+        return self.matriz().sum(axis=0)
+
+    def contar(self, d_ini: date, d_fim: date) -> np.ndarray:
+        """Dias trabalhados em [d_ini, d_fim] por funcionário."""
+        return _popcount(self.bits & _faixa(self.offset(d_ini), self.offset(d_fim)))
+
+    # ── Regras ────────────────────────────────────────────────────────────────
+
+    def sequencias(self, n: int) -> np.ndarray:
+        """uint64 por funcionário: bit i ligado se os dias i..i+n-1 são todos trabalhados
+        (dobrando a sequência: 1 → 2 → 4 → ... e fechando no tamanho exato)."""
+        x = self.bits.copy()
+        tam = 1
+        while tam * 2 <= n:
+            x &= _deslocar(x, tam)
+            tam *= 2
+        if tam < n:
+            x &= _deslocar(x, n - tam)
+        return x
+
+    def sem_folga(self, n: int = 7, desde: date = None):
+        """(bool por funcionário, data de início da primeira sequência de n dias ou None).
+        desde: ignora sequências que terminam antes dessa data."""
+        seq = self.sequencias(n)
+        if desde is not None:
+            seq &= ~_faixa(0, self.offset(desde) - n)
+        tem = seq != 0
+        menor = seq & (~seq + _UM)                 # bit menos significativo ligado
+        offs = np.where(tem, np.log2(np.where(tem, menor, _UM).astype(np.float64)), -1).astype(np.int64)
+        return tem, [self.inicio + timedelta(days=int(o)) if o >= 0 else None for o in offs]
+
+    def regras_dia(self, linhas, datas, incluir_dia: bool = True):
+        """Para cada item (linha, data): (DSR, domingo anterior) com as mesmas regras
+        do motor_clt — DSR = 6+ dias já escalados em [d-6, d]; domingo anterior =
+        trabalhou em d-7. A janela deve começar 7 dias antes da menor data.
+        Sem `incluir_dia` o próprio d não conta (a célula é validada como nova).
+        Retorna dois arrays bool."""
+        linhas = np.asarray(linhas, dtype=np.intp)
+        offs = np.array([self.offset(d) for d in datas], dtype=np.int64)
+        b = self.bits[linhas]
+        dsr = _popcount(b & _faixa(offs - 6, offs if incluir_dia else offs - 1)) >= 6
+        ant = offs - 7
+        dentro = ant >= 0
+        dom = np.zeros(len(offs), dtype=bool)
+        if dentro.any():
+            dom[dentro] = ((b[dentro] >> ant[dentro].astype(np.uint64)) & _UM).astype(bool)
+        return dsr, dom
+
+    def domingos_consecutivos(self, d: date) -> np.ndarray:
+        """bool por funcionário: trabalha no domingo d e no domingo anterior."""
+        return self.trabalha(d) & self.trabalha(d - timedelta(days=7))
@@ -0,0 +1,240 @@
+"""
+Escala efetiva: a exceção (AlocacaoDiaria) vence; sem exceção vale o horário
+base do funcionário nos dias da semana do turno.
+
+`resolver(func_ids, data_ini, data_fim)` devolve {(func_id, data): TurnoEfetivo}
+só com os dias trabalhados, com início/fim/intervalo do dia (dias complexos e
+turno noturno resolvidos):
+
+- cache entre requisições por (funcionário, mês), só com ids (turno, alocação),
+  descartado quando a versão da escala muda;
+- as linhas que faltam vêm de duas consultas (exceções + horário base), para
+  todos os funcionários de uma vez;
+- memo da sessão (uma por requisição/tarefa) com os Turnos carregados e os
+  horários por dia da semana; limpo em flush/commit/rollback. Com escrita
+  pendente na transação o cache entre requisições não é usado.
+
+A matriz do cobertura_engine é a visão vetorizada (NumPy) da mesma regra para
+mês × departamento.
+"""
+import calendar as cal_mod
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import AlocacaoDiaria, Funcionario, Turno
+
+_CACHE_MAX = 20000   # linhas (funcionário × mês)
+_LOTE_IN = 900       # ids por IN (limite de parâmetros do SQLite)
+
+_linhas: OrderedDict = OrderedDict()
+_linhas_versao = None
+_linhas_lock = threading.Lock()
+
+
+class TurnoEfetivo:
+    """Turno de um funcionário num dia.
+
+    - turno:      Turno (objeto da sessão corrente)
+    - inicio/fim: datetime; turno noturno termina no dia seguinte
+    - intervalo:  minutos de intervalo do dia
+    - is_excecao: célula vem de AlocacaoDiaria (alocacao_id, aviso = compliance_warning)
+    """
+    __slots__ = ('funcionario_id', 'data', 'turno', 'inicio', 'fim', 'intervalo',
+                 'is_excecao', 'alocacao_id', 'aviso')
+
+    def __init__(self, funcionario_id, data, turno, inicio, fim, intervalo,
+                 is_excecao=False, alocacao_id=None, aviso=False):
+        self.funcionario_id = funcionario_id
+        self.data = data
+        self.turno = turno
+        self.inicio = inicio
+        self.fim = fim
+        self.intervalo = intervalo
+        self.is_excecao = is_excecao
+        self.alocacao_id = alocacao_id
+        self.aviso = aviso
+
+    @property
+    def horas(self) -> float:
+        """Horas previstas no dia (mesma conta de Turno.duracao_horas_no_dia)."""
+        return max(0, (self.fim - self.inicio).seconds / 3600 - (self.intervalo / 60))
+
+    def __repr__(self):
+        return f'<TurnoEfetivo {self.funcionario_id} {self.data} {self.turno.nome}>'
+
+
+# ── Memo da sessão ────────────────────────────────────────────────────────────
+
+def _memo() -> dict:
+    return db.session.info.setdefault('_escala_efetiva', {'turnos': {}, 'horarios': {}})
+
+
+@event.listens_for(Session, 'after_flush')
+def _sessao_suja(session, flush_context):
+    session.info.pop('_escala_efetiva', None)
+    session.info['_escala_efetiva_pendente'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _sessao_limpa(session):
+    session.info.pop('_escala_efetiva', None)
+    session.info.pop('_escala_efetiva_pendente', None)
+
+
+def _turnos(ids) -> dict:
+    """Turnos da sessão por id (carregados uma vez por requisição)."""
+    turnos = _memo()['turnos']
+    faltam = [tid for tid in ids if tid not in turnos]
+    if faltam:
+        turnos.update({t.id: t for t in Turno.query.filter(Turno.id.in_(faltam))})
+    return turnos
+
+
+def _horario(turno, d: date):
+    """(inicio, fim, intervalo) do turno na data, com memo por dia da semana."""
+    horarios = _memo()['horarios']
+    chave = (turno.id, d.weekday())
+    h = horarios.get(chave)
+    if h is None:
+        h_ini, h_fim, intervalo = turno.get_horario_dia(d.weekday())
+        h = horarios[chave] = (h_ini, h_fim, int(intervalo or 0))
+    return h
+
+
+# ── Linhas (funcionário × mês) ────────────────────────────────────────────────
+
+def _meses(data_ini: date, data_fim: date) -> list:
+    meses = []
+    ano, mes = data_ini.year, data_ini.month
+    while (ano, mes) <= (data_fim.year, data_fim.month):
+        meses.append((ano, mes))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+def _carregar_linhas(chaves) -> dict:
+    """{(func_id, ano, mes): tupla por dia do mês com None ou (turno_id, aloc_id, aviso)}
+    com uma consulta de exceções e uma de horário base para todas as chaves."""
+    func_ids = sorted({fid for fid, _, _ in chaves})
+    meses = sorted({(a, m) for _, a, m in chaves})
+    d_ini = date(*meses[0], 1)
+    d_fim = date(*meses[-1], cal_mod.monthrange(*meses[-1])[1])
+
+    base_ids, excecoes = {}, {}
+    for i in range(0, len(func_ids), _LOTE_IN):
+        lote = func_ids[i:i + _LOTE_IN]
+        base_ids.update(
+            db.session.query(Funcionario.id, Funcionario.horario_base_id)
+            .filter(Funcionario.id.in_(lote), Funcionario.horario_base_id.isnot(None))
+        )
+        for fid, d, tid, aloc_id, aviso in (
+            db.session.query(AlocacaoDiaria.funcionario_id, AlocacaoDiaria.data,
+                             AlocacaoDiaria.turno_id, AlocacaoDiaria.id,
+                             AlocacaoDiaria.compliance_warning)
+            .filter(AlocacaoDiaria.funcionario_id.in_(lote),
+                    AlocacaoDiaria.data.between(d_ini, d_fim))
+        ):
+            excecoes[(fid, d)] = (tid, aloc_id, bool(aviso))
+
+    dias_base = {
+        tid: set(int(x) for x in (dias or '').split(',') if x.strip())
+        for tid, dias in db.session.query(Turno.id, Turno.dias_semana)
+        .filter(Turno.id.in_(set(base_ids.values())))
+    } if base_ids else {}
+
+    linhas = {}
+    for fid, ano, mes in chaves:
+        base = base_ids.get(fid)
+        dias = dias_base.get(base, ())
+        linha = []
+        for dia in range(1, cal_mod.monthrange(ano, mes)[1] + 1):
+            d = date(ano, mes, dia)
+            cel = excecoes.get((fid, d))
+            if cel is None and d.weekday() in dias:
+                cel = (base, None, False)
+            linha.append(cel)
+        linhas[(fid, ano, mes)] = tuple(linha)
+    return linhas
+
+
+def _obter_linhas(chaves) -> dict:
+    """Linhas do cache entre requisições; as que faltam são carregadas em lote."""
+    global _linhas_versao
+    from services.escala_versao import versao_atual
+
+    if db.session.info.get('_escala_efetiva_pendente'):
+        # Escrita não commitada na transação: lê direto, sem tocar no cache
+        return _carregar_linhas(chaves)
+
+    versao = versao_atual()
+    encontradas, faltam = {}, []
+    with _linhas_lock:
+        if versao != _linhas_versao:
+            _linhas.clear()
+            _linhas_versao = versao
+        for chave in chaves:
+            linha = _linhas.get(chave)
+            if linha is None:
+                faltam.append(chave)
+            else:
+                _linhas.move_to_end(chave)
+                encontradas[chave] = linha
+    if faltam:
+        novas = _carregar_linhas(faltam)
+        encontradas.update(novas)
+        with _linhas_lock:
+            if versao == _linhas_versao:
+                _linhas.update(novas)
+                while len(_linhas) > _CACHE_MAX:
+                    _linhas.popitem(last=False)
+    return encontradas
+
+
+# ── API ───────────────────────────────────────────────────────────────────────
+
+def resolver(func_ids, data_ini: date, data_fim: date) -> dict:
+    """{(func_id, data): TurnoEfetivo} dos dias trabalhados em [data_ini, data_fim]."""
+    func_ids = list(dict.fromkeys(func_ids))
+    if not func_ids or data_fim < data_ini:
+        return {}
+    meses = _meses(data_ini, data_fim)
+    linhas = _obter_linhas([(fid, a, m) for fid in func_ids for a, m in meses])
+    turnos = _turnos({cel[0] for linha in linhas.values() for cel in linha if cel})
+
+    efetivos = {}
+    for (fid, ano, mes), linha in linhas.items():
+        for i, cel in enumerate(linha):
+            if cel is None:
+                continue
+            d = date(ano, mes, i + 1)
+            if d < data_ini or d > data_fim:
+                continue
+            turno = turnos.get(cel[0])
+            if turno is None:
+                continue
+            h_ini, h_fim, intervalo = _horario(turno, d)
+            inicio = datetime.combine(d, h_ini)
+            fim = datetime.combine(d, h_fim)
+            if fim < inicio:
+                fim += timedelta(days=1)
+            efetivos[(fid, d)] = TurnoEfetivo(fid, d, turno, inicio, fim, intervalo,
+                                              cel[1] is not None, cel[1], cel[2])
+    return efetivos
+
+
+def turno_do_dia(func_id, data_ref: date):
+    """TurnoEfetivo do funcionário na data, ou None (folga)."""
+    return resolver([func_id], data_ref, data_ref).get((func_id, data_ref))
+
+
+def escalados_no_dia(data_ref: date, func_ids=None) -> dict:
+    """{func_id: TurnoEfetivo} de quem trabalha na data (padrão: funcionários ativos)."""
+    if func_ids is None:
+        func_ids = [fid for fid, in db.session.query(Funcionario.id).filter(Funcionario.ativo == True)]
+    return {fid: cel for (fid, _), cel in resolver(func_ids, data_ref, data_ref).items()}
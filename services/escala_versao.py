@@ -0,0 +1,271 @@
+"""
+Versão global da escala + log de alterações (tabela `escala_alteracoes`).
+
+Toda escrita em AlocacaoDiaria, Turno, Funcionario (campos que afetam a escala)
+ou GrupoDepartamento grava uma linha no log dentro da mesma transação; o `id`
+da última linha é a versão corrente da escala.
+
+- Escritas via ORM (add/alterar/delete + commit) são capturadas no before_flush,
+  com funcionário e data de cada alocação tocada.
+- UPDATE/DELETE/INSERT em massa (query.delete(), session.execute(update(...)))
+  geram uma entrada 'lote' sem detalhe, o que força recarga completa nos
+  clientes em modo delta. Quem já registrou as células afetadas com
+  `registrar_alteracoes()` pode passar execution_options(escala_registrado=True).
+
+Os endpoints JSON de escala usam a versão como ETag (`cache_por_versao`).
+
+Como o modo delta lê `id > versao`, um id menor que só fosse commitado depois
+de o cliente ver um maior seria perdido. No PostgreSQL cada transação toma um
+advisory lock de transação antes da primeira linha do log, então as escritas
+no log são serializadas até o commit e os ids saem na ordem de commit (como em
+eventos_batidas.publicar); o SQLite já serializa as escritas.
+"""
+import hashlib
+import zlib
+from datetime import date, datetime, timedelta
+from functools import wraps
+
+from sqlalchemy import event, func, inspect as sa_inspect, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+
+# Campos do funcionário que mudam o que os endpoints de escala exibem/validam
+_CAMPOS_FUNCIONARIO = ('nome', 'departamento', 'funcao', 'ativo', 'horario_base_id', 'sexo')
+
+_DIAS_RETENCAO = 30   # alterações mais antigas são removidas pela limpeza diária
+
+_CHAVE_LOG = zlib.crc32(b'escala_alteracoes')
+
+_registrado = False
+
+
+# ── Versão e log ──────────────────────────────────────────────────────────────
+
+def versao_atual() -> int:
+    """Versão corrente da escala (id da última alteração; 0 se nunca houve)."""
+    from models import EscalaAlteracao
+    return db.session.query(func.max(EscalaAlteracao.id)).scalar() or 0
+
+
+def registrar_alteracoes(celulas, operacao: str = 'bulk'):
+    """Registra explicitamente células (func_id, data) alteradas por escrita em massa.
+    Não faz commit — entra na mesma transação da escrita."""
+    from models import EscalaAlteracao
+    vistos = set()
+    for fid, d in celulas:
+        if (fid, d) in vistos:
+            continue
+        vistos.add((fid, d))
+        db.session.add(EscalaAlteracao(
+            entidade='alocacao', operacao=operacao, funcionario_id=fid, data=d,
+        ))
+
+
+def alteracoes_desde(versao: int):
+    """Alterações com id > versao. Retorna None se o log já foi podado além
+    dessa versão (o cliente precisa recarregar tudo)."""
+    from models import EscalaAlteracao
+    if versao > 0:
+        menor = db.session.query(func.min(EscalaAlteracao.id)).scalar()
+        if menor is not None and menor > versao + 1:
+            return None
+    return (
+        EscalaAlteracao.query
+        .filter(EscalaAlteracao.id > versao)
+        .order_by(EscalaAlteracao.id)
+        .all()
+    )
+
+
+def limpar_alteracoes(dias: int = _DIAS_RETENCAO) -> int:
+    """Remove entradas antigas do log, sempre preservando a última (a versão
+    corrente não pode regredir)."""
+    from models import EscalaAlteracao
+    ultima = versao_atual()
+    if not ultima:
+        return 0
+    limite = datetime.utcnow() - timedelta(days=dias)
+    removidas = (
+        EscalaAlteracao.query
+        .filter(EscalaAlteracao.criado_em < limite, EscalaAlteracao.id < ultima)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    return removidas
+
+
+# ── Captura automática (eventos da Session) ───────────────────────────────────
+
+def _historico(obj, campo):
+    """(valor_antigo, valor_novo) de um atributo; antigo = novo se não mudou."""
+    hist = sa_inspect(obj).attrs[campo].history
+    novo = getattr(obj, campo)
+    antigo = hist.deleted[0] if hist.deleted else novo
+    return antigo, novo
+
+
+def _entradas_flush(session) -> list:
+    from models import AlocacaoDiaria, Turno, Funcionario, GrupoDepartamento, EscalaAlteracao
+
+    chaves = set()
+    entradas = []
+
+    def _add(entidade, operacao, funcionario_id=None, data=None, referencia_id=None):
+        chave = (entidade, funcionario_id, data, referencia_id)
+        if chave in chaves:
+            return
+        chaves.add(chave)
+        entradas.append(EscalaAlteracao(
+            entidade=entidade, operacao=operacao,
+            funcionario_id=funcionario_id, data=data, referencia_id=referencia_id,
+        ))
+
+    for obj in session.new:
+        if isinstance(obj, AlocacaoDiaria):
+            _add('alocacao', 'insert', obj.funcionario_id, obj.data)
+        elif isinstance(obj, Turno):
+            _add('turno', 'insert')
+        elif isinstance(obj, Funcionario):
+            _add('funcionario', 'insert', obj.id)
+        elif isinstance(obj, GrupoDepartamento):
+            _add('grupo', 'insert')
+
+    for obj in session.dirty:
+        if isinstance(obj, EscalaAlteracao) or not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, AlocacaoDiaria):
+            # Mover/trocar recurso: a célula de origem e a de destino mudam
+            fid_ant, fid_novo = _historico(obj, 'funcionario_id')
+            d_ant, d_novo = _historico(obj, 'data')
+            _add('alocacao', 'update', fid_ant, d_ant, obj.id)
+            _add('alocacao', 'update', fid_novo, d_novo, obj.id)
+        elif isinstance(obj, Turno):
+            _add('turno', 'update', referencia_id=obj.id)
+        elif isinstance(obj, Funcionario):
+            # Decidido só no commit: o sync marca todos inativos e reativa os
+            # que vieram da API, com autoflush no meio — não é alteração real.
+            originais = session.info.setdefault('_escala_func_orig', {})
+            insp = sa_inspect(obj)
+            for campo in _CAMPOS_FUNCIONARIO:
+                hist = insp.attrs[campo].history
+                if hist.has_changes():
+                    originais.setdefault(obj.id, {}).setdefault(
+                        campo, hist.deleted[0] if hist.deleted else None)
+        elif isinstance(obj, GrupoDepartamento):
+            _add('grupo', 'update', referencia_id=obj.id)
+
+    for obj in session.deleted:
+        if isinstance(obj, AlocacaoDiaria):
+            fid_ant, _ = _historico(obj, 'funcionario_id')
+            d_ant, _ = _historico(obj, 'data')
+            _add('alocacao', 'delete', fid_ant, d_ant, obj.id)
+        elif isinstance(obj, Turno):
+            _add('turno', 'delete', referencia_id=obj.id)
+        elif isinstance(obj, Funcionario):
+            _add('funcionario', 'delete', obj.id)
+        elif isinstance(obj, GrupoDepartamento):
+            _add('grupo', 'delete', referencia_id=obj.id)
+
+    return entradas
+
+
+def _serializar_log(session):
+    """Trava de escrita no log até o fim da transação (uma vez por transação)."""
+    if session.info.get('_escala_trava'):
+        return
+    conn = session.connection()
+    if conn.dialect.name == 'postgresql':
+        conn.execute(select(func.pg_advisory_xact_lock(_CHAVE_LOG)))
+    session.info['_escala_trava'] = True
+
+
+def _before_flush(session, flush_context, instances):
+    from models import EscalaAlteracao
+    entradas = _entradas_flush(session)
+    if entradas:
+        session.add_all(entradas)
+    if any(isinstance(obj, EscalaAlteracao) for obj in session.new):
+        _serializar_log(session)
+
+
+def _before_commit(session):
+    from models import Funcionario, EscalaAlteracao
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    originais = session.info.pop('_escala_func_orig', None)
+    if not originais:
+        return
+    for fid, campos in originais.items():
+        f = session.get(Funcionario, fid)
+        if f is None or any(getattr(f, c) != v for c, v in campos.items()):
+            session.add(EscalaAlteracao(entidade='funcionario', operacao='update', funcionario_id=fid))
+
+
+def _limpar_pendentes(session, *args):
+    session.info.pop('_escala_func_orig', None)
+    session.info.pop('_escala_trava', None)
+
+
+def _do_orm_execute(state):
+    if not (state.is_update or state.is_delete or state.is_insert):
+        return
+    if state.execution_options.get('escala_registrado'):
+        return
+    from models import AlocacaoDiaria, Turno, Funcionario, GrupoDepartamento, EscalaAlteracao
+    mapper = state.bind_mapper
+    if mapper is None or mapper.class_ not in (AlocacaoDiaria, Turno, Funcionario, GrupoDepartamento):
+        return
+    state.session.add(EscalaAlteracao(entidade='lote', operacao='bulk'))
+
+
+def init_escala_versao(app):
+    """Liga os listeners de Session (uma vez por processo)."""
+    global _registrado
+    if _registrado:
+        return
+    event.listen(Session, 'before_flush', _before_flush)
+    event.listen(Session, 'before_commit', _before_commit)
+    event.listen(Session, 'after_commit', _limpar_pendentes)
+    event.listen(Session, 'after_rollback', _limpar_pendentes)
+    event.listen(Session, 'do_orm_execute', _do_orm_execute)
+    _registrado = True
+
+
+# ── ETag / 304 para endpoints JSON ────────────────────────────────────────────
+
+def cache_por_versao(extra=None):
+    """Decorator: responde 304 quando o If-None-Match bate com a versão da escala.
+
+    A ETag combina a versão corrente, a URL completa (filtros) e, se informado,
+    o retorno de `extra()` — para dados que dependem de algo além da escala
+    (ex.: batidas do dia no Gantt, data de hoje no quadro).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request, make_response
+
+            versao = versao_atual()
+            partes = [str(versao), request.full_path]
+            if extra is not None:
+                partes.append(repr(extra()))
+            etag = f'v{versao}-' + hashlib.sha1('|'.join(partes).encode()).hexdigest()[:16]
+
+            if request.if_none_match.contains(etag):
+                resp = make_response('', 304)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag)
+            resp.headers['Cache-Control'] = 'private, no-cache'
+            resp.headers['X-Escala-Versao'] = str(versao)
+            return resp
+        return wrapper
+    return decorator
+
+
+def dia_corrente() -> date:
+    """Componente extra de ETag para respostas que dependem do dia corrente."""
+    return date.today()
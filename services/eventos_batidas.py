@@ -0,0 +1,244 @@
+"""
+Eventos de batidas alteradas (outbox `eventos_batidas`) e seus consumidores.
+
+O sync de batidas (e a correção manual de batidas) grava, na mesma transação
+das batidas, um evento por (funcionário, dia) cujas batidas mudaram —
+`publicar()`. Cada consumidor guarda em `consumidores_eventos` o último id
+processado e, em `consumir()`, lê os eventos seguintes em lotes, trata só as
+chaves afetadas e avança o offset depois de tratar (pelo menos uma vez: se
+falhar no meio, o lote volta inteiro na próxima rodada — os tratadores são
+idempotentes).
+
+Consumidores, na ordem em que rodam (cada um vê o estado deixado pelos
+anteriores):
+
+  - inconsistencias : reavalia os achados dos dias (services/inconsistencias_batidas);
+  - banco_horas     : recalcula os saldos do funcionário do dia mais antigo
+                      afetado até hoje (o saldo é acumulado);
+  - regras_evento   : regras EVENT_SYNC só para os funcionários afetados, de
+                      hoje e ontem, sem repetir mensagem já enviada;
+  - dashboard       : snapshot de hoje dos departamentos afetados.
+
+`consumir_todos()` roda fora do sync, a cada minuto: pela task
+tasks.consumir_eventos_batidas e pelo job `eventos_batidas` do APScheduler
+(services/auto_sync). O sync só publica; o custo dos consumidores não entra na
+rodada dele.
+
+Exclusividade: cada consumidor roda com uma trava que vale a rodada inteira,
+não a transação — os tratadores fazem commit no meio. No PostgreSQL é um
+advisory lock de sessão numa conexão separada (pg_try_advisory_lock); quem não
+o consegue pula o consumidor em vez de esperar. Dentro do processo, uma trava
+local cobre os demais bancos.
+
+Offset × commit fora de ordem: o consumidor lê `id > ultimo_id`, então um id
+menor que só fica visível depois seria pulado. Por isso as publicações são
+serializadas até o commit — no PostgreSQL `publicar()` toma um advisory lock de
+transação antes de inserir; o SQLite já serializa as escritas — e os ids ficam
+na ordem de commit. `publicar()` deve ser a última escrita antes do commit,
+para não segurar a trava à toa.
+"""
+import logging
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import ConsumidorEvento, EventoBatida, Funcionario
+
+logger = logging.getLogger('eventos_batidas')
+
+LOTE = 1000
+_DIAS_RETENCAO = 7
+
+_consumidores = {}   # nome → tratador(chaves: set[(funcionario_id, data)])
+_travas_locais = {}  # nome → threading.Lock
+_travas_guarda = threading.Lock()
+
+
+def _chave_trava(nome: str) -> int:
+    """Chave estável (entre processos) do advisory lock."""
+    return zlib.crc32(f'eventos_batidas:{nome}'.encode())
+
+
+_CHAVE_PUBLICACAO = _chave_trava('publicar')
+
+
+def consumidor(nome: str):
+    """Registra um tratador de eventos; a ordem de registro é a de execução."""
+    def deco(fn):
+        _consumidores[nome] = fn
+        return fn
+    return deco
+
+
+# ── Publicação ────────────────────────────────────────────────────────────────
+
+def publicar(dias, origem: str = 'sync') -> int:
+    """Um evento por (funcionario_id, data). Não faz commit — entra na
+    transação de quem gravou as batidas e deve vir logo antes do commit: no
+    PostgreSQL segura a trava de publicação até lá."""
+    dias = sorted(set(dias))
+    if not dias:
+        return 0
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(select(func.pg_advisory_xact_lock(_CHAVE_PUBLICACAO)))
+    agora = datetime.utcnow()
+    db.session.add_all([EventoBatida(funcionario_id=fid, data=d, origem=origem, criado_em=agora)
+                        for fid, d in dias])
+    return len(dias)
+
+
+# ── Consumo ───────────────────────────────────────────────────────────────────
+
+@contextmanager
+def _trava(nome):
+    """True se este processo ficou com o consumidor até o fim do bloco."""
+    with _travas_guarda:
+        local = _travas_locais.setdefault(nome, threading.Lock())
+    if not local.acquire(blocking=False):
+        yield False
+        return
+    try:
+        if db.engine.dialect.name != 'postgresql':
+            yield True
+            return
+        chave = _chave_trava(nome)
+        with db.engine.connect() as conn:
+            if not conn.execute(select(func.pg_try_advisory_lock(chave))).scalar():
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                conn.execute(select(func.pg_advisory_unlock(chave)))
+                conn.commit()
+    finally:
+        local.release()
+
+
+def _registro(nome):
+    c = db.session.get(ConsumidorEvento, nome)
+    if c is None:
+        try:
+            db.session.add(ConsumidorEvento(nome=nome, ultimo_id=0, processados=0))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()           # criado por outro processo
+        c = db.session.get(ConsumidorEvento, nome)
+    return c
+
+
+def consumir(nome: str, lote: int = LOTE) -> dict:
+    """Trata os eventos pendentes de um consumidor. Retorna eventos e chaves
+    tratados; em erro, guarda a mensagem no consumidor e para (o offset fica).
+    Se outro processo já está com o consumidor, não faz nada."""
+    tratador = _consumidores[nome]
+    res = {'eventos': 0, 'chaves': 0, 'erro': None}
+    with _trava(nome) as minha:
+        if not minha:
+            return res
+        while True:
+            ultimo_id = _registro(nome).ultimo_id
+            eventos = (db.session.query(EventoBatida.id, EventoBatida.funcionario_id, EventoBatida.data)
+                       .filter(EventoBatida.id > ultimo_id).order_by(EventoBatida.id).limit(lote).all())
+            if not eventos:
+                db.session.commit()
+                return res
+            chaves = {(fid, d) for _, fid, d in eventos}
+            ultimo = eventos[-1][0]
+            try:
+                tratador(chaves)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f'[eventos_batidas] {nome}: erro no lote até #{ultimo}: {e}')
+                c = db.session.get(ConsumidorEvento, nome)
+                c.erro = f'{type(e).__name__}: {e}'[:2000]
+                c.atualizado_em = datetime.utcnow()
+                db.session.commit()
+                res['erro'] = c.erro
+                return res
+            # Os tratadores podem ter feito commit: relê a linha
+            c = db.session.get(ConsumidorEvento, nome)
+            c.ultimo_id = ultimo
+            c.processados = (c.processados or 0) + len(eventos)
+            c.atualizado_em = datetime.utcnow()
+            c.erro = None
+            db.session.commit()
+            res['eventos'] += len(eventos)
+            res['chaves'] += len(chaves)
+            if len(eventos) < lote:
+                return res
+
+
+def consumir_todos() -> dict:
+    """Roda os consumidores em ordem; a falha de um não impede os outros."""
+    return {nome: consumir(nome) for nome in _consumidores}
+
+
+def pendentes() -> dict:
+    """{consumidor: eventos ainda não tratados}."""
+    ultimo = db.session.query(db.func.max(EventoBatida.id)).scalar() or 0
+    offsets = dict(db.session.query(ConsumidorEvento.nome, ConsumidorEvento.ultimo_id))
+    return {nome: max(0, ultimo - offsets.get(nome, 0)) for nome in _consumidores}
+
+
+def limpar_eventos(dias: int = _DIAS_RETENCAO) -> int:
+    """Remove eventos mais antigos que `dias` já tratados por todos os consumidores."""
+    offsets = dict(db.session.query(ConsumidorEvento.nome, ConsumidorEvento.ultimo_id))
+    corte = min(offsets.get(nome, 0) for nome in _consumidores)
+    n = (EventoBatida.query
+         .filter(EventoBatida.id <= corte, EventoBatida.criado_em < datetime.utcnow() - timedelta(days=dias))
+         .delete(synchronize_session=False))
+    db.session.commit()
+    return n
+
+
+# ── Consumidores ──────────────────────────────────────────────────────────────
+
+@consumidor('inconsistencias')
+def _inconsistencias(chaves):
+    from services.inconsistencias_batidas import reavaliar_dias
+    reavaliar_dias(chaves, resolucao='sync')
+
+
+@consumidor('banco_horas')
+def _banco_horas(chaves):
+    from services.banco_horas_service import salvar_saldos_lote
+    hoje = date.today()
+    desde: dict[str, date] = {}
+    for fid, d in chaves:
+        if d <= hoje:
+            desde[fid] = min(d, desde.get(fid, d))
+    por_inicio: dict[date, set] = {}
+    for fid, d in desde.items():
+        por_inicio.setdefault(d, set()).add(fid)
+    for d, fids in sorted(por_inicio.items()):
+        salvar_saldos_lote(fids, d, hoje)
+
+
+@consumidor('regras_evento')
+def _regras_evento(chaves):
+    from services.notification_processor import processar_regras_evento
+    hoje = date.today()
+    por_dia: dict[date, set] = {}
+    for fid, d in chaves:
+        if hoje - timedelta(days=1) <= d <= hoje:   # ontem: turnos noturnos
+            por_dia.setdefault(d, set()).add(fid)
+    for d, fids in sorted(por_dia.items()):
+        processar_regras_evento('EVENT_SYNC', d, func_ids=fids)
+
+
+@consumidor('dashboard')
+def _dashboard(chaves):
+    from services.snapshot_service import atualizar_snapshot
+    hoje = date.today()
+    fids = {fid for fid, d in chaves if d == hoje}
+    if not fids:
+        return
+    depts = {dept or '' for dept, in (db.session.query(Funcionario.departamento)
+                                       .filter(Funcionario.id.in_(fids)).distinct())}
+    atualizar_snapshot(hoje, depts)
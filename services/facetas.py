@@ -0,0 +1,122 @@
+"""
+Facetas de filtro: departamentos, grupos de departamentos, funções e contagens
+dos funcionários ativos, em cache por processo.
+
+Os dropdowns e os filtros por departamento/grupo leem daqui em vez de rodar
+SELECT DISTINCT e buscar o grupo a cada requisição. O cache é reconstruído
+quando a versão das facetas (Configuracao 'facetas_versao') muda:
+`invalidar_facetas()` é chamado por sync_funcionarios e pelo CRUD de grupos,
+dentro da mesma transação da escrita, e os outros workers recarregam na
+próxima leitura.
+"""
+import threading
+import uuid
+
+from extensions import db
+from models import Configuracao, Funcionario, GrupoDepartamento
+
+_CHAVE_VERSAO = 'facetas_versao'
+
+_cache = {'versao': None, 'dados': None}
+_cache_lock = threading.Lock()
+
+
+def _versao():
+    return (db.session.query(Configuracao.valor)
+            .filter(Configuracao.chave == _CHAVE_VERSAO).scalar())
+
+
+def _construir() -> dict:
+    """Uma agregação (departamento, função, total) + os grupos com membros."""
+    from sqlalchemy import func
+    from sqlalchemy.orm import selectinload
+
+    departamentos, funcoes = {}, {}
+    funcoes_por_dept: dict[str, set] = {}
+    for dept, funcao, total in (
+        db.session.query(Funcionario.departamento, Funcionario.funcao, func.count(Funcionario.id))
+        .filter(Funcionario.ativo == True)
+        .group_by(Funcionario.departamento, Funcionario.funcao)
+    ):
+        if dept:
+            departamentos[dept] = departamentos.get(dept, 0) + total
+        if funcao:
+            funcoes[funcao] = funcoes.get(funcao, 0) + total
+            funcoes_por_dept.setdefault(dept or '', set()).add(funcao)
+
+    grupos = {
+        g.nome: g.departamentos
+        for g in GrupoDepartamento.query.options(selectinload(GrupoDepartamento.membros))
+        .order_by(GrupoDepartamento.nome)
+    }
+    return {
+        'departamentos':    sorted(departamentos),
+        'grupos':           grupos,
+        'funcoes':          sorted(funcoes),
+        'funcoes_por_dept': {d: sorted(fs) for d, fs in funcoes_por_dept.items()},
+        'total_por_dept':   departamentos,
+        'total_por_funcao': funcoes,
+    }
+
+
+def facetas() -> dict:
+    """Facetas correntes (não alterar o dict devolvido):
+    departamentos, grupos {nome: [departamentos]}, funcoes, funcoes_por_dept,
+    total_por_dept e total_por_funcao (funcionários ativos)."""
+    versao = _versao()
+    with _cache_lock:
+        if _cache['dados'] is not None and _cache['versao'] == versao:
+            return _cache['dados']
+    dados = _construir()
+    with _cache_lock:
+        _cache['versao'], _cache['dados'] = versao, dados
+    return dados
+
+
+def invalidar_facetas():
+    """Marca as facetas para reconstrução. Não faz commit — entra na transação
+    da escrita (sync de funcionários, edição de grupos)."""
+    c = Configuracao.query.filter_by(chave=_CHAVE_VERSAO).first()
+    if not c:
+        c = Configuracao(chave=_CHAVE_VERSAO)
+        db.session.add(c)
+    c.valor = uuid.uuid4().hex
+
+
+# ── Consultas prontas ─────────────────────────────────────────────────────────
+
+def lista_departamentos() -> list:
+    """Grupos primeiro, depois departamentos individuais (dropdowns em todo o sistema)."""
+    f = facetas()
+    return list(f['grupos']) + f['departamentos']
+
+
+def resolver_departamentos(dept_str: str) -> list:
+    """Nome de departamento OU grupo → lista de departamentos reais ([] = sem filtro).
+    Ex: 'Praia do Canto' → ['PRAIA FITNESS', 'FUNCIONAL DA PRAIA']
+        'PRAIA FITNESS'  → ['PRAIA FITNESS']
+    """
+    if not dept_str:
+        return []
+    depts = facetas()['grupos'].get(dept_str)
+    return list(depts) if depts is not None else [dept_str]
+
+
+def filtrar_departamento(q, dept_str: str, coluna=None):
+    """Aplica o filtro de departamento/grupo já resolvido (sem consulta) à query."""
+    depts = resolver_departamentos(dept_str)
+    if not depts:
+        return q
+    coluna = Funcionario.departamento if coluna is None else coluna
+    if len(depts) == 1:
+        return q.filter(coluna == depts[0])
+    return q.filter(coluna.in_(depts))
+
+
+def funcoes(departamento: str = None) -> list:
+    """Funções dos funcionários ativos, opcionalmente de um departamento/grupo."""
+    f = facetas()
+    if not departamento:
+        return f['funcoes']
+    por_dept = f['funcoes_por_dept']
+    return sorted({fn for d in resolver_departamentos(departamento) for fn in por_dept.get(d, ())})
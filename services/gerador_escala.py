@@ -0,0 +1,243 @@
+"""
+Gerador de escala em lote – usado por padrao_aplicar, cargo_mensal,
+_aplicar_escala_futuro e config_hub.escalas_importar.
+
+1. `celulas_padrao` calcula as células alvo {(func_id, data): turno_id} de N
+   funcionários com aritmética de datas vetorizada (NumPy): dias da semana do
+   turno e, para PadraoTurno, o ciclo trabalho/folga com a posição inicial de
+   cada funcionário (defasagem).
+2. `planejar` carrega as alocações existentes do intervalo numa consulta e
+   faz o diff: inserir, atualizar (turno diferente), remover e inalteradas.
+3. `validar_plano` (opcional) roda o validar_lote do motor_clt sobre a escala
+   efetiva resultante, sem consultas por célula.
+4. `aplicar_plano` grava com DELETE/UPDATE/INSERT em lote e registra as
+   células no log de versão da escala.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from extensions import db
+from models import AlocacaoDiaria
+
+# Modos do diff
+INSERIR = 'inserir'          # só cria as células que não existem
+UPSERT = 'upsert'            # cria as que faltam e troca o turno das existentes
+SUBSTITUIR = 'substituir'    # upsert + remove as existentes fora do alvo no intervalo
+
+_LOTE_IN = 1000   # ids por DELETE ... IN (limite de parâmetros do SQLite)
+
+
+def _datas(data_ini: date, data_fim: date) -> np.ndarray:
+    return np.arange(np.datetime64(data_ini, 'D'), np.datetime64(data_fim, 'D') + 1)
+
+
+def celulas_padrao(func_ids, data_ini: date, data_fim: date, turno_id: int,
+                   dias_semana=None, dias_trabalho: int = None, dias_folga: int = 0,
+                   posicoes=None) -> dict:
+    """Células {(func_id, data): turno_id} de um turno aplicado a vários funcionários.
+
+    - dias_semana: dias (0=seg..6=dom) em que o turno vale; None = todos
+    - dias_trabalho/dias_folga: ciclo do PadraoTurno (ex.: 6x1); None = sem ciclo
+    - posicoes: posição inicial no ciclo por funcionário (mesma ordem de func_ids);
+      None = todos começam o ciclo em data_ini
+    """
+    func_ids = list(func_ids)
+    if not func_ids or data_fim < data_ini:
+        return {}
+    datas = _datas(data_ini, data_fim)
+    # 01/01/1970 foi quinta-feira (3)
+    wd = (datas.astype('int64') + 3) % 7
+    on = np.ones((len(func_ids), len(datas)), dtype=bool)
+    if dias_semana is not None:
+        on &= np.isin(wd, list(dias_semana))[None, :]
+    if dias_trabalho:
+        ciclo = dias_trabalho + (dias_folga or 0)
+        pos0 = np.zeros(len(func_ids), dtype=np.int64) if posicoes is None else np.asarray(posicoes, dtype=np.int64)
+        pos = (pos0[:, None] + np.arange(len(datas))[None, :]) % ciclo
+        on &= pos < dias_trabalho
+    linhas, colunas = np.nonzero(on)
+    dias = datas.astype(object)   # numpy datetime64[D] → datetime.date
+    return {(func_ids[i], dias[j]): turno_id for i, j in zip(linhas.tolist(), colunas.tolist())}
+
+
+def celulas_dias_semana(func_id, data_ini: date, data_fim: date, turno_id: int, dias_semana) -> dict:
+    """Atalho para um funcionário em dias da semana fixos."""
+    return celulas_padrao([func_id], data_ini, data_fim, turno_id, dias_semana=dias_semana)
+
+
+class PlanoEscala:
+    """Diff entre as células alvo e as alocações existentes.
+
+    - inserir:   [(func_id, data, turno_id)]
+    - atualizar: [(aloc_id, func_id, data, turno_id)]
+    - remover:   [(aloc_id, func_id, data)]
+    - inalteradas: quantas células alvo já estavam com o mesmo turno
+    - infracoes: {(func_id, data): [infrações]} depois de validar_plano
+    - validado:  se validar_plano rodou (as células a inserir/atualizar foram revalidadas)
+    """
+
+    def __init__(self, inserir, atualizar, remover, inalteradas, func_ids, data_ini, data_fim):
+        self.inserir = inserir
+        self.atualizar = atualizar
+        self.remover = remover
+        self.inalteradas = inalteradas
+        self.func_ids = func_ids
+        self.data_ini = data_ini
+        self.data_fim = data_fim
+        self.infracoes: dict = {}
+        self.validado = False
+
+    @property
+    def bloqueantes(self) -> dict:
+        return {k: [i for i in v if i.get('severity', 'error') == 'error']
+                for k, v in self.infracoes.items()
+                if any(i.get('severity', 'error') == 'error' for i in v)}
+
+    @property
+    def total_alvo(self) -> int:
+        return len(self.inserir) + len(self.atualizar) + self.inalteradas
+
+    def resumo(self, limite: int = 50) -> dict:
+        """Resposta de prévia (dry-run)."""
+        def _fmt(chave, infracoes):
+            return {'func_id': chave[0], 'data': chave[1].isoformat(),
+                    'infracoes': [i['message'] for i in infracoes]}
+        bloq = self.bloqueantes
+        avisos = {k: v for k, v in self.infracoes.items() if k not in bloq}
+        return {
+            'inserir':     len(self.inserir),
+            'atualizar':   len(self.atualizar),
+            'remover':     len(self.remover),
+            'inalteradas': self.inalteradas,
+            'bloqueantes': [_fmt(k, v) for k, v in sorted(bloq.items())[:limite]],
+            'total_bloqueantes': len(bloq),
+            'avisos':      [_fmt(k, v) for k, v in sorted(avisos.items())[:limite]],
+            'total_avisos': len(avisos),
+        }
+
+
+def planejar(alvo: dict, func_ids=None, data_ini: date = None, data_fim: date = None,
+             modo: str = UPSERT, remover=()) -> PlanoEscala:
+    """Diff de `alvo` {(func_id, data): turno_id} contra as alocações existentes
+    de func_ids em [data_ini, data_fim] (por padrão, o envelope do alvo).
+    `remover`: células (func_id, data) a apagar explicitamente, se existirem."""
+    remover = set(remover)
+    chaves = set(alvo) | remover
+    func_ids = sorted(set(func_ids) if func_ids is not None else {fid for fid, _ in chaves})
+    if chaves:
+        data_ini = data_ini or min(d for _, d in chaves)
+        data_fim = data_fim or max(d for _, d in chaves)
+    existentes = {}
+    if func_ids and data_ini and data_fim:
+        for aloc_id, fid, d, tid in (
+            db.session.query(AlocacaoDiaria.id, AlocacaoDiaria.funcionario_id,
+                             AlocacaoDiaria.data, AlocacaoDiaria.turno_id)
+            .filter(AlocacaoDiaria.funcionario_id.in_(func_ids),
+                    AlocacaoDiaria.data.between(data_ini, data_fim))
+        ):
+            existentes[(fid, d)] = (aloc_id, tid)
+
+    inserir, atualizar, apagar = [], [], []
+    inalteradas = 0
+    for (fid, d), tid in sorted(alvo.items()):
+        atual = existentes.get((fid, d))
+        if atual is None:
+            inserir.append((fid, d, tid))
+        elif modo == INSERIR or atual[1] == tid:
+            inalteradas += 1
+        else:
+            atualizar.append((atual[0], fid, d, tid))
+    if modo == SUBSTITUIR:
+        apagar = [(aloc_id, fid, d) for (fid, d), (aloc_id, _) in sorted(existentes.items())
+                  if (fid, d) not in alvo]
+    elif remover:
+        apagar = [(existentes[c][0],) + c for c in sorted(remover) if c in existentes and c not in alvo]
+    return PlanoEscala(inserir, atualizar, apagar, inalteradas, func_ids, data_ini, data_fim)
+
+
+def validar_plano(plano: PlanoEscala) -> dict:
+    """Valida (motor_clt, em memória) cada célula criada/alterada contra a escala
+    efetiva (exceções + horário base) como ficará depois do plano — a mesma
+    escala que o sandbox usa. Preenche e retorna plano.infracoes."""
+    from models import Funcionario, Turno
+    from services.motor_clt import carregar_escala_efetiva, validar_alocacao_escala, _MemoTurno
+
+    celulas = [(fid, d, tid) for fid, d, tid in plano.inserir]
+    celulas += [(fid, d, tid) for _, fid, d, tid in plano.atualizar]
+    plano.validado = True
+    if not celulas:
+        plano.infracoes = {}
+        return plano.infracoes
+
+    func_ids = sorted({fid for fid, _, _ in celulas})
+    escala = carregar_escala_efetiva(func_ids, plano.data_ini - timedelta(days=7),
+                                     plano.data_fim + timedelta(days=7))
+    turnos = {t.id: t for t in Turno.query.filter(Turno.id.in_({tid for _, _, tid in celulas}))}
+    funcs = {f.id: f for f in Funcionario.query.filter(Funcionario.id.in_(func_ids))}
+    # Sem a exceção removida, o dia volta ao horário base (se ele trabalha nesse dia)
+    for _, fid, d in plano.remover:
+        if fid not in funcs:
+            continue
+        dias = escala.setdefault(fid, {})
+        base = funcs[fid].horario_base
+        if base and d.weekday() in base.dias_semana_list:
+            dias[d] = base
+        else:
+            dias.pop(d, None)
+    for fid, d, tid in celulas:
+        escala.setdefault(fid, {})[d] = turnos[tid]
+
+    # Cada célula é validada como nova: sai da escala durante a própria validação
+    memo = _MemoTurno()
+    infracoes = {}
+    for fid, d, tid in celulas:
+        dias = escala[fid]
+        turno = dias.pop(d)
+        encontradas = validar_alocacao_escala(fid, d, turno, escala, funcs.get(fid), memo)
+        if encontradas:
+            infracoes[(fid, d)] = encontradas
+        dias[d] = turno
+    plano.infracoes = infracoes
+    return infracoes
+
+
+def aplicar_plano(plano: PlanoEscala, commit: bool = True) -> int:
+    """Grava o plano em lote (DELETE/UPDATE/INSERT). Avisos de validação viram
+    compliance_warning; sem validar_plano, as células atualizadas mantêm o aviso
+    que já tinham. Retorna o número de células gravadas (inseridas + atualizadas)."""
+    from sqlalchemy import delete, insert, update
+    from services.escala_versao import registrar_alteracoes
+
+    def _aviso(fid, d):
+        infracoes = plano.infracoes.get((fid, d))
+        return '; '.join(i['message'] for i in infracoes) if infracoes else None
+
+    registrar_alteracoes(
+        [(fid, d) for _, fid, d in plano.remover]
+        + [(fid, d) for _, fid, d, _ in plano.atualizar]
+        + [(fid, d) for fid, d, _ in plano.inserir]
+    )
+    ids_remover = [aloc_id for aloc_id, _, _ in plano.remover]
+    for i in range(0, len(ids_remover), _LOTE_IN):
+        db.session.execute(
+            delete(AlocacaoDiaria)
+            .where(AlocacaoDiaria.id.in_(ids_remover[i:i + _LOTE_IN]))
+            .execution_options(escala_registrado=True, synchronize_session=False)
+        )
+    if plano.atualizar:
+        db.session.execute(
+            update(AlocacaoDiaria).execution_options(escala_registrado=True),
+            [{'id': aloc_id, 'turno_id': tid, 'compliance_warning': _aviso(fid, d)}
+             if plano.validado else {'id': aloc_id, 'turno_id': tid}
+             for aloc_id, fid, d, tid in plano.atualizar],
+        )
+    if plano.inserir:
+        db.session.execute(
+            insert(AlocacaoDiaria).execution_options(escala_registrado=True),
+            [{'funcionario_id': fid, 'data': d, 'turno_id': tid, 'compliance_warning': _aviso(fid, d)}
+             for fid, d, tid in plano.inserir],
+        )
+    if commit:
+        db.session.commit()
+    return len(plano.inserir) + len(plano.atualizar)
@@ -0,0 +1,357 @@
+"""
+Inconsistências de batidas: detecção em SQL (funções de janela + GROUP BY) e
+achados persistidos em `batida_inconsistencias`.
+
+As regras, calculadas pelo banco sobre as batidas de cada dia:
+
+  - impares   : COUNT(*) do dia ímpar
+  - duplicata : batida do mesmo tipo da anterior (LAG) em até 5 min
+  - invertida : mesmo tipo da anterior com mais de 5 min; ou a k-ésima Saída
+                antes da k-ésima Entrada (ROW_NUMBER por tipo)
+  - curta     : k-ésimo par Entrada→Saída com menos de 15 min
+  - longa     : primeira→última batida do dia (MIN/MAX) acima de 14 h
+
+A ordem das batidas no dia é a da coluna `hora` ('HH:MM'); horas fora desse
+formato contam no total do dia, mas não nas comparações.
+
+`reavaliar_dias` roda a detecção só para os (funcionário, dia) tocados — pelo
+sync ou por uma correção do gestor — e sincroniza a tabela: achado novo entra
+aberto, achado que sumiu é resolvido (quando, por quem, como) e
+Batida.inconsistente passa a refletir os achados abertos. A tela, o dashboard
+e as notificações leem as linhas prontas.
+"""
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, and_, case, cast, func, literal, or_, select, tuple_, union_all, update
+from sqlalchemy.sql.functions import coalesce
+
+from extensions import db
+from models import Batida, BatidaInconsistencia, Funcionario
+
+LIMIAR_DUPLICATA_MIN = 5    # minutos – batidas mais próximas que isso são "duplicata"
+LIMIAR_CURTA_MIN = 15       # minutos – intervalo entre entrada/saída considerado curto
+LIMIAR_LONGA_HORAS = 14     # horas   – turno acima disso é suspeito
+
+# Ordem das etapas na descrição do dia (a mesma da análise original)
+ETAPA_IMPARES, ETAPA_SEQUENCIA, ETAPA_PAR, ETAPA_LONGA = 1, 2, 3, 4
+
+ORDENS = ('data', 'nome', 'departamento', 'problemas')
+
+_LOTE_DIAS = 500    # (funcionário, dia) por consulta no IN
+
+
+def _minutos(hora):
+    """'HH:MM' → minutos desde meia-noite (NULL fora do formato)."""
+    return case(
+        (hora.like('__:__'),
+         cast(func.substr(hora, 1, 2), Integer) * 60 + cast(func.substr(hora, 4, 2), Integer)),
+        else_=None,
+    )
+
+
+def _batidas(data_inicio, data_fim, dept=None, func_id=None, dias=None):
+    """CTE com as batidas do escopo (funcionários ativos) e o minuto da hora."""
+    q = (
+        select(Batida.id, Batida.funcionario_id, Batida.data, Batida.hora, Batida.tipo,
+               _minutos(Batida.hora).label('minuto'))
+        .join(Funcionario, Funcionario.id == Batida.funcionario_id)
+        .where(Batida.data >= data_inicio, Batida.data <= data_fim, Funcionario.ativo == True)
+    )
+    if func_id:
+        q = q.where(Batida.funcionario_id == func_id)
+    elif dept:
+        from services.facetas import filtrar_departamento
+        q = filtrar_departamento(q, dept)
+    if dias is not None:
+        q = q.where(tuple_(Batida.funcionario_id, Batida.data).in_(dias))
+    return q.cte('b')
+
+
+def _achados(b):
+    """UNION ALL das quatro detecções: uma linha por problema.
+    Colunas: funcionario_id, data, tipo, etapa, pos, id_a, id_b, hora_a, hora_b,
+    tipo_a, tipo_b, valor (batidas no dia / diferença em minutos / total do dia)."""
+    dia = (b.c.funcionario_id, b.c.data)
+
+    # Por dia: quantidade e primeira/última batida
+    por_dia = (
+        select(b.c.funcionario_id, b.c.data, func.count().label('n'),
+               func.min(b.c.hora).label('h_ini'), func.max(b.c.hora).label('h_fim'))
+        .group_by(*dia)
+        .subquery('d')
+    )
+    impares = select(
+        por_dia.c.funcionario_id, por_dia.c.data, literal('impares').label('tipo'),
+        literal(ETAPA_IMPARES).label('etapa'), literal(0).label('pos'),
+        literal(None, Integer).label('id_a'), literal(None, Integer).label('id_b'),
+        literal(None, db.String).label('hora_a'), literal(None, db.String).label('hora_b'),
+        literal(None, db.String).label('tipo_a'), literal(None, db.String).label('tipo_b'),
+        por_dia.c.n.label('valor'),
+    ).where(por_dia.c.n % 2 == 1)
+
+    total = _minutos(por_dia.c.h_fim) - _minutos(por_dia.c.h_ini)
+    longa = select(
+        por_dia.c.funcionario_id, por_dia.c.data, literal('longa'), literal(ETAPA_LONGA), literal(0),
+        literal(None, Integer), literal(None, Integer), por_dia.c.h_ini, por_dia.c.h_fim,
+        literal(None, db.String), literal(None, db.String), total,
+    ).where(por_dia.c.n >= 2, total > LIMIAR_LONGA_HORAS * 60)
+
+    # Batida × anterior no dia (LAG) e posição entre as do mesmo tipo (ROW_NUMBER)
+    janela = dict(partition_by=dia, order_by=b.c.hora)
+    w = select(
+        b.c.id, b.c.funcionario_id, b.c.data, b.c.hora, b.c.tipo, b.c.minuto,
+        func.row_number().over(**janela).label('pos'),
+        func.lag(b.c.id).over(**janela).label('ant_id'),
+        func.lag(b.c.hora).over(**janela).label('ant_hora'),
+        func.lag(b.c.tipo).over(**janela).label('ant_tipo'),
+        func.lag(b.c.minuto).over(**janela).label('ant_minuto'),
+        func.row_number().over(partition_by=(*dia, b.c.tipo), order_by=b.c.hora).label('k'),
+    ).subquery('w')
+
+    diff_seq = w.c.minuto - w.c.ant_minuto
+    sequencia = select(
+        w.c.funcionario_id, w.c.data,
+        case((diff_seq <= LIMIAR_DUPLICATA_MIN, 'duplicata'), else_='invertida'),
+        literal(ETAPA_SEQUENCIA), w.c.pos,
+        w.c.ant_id, w.c.id, w.c.ant_hora, w.c.hora, w.c.ant_tipo, w.c.tipo, diff_seq,
+    ).where(
+        w.c.ant_id.isnot(None), w.c.minuto.isnot(None), w.c.ant_minuto.isnot(None),
+        coalesce(w.c.tipo, '') == coalesce(w.c.ant_tipo, ''),
+    )
+
+    # k-ésima Entrada com a k-ésima Saída
+    e, s = w.alias('e'), w.alias('s')
+    diff_par = s.c.minuto - e.c.minuto
+    pares = select(
+        e.c.funcionario_id, e.c.data,
+        case((diff_par < 0, 'invertida'), else_='curta'),
+        literal(ETAPA_PAR), e.c.k,
+        e.c.id, s.c.id, e.c.hora, s.c.hora, e.c.tipo, s.c.tipo, diff_par,
+    ).select_from(
+        e.join(s, and_(s.c.funcionario_id == e.c.funcionario_id, s.c.data == e.c.data,
+                       s.c.k == e.c.k, s.c.tipo == 'Saida'))
+    ).where(
+        e.c.tipo == 'Entrada', e.c.minuto.isnot(None), s.c.minuto.isnot(None),
+        or_(diff_par < 0, and_(diff_par > 0, diff_par < LIMIAR_CURTA_MIN)),
+    )
+
+    return union_all(impares, sequencia, pares, longa).subquery('achados')
+
+
+def achados_dos_dias(data_inicio, data_fim, dias) -> list:
+    """Detecção (SQL) nos (funcionario_id, data) informados, na ordem de exibição."""
+    if not dias:
+        return []
+    a = _achados(_batidas(data_inicio, data_fim, dias=dias))
+    return db.session.execute(
+        select(a).order_by(a.c.funcionario_id, a.c.data, a.c.etapa, a.c.pos)
+    ).all()
+
+
+def descrever(a):
+    """Linha de achado → (tipo, severidade, descrição, ids das batidas).
+    ids = None em ímpares/longa (o dia inteiro / primeira e última)."""
+    if a.tipo == 'impares':
+        return ('impares', 'alta',
+                f'{a.valor} batida(s) no dia — número ímpar (entrada ou saída faltando)', None)
+    if a.tipo == 'longa':
+        return ('longa', 'baixa',
+                f'Período total muito longo: {a.hora_a} → '
+                f'{a.hora_b} ({a.valor // 60}h{a.valor % 60:02d}min)', None)
+    ids = [a.id_a, a.id_b]
+    if a.tipo == 'duplicata':
+        return ('duplicata', 'media',
+                f'Possível duplicata: {a.tipo_a} {a.hora_a} '
+                f'e {a.tipo_b} {a.hora_b} ({a.valor} min de diferença)', ids)
+    if a.tipo == 'curta':
+        return ('curta', 'media', f'Turno muito curto: {a.hora_a} → {a.hora_b} ({a.valor} min)', ids)
+    if a.etapa == ETAPA_PAR:
+        return ('invertida', 'alta', f'Saída ({a.hora_b}) antes da Entrada ({a.hora_a})', ids)
+    return ('invertida', 'media',
+            f'Sequência suspeita: {a.tipo_a} {a.hora_a} seguido de {a.tipo_b} {a.hora_b}', ids)
+
+
+# ── Achados persistidos ───────────────────────────────────────────────────────
+
+def reavaliar_dias(dias, usuario_id=None, resolucao: str = 'sync') -> dict:
+    """Reavalia os (funcionario_id, data) e sincroniza batida_inconsistencias
+    e Batida.inconsistente. Não faz commit — entra na transação de quem chamou
+    (sync de batidas, edição/inclusão/exclusão de batida). Dias de funcionários
+    inativos ficam como estão: a detecção só olha os ativos, e os achados deles
+    não devem ser dados como resolvidos por isso."""
+    dias = sorted(set(dias))
+    res = {'dias': len(dias), 'novas': 0, 'resolvidas': 0, 'abertas': 0}
+    for k in range(0, len(dias), _LOTE_DIAS):
+        _reavaliar_lote(dias[k:k + _LOTE_DIAS], usuario_id, resolucao, res)
+    return res
+
+
+def _chave(func_id, data_ref, tipo, ids):
+    """Identidade do achado entre reavaliações: os pares pelas batidas envolvidas;
+    ímpares e longa são do dia (as batidas mudam sem o problema sumir)."""
+    return (func_id, data_ref, tipo, () if tipo in ('impares', 'longa') else tuple(ids))
+
+
+def _reavaliar_lote(lote, usuario_id, resolucao, res):
+    ativos = {fid for fid, in db.session.query(Funcionario.id).filter(
+        Funcionario.id.in_({fid for fid, _ in lote}), Funcionario.ativo == True)}
+    lote = [(fid, d) for fid, d in lote if fid in ativos]
+    if not lote:
+        return
+    chave_dia = tuple_(Batida.funcionario_id, Batida.data).in_(lote)
+    ids_dia: dict[tuple, list] = {}
+    for bid, fid, d in (db.session.query(Batida.id, Batida.funcionario_id, Batida.data)
+                        .filter(chave_dia).order_by(Batida.hora)):
+        ids_dia.setdefault((fid, d), []).append(bid)
+
+    detectados = {}
+    ini, fim = min(d for _, d in lote), max(d for _, d in lote)
+    for a in achados_dos_dias(ini, fim, lote):
+        tipo, severidade, descricao, ids = descrever(a)
+        if ids is None:
+            todos = ids_dia.get((a.funcionario_id, a.data), [])
+            ids = todos if tipo == 'impares' else todos[:1] + todos[-1:]
+        detectados[_chave(a.funcionario_id, a.data, tipo, ids)] = \
+            (severidade, a.etapa * 1000 + a.pos, descricao, ids)
+
+    agora = datetime.utcnow()
+    abertas_ids = set()
+    for inc in BatidaInconsistencia.query.filter(
+        BatidaInconsistencia.aberta == True,
+        tuple_(BatidaInconsistencia.funcionario_id, BatidaInconsistencia.data).in_(lote),
+    ):
+        atual = detectados.pop(_chave(inc.funcionario_id, inc.data, inc.tipo, inc.batida_ids), None)
+        if atual is None:
+            inc.aberta = False
+            inc.resolvido_em = agora
+            inc.resolvido_por = usuario_id
+            inc.resolucao = resolucao
+            res['resolvidas'] += 1
+            continue
+        inc.severidade, inc.ordem, inc.descricao, ids = atual
+        if ids != inc.batida_ids:
+            inc.batida_ids_json = json.dumps(ids)
+        abertas_ids.update(ids)
+        res['abertas'] += 1
+
+    for (fid, d, tipo, _), (severidade, ordem, descricao, ids) in detectados.items():
+        db.session.add(BatidaInconsistencia(
+            funcionario_id=fid, data=d, tipo=tipo, severidade=severidade, ordem=ordem,
+            descricao=descricao, batida_ids_json=json.dumps(list(ids)), detectado_em=agora,
+        ))
+        abertas_ids.update(ids)
+        res['novas'] += 1
+        res['abertas'] += 1
+
+    # Batida.inconsistente = participa de algum achado aberto
+    todas = [bid for ids in ids_dia.values() for bid in ids]
+    ok = [bid for bid in todas if bid not in abertas_ids]
+    for valor, ids in ((False, ok), (True, sorted(abertas_ids))):
+        if ids:
+            db.session.execute(
+                update(Batida).where(Batida.id.in_(ids), Batida.inconsistente.isnot(valor))
+                .values(inconsistente=valor).execution_options(synchronize_session=False)
+            )
+
+
+def reprocessar_periodo(data_inicio, data_fim, bloco_dias: int = 31) -> dict:
+    """Reavalia todos os dias com batida em [data_inicio, data_fim] (carga
+    inicial / recálculo). Faz commit a cada bloco."""
+    total = {'dias': 0, 'novas': 0, 'resolvidas': 0, 'abertas': 0}
+    ini = data_inicio
+    while ini <= data_fim:
+        fim = min(data_fim, ini + timedelta(days=bloco_dias - 1))
+        dias = [tuple(r) for r in (
+            db.session.query(Batida.funcionario_id, Batida.data)
+            .filter(Batida.data.between(ini, fim))
+            .group_by(Batida.funcionario_id, Batida.data)
+        )]
+        # Dias que ficaram sem batida também podem ter achados abertos
+        dias += [tuple(r) for r in (
+            db.session.query(BatidaInconsistencia.funcionario_id, BatidaInconsistencia.data)
+            .filter(BatidaInconsistencia.aberta == True, BatidaInconsistencia.data.between(ini, fim))
+            .distinct()
+        )]
+        for chave, n in reavaliar_dias(dias, resolucao='sync').items():
+            total[chave] += n
+        db.session.commit()
+        ini = fim + timedelta(days=1)
+    return total
+
+
+# ── Leitura ───────────────────────────────────────────────────────────────────
+
+def _escopo(q, dept=None, func_id=None):
+    if func_id:
+        return q.where(BatidaInconsistencia.funcionario_id == func_id)
+    if dept:
+        from services.facetas import filtrar_departamento
+        return filtrar_departamento(q, dept)
+    return q
+
+
+def contar_dias(data_inicio, data_fim, dept=None, func_id=None) -> int:
+    """(funcionário, dia) com ao menos uma batida no escopo."""
+    b = _batidas(data_inicio, data_fim, dept, func_id)
+    dias = select(b.c.funcionario_id, b.c.data).group_by(b.c.funcionario_id, b.c.data).subquery()
+    return db.session.execute(select(func.count()).select_from(dias)).scalar() or 0
+
+
+def contar_resolvidas(data_inicio, data_fim, dept=None, func_id=None) -> int:
+    I = BatidaInconsistencia
+    q = (select(func.count(I.id))
+         .join(Funcionario, Funcionario.id == I.funcionario_id)
+         .where(I.aberta == False, I.data >= data_inicio, I.data <= data_fim, Funcionario.ativo == True))
+    return db.session.execute(_escopo(q, dept, func_id)).scalar() or 0
+
+
+def pagina_dias(data_inicio, data_fim, dept=None, func_id=None,
+                ordem='data', decrescente=False, pagina=1, por_pagina=50):
+    """Dias com inconsistência aberta, uma página. Retorna (total, [linha]) com
+    linha = (funcionario_id, data, nome, departamento, problemas)."""
+    I = BatidaInconsistencia
+    n = func.count(I.id).label('problemas')
+    agrupado = _escopo(
+        select(I.funcionario_id, I.data, Funcionario.nome, Funcionario.departamento, n,
+               func.count().over().label('total'))
+        .join(Funcionario, Funcionario.id == I.funcionario_id)
+        .where(I.aberta == True, I.data >= data_inicio, I.data <= data_fim, Funcionario.ativo == True),
+        dept, func_id,
+    ).group_by(I.funcionario_id, I.data, Funcionario.nome, Funcionario.departamento)
+    chaves = {
+        'data':         [I.data, I.funcionario_id],
+        'nome':         [Funcionario.nome, I.data],
+        'departamento': [Funcionario.departamento, Funcionario.nome, I.data],
+        'problemas':    [n, I.data, I.funcionario_id],
+    }[ordem if ordem in ORDENS else 'data']
+    if decrescente:
+        chaves = [c.desc() for c in chaves]
+    linhas = db.session.execute(
+        agrupado.order_by(*chaves).limit(por_pagina).offset((pagina - 1) * por_pagina)
+    ).all()
+    total = linhas[0].total if linhas else (
+        0 if pagina == 1 else db.session.execute(select(func.count()).select_from(agrupado.subquery())).scalar()
+    )
+    return total, [tuple(l[:5]) for l in linhas]
+
+
+def inconsistencias_dos_dias(dias) -> list:
+    """Achados abertos dos (funcionario_id, data) informados, na ordem de exibição."""
+    if not dias:
+        return []
+    I = BatidaInconsistencia
+    return (I.query
+            .filter(I.aberta == True, tuple_(I.funcionario_id, I.data).in_(dias))
+            .order_by(I.funcionario_id, I.data, I.ordem)
+            .all())
+
+
+def abertas_por_funcionario(data_ref) -> dict:
+    """{funcionario_id: inconsistências abertas no dia}."""
+    I = BatidaInconsistencia
+    return dict(
+        db.session.query(I.funcionario_id, func.count(I.id))
+        .filter(I.aberta == True, I.data == data_ref)
+        .group_by(I.funcionario_id)
+    )
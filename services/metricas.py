@@ -0,0 +1,308 @@
+"""
+Métricas no formato Prometheus (GET /metrics).
+
+- sync          : duração e resultado de cada sync (funcionarios, horarios,
+                  batidas), registros recebidos e batidas novas por execução
+                  (histograma; o _sum dá o total);
+                  atraso desde a última sync de batidas bem-sucedida (marca
+                  d'água em Configuracao, lida na hora da coleta);
+                  eventos de batidas pendentes por consumidor.
+- API Secullum  : latência e erros por operação (token, funcionarios,
+                  horarios, batidas).
+- Celery        : duração por task e espera na fila (publicação → início).
+- HTTP          : histograma de latência por endpoint (blueprint.view).
+- Banco         : espera no checkout do pool (PoolMedido) e ocupação do pool.
+- WhatsApp      : latência e falhas dos envios da Mega-API.
+
+Com vários processos (gunicorn, worker Celery), cada processo grava seus
+valores em PROMETHEUS_MULTIPROC_DIR (modo multiprocess do prometheus_client)
+e o /metrics soma os arquivos de todos os diretórios em METRICAS_DIRS (por
+padrão, só o próprio). O diretório é criado junto com as primeiras métricas
+do processo e só pode ser limpo antes delas: o gunicorn.conf.py o limpa no
+master, antes de os workers importarem o app; o worker Celery, no comando do
+container, antes de subir (o `celery -A app.celery_app` já cria as métricas ao
+importar o app). Os processos que morrem são marcados (gunicorn e Celery).
+
+Sem o pacote prometheus_client as funções de observação não fazem nada e o
+/metrics não é registrado.
+"""
+import glob
+import logging
+import os
+import shutil
+import time as _time
+from contextlib import contextmanager
+
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger('metricas')
+
+_BUCKETS_HTTP = (.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+_BUCKETS_SYNC = (.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+_BUCKETS_REGISTROS = (0, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+_BUCKETS_POOL = (.001, .005, .01, .05, .1, .5, 1, 5, 30)
+
+_m = None            # métricas criadas (namespace) ou False se indisponível
+
+
+def _metricas():
+    """Cria as métricas na primeira chamada; None sem prometheus_client."""
+    global _m
+    if _m is None:
+        try:
+            from prometheus_client import Counter, Histogram
+        except ImportError:
+            _m = False
+            return None
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            # Em multiprocess cada métrica já abre seu arquivo no diretório
+            os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+        class _M:
+            pass
+        m = _M()
+        m.sync_duracao = Histogram('secullum_sync_duracao_segundos', 'Duração de cada sync',
+                                   ['tipo', 'status'], buckets=_BUCKETS_SYNC)
+        m.sync_registros = Histogram('secullum_sync_registros', 'Registros por execução do sync',
+                                     ['tipo'], buckets=_BUCKETS_REGISTROS)
+        m.api_duracao = Histogram('secullum_api_duracao_segundos', 'Latência das chamadas à API Secullum',
+                                  ['operacao'], buckets=_BUCKETS_HTTP)
+        m.api_erros = Counter('secullum_api_erros', 'Chamadas à API Secullum com erro',
+                              ['operacao', 'motivo'])
+        m.task_duracao = Histogram('celery_task_duracao_segundos', 'Duração das tasks Celery',
+                                   ['task', 'status'], buckets=_BUCKETS_SYNC)
+        m.task_espera = Histogram('celery_task_espera_segundos', 'Tempo na fila (publicação → início)',
+                                  ['task'], buckets=_BUCKETS_SYNC)
+        m.http_duracao = Histogram('http_requisicao_duracao_segundos', 'Latência das requisições HTTP',
+                                   ['endpoint', 'metodo', 'status'], buckets=_BUCKETS_HTTP)
+        m.pool_espera = Histogram('db_pool_checkout_espera_segundos', 'Espera por conexão do pool',
+                                  buckets=_BUCKETS_POOL)
+        m.whatsapp_duracao = Histogram('whatsapp_envio_duracao_segundos', 'Latência dos envios WhatsApp',
+                                       ['operacao'], buckets=_BUCKETS_HTTP)
+        m.whatsapp_envios = Counter('whatsapp_envios', 'Envios WhatsApp por resultado',
+                                    ['operacao', 'tipo', 'status'])
+        _m = m
+    return _m or None
+
+
+# ── Observação ────────────────────────────────────────────────────────────────
+
+class _Chamada:
+    """Resultado de uma chamada externa: quem mede preenche `status` (HTTP)."""
+    status = None
+
+    @property
+    def ok(self):
+        return self.status is not None and 200 <= self.status < 300
+
+
+@contextmanager
+def medir_api(operacao: str):
+    """with medir_api('batidas') as c: r = requests.get(...); c.status = r.status_code"""
+    c = _Chamada()
+    t0 = _time.perf_counter()
+    try:
+        yield c
+    except Exception:
+        _observar_api(operacao, _time.perf_counter() - t0, 'excecao')
+        raise
+    _observar_api(operacao, _time.perf_counter() - t0, None if c.ok else f'http_{c.status}')
+
+
+def _observar_api(operacao, segundos, motivo):
+    m = _metricas()
+    if not m:
+        return
+    m.api_duracao.labels(operacao).observe(segundos)
+    if motivo:
+        m.api_erros.labels(operacao, motivo).inc()
+
+
+@contextmanager
+def medir_whatsapp(operacao: str, tipo: str):
+    """Como medir_api, para a Mega-API; conta envios por status (ok/erro/excecao)."""
+    c = _Chamada()
+    t0 = _time.perf_counter()
+    status = 'excecao'
+    try:
+        yield c
+        status = 'ok' if c.ok else 'erro'
+    finally:
+        m = _metricas()
+        if m:
+            m.whatsapp_duracao.labels(operacao).observe(_time.perf_counter() - t0)
+            m.whatsapp_envios.labels(operacao, tipo or '', status).inc()
+
+
+def observar_sync(tipo: str, status: str, segundos: float, registros: int = 0, novos: int = 0):
+    """Uma execução de sync (chamado por services/sync_runs.execucao_sync)."""
+    m = _metricas()
+    if not m:
+        return
+    m.sync_duracao.labels(tipo, status).observe(segundos)
+    m.sync_registros.labels(tipo).observe(registros)
+    if tipo == 'batidas':
+        m.sync_registros.labels('batidas_novas').observe(novos)
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mede a espera no checkout (poolclass do engine)."""
+
+    def _do_get(self):
+        t0 = _time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            m = _metricas()
+            if m:
+                m.pool_espera.observe(_time.perf_counter() - t0)
+
+
+# ── Multiprocess ──────────────────────────────────────────────────────────────
+
+def _dirs() -> list:
+    extras = [d.strip() for d in os.getenv('METRICAS_DIRS', '').split(',') if d.strip()]
+    proprio = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    return extras or ([proprio] if proprio else [])
+
+
+def limpar_diretorio():
+    """Apaga os valores do diretório multiprocess deste serviço. Só na subida,
+    antes de qualquer processo do serviço criar as métricas."""
+    d = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if not d:
+        return
+    shutil.rmtree(d, ignore_errors=True)
+    os.makedirs(d, exist_ok=True)
+
+
+def processo_encerrado(pid: int):
+    """Descarta os gauges 'live' de um processo que morreu."""
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+    except ImportError:
+        pass
+
+
+class _ColetorMultiprocess:
+    """Soma os arquivos .db de todos os diretórios (web + worker)."""
+
+    def collect(self):
+        from prometheus_client.multiprocess import MultiProcessCollector
+        arquivos = [f for d in _dirs() for f in glob.glob(os.path.join(d, '*.db'))]
+        return MultiProcessCollector.merge(arquivos, accumulate=True)
+
+
+class _ColetorEstado:
+    """Valores lidos na hora da coleta: atraso do sync, eventos pendentes e
+    ocupação do pool."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+        from extensions import db
+        from services.eventos_batidas import pendentes as eventos_pendentes
+        from services.sync_service import get_ultima_sync_batidas
+        with self.app.app_context():
+            try:
+                ultima = get_ultima_sync_batidas()
+                pendentes = eventos_pendentes()
+            except Exception:
+                db.session.rollback()
+                ultima, pendentes = None, {}
+            finally:
+                db.session.remove()
+            pool = db.engine.pool
+        g = GaugeMetricFamily('secullum_sync_atraso_segundos',
+                              'Segundos desde a marca d\'água da última sync de batidas bem-sucedida')
+        if ultima:
+            g.add_metric([], max(0.0, _time.time() - ultima.timestamp()))
+        yield g
+        p = GaugeMetricFamily('eventos_batidas_pendentes', 'Eventos de batidas ainda não tratados',
+                              labels=['consumidor'])
+        for nome, n in pendentes.items():
+            p.add_metric([nome], n)
+        yield p
+        if isinstance(pool, QueuePool):
+            yield GaugeMetricFamily('db_pool_conexoes_em_uso', 'Conexões em uso (processo do /metrics)',
+                                    value=pool.checkedout())
+            yield GaugeMetricFamily('db_pool_tamanho', 'Tamanho do pool (processo do /metrics)',
+                                    value=pool.size())
+
+
+# ── Integração com Flask / Celery ─────────────────────────────────────────────
+
+def init_metricas(app):
+    """Registra /metrics, a latência por endpoint e os sinais do Celery."""
+    if not app.config.get('METRICAS', True) or not _metricas():
+        if app.config.get('METRICAS', True):
+            logger.warning('[metricas] prometheus_client não instalado: /metrics desativado.')
+        return
+    from flask import Response, abort, g, request
+
+    token = app.config.get('METRICAS_TOKEN') or ''
+
+    @app.before_request
+    def _metricas_inicio():
+        g._metricas_t0 = _time.perf_counter()
+
+    @app.after_request
+    def _metricas_http(response):
+        t0 = g.pop('_metricas_t0', None)
+        if t0 is not None and request.endpoint != 'metricas':
+            _m.http_duracao.labels(request.endpoint or 'nao_encontrado', request.method,
+                                   str(response.status_code)).observe(_time.perf_counter() - t0)
+        return response
+
+    def metricas():
+        from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+        if _dirs():
+            registro = CollectorRegistry()
+            registro.register(_ColetorMultiprocess())
+        else:
+            registro = REGISTRY
+        saida = generate_latest(registro)
+        estado = CollectorRegistry()
+        estado.register(_ColetorEstado(app))
+        return Response(saida + generate_latest(estado), mimetype=CONTENT_TYPE_LATEST)
+
+    app.add_url_rule('/metrics', 'metricas', metricas)
+    _init_celery()
+
+
+def _init_celery():
+    try:
+        from celery.signals import before_task_publish, task_postrun, task_prerun, worker_process_shutdown
+    except ImportError:
+        return
+    inicio = {}
+
+    @before_task_publish.connect(weak=False)
+    def _publicada(headers=None, **kwargs):
+        if headers is not None:
+            headers['publicado_em'] = _time.time()
+
+    @task_prerun.connect(weak=False)
+    def _task_inicio(task_id=None, task=None, **kwargs):
+        inicio[task_id] = _time.perf_counter()
+        publicado = getattr(task.request, 'publicado_em', None) if task else None
+        if publicado:
+            _m.task_espera.labels(task.name).observe(max(0.0, _time.time() - float(publicado)))
+
+    @task_postrun.connect(weak=False)
+    def _task_fim(task_id=None, task=None, state=None, **kwargs):
+        t0 = inicio.pop(task_id, None)
+        if t0 is not None:
+            _m.task_duracao.labels(getattr(task, 'name', '') or 'task',
+                                   (state or '').lower()).observe(_time.perf_counter() - t0)
+
+    @worker_process_shutdown.connect(weak=False)
+    def _worker_fim(pid=None, **kwargs):
+        processo_encerrado(pid or os.getpid())
@@ -179,3 +179,210 @@ def validar_alocacao(func_id: str, data: 'date', turno: Turno) -> list[dict]:
         infracoes.append(erro)
 
     return infracoes
+
+
+# ── Validação em lote (memória) ───────────────────────────────────────────────
+# Mesmas regras de validar_alocacao, mas com as alocações vizinhas carregadas
+# uma única vez. `escala` = {func_id: {data: Turno}} com as AlocacaoDiaria
+# que servem de contexto (dia anterior/seguinte, semana, janela do DSR).
+
+def carregar_escala(func_ids, data_ini: 'date', data_fim: 'date') -> dict:
+    """Carrega as alocações do intervalo (com turno) em uma query: {func_id: {data: Turno}}."""
+    from sqlalchemy.orm import joinedload
+    escala: dict = {}
+    func_ids = list(func_ids)
+    if not func_ids:
+        return escala
+    alocacoes = (
+        AlocacaoDiaria.query
+        .options(joinedload(AlocacaoDiaria.turno))
+        .filter(
+            AlocacaoDiaria.funcionario_id.in_(func_ids),
+            AlocacaoDiaria.data >= data_ini,
+            AlocacaoDiaria.data <= data_fim,
+        )
+        .all()
+    )
+    for a in alocacoes:
+        escala.setdefault(a.funcionario_id, {})[a.data] = a.turno
+    return escala
+
+
+def carregar_escala_efetiva(func_ids, data_ini: 'date', data_fim: 'date') -> dict:
+    """Como carregar_escala, mas com a escala efetiva (exceção ou horário base —
+    services/escala_efetiva): {func_id: {data: Turno}} dos dias trabalhados."""
+    from services.escala_efetiva import resolver
+    return escala_de_efetivos(resolver(func_ids, data_ini, data_fim))
+
+
+def escala_de_efetivos(efetivos: dict) -> dict:
+    """{(func_id, data): TurnoEfetivo} do resolver → {func_id: {data: Turno}}."""
+    escala: dict = {}
+    for (fid, d), cel in efetivos.items():
+        escala.setdefault(fid, {})[d] = cel.turno
+    return escala
+
+
+class _MemoTurno:
+    """Cache de horários/durações por (turno, dia da semana) durante um lote."""
+
+    def __init__(self):
+        self._horario = {}
+        self._duracao = {}
+        self._intra = {}
+
+    def horario(self, turno, data):
+        k = (turno.id, data.weekday())
+        if k not in self._horario:
+            self._horario[k] = turno.get_horario_dia(data.weekday())
+        return self._horario[k]
+
+    def duracao(self, turno, data):
+        k = (turno.id, data.weekday())
+        if k not in self._duracao:
+            self._duracao[k] = turno.duracao_horas_no_dia(data)
+        return self._duracao[k]
+
+    def intrajornada(self, turno, data):
+        k = (turno.id, data.weekday())
+        if k not in self._intra:
+            self._intra[k] = validar_intrajornada(turno, data)
+        return self._intra[k]
+
+    def fim(self, turno, data):
+        h_ini, h_fim, _ = self.horario(turno, data)
+        fim = _combine(data, h_fim)
+        if h_fim < h_ini:
+            fim += timedelta(days=1)
+        return fim
+
+    def inicio(self, turno, data):
+        return _combine(data, self.horario(turno, data)[0])
+
+
+def validar_alocacao_escala(func_id: str, data: 'date', turno: Turno, escala: dict,
+                            func=None, memo: _MemoTurno = None, dias_bits=None) -> list[dict]:
+    """validar_alocacao usando `escala` em memória no lugar de consultas ao banco.
+    dias_bits: (dsr, domingo_anterior) já calculados em lote pelo EscalaBits."""
+    memo = memo or _MemoTurno()
+    dias = escala.get(func_id, {})
+    infracoes = []
+
+    erro = memo.intrajornada(turno, data)
+    if erro:
+        infracoes.append(erro)
+
+    # Interjornada (art. 66)
+    dia_anterior = data - timedelta(days=1)
+    dia_seguinte = data + timedelta(days=1)
+    erro = None
+    t_ant = dias.get(dia_anterior)
+    if t_ant is not None:
+        intervalo = (memo.inicio(turno, data) - memo.fim(t_ant, dia_anterior)).total_seconds() / 3600
+        if intervalo < 11:
+            erro = {
+                'error': 'INTERJORNADA',
+                'message': f'Intervalo de {intervalo:.1f}h com ontem é inferior a 11h.',
+                'horas_encontradas': round(intervalo, 1),
+            }
+    t_seg = dias.get(dia_seguinte)
+    if erro is None and t_seg is not None:
+        intervalo = (memo.inicio(t_seg, dia_seguinte) - memo.fim(turno, data)).total_seconds() / 3600
+        if intervalo < 11:
+            erro = {
+                'error': 'INTERJORNADA',
+                'message': f'Intervalo de {intervalo:.1f}h com amanhã é inferior a 11h.',
+                'horas_encontradas': round(intervalo, 1),
+            }
+    if erro:
+        infracoes.append(erro)
+
+    # Carga semanal (art. 58)
+    inicio_semana = data - timedelta(days=data.weekday())
+    total_horas = memo.duracao(turno, data)
+    for i in range(7):
+        d = inicio_semana + timedelta(days=i)
+        if d != data and d in dias:
+            total_horas += memo.duracao(dias[d], d)
+    if total_horas > 44:
+        infracoes.append({
+            'error': 'CARGA_SEMANAL',
+            'message': f'Carga semanal de {total_horas:.1f}h excede o limite de 44h (CLT art. 58).',
+            'horas_encontradas': round(total_horas, 1),
+        })
+
+    # DSR (art. 67): alocações existentes em [data-6, data]
+    if dias_bits is not None:
+        dsr, domingo_anterior_trabalhado = dias_bits
+    else:
+        dsr = sum(1 for i in range(7) if (data - timedelta(days=i)) in dias) >= 6
+        domingo_anterior_trabalhado = (data - timedelta(days=7)) in dias
+    if dsr:
+        infracoes.append({
+            'error': 'DSR',
+            'message': 'Funcionário escalado 7 dias consecutivos sem folga (CLT art. 67 – DSR).',
+        })
+
+    # Art. 386 – domingos consecutivos (mulheres)
+    if data.weekday() == 6 and func is not None and func.sexo == 'F':
+        domingo_anterior = data - timedelta(days=7)
+        if domingo_anterior_trabalhado:
+            infracoes.append({
+                'error': 'DOMINGO_CONSECUTIVO',
+                'message': (
+                    f'Art. 386 CLT: {func.nome} trabalhou no domingo anterior '
+                    f'({domingo_anterior.strftime("%d/%m")}). '
+                    'O revezamento quinzenal é obrigatório para mulheres.'
+                ),
+                'severity': 'warning',
+            })
+
+    return infracoes
+
+
+def validar_lote(itens, escala: dict = None, funcs: dict = None) -> dict:
+    """Valida várias alocações de uma vez.
+
+    itens: iterável de (func_id, data, turno). Um item que já está na escala é
+           validado como novo — sai dela durante a própria validação, como no
+           validar_plano e no sandbox.
+    escala: contexto {func_id: {data: Turno}}; se omitido é carregado do banco
+            (escala efetiva) cobrindo a janela necessária (semana + DSR + vizinhos).
+    funcs:  {func_id: Funcionario} para a regra do Art. 386; carregado se omitido.
+    Retorna {(func_id, data): [infrações]} apenas para itens com infração.
+    """
+    itens = list(itens)
+    if not itens:
+        return {}
+    func_ids = {fid for fid, _, _ in itens}
+    if escala is None:
+        d_min = min(d for _, d, _ in itens) - timedelta(days=7)
+        d_max = max(d for _, d, _ in itens) + timedelta(days=7)
+        escala = carregar_escala_efetiva(func_ids, d_min, d_max)
+    if funcs is None:
+        funcs = {f.id: f for f in Funcionario.query.filter(Funcionario.id.in_(list(func_ids))).all()}
+
+    # DSR e domingo anterior de todos os itens com operações de bits, quando a
+    # janela (7 dias de contexto + período) cabe em um uint64 por funcionário
+    from services.escala_bits import EscalaBits, JANELA_MAX
+    d_min = min(d for _, d, _ in itens)
+    dias = (max(d for _, d, _ in itens) - d_min).days + 8
+    regras = None
+    if dias <= JANELA_MAX:
+        bits = EscalaBits.de_escala(escala, d_min - timedelta(days=7), dias, sorted(func_ids))
+        dsr, dom = bits.regras_dia([bits.linha(fid) for fid, _, _ in itens], [d for _, d, _ in itens],
+                                   incluir_dia=False)
+        regras = list(zip(dsr.tolist(), dom.tolist()))
+
+    memo = _MemoTurno()
+    resultado = {}
+    for k, (fid, data, turno) in enumerate(itens):
+        dias = escala.setdefault(fid, {})
+        proprio = dias.pop(data, None)
+        infracoes = validar_alocacao_escala(fid, data, turno, escala, funcs.get(fid), memo,
+                                            regras[k] if regras else None)
+        if proprio is not None:
+            dias[data] = proprio
+        if infracoes:
+            resultado[(fid, data)] = infracoes
+    return resultado
@@ -3,17 +3,17 @@ Motor de processamento de regras de notificação WhatsApp (Fase 4).
 Avalia condições de negócio e despacha mensagens via whatsapp_bot.
 """
 import os
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 
 from extensions import db
-from models import NotificationRule, AlocacaoDiaria, Batida, Funcionario
+from models import NotificationRule, Batida, Funcionario, WhatsappLog
 
 GESTOR_CELULAR = os.getenv('GESTOR_CELULAR', '')
 
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
 
-def _render(template: str, func, minutos: int = 0, aloc=None, data_ref=None) -> str:
+def _render(template: str, func, minutos: int = 0, cel=None, data_ref=None) -> str:
     if not template:
         return ''
     partes = func.nome.split()
@@ -21,9 +21,9 @@ def _render(template: str, func, minutos: int = 0, aloc=None, data_ref=None) ->
         '{name}':      partes[0] if partes else func.nome,
         '{full_name}': func.nome,
         '{minutes}':   str(minutos),
-        '{turno}':     aloc.turno.nome if aloc else '',
-        '{inicio}':    aloc.turno.hora_inicio.strftime('%H:%M') if aloc else '',
-        '{fim}':       aloc.turno.hora_fim.strftime('%H:%M') if aloc else '',
+        '{turno}':     cel.turno.nome if cel else '',
+        '{inicio}':    cel.inicio.strftime('%H:%M') if cel else '',
+        '{fim}':       cel.fim.strftime('%H:%M') if cel else '',
         '{data}':      (data_ref or date.today()).strftime('%d/%m/%Y'),
     }
     for var, val in subs.items():
@@ -31,96 +31,132 @@ def _render(template: str, func, minutos: int = 0, aloc=None, data_ref=None) ->
     return template
 
 
-def _celular_gestor(func) -> str:
-    if func and func.departamento:
-        from models import UnidadeLider
-        ul = UnidadeLider.query.filter_by(departamento=func.departamento).first()
-        if ul and ul.celular_lider:
-            return ul.celular_lider
-    return GESTOR_CELULAR
+def _lideres() -> dict:
+    """{departamento: celular do líder} (o primeiro cadastrado de cada unidade)."""
+    from models import UnidadeLider
+    lideres = {}
+    for dept, celular in (db.session.query(UnidadeLider.departamento, UnidadeLider.celular_lider)
+                          .order_by(UnidadeLider.id)):
+        lideres.setdefault(dept, celular)
+    return lideres
 
 
-def _combine(d: date, t) -> datetime:
-    return datetime.combine(d, t)
+def _celular_gestor(func, lideres: dict) -> str:
+    if func and func.departamento and lideres.get(func.departamento):
+        return lideres[func.departamento]
+    return GESTOR_CELULAR
 
 
-def _parse_hora(hora_str: str, data_ref: date) -> datetime:
-    return datetime.strptime(hora_str[:5], '%H:%M').replace(
-        year=data_ref.year, month=data_ref.month, day=data_ref.day
+def _parse_hora(hora_str: str, cel) -> datetime:
+    """Batida como datetime no eixo do turno: em turno noturno, horas bem antes
+    do início (madrugada) são do dia seguinte."""
+    hora = datetime.strptime(hora_str[:5], '%H:%M').replace(
+        year=cel.data.year, month=cel.data.month, day=cel.data.day
     )
+    if cel.fim.date() > cel.data and hora < cel.inicio - timedelta(hours=6):
+        hora += timedelta(days=1)
+    return hora
 
 
 # ── Checadores de condição ─────────────────────────────────────────────────────
+# Recebem as batidas do funcionário no dia já no eixo do turno (ver _batidas_turno).
+
+def _horas_do_dia(data_ref: date, func_ids) -> dict:
+    """{func_id: [hora]} das batidas do dia dos funcionários (uma consulta)."""
+    horas = {}
+    for fid, hora in db.session.query(Batida.funcionario_id, Batida.hora).filter(Batida.data == data_ref):
+        if fid in func_ids:
+            horas.setdefault(fid, []).append(hora)
+    return horas
+
+
+def _batidas_turno(horas, cel) -> list[datetime]:
+    return sorted(_parse_hora(h, cel) for h in horas)
 
-def _checar_atraso(func_id, data_ref: date, aloc, threshold: int):
-    batidas = (Batida.query.filter_by(funcionario_id=func_id, data=data_ref)
-               .order_by(Batida.hora).all())
+
+def _checar_atraso(batidas, cel, threshold: int):
     if not batidas:
         return False, 0
-    primeira = _parse_hora(batidas[0].hora, data_ref)
-    ini_turno = _combine(data_ref, aloc.turno.hora_inicio)
-    diff = (primeira - ini_turno).total_seconds() / 60
+    diff = (batidas[0] - cel.inicio).total_seconds() / 60
     return (True, int(diff)) if diff > threshold else (False, 0)
 
 
-def _checar_hora_extra(func_id, data_ref: date, aloc, threshold: int):
-    batidas = (Batida.query.filter_by(funcionario_id=func_id, data=data_ref)
-               .order_by(Batida.hora).all())
+def _checar_hora_extra(batidas, cel, threshold: int):
     if len(batidas) < 2:
         return False, 0
-    ultima = _parse_hora(batidas[-1].hora, data_ref)
-    fim_turno = _combine(data_ref, aloc.turno.hora_fim)
-    diff = (ultima - fim_turno).total_seconds() / 60
+    diff = (batidas[-1] - cel.fim).total_seconds() / 60
     return (True, int(diff)) if diff > threshold else (False, 0)
 
 
-def _checar_antecipacao(func_id, data_ref: date, aloc, threshold: int):
-    batidas = (Batida.query.filter_by(funcionario_id=func_id, data=data_ref)
-               .order_by(Batida.hora).all())
+def _checar_antecipacao(batidas, cel, threshold: int):
     if len(batidas) < 2:
         return False, 0
-    ultima = _parse_hora(batidas[-1].hora, data_ref)
-    fim_turno = _combine(data_ref, aloc.turno.hora_fim)
-    diff = (fim_turno - ultima).total_seconds() / 60
+    diff = (cel.fim - batidas[-1]).total_seconds() / 60
     return (True, int(diff)) if diff > threshold else (False, 0)
 
 
-def _checar_ausencia(func_id, data_ref: date) -> bool:
-    return Batida.query.filter_by(funcionario_id=func_id, data=data_ref).count() == 0
+def _checar_interjornada(cel, vizinhos: dict) -> bool:
+    """Menos de 11h (CLT art. 66) entre o turno e o de ontem ou o de amanhã
+    na escala efetiva. vizinhos: {(func_id, data): TurnoEfetivo}."""
+    minimo = timedelta(hours=11)
+    ant = vizinhos.get((cel.funcionario_id, cel.data - timedelta(days=1)))
+    seg = vizinhos.get((cel.funcionario_id, cel.data + timedelta(days=1)))
+    return bool((ant and cel.inicio - ant.fim < minimo) or (seg and seg.inicio - cel.fim < minimo))
 
 
 # ── Envio ──────────────────────────────────────────────────────────────────────
 
-def _enviar(regra: NotificationRule, func, minutos: int, aloc, data_ref: date) -> int:
-    from services.whatsapp_bot import enviar_texto
+def _enviadas(func_ids) -> set:
+    """(func_id, celular, mensagem) das mensagens de regra enviadas sobre os
+    funcionários nas últimas 24 h."""
+    desde = datetime.utcnow() - timedelta(hours=24)
+    return set(db.session.query(WhatsappLog.funcionario_id, WhatsappLog.celular, WhatsappLog.mensagem).filter(
+        WhatsappLog.funcionario_id.in_(list(func_ids)), WhatsappLog.tipo == 'regra',
+        WhatsappLog.criado_em >= desde,
+    ))
+
+
+def _enviar(regra: NotificationRule, func, minutos: int, cel, data_ref: date,
+            lideres: dict, enviadas: set = None) -> int:
+    """Envia a regra aos destinatários. Com `enviadas` (reprocessamento do
+    mesmo dia pelos eventos), pula a mensagem já enviada ao mesmo celular."""
+    from services.whatsapp_bot import enviar_texto, _fone
     enviados = 0
 
+    def _mandar(template, celular):
+        msg = _render(template or '', func, minutos, cel, data_ref)
+        if not msg:
+            return 0
+        if enviadas is not None:
+            chave = (func.id, _fone(celular), msg)
+            if chave in enviadas:
+                return 0
+            enviadas.add(chave)
+        return 1 if enviar_texto(celular=celular, mensagem=msg, func_id=func.id, tipo='regra') else 0
+
     if regra.dest_employee and func.celular:
-        msg = _render(regra.template_employee or '', func, minutos, aloc, data_ref)
-        if msg and enviar_texto(celular=func.celular, mensagem=msg, func_id=func.id, tipo='regra'):
-            enviados += 1
+        enviados += _mandar(regra.template_employee, func.celular)
 
     if regra.dest_manager:
-        cel = _celular_gestor(func)
-        if cel:
-            msg = _render(regra.template_manager or '', func, minutos, aloc, data_ref)
-            if msg and enviar_texto(celular=cel, mensagem=msg, func_id=func.id, tipo='regra'):
-                enviados += 1
+        fone = _celular_gestor(func, lideres)
+        if fone:
+            enviados += _mandar(regra.template_manager, fone)
 
     if regra.dest_rh and GESTOR_CELULAR:
-        msg = _render(regra.template_manager or '', func, minutos, aloc, data_ref)
-        if msg and enviar_texto(celular=GESTOR_CELULAR, mensagem=msg, func_id=func.id, tipo='regra'):
-            enviados += 1
+        enviados += _mandar(regra.template_manager, GESTOR_CELULAR)
 
     return enviados
 
 
 # ── Processador principal ──────────────────────────────────────────────────────
 
-def processar_regras_evento(trigger_type: str, data_ref: date = None) -> dict:
+def processar_regras_evento(trigger_type: str, data_ref: date = None, func_ids=None) -> dict:
     """
     Avalia todas as regras ativas para o trigger dado.
     Chamado após sync de batidas ou manualmente.
+
+    `func_ids` limita a avaliação a esses funcionários (consumidor de eventos
+    de batidas, services/eventos_batidas) e não repete mensagem já enviada.
     """
     if data_ref is None:
         data_ref = date.today()
@@ -129,47 +165,60 @@ def processar_regras_evento(trigger_type: str, data_ref: date = None) -> dict:
     if not regras:
         return {'regras': 0, 'mensagens': 0}
 
-    alocacoes = (
-        AlocacaoDiaria.query
-        .filter_by(data=data_ref)
-        .join(Funcionario)
-        .filter(Funcionario.ativo == True)
-        .all()
-    )
+    # Escala efetiva do dia (exceção ou horário base) dos funcionários ativos
+    from services.escala_efetiva import escalados_no_dia
+    q_funcs = Funcionario.query.filter(Funcionario.ativo == True)
+    if func_ids is not None:
+        q_funcs = q_funcs.filter(Funcionario.id.in_(list(func_ids)))
+    funcs = {f.id: f for f in q_funcs}
+    escalados = escalados_no_dia(data_ref, funcs.keys())
 
     total = 0
-    now_t = datetime.now().time()
+    agora = datetime.combine(data_ref, datetime.now().time())
+    # Lidos uma vez para todos os funcionários, quando alguma regra pede
+    condicoes = {r.condition_type for r in regras}
+    horas = (_horas_do_dia(data_ref, escalados.keys())
+             if condicoes & {'LATE_ENTRY', 'OVERTIME', 'EARLY_LEAVE', 'ABSENCE'} else {})
+    vizinhos = {}
+    if 'INTERJORNADA' in condicoes:
+        from services.escala_efetiva import resolver
+        vizinhos = resolver(escalados.keys(), data_ref - timedelta(days=1), data_ref + timedelta(days=1))
+    inconsistencias = {}
+    if 'INCONSISTENCIA' in condicoes:
+        from services.inconsistencias_batidas import abertas_por_funcionario
+        inconsistencias = abertas_por_funcionario(data_ref)
+    lideres = _lideres() if any(r.dest_manager for r in regras) else {}
+    enviadas = _enviadas(escalados.keys()) if func_ids is not None else None
 
     for regra in regras:
         enviados_regra = 0
-        for aloc in alocacoes:
-            func = aloc.funcionario
-            if not func:
-                continue
+        for fid, cel in escalados.items():
+            func = funcs[fid]
 
             # Janela de expediente
             if regra.only_working_hours:
-                if not (aloc.turno.hora_inicio <= now_t <= aloc.turno.hora_fim):
+                if not (cel.inicio <= agora <= cel.fim):
                     continue
 
             threshold = regra.threshold_minutes or 15
             matched, minutos = False, 0
 
             if regra.condition_type == 'LATE_ENTRY':
-                matched, minutos = _checar_atraso(func.id, data_ref, aloc, threshold)
+                matched, minutos = _checar_atraso(_batidas_turno(horas.get(fid, ()), cel), cel, threshold)
             elif regra.condition_type == 'OVERTIME':
-                matched, minutos = _checar_hora_extra(func.id, data_ref, aloc, threshold)
+                matched, minutos = _checar_hora_extra(_batidas_turno(horas.get(fid, ()), cel), cel, threshold)
             elif regra.condition_type == 'EARLY_LEAVE':
-                matched, minutos = _checar_antecipacao(func.id, data_ref, aloc, threshold)
+                matched, minutos = _checar_antecipacao(_batidas_turno(horas.get(fid, ()), cel), cel, threshold)
             elif regra.condition_type == 'ABSENCE':
-                matched = _checar_ausencia(func.id, data_ref)
+                matched = fid not in horas
+            elif regra.condition_type == 'INCONSISTENCIA':
+                minutos = inconsistencias.get(fid, 0)
+                matched = minutos > 0
             elif regra.condition_type == 'INTERJORNADA':
-                from services.motor_clt import validar_interjornada
-                if validar_interjornada(func.id, data_ref, aloc.turno):
-                    matched = True
+                matched = _checar_interjornada(cel, vizinhos)
 
             if matched:
-                enviados_regra += _enviar(regra, func, minutos, aloc, data_ref)
+                enviados_regra += _enviar(regra, func, minutos, cel, data_ref, lideres, enviadas)
 
         if enviados_regra > 0:
             regra.mensagens_enviadas = (regra.mensagens_enviadas or 0) + enviados_regra
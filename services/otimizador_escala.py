@@ -0,0 +1,610 @@
+"""
+Otimizador de escala mensal – gera as AlocacaoDiaria de um mês para um
+departamento/função, respeitando as regras do motor_clt e buscando atender as
+metas de cobertura com a carga distribuída de forma equilibrada.
+
+Restrições rígidas (nunca violadas pelas células geradas):
+- turno válido no dia da semana (dias_semana) e com intrajornada ok (art. 71)
+- interjornada de 11h com o dia anterior e o seguinte (art. 66)
+- no máximo 44h na semana seg–dom (art. 58)
+- no máximo 6 dias seguidos de trabalho – DSR (art. 67)
+- mulheres não trabalham dois domingos seguidos (art. 386)
+
+Custo (minimizado):
+- PESO_FALTA por pessoa faltando em cada meta (faixa de CoberturaMinima no dia)
+- PESO_EXCESSO por pessoa além da meta
+- PESO_HORAS × horas² e PESO_DOMINGO × domingos² por funcionário (equilíbrio)
+
+A escala efetiva (horário base + exceções) entra como contexto: dias do horário
+base e exceções existentes ficam fixos (a não ser com `substituir=True`, que
+refaz as exceções do mês), assim como a semana antes e depois do mês.
+
+Busca local (simulated annealing) com reinícios, sob um tempo limite. Fora da
+web (bench, scripts) os reinícios podem rodar em paralelo num pool de
+processos; a rota /escalas/otimizar usa um processo só e um tempo curto, para
+não estourar o timeout do worker. O problema é montado em estruturas simples
+(listas) para ser enviado aos processos; o módulo só importa os models nas
+funções que acessam o banco.
+"""
+import math
+import os
+import random
+import time as _time
+from datetime import date, timedelta
+
+PESO_FALTA = 1000.0
+PESO_EXCESSO = 5.0
+PESO_HORAS = 0.05
+PESO_DOMINGO = 20.0
+
+INTERJORNADA_MIN = 11 * 60
+CARGA_SEMANAL_MAX = 44.0
+DIAS_SEGUIDOS_MAX = 6
+DIAS_CONTEXTO = 7
+
+
+class ProblemaEscala:
+    """Dados do mês já resolvidos em listas (sem ORM), indexados por posição.
+
+    - funcs:    [{'id', 'nome', 'funcao', 'sexo', 'departamento'}]
+    - datas:    [date] da semana anterior ao mês até a semana seguinte
+    - mes_ini, mes_fim: faixa [mes_ini, mes_fim) de colunas do mês
+    - turnos:   [{'id', 'nome'}]; ini/fim (minutos, fim > ini) e horas por dia da semana
+    - inicial:  turno de cada célula (-1 = folga); livre: célula que a busca pode mudar
+    - opcoes:   turnos permitidos por funcionário × dia da semana
+    - demandas: metas de cobertura (ver _demandas)
+    """
+
+    def __init__(self, funcs, datas, mes_ini, mes_fim, turnos, ini, fim, horas,
+                 inicial, livre, opcoes, demandas, substituidas):
+        self.funcs = funcs
+        self.datas = datas
+        self.mes_ini = mes_ini
+        self.mes_fim = mes_fim
+        self.turnos = turnos
+        self.ini = ini
+        self.fim = fim
+        # Linha extra (índice -1) = folga, para evitar testes no laço da busca
+        self.horas = horas + [[0.0] * 7]
+        self.inicial = inicial
+        self.livre = livre
+        self.opcoes = opcoes
+        self.demandas = demandas
+        self.substituidas = substituidas
+
+        self.wd = [d.weekday() for d in datas]
+        seg0 = datas[0] - timedelta(days=datas[0].weekday())
+        self.semana = [(d - seg0).days // 7 for d in datas]
+        self.n_semanas = self.semana[-1] + 1 if datas else 0
+        self.feminino = [f['sexo'] == 'F' for f in funcs]
+
+        # Demandas por funcionário e dia da semana (laço curto na avaliação)
+        self.dem_wd = [[[] for _ in range(7)] for _ in funcs]
+        for k, dem in enumerate(demandas):
+            for f in dem['membros']:
+                for wd in dem['dias_semana']:
+                    self.dem_wd[f][wd].append(k)
+
+
+# ── Busca local ───────────────────────────────────────────────────────────────
+
+def _penalidade(cobertos: int, minimo: int) -> float:
+    if cobertos < minimo:
+        return PESO_FALTA * (minimo - cobertos)
+    return PESO_EXCESSO * (cobertos - minimo)
+
+
+class _Busca:
+    """Estado de uma rodada de simulated annealing sobre um ProblemaEscala."""
+
+    def __init__(self, p: ProblemaEscala, rng: random.Random, grade=None):
+        self.p = p
+        self.rng = rng
+        n_f, n_c = len(p.funcs), len(p.datas)
+        self.X = [list(linha) for linha in (grade or p.inicial)]
+        self.cov = [[0] * n_c for _ in p.demandas]
+        self.h = [0.0] * n_f
+        self.dom = [0] * n_f
+        self.sem = [[0.0] * p.n_semanas for _ in range(n_f)]
+        for f in range(n_f):
+            for c in range(n_c):
+                if self.X[f][c] >= 0:
+                    self._contabilizar(f, c, self.X[f][c], 1)
+        self.livres = [(f, c) for f in range(n_f) for c in range(p.mes_ini, p.mes_fim)
+                       if p.livre[f][c] and p.opcoes[f][p.wd[c]]]
+        self.livres_col = {}
+        for f, c in self.livres:
+            self.livres_col.setdefault(c, []).append(f)
+        self.custo = self.custo_total()
+        self.melhor = [list(linha) for linha in self.X]
+        self.melhor_custo = self.custo
+        self.iteracoes = 0
+
+    # Contabilidade incremental
+
+    def _contabilizar(self, f, c, t, s):
+        p = self.p
+        wd = p.wd[c]
+        self.sem[f][p.semana[c]] += s * p.horas[t][wd]
+        if p.mes_ini <= c < p.mes_fim:
+            self.h[f] += s * p.horas[t][wd]
+            if wd == 6:
+                self.dom[f] += s
+        for k in p.dem_wd[f][wd]:
+            dem = p.demandas[k]
+            if dem['minimo'][c] and dem['mesmo'][t]:
+                self.cov[k][c] += s
+        if c + 1 < len(p.datas):
+            for k in p.dem_wd[f][p.wd[c + 1]]:
+                dem = p.demandas[k]
+                if dem['minimo'][c + 1] and dem['vespera'][t]:
+                    self.cov[k][c + 1] += s
+
+    def custo_total(self) -> float:
+        total = 0.0
+        for k, dem in enumerate(self.p.demandas):
+            for c, m in enumerate(dem['minimo']):
+                if m:
+                    total += _penalidade(self.cov[k][c], m)
+        total += PESO_HORAS * sum(x * x for x in self.h)
+        total += PESO_DOMINGO * sum(x * x for x in self.dom)
+        return total
+
+    def _delta(self, f, c, antigo, novo) -> float:
+        p = self.p
+        wd = p.wd[c]
+        d = 0.0
+        for k in p.dem_wd[f][wd]:
+            dem = p.demandas[k]
+            m = dem['minimo'][c]
+            if not m:
+                continue
+            a = dem['mesmo'][novo] - dem['mesmo'][antigo]
+            if a:
+                x = self.cov[k][c]
+                d += _penalidade(x + a, m) - _penalidade(x, m)
+        if c + 1 < len(p.datas):
+            for k in p.dem_wd[f][p.wd[c + 1]]:
+                dem = p.demandas[k]
+                m = dem['minimo'][c + 1]
+                if not m:
+                    continue
+                a = dem['vespera'][novo] - dem['vespera'][antigo]
+                if a:
+                    x = self.cov[k][c + 1]
+                    d += _penalidade(x + a, m) - _penalidade(x, m)
+        dh = p.horas[novo][wd] - p.horas[antigo][wd]
+        if dh:
+            h = self.h[f]
+            d += PESO_HORAS * ((h + dh) ** 2 - h * h)
+        if wd == 6 and (novo >= 0) != (antigo >= 0):
+            n = self.dom[f]
+            d += PESO_DOMINGO * ((n + (1 if novo >= 0 else -1)) ** 2 - n * n)
+        return d
+
+    def _viavel(self, f, c, t) -> bool:
+        """Restrições CLT para colocar o turno t na célula (f, c)."""
+        p = self.p
+        X = self.X[f]
+        wd = p.wd[c]
+        n_c = len(X)
+        if c > 0 and X[c - 1] >= 0:
+            if 1440 + p.ini[t][wd] - p.fim[X[c - 1]][p.wd[c - 1]] < INTERJORNADA_MIN:
+                return False
+        if c + 1 < n_c and X[c + 1] >= 0:
+            if 1440 + p.ini[X[c + 1]][p.wd[c + 1]] - p.fim[t][wd] < INTERJORNADA_MIN:
+                return False
+        if self.sem[f][p.semana[c]] - p.horas[X[c]][wd] + p.horas[t][wd] > CARGA_SEMANAL_MAX + 1e-9:
+            return False
+        seguidos = 1
+        i = c - 1
+        while i >= 0 and X[i] >= 0 and seguidos <= DIAS_SEGUIDOS_MAX:
+            seguidos += 1
+            i -= 1
+        i = c + 1
+        while i < n_c and X[i] >= 0 and seguidos <= DIAS_SEGUIDOS_MAX:
+            seguidos += 1
+            i += 1
+        if seguidos > DIAS_SEGUIDOS_MAX:
+            return False
+        if wd == 6 and p.feminino[f]:
+            if (c >= 7 and X[c - 7] >= 0) or (c + 7 < n_c and X[c + 7] >= 0):
+                return False
+        return True
+
+    def _trocar_celula(self, f, c, novo):
+        antigo = self.X[f][c]
+        if antigo >= 0:
+            self._contabilizar(f, c, antigo, -1)
+        self.X[f][c] = novo
+        if novo >= 0:
+            self._contabilizar(f, c, novo, 1)
+
+    def _aceita(self, delta, temperatura) -> bool:
+        return delta <= 0 or self.rng.random() < math.exp(-delta / temperatura)
+
+    # Construção inicial
+
+    def construir(self):
+        """Gulosa: percorre as metas em ordem aleatória preenchendo as faltas."""
+        p, rng = self.p, self.rng
+        celulas = [(k, c) for k, dem in enumerate(p.demandas)
+                   for c, m in enumerate(dem['minimo']) if m]
+        rng.shuffle(celulas)
+        for k, c in celulas:
+            dem = p.demandas[k]
+            if self.cov[k][c] >= dem['minimo'][c]:
+                continue
+            candidatos = [f for f in self.livres_col.get(c, ()) if f in dem['membros'] and self.X[f][c] < 0]
+            rng.shuffle(candidatos)
+            for f in candidatos:
+                opcoes = [t for t in p.opcoes[f][p.wd[c]] if dem['mesmo'][t] and self._viavel(f, c, t)]
+                if not opcoes:
+                    continue
+                self._trocar_celula(f, c, rng.choice(opcoes))
+                if self.cov[k][c] >= dem['minimo'][c]:
+                    break
+        self.custo = self.custo_total()
+        self.melhor = [list(linha) for linha in self.X]
+        self.melhor_custo = self.custo
+
+    # Movimentos
+
+    def _mover(self, temperatura):
+        """Muda o turno de uma célula (ou folga)."""
+        p, rng = self.p, self.rng
+        f, c = self.livres[rng.randrange(len(self.livres))]
+        antigo = self.X[f][c]
+        opcoes = p.opcoes[f][p.wd[c]]
+        novo = -1 if antigo >= 0 and rng.random() < 0.5 else opcoes[rng.randrange(len(opcoes))]
+        if novo == antigo or (novo >= 0 and not self._viavel(f, c, novo)):
+            return
+        delta = self._delta(f, c, antigo, novo)
+        if self._aceita(delta, temperatura):
+            self._trocar_celula(f, c, novo)
+            self.custo += delta
+
+    def _passar(self, temperatura):
+        """Passa o turno de um funcionário para outro de folga no mesmo dia."""
+        p, rng = self.p, self.rng
+        f1, c = self.livres[rng.randrange(len(self.livres))]
+        t = self.X[f1][c]
+        if t < 0:
+            return
+        pares = self.livres_col[c]
+        f2 = pares[rng.randrange(len(pares))]
+        if f2 == f1 or self.X[f2][c] >= 0 or t not in p.opcoes[f2][p.wd[c]]:
+            return
+        if not self._viavel(f2, c, t):
+            return
+        delta = self._delta(f1, c, t, -1)
+        self._trocar_celula(f1, c, -1)
+        delta += self._delta(f2, c, -1, t)
+        if self._aceita(delta, temperatura):
+            self._trocar_celula(f2, c, t)
+            self.custo += delta
+        else:
+            self._trocar_celula(f1, c, t)
+
+    def executar(self, tempo_limite: float, t_inicial: float = 200.0, t_final: float = 0.5):
+        if not self.livres:
+            return
+        inicio = _time.perf_counter()
+        temperatura = t_inicial
+        while True:
+            if self.iteracoes % 256 == 0:
+                decorrido = _time.perf_counter() - inicio
+                if decorrido >= tempo_limite:
+                    break
+                temperatura = t_inicial * (t_final / t_inicial) ** (decorrido / tempo_limite)
+                if self.custo < self.melhor_custo - 1e-6:
+                    self.melhor_custo = self.custo
+                    self.melhor = [list(linha) for linha in self.X]
+            self.iteracoes += 1
+            if self.rng.random() < 0.6:
+                self._mover(temperatura)
+            else:
+                self._passar(temperatura)
+        if self.custo < self.melhor_custo - 1e-6:
+            self.melhor_custo = self.custo
+            self.melhor = [list(linha) for linha in self.X]
+
+
+def _rodada(args):
+    """Uma rodada (processo do pool): construção gulosa + annealing."""
+    problema, semente, tempo_limite = args
+    busca = _Busca(problema, random.Random(semente))
+    busca.construir()
+    busca.executar(tempo_limite)
+    return busca.melhor_custo, busca.melhor, busca.iteracoes
+
+
+def avaliar(problema: ProblemaEscala, grade) -> dict:
+    """Faltas/excesso de cobertura e custo de uma grade."""
+    busca = _Busca(problema, None, grade)
+    faltas = excesso = 0
+    dias_descobertos = set()
+    for k, dem in enumerate(problema.demandas):
+        for c, m in enumerate(dem['minimo']):
+            if not m:
+                continue
+            x = busca.cov[k][c]
+            if x < m:
+                faltas += m - x
+                dias_descobertos.add(c)
+            else:
+                excesso += x - m
+    horas = [h for f, h in enumerate(busca.h) if any(problema.livre[f])]
+    return {
+        'custo':            round(busca.custo_total(), 1),
+        'faltas':           faltas,
+        'excesso':          excesso,
+        'dias_descobertos': len(dias_descobertos),
+        'horas_min':        round(min(horas), 1) if horas else 0,
+        'horas_max':        round(max(horas), 1) if horas else 0,
+    }
+
+
+def otimizar(problema: ProblemaEscala, tempo_limite: float = 20.0, reinicios: int = None,
+             processos: int = None, semente: int = None) -> dict:
+    """Roda `reinicios` buscas independentes (em paralelo quando processos > 1)
+    dentro de `tempo_limite` segundos e devolve a melhor grade.
+
+    Retorna dict com custo, faltas, excesso, alocacoes [(func_id, data, turno_id)]
+    das células livres trabalhadas, iteracoes, reinicios e tempo."""
+    inicio = _time.perf_counter()
+    processos = processos or min(4, os.cpu_count() or 1)
+    reinicios = reinicios or processos
+    semente = random.randrange(1 << 30) if semente is None else semente
+    rodadas = math.ceil(reinicios / max(processos, 1))
+    tarefas = [(problema, semente + i, tempo_limite / rodadas) for i in range(reinicios)]
+
+    if processos > 1 and reinicios > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # fork: os processos só calculam (não tocam no banco) e não precisam
+        # reimportar o app; onde não há fork, usa o padrão da plataforma
+        metodo = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=min(processos, reinicios),
+                                 mp_context=multiprocessing.get_context(metodo)) as pool:
+            resultados = list(pool.map(_rodada, tarefas))
+    else:
+        resultados = [_rodada(t) for t in tarefas]
+
+    custo, grade, _ = min(resultados, key=lambda r: r[0])
+    alocacoes = [
+        (problema.funcs[f]['id'], problema.datas[c], problema.turnos[grade[f][c]]['id'])
+        for f in range(len(problema.funcs))
+        for c in range(problema.mes_ini, problema.mes_fim)
+        if problema.livre[f][c] and grade[f][c] >= 0
+    ]
+    resultado = avaliar(problema, grade)
+    resultado.update({
+        'alocacoes':  alocacoes,
+        'iteracoes':  sum(r[2] for r in resultados),
+        'reinicios':  reinicios,
+        'tempo':      round(_time.perf_counter() - inicio, 2),
+    })
+    return resultado
+
+
+# ── Montagem a partir do banco ────────────────────────────────────────────────
+
+def _minutos(h) -> int:
+    return h.hour * 60 + h.minute
+
+
+def _dia_da_semana(wd: int) -> date:
+    """Uma data qualquer com o dia da semana pedido (para as regras por data)."""
+    return date(2024, 1, 1) + timedelta(days=wd)   # 01/01/2024 = segunda
+
+
+def _demandas(regras, metas, funcs, turnos, ini, fim, datas, mes_ini, mes_fim, funcoes_escopo):
+    """Metas de cobertura como listas por coluna.
+
+    Cada demanda: membros (funcionários que contam), dias_semana, minimo[coluna]
+    e, por turno, se ele cobre a faixa no mesmo dia ('mesmo') ou pela virada do
+    turno noturno do dia anterior ('vespera'). O índice -1 (folga) é sempre False.
+
+    - Regras de CoberturaMinima viram uma demanda por dia da semana e trecho
+      da janela entre inícios/fins de turno (um turno cobre o trecho inteiro ou
+      não cobre). O intervalo de descanso não é considerado.
+    - `metas` {(data, funcao): pessoas} – qualquer turno do dia conta.
+    - Sem regras nem metas: ao menos 1 pessoa por função em todos os dias.
+    """
+    from services.facetas import resolver_departamentos
+
+    n_c, n_t = len(datas), len(turnos)
+    demandas = []
+
+    def _membros(funcao, depts):
+        return {i for i, f in enumerate(funcs)
+                if (not funcao or f['funcao'] == funcao)
+                and (not depts or f['departamento'] in depts)}
+
+    for r in regras:
+        membros = _membros(r.funcao, resolver_departamentos(r.departamento) if r.departamento else None)
+        if not membros:
+            continue
+        r_ini, r_fim = _minutos(r.hora_inicio), _minutos(r.hora_fim)
+        if r_fim <= r_ini:
+            r_fim += 1440
+        for wd in range(7):
+            if r.dia_semana is not None and r.dia_semana != wd:
+                continue
+            cols = [c for c in range(mes_ini, mes_fim) if datas[c].weekday() == wd]
+            if not cols:
+                continue
+            wd_ant = (wd - 1) % 7
+            # Intervalos dos turnos no eixo do dia wd (noturno da véspera = -1440)
+            bordas = {r_ini, r_fim}
+            for t in range(n_t):
+                for a, b in ((ini[t][wd], fim[t][wd]), (ini[t][wd_ant] - 1440, fim[t][wd_ant] - 1440)):
+                    bordas.update(x for x in (a, b) if r_ini < x < r_fim)
+            bordas = sorted(bordas)
+            for s, e in zip(bordas, bordas[1:]):
+                minimo = [0] * n_c
+                for c in cols:
+                    minimo[c] = r.minimo
+                demandas.append({
+                    'membros':     membros,
+                    'dias_semana': (wd,),
+                    'minimo':      minimo,
+                    'mesmo':       [ini[t][wd] <= s and fim[t][wd] >= e for t in range(n_t)] + [False],
+                    'vespera':     [fim[t][wd_ant] - 1440 >= e and ini[t][wd_ant] - 1440 <= s
+                                    for t in range(n_t)] + [False],
+                    'regra_id':    r.id,
+                })
+
+    if metas is None and not demandas:
+        metas = {(datas[c], fn): 1 for c in range(mes_ini, mes_fim) for fn in funcoes_escopo}
+    por_funcao: dict = {}
+    col = {d: c for c, d in enumerate(datas)}
+    for (d, funcao), pessoas in (metas or {}).items():
+        c = col.get(d)
+        if c is None or not (mes_ini <= c < mes_fim) or pessoas <= 0:
+            continue
+        por_funcao.setdefault(funcao or '', [0] * n_c)[c] = pessoas
+    for funcao, minimo in por_funcao.items():
+        membros = _membros(funcao, None)
+        if membros:
+            demandas.append({
+                'membros':     membros,
+                'dias_semana': tuple(range(7)),
+                'minimo':      minimo,
+                'mesmo':       [True] * n_t + [False],
+                'vespera':     [False] * (n_t + 1),
+                'regra_id':    None,
+            })
+    return demandas
+
+
+def montar_problema(ano: int, mes: int, dept: str = '', funcao: str = '',
+                    metas: dict = None, substituir: bool = False,
+                    usar_previsao: bool = False) -> ProblemaEscala:
+    """Carrega funcionários, escala efetiva, turnos candidatos e metas do mês.
+
+    Com `usar_previsao`, o mínimo recomendado pela previsão de demanda
+    (services/previsao_demanda.py) entra como regras extras de cobertura.
+
+    Turnos candidatos de um funcionário: turnos do departamento dele (ou de um
+    grupo que o contém, ou globais) e da função dele (ou sem função), válidos
+    no dia da semana e sem infração de intrajornada.
+    """
+    import calendar as cal_mod
+    from extensions import db
+    from models import Funcionario, Turno
+    from services.cobertura_engine import matriz_cobertura
+    from services.facetas import resolver_departamentos
+    from services.cobertura_intradiaria import regras_aplicaveis
+    from services.motor_clt import validar_intrajornada
+
+    _, dias_no_mes = cal_mod.monthrange(ano, mes)
+    data_ini, data_fim = date(ano, mes, 1), date(ano, mes, dias_no_mes)
+    antes = [data_ini - timedelta(days=i) for i in range(DIAS_CONTEXTO, 0, -1)]
+    depois = [data_fim + timedelta(days=i) for i in range(1, DIAS_CONTEXTO + 1)]
+    datas = antes + [date(ano, mes, d) for d in range(1, dias_no_mes + 1)] + depois
+    mes_ini, mes_fim = len(antes), len(antes) + dias_no_mes
+
+    matriz = matriz_cobertura(ano, mes, dept, funcao, extras=antes + depois)
+    cols_matriz = matriz.colunas(datas)
+    funcs = matriz.funcs
+
+    # Turnos: todos os candidatos + os que já aparecem na escala efetiva
+    todos = Turno.query.order_by(Turno.id).all()
+    deptos_turno = {t.id: set(resolver_departamentos(t.departamento)) if t.departamento else None
+                    for t in todos}
+    turnos, ini, fim, horas = [], [], [], []
+    pos = {}
+    for t in todos:
+        pos[t.id] = len(turnos)
+        turnos.append({'id': t.id, 'nome': t.nome})
+        linha_ini, linha_fim, linha_h = [], [], []
+        for wd in range(7):
+            h_ini, h_fim, _ = t.get_horario_dia(wd)
+            a, b = _minutos(h_ini), _minutos(h_fim)
+            linha_ini.append(a)
+            linha_fim.append(b + 1440 if b < a else b)
+            linha_h.append(t.duracao_horas_no_dia(_dia_da_semana(wd)))
+        ini.append(linha_ini)
+        fim.append(linha_fim)
+        horas.append(linha_h)
+    validos_wd = [
+        [wd in t.dias_semana_list and validar_intrajornada(t, _dia_da_semana(wd)) is None for wd in range(7)]
+        for t in todos
+    ]
+
+    opcoes = []
+    for f in funcs:
+        linha = []
+        for wd in range(7):
+            linha.append([
+                pos[t.id] for t in todos
+                if validos_wd[pos[t.id]][wd]
+                and (t.funcao is None or t.funcao == f['funcao'])
+                and (deptos_turno[t.id] is None or f['departamento'] in deptos_turno[t.id])
+            ])
+        opcoes.append(linha)
+
+    # Horário base de cada funcionário (o que sobra quando a exceção é removida)
+    base = dict(
+        db.session.query(Funcionario.id, Funcionario.horario_base_id)
+        .filter(Funcionario.id.in_([f['id'] for f in funcs]))
+    ) if funcs else {}
+
+    inicial, livre, substituidas = [], [], []
+    for i, f in enumerate(funcs):
+        t_base = base.get(f['id'])
+        dias_base = set()
+        if t_base in pos:
+            dias_base = set(todos[pos[t_base]].dias_semana_list)
+        linha_t, linha_l = [], []
+        for c, mc in enumerate(cols_matriz):
+            ti = int(matriz.turno_idx[i, mc])
+            t = pos[matriz.turnos[ti]['id']] if ti >= 0 else -1
+            pode = mes_ini <= c < mes_fim and t < 0
+            if substituir and mes_ini <= c < mes_fim and matriz.excecao[i, mc]:
+                substituidas.append((f['id'], datas[c]))
+                if datas[c].weekday() in dias_base:
+                    t = pos[t_base]     # sem a exceção, vale o horário base (fixo)
+                else:
+                    pode = True         # a exceção atual é só o ponto de partida
+            linha_t.append(t)
+            linha_l.append(pode)
+        inicial.append(linha_t)
+        livre.append(linha_l)
+
+    regras = regras_aplicaveis(dept, funcao)
+    if usar_previsao:
+        from services.previsao_demanda import metas_previstas
+        regras = regras + metas_previstas(dept, funcao)
+    funcoes_escopo = sorted({f['funcao'] or '' for f in funcs}) if not funcao else [funcao]
+    demandas = _demandas(regras, metas, funcs, turnos, ini, fim, datas, mes_ini, mes_fim, funcoes_escopo)
+
+    return ProblemaEscala(funcs, datas, mes_ini, mes_fim, turnos, ini, fim, horas,
+                          inicial, livre, opcoes, demandas, substituidas)
+
+
+def gravar_resultado(problema: ProblemaEscala, resultado: dict) -> int:
+    """Grava as alocações geradas com INSERT em lote (e remove as exceções do mês
+    substituídas). Registra as células no log de versão da escala."""
+    from sqlalchemy import delete, insert, tuple_
+    from extensions import db
+    from models import AlocacaoDiaria
+    from services.escala_versao import registrar_alteracoes
+
+    novas = resultado['alocacoes']
+    registrar_alteracoes(list(problema.substituidas) + [(fid, d) for fid, d, _ in novas], operacao='otimizador')
+    if problema.substituidas:
+        db.session.execute(
+            delete(AlocacaoDiaria)
+            .where(tuple_(AlocacaoDiaria.funcionario_id, AlocacaoDiaria.data).in_(problema.substituidas))
+            .execution_options(escala_registrado=True, synchronize_session=False)
+        )
+    if novas:
+        db.session.execute(
+            insert(AlocacaoDiaria).execution_options(escala_registrado=True),
+            [{'funcionario_id': fid, 'data': d, 'turno_id': tid, 'is_excecao': True} for fid, d, tid in novas],
+        )
+    db.session.commit()
+    return len(novas)
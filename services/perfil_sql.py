@@ -0,0 +1,212 @@
+"""
+Contagem de consultas SQL por unidade de trabalho (requisição, task Celery,
+job do APScheduler) com detecção de N+1.
+
+Os eventos de cursor do SQLAlchemy somam, na medição ativa, o número de
+consultas e o tempo gasto no banco. Cada statement é reduzido a uma "forma"
+(parâmetros e listas de IN colapsados); a mesma forma repetida LIMIAR_N1
+vezes ou mais na mesma unidade é um N+1 provável.
+
+- Requisições: o log 'perfil_sql' recebe uma linha por requisição acima de
+  PERFIL_SQL_LIMITE consultas e um aviso por N+1 (com o endpoint). Com
+  PERFIL_SQL_HEADER (ou app.debug) a resposta leva X-SQL-Consultas,
+  X-SQL-Tempo-ms e X-SQL-N1.
+- Tasks Celery: mesmo log, pelos sinais task_prerun/task_postrun.
+- Outros pontos (jobs, scripts): `with contar_consultas('nome') as m:`.
+
+Para testes/benchmarks, `orcamento_consultas(maximo)` falha com
+OrcamentoExcedido se o bloco fizer mais consultas que o orçamento ou tiver
+N+1.
+"""
+import logging
+import re
+import time as _time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('perfil_sql')
+
+LIMIAR_N1 = 10   # repetições da mesma forma na mesma unidade
+
+_atual: ContextVar = ContextVar('perfil_sql_medicao', default=None)
+_registrado = False
+
+_RE_PARAM = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+|\?")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_RE_ESPACO = re.compile(r"\s+")
+
+
+def forma(statement: str) -> str:
+    """Statement sem parâmetros nem tamanho de lista: 'IN (?, ?, ?)' → 'IN (?)'."""
+    s = _RE_PARAM.sub('?', statement)
+    s = _RE_LISTA.sub('(?)', s)
+    return _RE_ESPACO.sub(' ', s).strip()
+
+
+class Medicao:
+    """Consultas, tempo de banco e formas repetidas de uma unidade de trabalho.
+    Medições aninhadas também somam na de fora."""
+
+    def __init__(self, nome: str = '', pai=None):
+        self.nome = nome
+        self.pai = pai
+        self.consultas = 0
+        self.tempo = 0.0
+        self.formas: dict[str, int] = {}
+        self.inicio = _time.perf_counter()
+
+    def _somar(self, statement, duracao):
+        m = self
+        chave = forma(statement)
+        while m is not None:
+            m.consultas += 1
+            m.tempo += duracao
+            m.formas[chave] = m.formas.get(chave, 0) + 1
+            m = m.pai
+
+    @property
+    def tempo_ms(self) -> float:
+        return self.tempo * 1000
+
+    def n1(self, limiar: int = LIMIAR_N1) -> list:
+        """[(forma, repetições)] com pelo menos `limiar` repetições, da maior para a menor."""
+        return sorted(((f, n) for f, n in self.formas.items() if n >= limiar), key=lambda x: -x[1])
+
+    def resumo(self) -> str:
+        return f'{self.consultas} consultas, {self.tempo_ms:.1f} ms no banco'
+
+
+# ── Eventos do engine ─────────────────────────────────────────────────────────
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    if _atual.get() is not None:
+        conn.info.setdefault('perfil_sql_t0', []).append(_time.perf_counter())
+
+
+def _depois(conn, cursor, statement, parameters, context, executemany):
+    m = _atual.get()
+    pilha = conn.info.get('perfil_sql_t0')
+    if m is None or not pilha:
+        return
+    m._somar(statement, _time.perf_counter() - pilha.pop())
+
+
+def _registrar_eventos():
+    global _registrado
+    if _registrado:
+        return
+    event.listen(Engine, 'before_cursor_execute', _antes)
+    event.listen(Engine, 'after_cursor_execute', _depois)
+    _registrado = True
+
+
+# ── Medições ──────────────────────────────────────────────────────────────────
+
+def iniciar(nome: str = '') -> tuple:
+    """Abre uma medição (aninhada na atual, se houver). Retorna (medicao, token)."""
+    _registrar_eventos()
+    m = Medicao(nome, pai=_atual.get())
+    return m, _atual.set(m)
+
+
+def encerrar(token):
+    _atual.reset(token)
+
+
+def medicao_atual():
+    return _atual.get()
+
+
+@contextmanager
+def contar_consultas(nome: str = ''):
+    m, token = iniciar(nome)
+    try:
+        yield m
+    finally:
+        encerrar(token)
+
+
+def registrar_no_log(m: Medicao, limite: int = None):
+    """Linha de log da unidade (acima de `limite` consultas) e aviso por N+1."""
+    if limite is not None and m.consultas > limite:
+        logger.info(f'[{m.nome}] {m.resumo()}')
+    for f, n in m.n1():
+        logger.warning(f'[{m.nome}] N+1 provável: {n}× {f[:200]}')
+
+
+class OrcamentoExcedido(AssertionError):
+    pass
+
+
+@contextmanager
+def orcamento_consultas(maximo: int, nome: str = '', n1: bool = True):
+    """Falha se o bloco fizer mais de `maximo` consultas ou (com n1=True)
+    repetir uma forma LIMIAR_N1 vezes ou mais."""
+    with contar_consultas(nome) as m:
+        yield m
+    problemas = []
+    if m.consultas > maximo:
+        problemas.append(f'{m.consultas} consultas (orçamento {maximo})')
+    if n1:
+        problemas += [f'N+1: {n}× {f[:120]}' for f, n in m.n1()]
+    if problemas:
+        raise OrcamentoExcedido(f'{nome or "bloco"}: ' + '; '.join(problemas))
+
+
+# ── Integração com Flask / Celery ─────────────────────────────────────────────
+
+def init_perfil_sql(app):
+    """Mede cada requisição e, se houver Celery, cada task."""
+    if not app.config.get('PERFIL_SQL', True):
+        return
+    from flask import g, request
+
+    limite = int(app.config.get('PERFIL_SQL_LIMITE', 50))
+    header = app.config.get('PERFIL_SQL_HEADER') or app.debug
+
+    @app.before_request
+    def _perfil_inicio():
+        g._perfil_sql = iniciar(request.endpoint or request.path)
+
+    @app.after_request
+    def _perfil_headers(response):
+        m = getattr(g, '_perfil_sql', (None,))[0]
+        if m is not None and header:
+            response.headers['X-SQL-Consultas'] = str(m.consultas)
+            response.headers['X-SQL-Tempo-ms'] = f'{m.tempo_ms:.1f}'
+            response.headers['X-SQL-N1'] = str(len(m.n1()))
+        return response
+
+    @app.teardown_request
+    def _perfil_fim(exc=None):
+        par = g.pop('_perfil_sql', None)
+        if par is None:
+            return
+        m, token = par
+        try:
+            encerrar(token)
+        except ValueError:
+            pass   # token de outro contexto (teardown fora da thread da requisição)
+        registrar_no_log(m, limite)
+
+    try:
+        from celery.signals import task_postrun, task_prerun
+    except ImportError:
+        return
+    medicoes_tasks = {}
+
+    @task_prerun.connect(weak=False)
+    def _task_inicio(task_id=None, task=None, **kwargs):
+        medicoes_tasks[task_id] = iniciar(getattr(task, 'name', '') or 'task')
+
+    @task_postrun.connect(weak=False)
+    def _task_fim(task_id=None, **kwargs):
+        par = medicoes_tasks.pop(task_id, None)
+        if par is None:
+            return
+        m, token = par
+        encerrar(token)
+        registrar_no_log(m, limite)
@@ -0,0 +1,377 @@
+"""
+Previsão de demanda: curvas de presença real (batidas) por departamento/função
+em faixas de 15 min e o mínimo de pessoas recomendado por dia da semana.
+
+1. `atualizar_presencas` transforma as batidas em intervalos de presença
+   (pares entrada/saída na ordem do dia de cada funcionário) e conta, com uma
+   varredura vetorizada (+1 na entrada, -1 na saída, soma acumulada), as
+   pessoas com o ponto aberto no início de cada faixa. Grava uma
+   PresencaDiaria por (dia, departamento, função). É incremental: reprocessa
+   só a partir da marca d'água (Configuracao 'previsao_presenca_ate'), com
+   alguns dias de folga para as batidas sincronizadas com atraso.
+2. `recalcular_previsao` junta as últimas SEMANAS de PresencaDiaria num tensor
+   (grupo × dia × faixa) e calcula, por dia da semana, a média e o percentil
+   PERCENTIL, arredondado = mínimo recomendado. Grava PrevisaoDemanda e muda a
+   versão (Configuracao 'previsao_demanda_versao').
+3. `previsao(dept, funcao)` devolve as curvas do escopo (soma dos grupos), em
+   cache por processo até a versão mudar; `previsto_por_hora` e
+   `metas_previstas` alimentam a cobertura por horário e o otimizador.
+
+Departamento e função são os atuais de cada funcionário.
+"""
+import json
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+
+from extensions import db
+from models import Batida, Configuracao, Funcionario, PresencaDiaria, PrevisaoDemanda
+from services.cobertura_intradiaria import FAIXA_MIN, FAIXAS_DIA
+from services.facetas import resolver_departamentos
+
+HISTORICO_DIAS = 365        # primeira carga
+REPROCESSAR_DIAS = 3        # batidas que chegam depois (sync atrasado, ajustes)
+SEMANAS = 12                # janela da previsão
+PERCENTIL = 80              # mínimo recomendado = percentil da presença no horário
+DURACAO_MAX_MIN = 16 * 60   # par entrada/saída maior que isso é descartado
+VIRADA_MIN = 6 * 60         # batida tão antes da 1ª Entrada do dia é da madrugada seguinte
+
+_CHAVE_MARCA = 'previsao_presenca_ate'
+_CHAVE_VERSAO = 'previsao_demanda_versao'
+_LOTE_INSERT = 1000
+
+_cache = {'versao': None, 'dados': None}
+_cache_lock = threading.Lock()
+
+
+def _config(chave):
+    return db.session.query(Configuracao.valor).filter(Configuracao.chave == chave).scalar()
+
+
+def _gravar_config(chave, valor):
+    """Sem commit – entra na transação de quem chamou."""
+    c = Configuracao.query.filter_by(chave=chave).first()
+    if not c:
+        c = Configuracao(chave=chave)
+        db.session.add(c)
+    c.valor = str(valor)
+
+
+# ── 1. Presença real por faixa ────────────────────────────────────────────────
+
+def _minuto(hora: str) -> int:
+    try:
+        h, m = hora.split(':')[:2]
+        return int(h) * 60 + int(m)
+    except (AttributeError, ValueError):
+        return -1
+
+
+def curvas_presenca(data_ini: date, data_fim: date):
+    """Presença por (departamento, função) × dia × faixa em [data_ini, data_fim].
+    Retorna (grupos [(departamento, funcao)], int32 (n_grupos × n_dias × FAIXAS_DIA)).
+
+    As batidas de cada funcionário no dia, em ordem, formam pares entrada/saída
+    (1ª-2ª, 3ª-4ª...); uma batida sem par é ignorada. A faixa conta se a pessoa
+    estava com o ponto aberto no início dela. Turno noturno: a saída da
+    madrugada fica gravada na data da entrada, então uma batida mais de
+    VIRADA_MIN antes da primeira Entrada do dia é do dia seguinte (como no
+    _parse_hora do notification_processor). O dia anterior entra como contexto
+    (turno que atravessa a meia-noite do primeiro dia)."""
+    ctx = data_ini - timedelta(days=1)
+    origem = datetime.combine(ctx, time())
+    n_dias = (data_fim - data_ini).days + 1
+
+    grupos, grupo_pos, chave_pos = [], {}, {}
+    minutos, chave_lin, grupo_lin, entrada_lin = [], [], [], []
+    for fid, d, data_hora, hora, tipo, dept, funcao in (
+        db.session.query(Batida.funcionario_id, Batida.data, Batida.data_hora, Batida.hora, Batida.tipo,
+                         Funcionario.departamento, Funcionario.funcao)
+        .join(Funcionario, Funcionario.id == Batida.funcionario_id)
+        .filter(Batida.data.between(ctx, data_fim))
+    ):
+        if data_hora is not None:
+            m = int((data_hora - origem).total_seconds() // 60)
+        else:
+            m = _minuto(hora)
+            if m < 0:
+                continue
+            m += (d - ctx).days * 1440
+        g = (dept or '', funcao or '')
+        gi = grupo_pos.get(g)
+        if gi is None:
+            gi = grupo_pos[g] = len(grupos)
+            grupos.append(g)
+        ci = chave_pos.get((fid, d))
+        if ci is None:
+            ci = chave_pos[(fid, d)] = len(chave_pos)
+        minutos.append(m)
+        chave_lin.append(ci)
+        grupo_lin.append(gi)
+        entrada_lin.append(tipo == 'Entrada')
+
+    contagem = np.zeros((len(grupos), n_dias, FAIXAS_DIA), dtype=np.int32)
+    if not minutos:
+        return grupos, contagem
+
+    m = np.array(minutos, dtype=np.int64)
+    c = np.array(chave_lin, dtype=np.int64)
+    g = np.array(grupo_lin, dtype=np.intp)
+
+    # Saída da madrugada gravada no dia da entrada: passa para o dia seguinte
+    # (só nos dias com alguma Entrada — sem ela não há referência)
+    sem_entrada = np.iinfo(np.int64).max
+    primeira_entrada = np.full(len(chave_pos), sem_entrada, dtype=np.int64)
+    entrada = np.array(entrada_lin, dtype=bool)
+    np.minimum.at(primeira_entrada, c[entrada], m[entrada])
+    ref = primeira_entrada[c]
+    m = np.where((ref != sem_entrada) & (m < ref - VIRADA_MIN), m + 1440, m)
+
+    ordem = np.lexsort((m, c))
+    m, c, g = m[ordem], c[ordem], g[ordem]
+
+    # Batida repetida no mesmo minuto (REP + app, reenvio) conta uma vez
+    nova = np.ones(len(m), dtype=bool)
+    nova[1:] = (c[1:] != c[:-1]) | (m[1:] != m[:-1])
+    m, c, g = m[nova], c[nova], g[nova]
+
+    # Posição da batida no dia do funcionário: pares = posição par + a seguinte
+    inicio_grupo = np.ones(len(c), dtype=bool)
+    inicio_grupo[1:] = c[1:] != c[:-1]
+    primeira = np.maximum.accumulate(np.where(inicio_grupo, np.arange(len(c)), 0))
+    pos = np.arange(len(c)) - primeira
+    i = np.flatnonzero((pos[:-1] % 2 == 0) & (c[1:] == c[:-1]))
+    s, e, g = m[i], m[i + 1], g[i]
+    ok = (e - s > 0) & (e - s <= DURACAO_MAX_MIN)
+    s, e, g = s[ok], e[ok], g[ok]
+
+    # Linha do tempo: [dia anterior | período | dia seguinte], em faixas
+    n_faixas = (n_dias + 2) * FAIXAS_DIA
+    a = np.clip(-(-s // FAIXA_MIN), 0, n_faixas)
+    b = np.clip(-(-e // FAIXA_MIN), 0, n_faixas)
+    delta = np.zeros((len(grupos), n_faixas + 1), dtype=np.int32)
+    np.add.at(delta, (g, a), 1)
+    np.add.at(delta, (g, b), -1)
+    acumulado = np.cumsum(delta[:, :n_faixas], axis=1)
+    contagem[:] = acumulado[:, FAIXAS_DIA:FAIXAS_DIA * (n_dias + 1)].reshape(len(grupos), n_dias, FAIXAS_DIA)
+    return grupos, contagem
+
+
+def atualizar_presencas(ate: date = None, historico: int = HISTORICO_DIAS, bloco_dias: int = 92) -> dict:
+    """Grava PresencaDiaria até `ate` (padrão: ontem), a partir da marca d'água
+    menos REPROCESSAR_DIAS ou, na primeira carga, dos últimos `historico` dias.
+    Processa em blocos para limitar a memória. Faz commit."""
+    ate = ate or date.today() - timedelta(days=1)
+    marca = _config(_CHAVE_MARCA)
+    if marca:
+        ini = date.fromisoformat(marca) - timedelta(days=REPROCESSAR_DIAS - 1)
+    else:
+        ini = ate - timedelta(days=historico - 1)
+    ini = max(ini, ate - timedelta(days=historico - 1))
+
+    dias = linhas = 0
+    bloco_ini = ini
+    while bloco_ini <= ate:
+        bloco_fim = min(ate, bloco_ini + timedelta(days=bloco_dias - 1))
+        grupos, contagem = curvas_presenca(bloco_ini, bloco_fim)
+        PresencaDiaria.query.filter(PresencaDiaria.data.between(bloco_ini, bloco_fim)) \
+            .delete(synchronize_session=False)
+        picos = contagem.max(axis=2)
+        novos = []
+        for gi, j in zip(*(x.tolist() for x in np.nonzero(picos))):
+            dept, funcao = grupos[gi]
+            novos.append({
+                'data':         bloco_ini + timedelta(days=j),
+                'departamento': dept,
+                'funcao':       funcao,
+                'curva_json':   json.dumps(contagem[gi, j].tolist(), separators=(',', ':')),
+                'pico':         int(picos[gi, j]),
+            })
+        for k in range(0, len(novos), _LOTE_INSERT):
+            db.session.bulk_insert_mappings(PresencaDiaria, novos[k:k + _LOTE_INSERT])
+        dias += (bloco_fim - bloco_ini).days + 1
+        linhas += len(novos)
+        bloco_ini = bloco_fim + timedelta(days=1)
+
+    if ini <= ate:
+        _gravar_config(_CHAVE_MARCA, ate.isoformat())
+    db.session.commit()
+    return {'de': ini.isoformat(), 'ate': ate.isoformat(), 'dias': dias, 'linhas': linhas}
+
+
+# ── 2. Previsão por dia da semana ─────────────────────────────────────────────
+
+def recalcular_previsao(ate: date = None, semanas: int = SEMANAS, percentil: int = PERCENTIL) -> dict:
+    """Recalcula todas as PrevisaoDemanda das `semanas` até `ate` (padrão: ontem).
+    Dia com batidas de alguém e sem presença do grupo conta como zero para ele
+    (loja fechada, feriado); dia sem nenhuma batida fica fora (falha de sync).
+    Faz commit e muda a versão da previsão."""
+    ate = ate or date.today() - timedelta(days=1)
+    ini = ate - timedelta(days=semanas * 7 - 1)
+    n_dias = semanas * 7
+
+    grupos, grupo_pos, linhas = [], {}, []
+    for d, dept, funcao, curva in (
+        db.session.query(PresencaDiaria.data, PresencaDiaria.departamento,
+                         PresencaDiaria.funcao, PresencaDiaria.curva_json)
+        .filter(PresencaDiaria.data.between(ini, ate))
+    ):
+        g = (dept or '', funcao or '')
+        if g not in grupo_pos:
+            grupo_pos[g] = len(grupos)
+            grupos.append(g)
+        linhas.append((grupo_pos[g], (d - ini).days, curva))
+
+    tensor = np.zeros((len(grupos), n_dias, FAIXAS_DIA), dtype=np.int32)
+    com_dado = np.zeros(n_dias, dtype=bool)
+    for gi, j, curva in linhas:
+        tensor[gi, j] = json.loads(curva)
+        com_dado[j] = True
+
+    wd_dia = np.array([(ini + timedelta(days=j)).weekday() for j in range(n_dias)])
+    agora = datetime.utcnow()
+    novos = []
+    for wd in range(7):
+        cols = np.flatnonzero(com_dado & (wd_dia == wd))
+        if not len(cols) or not grupos:
+            continue
+        amostra = tensor[:, cols]                                  # grupos × dias × faixas
+        media = amostra.mean(axis=1)
+        recomendado = np.floor(np.percentile(amostra, percentil, axis=1) + 0.5).astype(np.int32)
+        presente = amostra.any(axis=(1, 2))
+        for gi in np.flatnonzero(presente).tolist():
+            dept, funcao = grupos[gi]
+            novos.append({
+                'departamento':     dept,
+                'funcao':           funcao,
+                'dia_semana':       wd,
+                'media_json':       json.dumps(np.round(media[gi], 2).tolist(), separators=(',', ':')),
+                'recomendado_json': json.dumps(recomendado[gi].tolist(), separators=(',', ':')),
+                'amostras':         int(len(cols)),
+                'gerado_em':        agora,
+            })
+
+    PrevisaoDemanda.query.delete(synchronize_session=False)
+    for k in range(0, len(novos), _LOTE_INSERT):
+        db.session.bulk_insert_mappings(PrevisaoDemanda, novos[k:k + _LOTE_INSERT])
+    _gravar_config(_CHAVE_VERSAO, uuid.uuid4().hex)
+    db.session.commit()
+    return {'de': ini.isoformat(), 'ate': ate.isoformat(), 'grupos': len(grupos),
+            'dias_com_dado': int(com_dado.sum()), 'linhas': len(novos)}
+
+
+# ── 3. Leitura (cache por versão) ─────────────────────────────────────────────
+
+def versao_previsao():
+    return _config(_CHAVE_VERSAO)
+
+
+def _carregar() -> dict:
+    """{(departamento, funcao): {'media', 'recomendado' (7 × FAIXAS_DIA), 'amostras' (7)}}."""
+    dados, gerado_em = {}, None
+    for p in PrevisaoDemanda.query.all():
+        g = dados.get((p.departamento, p.funcao))
+        if g is None:
+            g = dados[(p.departamento, p.funcao)] = {
+                'media':       np.zeros((7, FAIXAS_DIA), dtype=np.float64),
+                'recomendado': np.zeros((7, FAIXAS_DIA), dtype=np.int32),
+                'amostras':    np.zeros(7, dtype=np.int32),
+            }
+        g['media'][p.dia_semana] = json.loads(p.media_json)
+        g['recomendado'][p.dia_semana] = json.loads(p.recomendado_json)
+        g['amostras'][p.dia_semana] = p.amostras
+        if p.gerado_em and (gerado_em is None or p.gerado_em > gerado_em):
+            gerado_em = p.gerado_em
+    return {'grupos': dados, 'gerado_em': gerado_em}
+
+
+def _dados() -> dict:
+    versao = versao_previsao()
+    with _cache_lock:
+        if _cache['dados'] is not None and _cache['versao'] == versao:
+            return _cache['dados']
+    dados = _carregar()
+    with _cache_lock:
+        _cache['versao'], _cache['dados'] = versao, dados
+    return dados
+
+
+def _grupos_escopo(dept: str = '', funcao: str = '') -> list:
+    depts = set(resolver_departamentos(dept))
+    return [g for g in _dados()['grupos']
+            if (not depts or g[0] in depts) and (not funcao or g[1] == funcao)]
+
+
+def previsao(dept: str = '', funcao: str = ''):
+    """Curvas previstas do escopo (soma dos grupos de dept/grupo e função):
+    {'media', 'recomendado' (7 × FAIXAS_DIA, 0=seg), 'amostras', 'gerado_em'}
+    ou None se não houver previsão para o escopo. Não alterar os arrays."""
+    dados = _dados()
+    sel = _grupos_escopo(dept, funcao)
+    if not sel:
+        return None
+    grupos = dados['grupos']
+    return {
+        'media':       sum(grupos[g]['media'] for g in sel),
+        'recomendado': sum(grupos[g]['recomendado'] for g in sel),
+        'amostras':    np.max([grupos[g]['amostras'] for g in sel], axis=0),
+        'gerado_em':   dados['gerado_em'],
+    }
+
+
+def _por_hora(recomendado: np.ndarray) -> np.ndarray:
+    """(… × FAIXAS_DIA) → (… × 24): o maior quarto de hora de cada hora."""
+    return recomendado.reshape(*recomendado.shape[:-1], 24, FAIXAS_DIA // 24).max(axis=-1)
+
+
+def previsto_por_hora(datas, dept: str = '', funcao: str = ''):
+    """Mínimo recomendado por hora (n_dias × 24) para as datas, ou None."""
+    p = previsao(dept, funcao)
+    if p is None:
+        return None
+    horas = _por_hora(p['recomendado'])
+    return horas[[d.weekday() for d in datas]]
+
+
+class MetaPrevista:
+    """Meta de cobertura vinda da previsão, no formato de uma regra de
+    CoberturaMinima (usada pelo otimizador junto com as regras cadastradas)."""
+    __slots__ = ('id', 'departamento', 'funcao', 'dia_semana', 'hora_inicio', 'hora_fim', 'minimo')
+
+    def __init__(self, departamento, funcao, dia_semana, hora_inicio, hora_fim, minimo):
+        self.id = None
+        self.departamento = departamento
+        self.funcao = funcao
+        self.dia_semana = dia_semana
+        self.hora_inicio = hora_inicio
+        self.hora_fim = hora_fim
+        self.minimo = minimo
+
+    def __repr__(self):
+        return f'<MetaPrevista {self.departamento}/{self.funcao} {self.dia_semana} {self.hora_inicio}-{self.hora_fim} ≥{self.minimo}>'
+
+
+def metas_previstas(dept: str = '', funcao: str = '') -> list:
+    """Metas por (departamento, função, dia da semana), uma por trecho de horas
+    seguidas com o mesmo mínimo recomendado. Grupos sem departamento ou sem
+    função ficam de fora (não dá para expressá-los como regra)."""
+    grupos = _dados()['grupos']
+    metas = []
+    for dept_g, funcao_g in sorted(_grupos_escopo(dept, funcao)):
+        if not dept_g or not funcao_g:
+            continue
+        horas = _por_hora(grupos[(dept_g, funcao_g)]['recomendado'])
+        for wd in range(7):
+            linha = horas[wd].tolist()
+            h = 0
+            while h < 24:
+                v, fim = linha[h], h + 1
+                while fim < 24 and linha[fim] == v:
+                    fim += 1
+                if v > 0:
+                    metas.append(MetaPrevista(dept_g, funcao_g, wd, time(h),
+                                              time(fim) if fim < 24 else time(0), v))
+                h = fim
+    return metas
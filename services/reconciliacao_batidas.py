@@ -0,0 +1,279 @@
+"""
+Reconciliação das batidas locais com o Secullum por digest.
+
+Para cada (funcionário, dia) a tabela `batida_digests` guarda um digest
+(SHA-1) do conjunto normalizado de horários ('HH:MM', sem repetição) dos dois
+lados:
+
+  - local    : recalculado para os dias tocados pelo sync e pelas correções
+               do gestor (mesmos pontos que reavaliam as inconsistências);
+  - Secullum : gravado no próprio sync, a partir dos registros que a API
+               devolveu. Busca de dia completo (sem filtro de hora) substitui
+               o conjunto — e zera os dias do período que não vieram; busca
+               com janela de hora só acrescenta os horários vistos.
+
+A comparação confere os digests no banco e só monta o detalhe (horários de
+cada lado) dos dias que divergem; a ressincronização busca de novo só os dias
+divergentes, só dos funcionários envolvidos.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.sql.functions import coalesce
+
+from extensions import db
+from models import Batida, BatidaDigest, Funcionario
+
+_LOTE_DIAS = 500    # (funcionário, dia) por consulta no IN
+
+_MARCACOES_ESPECIAIS = {
+    'ATESTAD', 'ATESTADO', 'FOLGA', 'FALTA', 'FERIAS', 'NEUTRO',
+    'DSRFOL', 'DSRFALTA', 'COMPENSAR',
+}
+
+
+def digest(horas) -> str:
+    """SHA-1 do conjunto de horários 'HH:MM' (ordem e repetição não importam)."""
+    return hashlib.sha1(','.join(sorted(set(horas))).encode()).hexdigest()
+
+
+VAZIO = digest([])
+
+
+def horas_do_registro(registro) -> list:
+    """Horários válidos de um registro Secullum (Entrada1..5, Saida1..5) como
+    [{hora, tipo}], na normalização do sync (HH:MM, sem marcações/00:00)."""
+    horas = []
+    for i in range(1, 6):
+        for tipo_str, campo in [('Entrada', f'Entrada{i}'), ('Saida', f'Saida{i}')]:
+            hora = (registro.get(campo) or '').strip()
+            if not hora or hora.upper() in _MARCACOES_ESPECIAIS:
+                continue
+            partes = hora.split(':')
+            if len(partes) < 2:
+                continue
+            hora = f'{partes[0]}:{partes[1]}'
+            if hora == '00:00':
+                continue
+            horas.append({'hora': hora, 'tipo': tipo_str})
+    return horas
+
+
+def _linhas(lote) -> dict:
+    """{(funcionario_id, data): BatidaDigest} do lote, criando as que faltam."""
+    linhas = {(d.funcionario_id, d.data): d for d in BatidaDigest.query.filter(
+        tuple_(BatidaDigest.funcionario_id, BatidaDigest.data).in_(lote))}
+    for chave in lote:
+        if chave not in linhas:
+            linhas[chave] = BatidaDigest(funcionario_id=chave[0], data=chave[1],
+                                         n_local=0, n_secullum=0, horas_secullum_json='[]')
+            db.session.add(linhas[chave])
+    return linhas
+
+
+# ── Gravação ──────────────────────────────────────────────────────────────────
+
+def atualizar_locais(dias) -> int:
+    """Recalcula o digest local dos (funcionario_id, data). Não faz commit —
+    entra na transação do sync / da correção."""
+    dias = sorted(set(dias))
+    agora = datetime.utcnow()
+    for k in range(0, len(dias), _LOTE_DIAS):
+        lote = dias[k:k + _LOTE_DIAS]
+        horas: dict[tuple, list] = {}
+        for fid, d, hora in (db.session.query(Batida.funcionario_id, Batida.data, Batida.hora)
+                             .filter(tuple_(Batida.funcionario_id, Batida.data).in_(lote))):
+            horas.setdefault((fid, d), []).append(hora)
+        for chave, linha in _linhas(lote).items():
+            h = horas.get(chave, [])
+            linha.digest_local = digest(h)
+            linha.n_local = len(set(h))
+            linha.local_em = agora
+    return len(dias)
+
+
+def registrar_secullum(vistos: dict, completo: bool, periodo=None, funcionarios=None) -> int:
+    """Grava o lado Secullum a partir de {(funcionario_id, data): [{hora, tipo}]}.
+
+    completo=True (busca sem filtro de hora): o conjunto do dia é o que veio, e
+    os dias do `periodo` (data_ini, data_fim) que não vieram — dos funcionários
+    ativos, ou só de `funcionarios` — ficam vazios no Secullum.
+    completo=False (janela de hora): só acrescenta os horários vistos.
+    Não faz commit.
+    """
+    agora = datetime.utcnow()
+    chaves = sorted(vistos)
+    for k in range(0, len(chaves), _LOTE_DIAS):
+        lote = chaves[k:k + _LOTE_DIAS]
+        for chave, linha in _linhas(lote).items():
+            tipos = {} if completo else {h: t for h, t in linha.horas_secullum}
+            for b in vistos[chave]:
+                tipos.setdefault(b['hora'], b['tipo'])
+            linha.horas_secullum_json = json.dumps(sorted(tipos.items()))
+            linha.digest_secullum = digest(tipos)
+            linha.n_secullum = len(tipos)
+            linha.secullum_em = agora
+
+    if completo and periodo:
+        q = (BatidaDigest.query.join(Funcionario, Funcionario.id == BatidaDigest.funcionario_id)
+             .filter(BatidaDigest.data.between(*periodo), Funcionario.ativo == True,
+                     coalesce(BatidaDigest.digest_secullum, '') != VAZIO))
+        if funcionarios is not None:
+            q = q.filter(BatidaDigest.funcionario_id.in_(list(funcionarios)))
+        for linha in q:
+            if (linha.funcionario_id, linha.data) in vistos:
+                continue
+            linha.digest_secullum = VAZIO
+            linha.n_secullum = 0
+            linha.horas_secullum_json = '[]'
+            linha.secullum_em = agora
+    return len(chaves)
+
+
+def atualizar_locais_periodo(data_inicio, data_fim, bloco_dias: int = 31) -> int:
+    """Digest local de todos os dias com batida em [data_inicio, data_fim]
+    (carga inicial). Faz commit a cada bloco."""
+    total = 0
+    ini = data_inicio
+    while ini <= data_fim:
+        fim = min(data_fim, ini + timedelta(days=bloco_dias - 1))
+        dias = [tuple(r) for r in (
+            db.session.query(Batida.funcionario_id, Batida.data)
+            .filter(Batida.data.between(ini, fim))
+            .group_by(Batida.funcionario_id, Batida.data)
+        )]
+        total += atualizar_locais(dias)
+        db.session.commit()
+        ini = fim + timedelta(days=1)
+    return total
+
+
+def atualizar_do_secullum(data_inicio, data_fim, funcionarios=None):
+    """Busca o período no Secullum (dia completo) e grava só o lado Secullum
+    dos digests, sem importar batidas. None se a API falhar."""
+    from services.sync_service import _buscar_batidas, get_api, parse_date
+    registros = _buscar_batidas(get_api(), data_inicio.strftime('%Y-%m-%d'), data_fim.strftime('%Y-%m-%d'),
+                                None, None, funcionarios)
+    if registros is None:
+        return None
+    ativos = {fid for (fid,) in db.session.query(Funcionario.id).filter(Funcionario.ativo == True)}
+    if funcionarios is not None:
+        ativos &= set(funcionarios)
+    vistos = {}
+    for reg in registros:
+        fid = str(reg.get('FuncionarioId'))
+        d = parse_date(reg.get('Data'))
+        if fid in ativos and d:
+            vistos.setdefault((fid, d), []).extend(horas_do_registro(reg))
+    n = registrar_secullum(vistos, completo=True, periodo=(data_inicio, data_fim), funcionarios=funcionarios)
+    db.session.commit()
+    return n
+
+
+# ── Comparação ────────────────────────────────────────────────────────────────
+
+def _escopo(q, dept=None, func_id=None):
+    q = (q.join(Funcionario, Funcionario.id == BatidaDigest.funcionario_id)
+         .where(Funcionario.ativo == True))
+    if func_id:
+        return q.where(BatidaDigest.funcionario_id == func_id)
+    if dept:
+        from services.facetas import filtrar_departamento
+        return filtrar_departamento(q, dept)
+    return q
+
+
+def divergencias(data_inicio, data_fim, dept=None, func_id=None) -> dict:
+    """Compara os digests do período e detalha só os dias divergentes.
+
+    Dias sem digest do Secullum (nunca vistos num sync) não entram na
+    comparação; são contados em `sem_referencia`.
+    """
+    D = BatidaDigest
+    no_periodo = (D.data >= data_inicio, D.data <= data_fim)
+    totais = db.session.execute(_escopo(select(
+        func.count(case((D.n_secullum > 0, 1))),
+        func.count(case((D.n_local > 0, 1))),
+        func.count(case((D.secullum_em.is_(None) & (D.n_local > 0), 1))),
+        func.min(D.secullum_em),
+    ).select_from(D).where(*no_periodo), dept, func_id)).one()
+
+    rows = db.session.execute(_escopo(
+        select(D.funcionario_id, D.data, D.n_local, D.n_secullum, D.horas_secullum_json,
+               Funcionario.nome, Funcionario.departamento)
+        .select_from(D)
+        .where(*no_periodo, D.secullum_em.isnot(None),
+               coalesce(D.digest_local, VAZIO) != D.digest_secullum)
+        .order_by(D.data, D.funcionario_id),
+        dept, func_id)).all()
+
+    # Detalhe local só dos dias divergentes
+    chaves = [(r.funcionario_id, r.data) for r in rows]
+    locais: dict[tuple, dict] = {}
+    for k in range(0, len(chaves), _LOTE_DIAS):
+        for fid, d, hora, tipo in (db.session.query(Batida.funcionario_id, Batida.data, Batida.hora, Batida.tipo)
+                                   .filter(tuple_(Batida.funcionario_id, Batida.data).in_(chaves[k:k + _LOTE_DIAS]))):
+            locais.setdefault((fid, d), {}).setdefault(hora, tipo)
+
+    lista = []
+    for r in rows:
+        sec = dict(json.loads(r.horas_secullum_json or '[]'))
+        loc = locais.get((r.funcionario_id, r.data), {})
+        lista.append({
+            'funcionario_id': r.funcionario_id,
+            'nome':           r.nome or r.funcionario_id,
+            'departamento':   r.departamento or '—',
+            'data':           r.data.strftime('%Y-%m-%d'),
+            'data_fmt':       r.data.strftime('%d/%m/%Y'),
+            'dia_semana':     ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom'][r.data.weekday()],
+            'n_secullum':     len(sec),
+            'n_local':        len(loc),
+            'faltando':       len(sec) - len(loc),  # positivo = temos menos que o Secullum
+            'so_secullum':    sorted(set(sec) - set(loc)),
+            'so_local':       sorted(set(loc) - set(sec)),
+            'secullum_horas': [f'{h} ({sec[h]})' for h in sorted(sec)],
+            'local_horas':    [f'{h} ({loc[h] or "?"})' for h in sorted(loc)],
+        })
+
+    return {
+        'total_dias_sec': totais[0] or 0,
+        'total_dias_loc': totais[1] or 0,
+        'sem_referencia': totais[2] or 0,
+        'secullum_desde': totais[3].isoformat(timespec='minutes') if totais[3] else None,
+        'divergencias':   lista,
+    }
+
+
+# ── Ressincronização dirigida ─────────────────────────────────────────────────
+
+def ressincronizar(dias):
+    """Busca de novo (dia completo) só os dias de `dias` [(funcionario_id, data)]
+    e grava só os funcionários envolvidos. Datas contíguas viram uma faixa; em
+    cada faixa o sync busca por funcionário (CPF/PIS) quando são poucos.
+    Retorna (ok, msg)."""
+    from services.sync_service import sync_batidas
+    por_data: dict = {}
+    for fid, d in dias:
+        por_data.setdefault(d, set()).add(fid)
+    if not por_data:
+        return True, 'Nada a ressincronizar.'
+
+    faixas, datas = [], sorted(por_data)
+    ini = fim = datas[0]
+    for d in datas[1:]:
+        if d != fim + timedelta(days=1):
+            faixas.append((ini, fim))
+            ini = d
+        fim = d
+    faixas.append((ini, fim))
+
+    msgs = []
+    for ini, fim in faixas:
+        funcs = set().union(*(por_data[d] for d in por_data if ini <= d <= fim))
+        ok, msg = sync_batidas(ini.strftime('%Y-%m-%d'), fim.strftime('%Y-%m-%d'), funcionarios=funcs)
+        if not ok:
+            return False, msg
+        msgs.append(msg)
+    return True, f'{len(dias)} dia(s) em {len(faixas)} faixa(s) de datas. ' + ' '.join(msgs)
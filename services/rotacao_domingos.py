@@ -0,0 +1,181 @@
+"""
+Rotação de domingos: domingos trabalhados (escala efetiva) de todos os
+funcionários do escopo num horizonte de semanas, carregados de uma vez — a
+matriz do cobertura_engine só com as colunas de domingo, uma consulta de
+exceções — e analisados com NumPy:
+
+- domingos consecutivos (Art. 386 – mulheres) e sequência atual;
+- distribuição dos domingos trabalhados (equidade);
+- próximo domingo elegível de cada funcionário.
+
+Usado pelo painel de alertas, pelo rodapé do quadro e pelo gerador de rotação.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+HORIZONTE_SEMANAS = 12
+
+_REGRA_386 = 'Art. 386 CLT – domingos consecutivos'
+
+
+def domingo_ate(d: date) -> date:
+    """Último domingo em ou antes de d."""
+    return d - timedelta(days=(d.weekday() + 1) % 7)
+
+
+def domingos_entre(data_ini: date, data_fim: date) -> list:
+    """Domingos em [data_ini, data_fim], em ordem."""
+    d = data_ini + timedelta(days=(6 - data_ini.weekday()) % 7)
+    domingos = []
+    while d <= data_fim:
+        domingos.append(d)
+        d += timedelta(days=7)
+    return domingos
+
+
+class RotacaoDomingos:
+    """Domingos trabalhados de N funcionários.
+
+    - funcs:     [{'id', 'nome', 'funcao', 'sexo', 'departamento'}] (linhas)
+    - domingos:  [date] em ordem (colunas), o primeiro só como contexto
+    - trabalhou: bool (n × domingos)
+    - inicio:    primeiro domingo do horizonte (os anteriores são contexto)
+    """
+
+    def __init__(self, funcs, domingos, trabalhou, inicio: date = None):
+        self.funcs = funcs
+        self.domingos = list(domingos)
+        self.trabalhou = np.asarray(trabalhou, dtype=bool).reshape(len(funcs), len(self.domingos))
+        self.inicio = inicio or (self.domingos[0] if self.domingos else None)
+        self._col = {d: i for i, d in enumerate(self.domingos)}
+        self._lin = {f['id']: i for i, f in enumerate(funcs)}
+
+    @classmethod
+    def de_matriz(cls, matriz, domingos, inicio: date = None) -> 'RotacaoDomingos':
+        """A partir de uma MatrizCobertura que tenha os domingos entre as colunas."""
+        domingos = list(domingos)
+        trabalhou = matriz.escalado[:, matriz.colunas(domingos)] if domingos else \
+            np.zeros((len(matriz.funcs), 0), dtype=bool)
+        return cls(matriz.funcs, domingos, trabalhou, inicio)
+
+    # ── Acesso ────────────────────────────────────────────────────────────────
+
+    def linha(self, func_id):
+        return self._lin.get(func_id)
+
+    def marcar(self, func_id, domingo: date, trabalha: bool = True):
+        """Sobrepõe uma célula (ex.: plano do gerador ainda não gravado)."""
+        i, c = self._lin.get(func_id), self._col.get(domingo)
+        if i is not None and c is not None:
+            self.trabalhou[i, c] = trabalha
+
+    @property
+    def mulheres(self) -> np.ndarray:
+        return np.array([f['sexo'] == 'F' for f in self.funcs], dtype=bool)
+
+    def _colunas(self, desde: date = None, ate: date = None) -> np.ndarray:
+        desde = desde or self.inicio
+        return np.array([desde <= d and (ate is None or d <= ate) for d in self.domingos], dtype=bool)
+
+    # ── Análises ──────────────────────────────────────────────────────────────
+
+    def consecutivos(self) -> np.ndarray:
+        """bool (n × domingos): trabalhou no domingo e no anterior (a 1ª coluna é False)."""
+        m = np.zeros_like(self.trabalhou)
+        m[:, 1:] = self.trabalhou[:, 1:] & self.trabalhou[:, :-1]
+        return m
+
+    def violacoes(self, desde: date = None, ate: date = None) -> list[dict]:
+        """Domingos consecutivos de funcionárias no horizonte (Art. 386), por nome e data."""
+        m = self.consecutivos() & self.mulheres[:, None] & self._colunas(desde, ate)[None, :]
+        violacoes = [{
+            'func_id':   self.funcs[i]['id'],
+            'func_nome': self.funcs[i]['nome'],
+            'data':      self.domingos[j].isoformat(),
+            'domingo_anterior': self.domingos[j - 1].isoformat(),
+            'regra':     _REGRA_386,
+        } for i, j in zip(*(x.tolist() for x in np.nonzero(m)))]
+        violacoes.sort(key=lambda v: (v['func_nome'], v['data']))
+        return violacoes
+
+    def sequencia(self, ate: date = None) -> np.ndarray:
+        """Domingos trabalhados seguidos terminando em `ate` (padrão: o último),
+        contados dentro do horizonte, por funcionário."""
+        fim = self._col[ate] if ate is not None else len(self.domingos) - 1
+        ini = self._col.get(self.inicio, 0)
+        if fim < ini or not self.funcs:
+            return np.zeros(len(self.funcs), dtype=np.int64)
+        m = self.trabalhou[:, ini:fim + 1][:, ::-1]
+        # Primeira folga (do mais recente para trás) = tamanho da sequência
+        return np.where(m.all(axis=1), m.shape[1], np.argmin(m, axis=1))
+
+    def trabalhados(self, desde: date = None, ate: date = None) -> np.ndarray:
+        """Domingos trabalhados no horizonte, por funcionário."""
+        return self.trabalhou[:, self._colunas(desde, ate)].sum(axis=1)
+
+    def equidade(self, desde: date = None, ate: date = None) -> dict:
+        """Distribuição dos domingos trabalhados: média, desvio padrão, mínimo,
+        máximo, {domingos: funcionários} e a lista por funcionário (mais domingos primeiro)."""
+        cols = self._colunas(desde, ate)
+        contagem = self.trabalhou[:, cols].sum(axis=1)
+        if not len(contagem):
+            return {'domingos': int(cols.sum()), 'media': 0.0, 'desvio': 0.0, 'minimo': 0,
+                    'maximo': 0, 'distribuicao': {}, 'funcionarios': []}
+        media = float(contagem.mean())
+        valores, qtd = np.unique(contagem, return_counts=True)
+        ordem = sorted(range(len(self.funcs)), key=lambda i: (-contagem[i], self.funcs[i]['nome']))
+        return {
+            'domingos':     int(cols.sum()),
+            'media':        round(media, 2),
+            'desvio':       round(float(contagem.std()), 2),
+            'minimo':       int(contagem.min()),
+            'maximo':       int(contagem.max()),
+            'distribuicao': {int(v): int(n) for v, n in zip(valores, qtd)},
+            'funcionarios': [{
+                'func_id':     self.funcs[i]['id'],
+                'func_nome':   self.funcs[i]['nome'],
+                'trabalhados': int(contagem[i]),
+                'diferenca':   round(float(contagem[i]) - media, 2),
+            } for i in ordem],
+        }
+
+    def proximo_elegivel(self, a_partir: date) -> list:
+        """Próximo domingo (>= a_partir, dentro do horizonte) em que cada funcionário
+        pode ser escalado: sem turno no dia e, para mulheres, sem trabalhar no
+        domingo anterior nem no seguinte. None se não houver no horizonte."""
+        t = self.trabalhou
+        vizinho = np.zeros_like(t)
+        vizinho[:, 1:] |= t[:, :-1]
+        vizinho[:, :-1] |= t[:, 1:]
+        elegivel = ~t & ~(vizinho & self.mulheres[:, None])
+        elegivel &= np.array([d >= a_partir for d in self.domingos], dtype=bool)[None, :]
+        tem = elegivel.any(axis=1)
+        col = np.argmax(elegivel, axis=1)
+        return [self.domingos[c] if ok else None for ok, c in zip(tem.tolist(), col.tolist())]
+
+
+def analisar_domingos(data_ini: date, data_fim: date, dept: str = '', funcao: str = '',
+                      func_ids=None) -> RotacaoDomingos:
+    """Rotação dos domingos em [data_ini, data_fim] + o domingo anterior como
+    contexto, dos funcionários ativos do dept/grupo e função (matriz em cache
+    por versão) ou de `func_ids` (sem cache)."""
+    from services.cobertura_engine import matriz_datas, matriz_funcionarios
+    domingos = domingos_entre(data_ini, data_fim)
+    inicio = domingos[0] if domingos else None
+    if domingos:
+        domingos.insert(0, domingos[0] - timedelta(days=7))
+    if func_ids is not None:
+        matriz = matriz_funcionarios(func_ids, domingos)
+    else:
+        matriz = matriz_datas(domingos, dept, funcao)
+    return RotacaoDomingos.de_matriz(matriz, domingos, inicio)
+
+
+def analisar_semanas(ate: date, semanas: int = HORIZONTE_SEMANAS, futuras: int = 0,
+                     dept: str = '', funcao: str = '', func_ids=None) -> RotacaoDomingos:
+    """Horizonte das `semanas` até o último domingo em/antes de `ate`, mais
+    `futuras` domingos à frente (para o próximo domingo elegível)."""
+    ultimo = domingo_ate(ate)
+    return analisar_domingos(ultimo - timedelta(weeks=semanas - 1), ultimo + timedelta(weeks=futuras),
+                             dept, funcao, func_ids)
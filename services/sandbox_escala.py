@@ -0,0 +1,630 @@
+"""
+Sandbox de escala ("e se?") – edições de um mês em memória, sem gravar.
+
+O gestor abre um sandbox para um mês/departamento/função e experimenta
+alterações (trocar duas pessoas, passar um departamento para 6x1, mudar o
+turno de um dia...). Cada edição é aplicada sobre uma cópia da escala efetiva
+(horário base + exceções) e os indicadores são recalculados só nas células e
+semanas afetadas:
+
+- infrações CLT (motor_clt.validar_alocacao_escala) do funcionário na janela
+  de ±7 dias de cada célula alterada;
+- cobertura por dia contra as metas do otimizador (CoberturaMinima por faixa
+  ou 1 pessoa por função/dia), com a contabilidade incremental da _Busca;
+- horas do mês, horas acima de 44h/semana e o custo pelo valor-hora do banco.
+
+O snapshot (ProblemaEscala montado do banco) não é alterado: a grade corrente
+é uma cópia e o overlay são as células diferentes do snapshot. O sandbox em
+si (SandboxEscala) guarda só a lista de operações; o estado em memória fica
+em cache por processo e é remontado (replay das operações) quando a escala
+muda ou em outro worker. Gravar transforma o overlay num único plano do
+gerador_escala (DELETE/UPDATE/INSERT em lote).
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from extensions import db
+
+CARGA_SEMANAL = 44.0
+JANELA_CLT = 7        # dias ao redor de uma célula cujas validações dependem dela
+_CACHE_MAX = 16
+_LIMITE_LISTAS = 50
+
+_cache: OrderedDict = OrderedDict()   # sandbox_id -> (versao_escala, n_edicoes, EstadoSandbox)
+_cache_lock = threading.Lock()
+
+
+def _copia_turno(t):
+    """Turno fora da sessão: o estado fica em cache entre requisições e os
+    objetos da sessão expiram no commit."""
+    from models import Turno
+    return Turno(**{c.key: getattr(t, c.key) for c in Turno.__table__.columns})
+
+
+def _data(valor) -> date:
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(str(valor))
+    except ValueError:
+        raise ValueError(f'Data inválida: {valor}')
+
+
+class EstadoSandbox:
+    """Escala do mês em memória com as edições aplicadas.
+
+    - p:         ProblemaEscala do mês (snapshot; p.inicial não muda)
+    - base:      turno do horário base por célula (-1 = sem), o que vale sem exceção
+    - X:         grade corrente (índice do turno em p.turnos, -1 = folga)
+    - alteradas: células (f, c) do mês diferentes do snapshot (o overlay)
+    - infracoes: {(f, c): [infrações]} das células escaladas do mês
+    """
+
+    def __init__(self, problema, base, turnos, valor_hora: float):
+        from services.motor_clt import _MemoTurno
+        from services.otimizador_escala import _Busca
+
+        p = self.p = problema
+        self.base = base
+        self.turnos = turnos
+        self.valor_hora = valor_hora
+        self.busca = _Busca(p, None)
+        self.X = self.busca.X
+        self.funcs = [SimpleNamespace(**f) for f in p.funcs]
+        self.lin = {f['id']: i for i, f in enumerate(p.funcs)}
+        self.col = {d: c for c, d in enumerate(p.datas)}
+        self.pos = {t['id']: i for i, t in enumerate(p.turnos)}
+        self.mes = range(p.mes_ini, p.mes_fim)
+        self.semanas_mes = sorted({p.semana[c] for c in self.mes})
+        self.memo = _MemoTurno()
+        self.avisos_replay: list = []
+
+        n_f, n_c = len(p.funcs), len(p.datas)
+        self.escala = {f['id']: {p.datas[c]: turnos[t] for c, t in enumerate(linha) if t >= 0}
+                       for f, linha in zip(p.funcs, self.X)}
+        self.alteradas: set = set()
+        self.escalados = [sum(1 for f in range(n_f) if self.X[f][c] >= 0) for c in range(n_c)]
+        self.dem_col = [[k for k, dem in enumerate(p.demandas) if dem['minimo'][c]] for c in range(n_c)]
+        self.faltas = [0] * n_c
+        for c in self.mes:
+            self.faltas[c] = self._faltas_coluna(c)
+        self.extras = [self._extras(f) for f in range(n_f)]
+        self.infracoes: dict = {}
+        for f in range(n_f):
+            for c in self.mes:
+                self._validar(f, c)
+
+        self.inicial = self.resumo()
+        self.infracoes_iniciais = dict(self.infracoes)
+        self.horas_iniciais = list(self.busca.h)
+        self.extras_iniciais = list(self.extras)
+
+    # Indicadores por célula / coluna / funcionário
+
+    def _validar(self, f, c):
+        from services.motor_clt import validar_alocacao_escala
+        self.infracoes.pop((f, c), None)
+        t = self.X[f][c]
+        if t < 0:
+            return
+        fid, d = self.p.funcs[f]['id'], self.p.datas[c]
+        dias = self.escala[fid]
+        turno = dias.pop(d)      # a célula é validada como nova (mesma convenção do validar_plano)
+        encontradas = validar_alocacao_escala(fid, d, turno, self.escala, self.funcs[f], self.memo)
+        dias[d] = turno
+        if encontradas:
+            self.infracoes[(f, c)] = encontradas
+
+    def _faltas_coluna(self, c) -> int:
+        cov = self.busca.cov
+        faltas = 0
+        for k in self.dem_col[c]:
+            m = self.p.demandas[k]['minimo'][c]
+            if cov[k][c] < m:
+                faltas += m - cov[k][c]
+        return faltas
+
+    def _extras(self, f) -> float:
+        sem = self.busca.sem[f]
+        return sum(max(0.0, sem[w] - CARGA_SEMANAL) for w in self.semanas_mes)
+
+    def _mudar(self, f, c, novo) -> bool:
+        antigo = self.X[f][c]
+        if novo == antigo:
+            return False
+        self.busca._trocar_celula(f, c, novo)
+        dias = self.escala[self.p.funcs[f]['id']]
+        d = self.p.datas[c]
+        if novo >= 0:
+            dias[d] = self.turnos[novo]
+        else:
+            dias.pop(d, None)
+        self.escalados[c] += (novo >= 0) - (antigo >= 0)
+        if novo == self.p.inicial[f][c]:
+            self.alteradas.discard((f, c))
+        else:
+            self.alteradas.add((f, c))
+        return True
+
+    def _recalcular(self, tocadas):
+        """Revalida só a vizinhança das células tocadas."""
+        p = self.p
+        janelas: dict = {}
+        colunas = set()
+        for f, c in tocadas:
+            janelas.setdefault(f, set()).update(
+                range(max(p.mes_ini, c - JANELA_CLT), min(p.mes_fim, c + JANELA_CLT + 1)))
+            colunas.update((c, c + 1))   # turno noturno cobre a faixa da madrugada seguinte
+        for f, cols in janelas.items():
+            for c in cols:
+                self._validar(f, c)
+            self.extras[f] = self._extras(f)
+        for c in colunas:
+            if p.mes_ini <= c < p.mes_fim:
+                self.faltas[c] = self._faltas_coluna(c)
+
+    # Operações
+
+    def _linha(self, func_id) -> int:
+        f = self.lin.get(str(func_id))
+        if f is None:
+            raise ValueError(f'Funcionário {func_id} fora do escopo do sandbox.')
+        return f
+
+    def _coluna(self, valor) -> int:
+        c = self.col.get(_data(valor))
+        if c is None or c not in self.mes:
+            raise ValueError(f'Data {valor} fora do mês do sandbox.')
+        return c
+
+    def _turno(self, turno_id) -> int:
+        try:
+            return self.pos[int(turno_id)]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Turno {turno_id} não encontrado.')
+
+    def _intervalo(self, op) -> range:
+        p = self.p
+        c_ini = self._coluna(op['data_ini']) if op.get('data_ini') else p.mes_ini
+        c_fim = self._coluna(op['data_fim']) if op.get('data_fim') else p.mes_fim - 1
+        if c_fim < c_ini:
+            raise ValueError('Data final anterior à inicial.')
+        return range(c_ini, c_fim + 1)
+
+    def _recusa(self, f, c, motivo) -> dict:
+        return {'func_id': self.p.funcs[f]['id'], 'func_nome': self.p.funcs[f]['nome'],
+                'data': self.p.datas[c].isoformat(), 'motivo': motivo}
+
+    def _op_definir(self, op):
+        """Um dia de um funcionário. turno_id vazio = sem exceção (volta ao horário base)."""
+        f = self._linha(op.get('funcionario_id'))
+        c = self._coluna(op.get('data'))
+        tid = op.get('turno_id')
+        novo = self._turno(tid) if tid not in (None, '') else self.base[f][c]
+        return [(f, c, novo)], []
+
+    def _op_trocar(self, op):
+        """Troca a escala de dois funcionários dia a dia no intervalo."""
+        a = self._linha(op.get('funcionario_a'))
+        b = self._linha(op.get('funcionario_b'))
+        if a == b:
+            raise ValueError('Escolha dois funcionários diferentes.')
+        if not op.get('data_fim') and op.get('data_ini'):
+            op = {**op, 'data_fim': op['data_ini']}
+        celulas, recusadas = [], []
+        for c in self._intervalo(op):
+            ta, tb = self.X[a][c], self.X[b][c]
+            if ta == tb:
+                continue
+            if (tb < 0 and self.base[a][c] >= 0) or (ta < 0 and self.base[b][c] >= 0):
+                recusadas.append(self._recusa(a if tb < 0 else b, c, 'Folga em dia do horário base'))
+                continue
+            celulas += [(a, c, tb), (b, c, ta)]
+        return celulas, recusadas
+
+    def _op_padrao(self, op):
+        """Ciclo trabalho/folga (ex.: 6x1) para vários funcionários no intervalo."""
+        from services.gerador_escala import celulas_padrao
+        t = self._turno(op.get('turno_id'))
+        dias_trabalho = int(op.get('dias_trabalho') or 0)
+        dias_folga = int(op.get('dias_folga') or 0)
+        if dias_trabalho <= 0:
+            raise ValueError('Informe os dias de trabalho do ciclo.')
+        if op.get('funcionarios'):
+            linhas = [self._linha(fid) for fid in op['funcionarios']]
+        else:
+            dept = op.get('departamento') or None
+            linhas = [f for f, fn in enumerate(self.p.funcs) if not dept or fn['departamento'] == dept]
+        if not linhas:
+            raise ValueError('Nenhum funcionário para aplicar o padrão.')
+        cols = self._intervalo(op)
+        ciclo = dias_trabalho + dias_folga
+        defasagem = int(op.get('defasagem') or 0)
+        func_ids = [self.p.funcs[f]['id'] for f in linhas]
+        alvo = celulas_padrao(func_ids, self.p.datas[cols[0]], self.p.datas[cols[-1]],
+                              self.p.turnos[t]['id'], dias_semana=self.turnos[t].dias_semana_list,
+                              dias_trabalho=dias_trabalho, dias_folga=dias_folga,
+                              posicoes=[(-i * defasagem) % ciclo for i in range(len(linhas))])
+        celulas, recusadas = [], []
+        for f, fid in zip(linhas, func_ids):
+            for c in cols:
+                if (fid, self.p.datas[c]) in alvo:
+                    celulas.append((f, c, t))
+                elif self.base[f][c] >= 0:
+                    recusadas.append(self._recusa(f, c, 'Folga em dia do horário base'))
+                else:
+                    celulas.append((f, c, -1))
+        return celulas, recusadas
+
+    _OPERACOES = {'definir': _op_definir, 'trocar': _op_trocar, 'padrao': _op_padrao}
+
+    def aplicar(self, op: dict) -> dict:
+        """Aplica uma operação. Erros de parâmetro (ValueError) não mudam nada."""
+        metodo = self._OPERACOES.get(op.get('op'))
+        if metodo is None:
+            raise ValueError(f'Operação desconhecida: {op.get("op")}')
+        celulas, recusadas = metodo(self, op)
+        tocadas = {(f, c) for f, c, novo in celulas if self._mudar(f, c, novo)}
+        self._recalcular(tocadas)
+        return {'alteradas': len(tocadas), 'recusadas': recusadas[:_LIMITE_LISTAS],
+                'total_recusadas': len(recusadas)}
+
+    # Resultados
+
+    def resumo(self) -> dict:
+        erros = sum(1 for v in self.infracoes.values() if any(i.get('severity', 'error') == 'error' for i in v))
+        horas = sum(self.busca.h)
+        extras = sum(self.extras)
+        return {
+            'alteradas':        len(self.alteradas),
+            'infracoes':        erros,
+            'avisos':           len(self.infracoes) - erros,
+            'faltas':           sum(self.faltas[c] for c in self.mes),
+            'dias_descobertos': sum(1 for c in self.mes if self.faltas[c]),
+            'horas_mes':        round(horas, 1),
+            'horas_extras':     round(extras, 1),
+            'custo_extras':     round(extras * self.valor_hora, 2),
+        }
+
+    def impacto(self, atual: dict = None) -> dict:
+        """Diferença contra o snapshot. custo_horas = delta de horas × valor-hora
+        (mesma conta do simulador financeiro)."""
+        atual = atual or self.resumo()
+        delta = {k: round(atual[k] - self.inicial[k], 2) for k in atual if k != 'alteradas'}
+        delta['custo_horas'] = round(delta['horas_mes'] * self.valor_hora, 2)
+        return delta
+
+    def _nome_turno(self, t) -> str:
+        return self.p.turnos[t]['nome'] if t >= 0 else 'Folga'
+
+    def painel(self, limite: int = _LIMITE_LISTAS) -> dict:
+        """Tudo o que a tela do sandbox mostra."""
+        p = self.p
+        atual = self.resumo()
+
+        infracoes = []
+        for (f, c), v in self.infracoes.items():
+            infracoes.append({
+                'func_id':    p.funcs[f]['id'],
+                'func_nome':  p.funcs[f]['nome'],
+                'data':       p.datas[c].isoformat(),
+                'mensagens':  [i['message'] for i in v],
+                'bloqueante': any(i.get('severity', 'error') == 'error' for i in v),
+                'nova':       self.infracoes_iniciais.get((f, c)) != v,
+            })
+        infracoes.sort(key=lambda i: (not i['nova'], not i['bloqueante'], i['data'], i['func_nome']))
+        resolvidas = sum(1 for k in self.infracoes_iniciais if k not in self.infracoes)
+
+        funcionarios = []
+        for f, fn in enumerate(p.funcs):
+            dh = self.busca.h[f] - self.horas_iniciais[f]
+            de = self.extras[f] - self.extras_iniciais[f]
+            if abs(dh) > 1e-9 or abs(de) > 1e-9:
+                funcionarios.append({
+                    'func_id':      fn['id'],
+                    'func_nome':    fn['nome'],
+                    'horas':        round(self.busca.h[f], 1),
+                    'delta_horas':  round(dh, 1),
+                    'horas_extras': round(self.extras[f], 1),
+                    'delta_extras': round(de, 1),
+                })
+        funcionarios.sort(key=lambda x: (-abs(x['delta_horas']), x['func_nome']))
+
+        alteracoes = [{
+            'func_id':   p.funcs[f]['id'],
+            'func_nome': p.funcs[f]['nome'],
+            'data':      p.datas[c].isoformat(),
+            'de':        self._nome_turno(p.inicial[f][c]),
+            'para':      self._nome_turno(self.X[f][c]),
+        } for f, c in sorted(self.alteradas, key=lambda k: (p.datas[k[1]], p.funcs[k[0]]['nome']))]
+
+        return {
+            'resumo':             atual,
+            'inicial':            self.inicial,
+            'impacto':            self.impacto(atual),
+            'valor_hora':         self.valor_hora,
+            'cobertura':          [{'data': p.datas[c].isoformat(), 'escalados': self.escalados[c],
+                                    'faltas': self.faltas[c]} for c in self.mes],
+            'infracoes':          infracoes[:limite],
+            'total_infracoes':    len(infracoes),
+            'infracoes_resolvidas': resolvidas,
+            'funcionarios':       funcionarios[:limite],
+            'alteracoes':         alteracoes[:limite],
+            'total_alteracoes':   len(alteracoes),
+            'avisos_replay':      self.avisos_replay,
+        }
+
+    def alteracoes(self):
+        """Overlay como entrada do gerador_escala: (alvo {(func_id, data): turno_id},
+        remover [(func_id, data)]). Voltar ao turno do horário base (ou à folga,
+        sem horário base) = remover a exceção."""
+        alvo, remover = {}, []
+        for f, c in sorted(self.alteradas):
+            chave = (self.p.funcs[f]['id'], self.p.datas[c])
+            t = self.X[f][c]
+            if t == self.base[f][c]:
+                remover.append(chave)
+            else:
+                alvo[chave] = self.p.turnos[t]['id']
+        return alvo, remover
+
+
+# ── Montagem e cache ──────────────────────────────────────────────────────────
+
+def _montar_estado(sandbox) -> EstadoSandbox:
+    """Snapshot do mês (escala efetiva atual) + replay das operações do sandbox."""
+    from models import Funcionario, Turno
+    from services.banco_horas_service import get_config
+    from services.otimizador_escala import montar_problema
+
+    p = montar_problema(sandbox.ano, sandbox.mes, sandbox.departamento or '', sandbox.funcao or '')
+    orm = {t.id: t for t in Turno.query.all()}
+    turnos = [_copia_turno(orm[t['id']]) for t in p.turnos]
+    pos = {t['id']: i for i, t in enumerate(p.turnos)}
+
+    base_ids = dict(
+        db.session.query(Funcionario.id, Funcionario.horario_base_id)
+        .filter(Funcionario.id.in_([f['id'] for f in p.funcs]))
+    ) if p.funcs else {}
+    base = []
+    for f in p.funcs:
+        t = pos.get(base_ids.get(f['id']), -1)
+        dias = set(turnos[t].dias_semana_list) if t >= 0 else set()
+        base.append([t if wd in dias else -1 for wd in p.wd])
+
+    try:
+        valor_hora = float(get_config('banco_horas_valor_hora', '0') or 0)
+    except ValueError:
+        valor_hora = 0.0
+    estado = EstadoSandbox(p, base, turnos, valor_hora)
+    for i, op in enumerate(sandbox.edicoes, 1):
+        try:
+            estado.aplicar(op)
+        except ValueError as e:
+            estado.avisos_replay.append(f'Edição {i} ({op.get("descricao") or op.get("op")}) ignorada: {e}')
+    return estado
+
+
+def _obter(sandbox):
+    """Estado do sandbox, retirado do cache (uso exclusivo até _devolver)."""
+    from services.escala_versao import versao_atual
+    versao = versao_atual()
+    with _cache_lock:
+        item = _cache.pop(sandbox.id, None)
+    if item and item[0] == versao and item[1] == len(sandbox.edicoes):
+        return item[2], versao
+    return _montar_estado(sandbox), versao
+
+
+def _devolver(sandbox, versao: int, estado: EstadoSandbox):
+    with _cache_lock:
+        _cache[sandbox.id] = (versao, len(sandbox.edicoes), estado)
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+
+
+def _esquecer(sandbox_id: int):
+    with _cache_lock:
+        _cache.pop(sandbox_id, None)
+
+
+# ── API do sandbox ────────────────────────────────────────────────────────────
+
+def criar_sandbox(ano: int, mes: int, dept: str = '', funcao: str = '', nome: str = '',
+                  usuario_id=None):
+    from models import SandboxEscala
+    from services.escala_versao import versao_atual
+    sandbox = SandboxEscala(
+        nome=nome or f'Rascunho {mes:02d}/{ano}', usuario_id=usuario_id, ano=ano, mes=mes,
+        departamento=dept or None, funcao=funcao or None, versao_base=versao_atual(),
+    )
+    db.session.add(sandbox)
+    db.session.commit()
+    return sandbox
+
+
+def painel(sandbox) -> dict:
+    estado, versao = _obter(sandbox)
+    try:
+        return estado.painel()
+    finally:
+        _devolver(sandbox, versao, estado)
+
+
+def _descrever(op: dict, estado: EstadoSandbox) -> str:
+    def nome(fid):
+        f = estado.lin.get(str(fid))
+        return estado.p.funcs[f]['nome'] if f is not None else str(fid)
+
+    def turno(tid):
+        t = estado.pos.get(int(tid)) if str(tid).isdigit() else None
+        return estado.p.turnos[t]['nome'] if t is not None else str(tid)
+
+    if op['op'] == 'definir':
+        destino = turno(op['turno_id']) if op.get('turno_id') else 'horário base'
+        return f"{nome(op.get('funcionario_id'))} em {op.get('data')}: {destino}"
+    periodo = op.get('data_ini') or 'mês todo'
+    if op.get('data_fim') and op.get('data_fim') != op.get('data_ini'):
+        periodo = f"{op.get('data_ini') or 'início do mês'} a {op['data_fim']}"
+    if op['op'] == 'trocar':
+        return f"Troca {nome(op.get('funcionario_a'))} ↔ {nome(op.get('funcionario_b'))} ({periodo})"
+    ciclo = op.get('nome') or f"{op.get('dias_trabalho')}x{op.get('dias_folga') or 0}"
+    quem = f"{len(op['funcionarios'])} funcionário(s)" if op.get('funcionarios') else (op.get('departamento') or 'todos')
+    return f"{ciclo} ({turno(op.get('turno_id'))}) para {quem} ({periodo})"
+
+
+def _normalizar(op: dict) -> dict:
+    """Resolve o PadraoTurno no momento da edição: o replay não depende do
+    cadastro do padrão continuar igual."""
+    op = {k: v for k, v in op.items() if v not in (None, '', [])}
+    if op.get('op') == 'padrao' and op.get('padrao_id'):
+        from models import PadraoTurno
+        padrao = db.session.get(PadraoTurno, int(op.pop('padrao_id')))
+        if padrao is None:
+            raise ValueError('Padrão não encontrado.')
+        op.setdefault('turno_id', padrao.turno_id)
+        op.update(dias_trabalho=padrao.dias_trabalho, dias_folga=padrao.dias_folga, nome=padrao.nome)
+        if not op.get('turno_id'):
+            raise ValueError(f'O padrão "{padrao.nome}" não tem turno; escolha um turno.')
+    return op
+
+
+def editar(sandbox, op: dict) -> dict:
+    """Aplica uma operação ao sandbox (sem tocar na escala) e devolve o painel
+    atualizado. ValueError se a operação for inválida."""
+    if sandbox.status != 'aberto':
+        raise ValueError(f'Sandbox {sandbox.status}.')
+    op = _normalizar(op)
+    estado, versao = _obter(sandbox)
+    try:
+        resultado = estado.aplicar(op)
+    except ValueError:
+        _devolver(sandbox, versao, estado)
+        raise
+    op['descricao'] = _descrever(op, estado)
+    sandbox.edicoes = sandbox.edicoes + [op]
+    db.session.commit()
+    _devolver(sandbox, versao, estado)
+    return {**resultado, 'descricao': op['descricao'], 'painel': estado.painel()}
+
+
+def desfazer(sandbox) -> dict:
+    """Remove a última operação (o estado é remontado por replay)."""
+    if sandbox.status != 'aberto':
+        raise ValueError(f'Sandbox {sandbox.status}.')
+    edicoes = sandbox.edicoes
+    if not edicoes:
+        raise ValueError('Nada para desfazer.')
+    sandbox.edicoes = edicoes[:-1]
+    db.session.commit()
+    _esquecer(sandbox.id)
+    return painel(sandbox)
+
+
+def descartar(sandbox):
+    sandbox.status = 'descartado'
+    db.session.commit()
+    _esquecer(sandbox.id)
+
+
+def _conflitos(versao_base: int, celulas: set) -> list[dict]:
+    """Células do sandbox alteradas na escala depois que ele foi aberto."""
+    from services.escala_versao import alteracoes_desde
+    alteracoes = alteracoes_desde(versao_base)
+    if alteracoes is None:
+        return [{'motivo': 'O histórico de alterações da escala já foi limpo; não é possível conferir conflitos.'}]
+    conflitos, vistos = [], set()
+    for a in alteracoes:
+        if a.entidade == 'lote' and 'lote' not in vistos:
+            vistos.add('lote')
+            conflitos.append({'motivo': 'Houve uma alteração em massa na escala depois da abertura do sandbox.'})
+        elif a.entidade == 'alocacao' and (a.funcionario_id, a.data) in celulas \
+                and (a.funcionario_id, a.data) not in vistos:
+            vistos.add((a.funcionario_id, a.data))
+            conflitos.append({'func_id': a.funcionario_id, 'data': a.data.isoformat(),
+                              'motivo': 'Célula alterada na escala depois da abertura do sandbox.'})
+    return conflitos
+
+
+def gravar(sandbox, validar: bool = True, forcar: bool = False) -> dict:
+    """Grava o overlay como um único plano (gerador_escala). Com conflitos
+    (células alteradas na escala depois da abertura) só grava com `forcar`;
+    com `validar`, infrações CLT bloqueantes impedem a gravação."""
+    from services.gerador_escala import planejar, validar_plano, aplicar_plano, UPSERT
+    if sandbox.status != 'aberto':
+        return {'ok': False, 'error': f'Sandbox {sandbox.status}.'}
+    estado, versao = _obter(sandbox)
+    alvo, remover = estado.alteracoes()
+    _devolver(sandbox, versao, estado)
+    if not alvo and not remover:
+        return {'ok': False, 'error': 'Nenhuma alteração para gravar.'}
+
+    conflitos = _conflitos(sandbox.versao_base, set(alvo) | set(remover))
+    if conflitos and not forcar:
+        return {'ok': False, 'error': 'A escala mudou depois da abertura do sandbox.', 'conflitos': conflitos}
+
+    plano = planejar(alvo, modo=UPSERT, remover=remover)
+    if validar:
+        validar_plano(plano)
+        if plano.bloqueantes:
+            return {'ok': False, 'error': f'{len(plano.bloqueantes)} alocação(ões) com infração CLT bloqueante.',
+                    'plano': plano.resumo()}
+    gravadas = aplicar_plano(plano, commit=False)
+    sandbox.status = 'gravado'
+    db.session.commit()
+    _esquecer(sandbox.id)
+    return {'ok': True, 'gravadas': gravadas, 'removidas': len(plano.remover), 'plano': plano.resumo()}
+
+
+# ── Simulação pontual (financeiro.simular_escala) ─────────────────────────────
+
+def simular_funcionario(func_id: str, turno, data_ini: date, data_fim: date,
+                        substituir: bool = False) -> dict:
+    """Impacto em horas de aplicar `turno` nos dias da semana dele em
+    [data_ini, data_fim], contra a escala efetiva atual do funcionário.
+    Com `substituir` (aplicar a dias futuros), as outras exceções do período
+    somem, como em _aplicar_escala_futuro. Horas extras = acima de 44h nas
+    semanas seg–dom tocadas."""
+    from models import Funcionario
+    from services.motor_clt import carregar_escala_efetiva, _MemoTurno
+
+    func = db.session.get(Funcionario, func_id)
+    seg = data_ini - timedelta(days=data_ini.weekday())
+    dom = data_fim + timedelta(days=6 - data_fim.weekday())
+    escala = carregar_escala_efetiva([func_id], seg, dom).get(func_id, {})
+    t_base = func.horario_base if func else None
+    dias_base = set(t_base.dias_semana_list) if t_base else set()
+    dias_turno = set(turno.dias_semana_list)
+
+    memo = _MemoTurno()
+    antes, depois = {}, {}
+    dias = 0
+    d = seg
+    while d <= dom:
+        base = t_base if d.weekday() in dias_base else None
+        atual = escala.get(d)
+        novo = atual
+        if data_ini <= d <= data_fim:
+            if d.weekday() in dias_turno:
+                novo = turno
+                dias += 1
+            elif substituir:
+                novo = base
+        antes[d] = memo.duracao(atual, d) if atual is not None else 0.0
+        depois[d] = memo.duracao(novo, d) if novo is not None else 0.0
+        d += timedelta(days=1)
+
+    def _extras(horas):
+        semanas: dict = {}
+        for dia, h in horas.items():
+            semanas[(dia - seg).days // 7] = semanas.get((dia - seg).days // 7, 0.0) + h
+        return sum(max(0.0, h - CARGA_SEMANAL) for h in semanas.values())
+
+    periodo = [dia for dia in antes if data_ini <= dia <= data_fim]
+    return {
+        'dias':         dias,
+        'delta_horas':  sum(depois[dia] - antes[dia] for dia in periodo),
+        'delta_extras': _extras(depois) - _extras(antes),
+    }
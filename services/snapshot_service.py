@@ -0,0 +1,231 @@
+"""
+Snapshot operacional do dashboard (uma linha por departamento por dia).
+
+Mantido incrementalmente pelo pipeline de sync: após cada ingestão de batidas
+apenas os departamentos tocados são recalculados. O dashboard e o polling de deltas
+leem as linhas prontas de `snapshot_unidades` em vez de rodar as consultas
+agregadas a cada acesso.
+
+`versao` é um contador global lido pelo polling de deltas (`versao > v`): dois
+escritores simultâneos (sync, consumidor `dashboard` dos eventos de batidas,
+correção manual) não podem repetir versão nem commitar uma versão menor depois
+de uma maior. A versão é lida só depois de as linhas estarem gravadas na
+transação — no PostgreSQL sob um advisory lock de transação (como em
+eventos_batidas.publicar); no SQLite a própria escrita já segura a trava do
+banco até o commit.
+"""
+import json
+import zlib
+from datetime import date, datetime
+
+from sqlalchemy import func, select
+
+from extensions import db
+from models import Funcionario, Batida, BatidaInconsistencia, SnapshotUnidade
+
+_TOLERANCIA_ATRASO_MIN = 15   # minutos após o início do turno para contar como atraso
+_MAX_AUSENTES_LISTA    = 20   # nomes de ausentes guardados por unidade
+
+_CHAVE_VERSAO = zlib.crc32(b'snapshot_unidades')
+
+_CAMPOS = ('ativos', 'escalados', 'presentes', 'em_jornada', 'ausentes',
+           'atrasados', 'batidas', 'inconsistencias', 'ultima_batida', 'ausentes_json')
+
+
+def _hora_para_min(hora_str):
+    try:
+        h, m = hora_str.strip().split(':')[:2]
+        return int(h) * 60 + int(m)
+    except Exception:
+        return None
+
+
+def _filtro_depts(q, departamentos):
+    """Restringe a query aos departamentos informados ('' = sem departamento)."""
+    if departamentos is None:
+        return q
+    nomes = [d for d in departamentos if d]
+    conds = []
+    if nomes:
+        conds.append(Funcionario.departamento.in_(nomes))
+    if '' in departamentos:
+        conds.append(Funcionario.departamento.is_(None))
+    if not conds:
+        return q.filter(db.false())
+    return q.filter(db.or_(*conds))
+
+
+def _calcular(data_ref: date, departamentos=None) -> dict[str, dict]:
+    """Calcula os indicadores por departamento com três consultas agregadas."""
+    resultado: dict[str, dict] = {}
+
+    def _linha(dept):
+        return resultado.setdefault(dept or '', {
+            'ativos': 0, 'escalados': 0, 'presentes': 0, 'em_jornada': 0,
+            'ausentes': 0, 'atrasados': 0, 'batidas': 0, 'inconsistencias': 0,
+            'ultima_batida': None, 'ausentes_lista': [],
+        })
+
+    # 1. Ativos por departamento
+    q_ativos = (
+        db.session.query(Funcionario.departamento, func.count(Funcionario.id))
+        .filter(Funcionario.ativo == True)
+    )
+    for dept, total in _filtro_depts(q_ativos, departamentos).group_by(Funcionario.departamento):
+        _linha(dept)['ativos'] = total
+
+    # 2. Batidas do dia agregadas por funcionário
+    q_bat = (
+        db.session.query(
+            Batida.funcionario_id,
+            Funcionario.departamento,
+            func.count(Batida.id),
+            func.min(Batida.hora),
+            func.max(Batida.hora),
+        )
+        .join(Funcionario, Funcionario.id == Batida.funcionario_id)
+        .filter(Batida.data == data_ref, Funcionario.ativo == True)
+    )
+    q_bat = _filtro_depts(q_bat, departamentos).group_by(Batida.funcionario_id, Funcionario.departamento)
+    primeira_batida: dict[str, str] = {}
+    for fid, dept, total, primeira, ultima in q_bat:
+        linha = _linha(dept)
+        linha['presentes'] += 1
+        linha['batidas'] += total
+        if total % 2 == 1:
+            linha['em_jornada'] += 1
+        if ultima and (linha['ultima_batida'] is None or ultima > linha['ultima_batida']):
+            linha['ultima_batida'] = ultima
+        primeira_batida[fid] = primeira
+
+    # 2b. Inconsistências abertas do dia (achados gravados na ingestão)
+    q_inc = (
+        db.session.query(Funcionario.departamento, func.count(BatidaInconsistencia.id))
+        .join(Funcionario, Funcionario.id == BatidaInconsistencia.funcionario_id)
+        .filter(BatidaInconsistencia.data == data_ref, BatidaInconsistencia.aberta == True,
+                Funcionario.ativo == True)
+    )
+    for dept, total in _filtro_depts(q_inc, departamentos).group_by(Funcionario.departamento):
+        _linha(dept)['inconsistencias'] = total
+
+    # 3. Escalados do dia (escala efetiva: exceção ou horário base) com o turno para checar atraso
+    from services.escala_efetiva import escalados_no_dia
+    q_func = (
+        db.session.query(Funcionario.id, Funcionario.nome, Funcionario.departamento)
+        .filter(Funcionario.ativo == True)
+    )
+    funcs = _filtro_depts(q_func, departamentos).order_by(Funcionario.nome).all()
+    escalados = escalados_no_dia(data_ref, [fid for fid, _, _ in funcs])
+    agora_min = None
+    if data_ref == date.today():
+        agora = datetime.now()
+        agora_min = agora.hour * 60 + agora.minute
+    for fid, nome, dept in funcs:
+        cel = escalados.get(fid)
+        if cel is None:
+            continue
+        linha = _linha(dept)
+        linha['escalados'] += 1
+        ini_min = cel.inicio.hour * 60 + cel.inicio.minute
+        primeira = primeira_batida.get(fid)
+        if primeira is None:
+            linha['ausentes'] += 1
+            if len(linha['ausentes_lista']) < _MAX_AUSENTES_LISTA:
+                linha['ausentes_lista'].append({'id': fid, 'nome': nome})
+            # Ainda sem batida e já passou da tolerância → também conta como atraso
+            if agora_min is not None and agora_min > ini_min + _TOLERANCIA_ATRASO_MIN:
+                linha['atrasados'] += 1
+        else:
+            p_min = _hora_para_min(primeira)
+            if p_min is not None and p_min > ini_min + _TOLERANCIA_ATRASO_MIN:
+                linha['atrasados'] += 1
+
+    return resultado
+
+
+def atualizar_snapshot(data_ref: date = None, departamentos=None) -> list[dict]:
+    """Recalcula e persiste o snapshot do dia.
+
+    departamentos=None recalcula todas as unidades; uma lista limita o
+    recálculo às unidades tocadas pelo último sync. Só incrementa `versao`
+    das linhas cujos valores mudaram. Retorna as linhas alteradas (dicts).
+    """
+    data_ref = data_ref or date.today()
+    if departamentos is not None:
+        departamentos = {d or '' for d in departamentos}
+        if not departamentos:
+            return []
+
+    calculado = _calcular(data_ref, departamentos)
+
+    q_exist = SnapshotUnidade.query.filter_by(data=data_ref)
+    if departamentos is not None:
+        q_exist = q_exist.filter(SnapshotUnidade.departamento.in_(list(departamentos)))
+    existentes = {s.departamento: s for s in q_exist.all()}
+
+    # Unidades recalculadas que não têm mais ninguém ficam zeradas
+    for dept in existentes:
+        calculado.setdefault(dept, {
+            'ativos': 0, 'escalados': 0, 'presentes': 0, 'em_jornada': 0,
+            'ausentes': 0, 'atrasados': 0, 'batidas': 0, 'inconsistencias': 0,
+            'ultima_batida': None, 'ausentes_lista': [],
+        })
+
+    alterados = []
+    agora = datetime.utcnow()
+    for dept, valores in calculado.items():
+        valores = dict(valores)
+        valores['ausentes_json'] = json.dumps(valores.pop('ausentes_lista'), ensure_ascii=False)
+        snap = existentes.get(dept)
+        if snap is None:
+            snap = SnapshotUnidade(departamento=dept, data=data_ref)
+            db.session.add(snap)
+        elif all(getattr(snap, c) == valores[c] for c in _CAMPOS):
+            continue
+        for campo in _CAMPOS:
+            setattr(snap, campo, valores[campo])
+        snap.atualizado_em = agora
+        alterados.append(snap)
+
+    if alterados:
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(select(func.pg_advisory_xact_lock(_CHAVE_VERSAO)))
+        db.session.flush()
+        versao = db.session.query(func.max(SnapshotUnidade.versao)).scalar() or 0
+        for snap in alterados:
+            versao += 1
+            snap.versao = versao
+    db.session.commit()
+    return [s.to_dict() for s in alterados]
+
+
+def snapshot_do_dia(data_ref: date = None) -> list[SnapshotUnidade]:
+    """Linhas do snapshot do dia; calcula na hora se o sync ainda não gerou nenhuma."""
+    data_ref = data_ref or date.today()
+    linhas = SnapshotUnidade.query.filter_by(data=data_ref).order_by(SnapshotUnidade.departamento).all()
+    if not linhas:
+        atualizar_snapshot(data_ref)
+        linhas = SnapshotUnidade.query.filter_by(data=data_ref).order_by(SnapshotUnidade.departamento).all()
+    return linhas
+
+
+def alteracoes_desde(versao: int, data_ref: date = None) -> list[dict]:
+    """Linhas do dia com versão maior que `versao` (deltas para o polling do dashboard)."""
+    data_ref = data_ref or date.today()
+    linhas = (
+        SnapshotUnidade.query
+        .filter(SnapshotUnidade.data == data_ref, SnapshotUnidade.versao > versao)
+        .order_by(SnapshotUnidade.versao)
+        .all()
+    )
+    return [s.to_dict() for s in linhas]
+
+
+def totais(linhas) -> dict:
+    """Soma os indicadores de todas as unidades para os cards do dashboard."""
+    tot = {c: 0 for c in ('ativos', 'escalados', 'presentes', 'em_jornada',
+                          'ausentes', 'atrasados', 'batidas', 'inconsistencias')}
+    for s in linhas:
+        for c in tot:
+            tot[c] += getattr(s, c) or 0
+    return tot
@@ -4,56 +4,49 @@ Usados pela Etapa 4 do módulo de Escala Inteligente (prd.md).
 """
 import calendar as cal_mod
 from datetime import date, timedelta
-from models import AlocacaoDiaria, Funcionario, BancoHorasSaldo, Turno, GrupoDepartamento
-from extensions import db
 
+import numpy as np
 
-def _filtrar_dept(q, dept_str: str):
-    """Suporta grupos de departamentos na filtragem."""
-    if not dept_str:
-        return q
-    grupo = GrupoDepartamento.query.filter_by(nome=dept_str).first()
-    depts = grupo.departamentos if grupo else [dept_str]
-    if len(depts) == 1:
-        return q.filter(Funcionario.departamento == depts[0])
-    return q.filter(Funcionario.departamento.in_(depts))
+from models import Funcionario, BancoHorasSaldo, Turno
+from extensions import db
+from services.facetas import filtrar_departamento
 
 
-def alertas_cobertura(mes_ano: str, dept: str = None, funcao: str = None) -> list[dict]:
-    """Retorna lista de dias do mês onde a cobertura para dept/função é zero."""
+def _escala_bits_mes(mes_ano: str, dept: str = None, funcao: str = None):
+    """Matriz de cobertura do mês (em cache por versão) + EscalaBits da janela
+    [1º dia - 7, último dia], para as regras que olham a semana anterior.
+    Retorna (matriz, bits, data_ini, data_fim) ou None se mes_ano for inválido."""
+    from services.cobertura_engine import matriz_cobertura
+    from services.escala_bits import EscalaBits
     try:
         ano, mes = int(mes_ano[:4]), int(mes_ano[5:7])
     except (ValueError, IndexError):
-        return []
-
+        return None
     _, dias_no_mes = cal_mod.monthrange(ano, mes)
     data_ini = date(ano, mes, 1)
     data_fim = date(ano, mes, dias_no_mes)
+    contexto = [data_ini - timedelta(days=i) for i in range(7, 0, -1)]
+    matriz = matriz_cobertura(ano, mes, dept or '', funcao or '', extras=contexto)
+    bits = EscalaBits.de_matriz(matriz, contexto + matriz.datas[:dias_no_mes])
+    return matriz, bits, data_ini, data_fim
 
-    # Funcionários no escopo
-    q = Funcionario.query.filter_by(ativo=True)
-    q = _filtrar_dept(q, dept)
-    if funcao: q = q.filter(Funcionario.funcao == funcao)
-    func_ids = {f.id for f in q.all()}
-    if not func_ids:
-        return []
-
-    # Alocações do mês no escopo
-    alocacoes = AlocacaoDiaria.query.filter(
-        AlocacaoDiaria.funcionario_id.in_(func_ids),
-        AlocacaoDiaria.data >= data_ini,
-        AlocacaoDiaria.data <= data_fim,
-    ).all()
 
-    dias_com_cobertura = {a.data.day for a in alocacoes}
+def alertas_cobertura(mes_ano: str, dept: str = None, funcao: str = None) -> list[dict]:
+    """Retorna lista de dias do mês onde a cobertura para dept/função é zero."""
+    mes_bits = _escala_bits_mes(mes_ano, dept, funcao)
+    if mes_bits is None:
+        return []
+    matriz, bits, data_ini, _ = mes_bits
+    if not matriz.funcs:
+        return []
 
     descobertos = []
-    for d in range(1, dias_no_mes + 1):
-        if d not in dias_com_cobertura:
-            dt = date(ano, mes, d)
+    for i, total in enumerate(bits.por_dia()[7:].tolist()):
+        if total == 0:
+            dt = data_ini + timedelta(days=i)
             descobertos.append({
                 'data':   dt.isoformat(),
-                'dia':    d,
+                'dia':    dt.day,
                 'dia_semana': dt.weekday(),  # 6 = domingo
                 'funcao': funcao or '',
                 'dept':   dept or '',
@@ -61,66 +54,98 @@ def alertas_cobertura(mes_ano: str, dept: str = None, funcao: str = None) -> lis
     return descobertos
 
 
-def violacoes_art386(mes_ano: str, dept: str = None, funcao: str = None) -> list[dict]:
-    """Retorna lista de alocações de domingo que violam o Art. 386 (mulheres consecutivos)."""
+def _rotacao_mes(mes_ano: str, dept: str = None, funcao: str = None):
+    """Rotação de domingos das 12 semanas até o fim do mês (em cache por versão).
+    Retorna (rotacao, data_ini, data_fim) ou None se mes_ano for inválido."""
+    from services.rotacao_domingos import analisar_semanas
     try:
         ano, mes = int(mes_ano[:4]), int(mes_ano[5:7])
+        data_ini = date(ano, mes, 1)
     except (ValueError, IndexError):
-        return []
+        return None
+    data_fim = date(ano, mes, cal_mod.monthrange(ano, mes)[1])
+    return analisar_semanas(data_fim, dept=dept or '', funcao=funcao or ''), data_ini, data_fim
 
-    _, dias_no_mes = cal_mod.monthrange(ano, mes)
-    data_ini = date(ano, mes, 1)
-    data_fim = date(ano, mes, dias_no_mes)
 
-    q = Funcionario.query.filter_by(ativo=True, sexo='F')
-    q = _filtrar_dept(q, dept)
-    if funcao: q = q.filter(Funcionario.funcao == funcao)
-    funcs_f = q.all()
-    if not funcs_f:
+def violacoes_art386(mes_ano: str, dept: str = None, funcao: str = None) -> list[dict]:
+    """Retorna lista de alocações de domingo que violam o Art. 386 (mulheres consecutivos),
+    inclusive contra o último domingo do mês anterior."""
+    rot_mes = _rotacao_mes(mes_ano, dept, funcao)
+    if rot_mes is None:
         return []
-
-    violacoes = []
-    for func in funcs_f:
-        # Alocações em domingos do mês
-        alocacoes = AlocacaoDiaria.query.filter(
-            AlocacaoDiaria.funcionario_id == func.id,
-            AlocacaoDiaria.data >= data_ini,
-            AlocacaoDiaria.data <= data_fim,
-        ).all()
-        domingos = sorted(a.data for a in alocacoes if a.data.weekday() == 6)
-        for i, dom in enumerate(domingos):
-            if i > 0 and (dom - domingos[i - 1]).days == 7:
-                violacoes.append({
-                    'func_id':   func.id,
-                    'func_nome': func.nome,
-                    'data':      dom.isoformat(),
-                    'domingo_anterior': domingos[i - 1].isoformat(),
-                    'regra': 'Art. 386 CLT – domingos consecutivos',
-                })
-    return violacoes
+    rot, data_ini, data_fim = rot_mes
+    return rot.violacoes(desde=data_ini, ate=data_fim)
+
+
+def equidade_domingos(mes_ano: str, dept: str = None, funcao: str = None, limite: float = 2) -> dict:
+    """Distribuição dos domingos trabalhados nas 12 semanas até o fim do mês;
+    'funcionarios' só com quem está `limite` ou mais domingos acima da média."""
+    rot_mes = _rotacao_mes(mes_ano, dept, funcao)
+    if rot_mes is None:
+        return {}
+    eq = rot_mes[0].equidade()
+    eq['funcionarios'] = [f for f in eq['funcionarios'] if f['diferenca'] >= limite]
+    return eq
+
+
+def violacoes_dsr(mes_ano: str, dept: str = None, funcao: str = None) -> list[dict]:
+    """Funcionários escalados 7 dias seguidos sem folga (Art. 67 – DSR) com a
+    sequência terminando no mês; uma entrada por funcionário (a primeira)."""
+    mes_bits = _escala_bits_mes(mes_ano, dept, funcao)
+    if mes_bits is None:
+        return []
+    matriz, bits, data_ini, _ = mes_bits
+    tem, inicios = bits.sem_folga(7, desde=data_ini)
+    return [{
+        'func_id':     matriz.funcs[i]['id'],
+        'func_nome':   matriz.funcs[i]['nome'],
+        'data_inicio': inicios[i].isoformat(),
+        'data':        (inicios[i] + timedelta(days=6)).isoformat(),
+        'regra': 'Art. 67 CLT – 7 dias consecutivos sem folga (DSR)',
+    } for i in np.nonzero(tem)[0].tolist()]
+
+
+def _saldos_atuais(func_ids) -> dict[str, float]:
+    """Saldo acumulado do último registro de banco de horas de cada funcionário
+    (uma consulta, com ROW_NUMBER() por funcionário)."""
+    from sqlalchemy import func
+    func_ids = list(func_ids)
+    if not func_ids:
+        return {}
+    rn = func.row_number().over(
+        partition_by=BancoHorasSaldo.funcionario_id,
+        order_by=BancoHorasSaldo.data.desc(),
+    ).label('rn')
+    sub = (
+        db.session.query(BancoHorasSaldo.funcionario_id, BancoHorasSaldo.saldo_acumulado, rn)
+        .filter(BancoHorasSaldo.funcionario_id.in_(func_ids))
+        .subquery()
+    )
+    return {
+        fid: float(saldo or 0)
+        for fid, saldo in db.session.query(sub.c.funcionario_id, sub.c.saldo_acumulado).filter(sub.c.rn == 1)
+    }
 
 
-def sugerir_substituto(data_ref: date, funcao: str = None, dept: str = None) -> dict | None:
+def ranquear_substitutos(data_ref: date, funcao: str = None, dept: str = None, k: int = 5) -> list[dict]:
     """
-    Encontra o melhor candidato para cobrir 'data_ref':
+    Ranking dos melhores candidatos para cobrir 'data_ref' (top-k, com score):
     1. Funcionários ativos com funcao/dept
-    2. Sem alocação no dia
-    3. Sem infração CLT bloqueante
-    4. Ordenado por menor saldo acumulado no banco de horas (quem mais deve horas)
-    Retorna dict com func_id, nome, saldo_banco, turno sugerido, folga_sugerida.
+    2. Sem turno no dia (exceção ou horário base)
+    3. Sem infração CLT bloqueante (validar_lote, sem consultas por candidato)
+    4. Score 0–100: menor saldo no banco de horas (60), menor carga na semana (30),
+       folga compensatória disponível (10), menos 10 por aviso CLT não bloqueante.
+    Tudo em carga única: candidatos, escala de [d-7, d+14], saldos (ROW_NUMBER).
     """
-    from services.motor_clt import validar_alocacao
+    from services.escala_efetiva import resolver
+    from services.motor_clt import escala_de_efetivos, validar_lote
 
     q = Funcionario.query.filter_by(ativo=True)
-    q = _filtrar_dept(q, dept)
+    q = filtrar_departamento(q, dept)
     if funcao: q = q.filter(Funcionario.funcao == funcao)
     candidatos = q.order_by(Funcionario.nome).all()
-
-    # Já alocados no dia
-    ja_alocados = {
-        a.funcionario_id
-        for a in AlocacaoDiaria.query.filter_by(data=data_ref).all()
-    }
+    if not candidatos:
+        return []
 
     # Turno padrão do dia (qualquer turno ativo do dept/funcao)
     turno = (
@@ -133,53 +158,73 @@ def sugerir_substituto(data_ref: date, funcao: str = None, dept: str = None) ->
     ) or Turno.query.order_by(Turno.id).first()
 
     if not turno:
-        return None
+        return []
 
-    melhores = []
-    for func in candidatos:
-        if func.id in ja_alocados:
-            continue
-        infracoes = validar_alocacao(func.id, data_ref, turno)
-        bloqueantes = [i for i in infracoes if i.get('severity', 'error') == 'error']
-        if bloqueantes:
-            continue
+    funcs = {f.id: f for f in candidatos}
+    # Contexto CLT (semana, DSR, vizinhos) + índice de folgas nas duas semanas seguintes
+    efetivos = resolver(funcs.keys(), data_ref - timedelta(days=7), data_ref + timedelta(days=14))
+    escala = escala_de_efetivos(efetivos)
 
-        # Saldo banco de horas (último registro)
-        saldo_row = (
-            BancoHorasSaldo.query
-            .filter_by(funcionario_id=func.id)
-            .order_by(BancoHorasSaldo.data.desc())
-            .first()
-        )
-        saldo = float(saldo_row.saldo_acumulado) if saldo_row else 0.0
-        melhores.append((saldo, func, turno))
+    wd = data_ref.weekday()
+    livres = [f for f in candidatos if (f.id, data_ref) not in efetivos]
+    if not livres:
+        return []
 
-    if not melhores:
-        return None
+    infracoes = validar_lote(((f.id, data_ref, turno) for f in livres), escala, funcs)
+    saldos = _saldos_atuais(f.id for f in livres)
 
-    # Ordena por menor saldo (quem mais deve)
-    melhores.sort(key=lambda x: x[0])
-    saldo, func, turno = melhores[0]
-
-    # Sugere próxima folga compensatória (próxima segunda-feira livre)
-    folga_sugerida = None
-    for i in range(1, 15):
-        d = data_ref + timedelta(days=i)
-        if d.weekday() == 0:  # segunda-feira
-            tem_aloc = AlocacaoDiaria.query.filter_by(
-                funcionario_id=func.id, data=d).first()
-            if not tem_aloc:
-                folga_sugerida = d.isoformat()
-                break
+    semana_ini = data_ref - timedelta(days=wd)
+    segundas = [data_ref + timedelta(days=i) for i in range(1, 15)
+                if (data_ref + timedelta(days=i)).weekday() == 0]
 
-    return {
-        'func_id':        func.id,
-        'func_nome':      func.nome,
-        'funcao':         func.funcao or '',
-        'saldo_banco':    round(saldo, 1),
+    aptos = []
+    for f in livres:
+        infr = infracoes.get((f.id, data_ref), [])
+        if any(i.get('severity', 'error') == 'error' for i in infr):
+            continue
+        horas_semana = 0.0
+        for i in range(7):
+            cel = efetivos.get((f.id, semana_ini + timedelta(days=i)))
+            if cel:
+                horas_semana += cel.horas
+        # Próxima segunda-feira livre (folga compensatória)
+        folga = next((d for d in segundas if (f.id, d) not in efetivos), None)
+        aptos.append({
+            'func':         f,
+            'saldo':        saldos.get(f.id, 0.0),
+            'horas_semana': horas_semana,
+            'avisos':       [i['message'] for i in infr],
+            'folga':        folga,
+        })
+    if not aptos:
+        return []
+
+    s_min = min(c['saldo'] for c in aptos)
+    s_max = max(c['saldo'] for c in aptos)
+    for c in aptos:
+        p_saldo = 1.0 if s_max == s_min else (s_max - c['saldo']) / (s_max - s_min)
+        p_carga = max(0.0, 1.0 - c['horas_semana'] / 44)
+        c['score'] = round(60 * p_saldo + 30 * p_carga + (10 if c['folga'] else 0)
+                           - 10 * len(c['avisos']), 1)
+
+    aptos.sort(key=lambda c: (-c['score'], c['saldo'], c['func'].nome))
+    return [{
+        'func_id':        c['func'].id,
+        'func_nome':      c['func'].nome,
+        'funcao':         c['func'].funcao or '',
+        'saldo_banco':    round(c['saldo'], 1),
+        'horas_semana':   round(c['horas_semana'], 1),
+        'avisos':         c['avisos'],
+        'score':          c['score'],
         'turno_id':       turno.id,
         'turno_nome':     turno.nome,
         'turno_inicio':   turno.hora_inicio.strftime('%H:%M'),
         'turno_fim':      turno.hora_fim.strftime('%H:%M'),
-        'folga_sugerida': folga_sugerida,
-    }
+        'folga_sugerida': c['folga'].isoformat() if c['folga'] else None,
+    } for c in aptos[:max(k, 1)]]
+
+
+def sugerir_substituto(data_ref: date, funcao: str = None, dept: str = None) -> dict | None:
+    """Melhor candidato para cobrir 'data_ref' (primeiro do ranquear_substitutos)."""
+    ranking = ranquear_substitutos(data_ref, funcao=funcao, dept=dept, k=1)
+    return ranking[0] if ranking else None
@@ -0,0 +1,241 @@
+"""
+Histórico das execuções de sync (tabela `sync_runs`).
+
+Cada chamada de sync_funcionarios, sync_batidas, sync_horarios e
+sync_alocacoes (decorador `execucao_sync`) grava uma linha com:
+
+  - origem  : apscheduler / celery / manual (rota) / script — o job do
+              APScheduler avisa com `contexto_sync(origem=...)`; Celery e
+              rotas são detectados;
+  - janela  : período pedido (e o modo, no caso das batidas);
+  - fases   : API (trechos em `fase_api()`), banco (tempo de SQL medido por
+              services/perfil_sql) e processamento (o resto);
+  - contagens (`anotar`), erro e o maior RSS amostrado.
+
+`estatisticas()` resume o período em percentis por tipo/modo para a aba de
+sync do config hub.
+"""
+import logging
+import math
+import os
+import time as _time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from functools import wraps
+
+logger = logging.getLogger('sync_runs')
+
+_DIAS_RETENCAO = 90
+
+_atual: ContextVar = ContextVar('sync_run_atual', default=None)
+_contexto: ContextVar = ContextVar('sync_run_contexto', default={})
+
+
+class _Execucao:
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.iniciado_em = datetime.utcnow()
+        self.api = 0.0
+        self.registros = self.novos = self.atualizados = self.ignorados = 0
+        self.memoria = _rss_mb()
+
+    def amostrar_memoria(self):
+        rss = _rss_mb()
+        if rss is not None:
+            self.memoria = max(self.memoria or 0.0, rss)
+
+
+def _rss_mb():
+    """RSS atual do processo (Linux); fora do Linux, o pico do processo."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except Exception:
+            return None
+
+
+# ── Contexto (origem / modo) ──────────────────────────────────────────────────
+
+@contextmanager
+def contexto_sync(origem: str = None, modo: str = None):
+    """Define origem e/ou modo das execuções feitas dentro do bloco."""
+    atual = dict(_contexto.get())
+    if origem:
+        atual['origem'] = origem
+    if modo:
+        atual['modo'] = modo
+    token = _contexto.set(atual)
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+def _origem() -> str:
+    explicita = _contexto.get().get('origem')
+    if explicita:
+        return explicita
+    try:
+        from celery import current_task
+        if current_task and current_task.request.id:
+            return 'celery'
+    except ImportError:
+        pass
+    from flask import has_request_context
+    return 'manual' if has_request_context() else 'script'
+
+
+# ── Durante a execução ────────────────────────────────────────────────────────
+
+@contextmanager
+def fase_api():
+    """Trecho de chamada à API (somado em api_ms da execução corrente)."""
+    ex = _atual.get()
+    t0 = _time.perf_counter()
+    try:
+        yield
+    finally:
+        if ex is not None:
+            ex.api += _time.perf_counter() - t0
+            ex.amostrar_memoria()
+
+
+def anotar(**contagens):
+    """Contagens da execução corrente (registros, novos, atualizados, ignorados)."""
+    ex = _atual.get()
+    if ex is None:
+        return
+    for campo, valor in contagens.items():
+        setattr(ex, campo, int(valor or 0))
+
+
+# ── Decorador ─────────────────────────────────────────────────────────────────
+
+def execucao_sync(tipo: str, janela=None):
+    """Grava uma SyncRun por chamada de uma função de sync que retorna (ok, msg).
+
+    `janela(*args, **kwargs)` → (inicio, fim, modo) extrai o período pedido.
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            from services.perfil_sql import contar_consultas
+            ex = _Execucao(tipo)
+            token = _atual.set(ex)
+            t0 = _time.perf_counter()
+            ok, msg, status, m = False, None, 'excecao', None
+            try:
+                with contar_consultas(f'sync.{tipo}') as m:
+                    ok, msg = fn(*args, **kwargs)
+                status = 'ok' if ok else 'falha'
+                return ok, msg
+            except Exception as e:
+                msg = f'{type(e).__name__}: {e}'
+                raise
+            finally:
+                _atual.reset(token)
+                duracao = _time.perf_counter() - t0
+                ex.amostrar_memoria()
+                ini, fim, modo = janela(*args, **kwargs) if janela else (None, None, None)
+                _gravar(ex, duracao, m, ok, msg, ini, fim, _contexto.get().get('modo') or modo,
+                        descartar=status == 'excecao')
+                from services.metricas import observar_sync
+                observar_sync(tipo, status, duracao, ex.registros, ex.novos)
+        return wrapper
+    return deco
+
+
+def _gravar(ex, duracao, medicao, ok, msg, ini, fim, modo, descartar=False):
+    from extensions import db
+    from models import SyncRun
+    banco = medicao.tempo if medicao else 0.0
+    try:
+        if descartar:
+            db.session.rollback()   # a função levantou no meio da transação
+        db.session.add(SyncRun(
+            tipo=ex.tipo, modo=modo, origem=_origem(), iniciado_em=ex.iniciado_em,
+            janela_inicio=ini, janela_fim=fim,
+            duracao_ms=round(duracao * 1000), api_ms=round(ex.api * 1000), banco_ms=round(banco * 1000),
+            processamento_ms=max(0, round((duracao - ex.api - banco) * 1000)),
+            consultas=medicao.consultas if medicao else 0,
+            registros=ex.registros, novos=ex.novos, atualizados=ex.atualizados, ignorados=ex.ignorados,
+            ok=bool(ok), erro=None if ok else (msg or '')[:2000],
+            memoria_mb=round(ex.memoria, 1) if ex.memoria is not None else None,
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'[sync_runs] Erro ao gravar execução de {ex.tipo}: {e}')
+
+
+def limpar_execucoes(dias: int = _DIAS_RETENCAO) -> int:
+    from extensions import db
+    from models import SyncRun
+    n = SyncRun.query.filter(SyncRun.iniciado_em < datetime.utcnow() - timedelta(days=dias)).delete()
+    db.session.commit()
+    return n
+
+
+# ── Resumo ────────────────────────────────────────────────────────────────────
+
+def _percentil(valores: list, p: float):
+    """Percentil por posição mais próxima (valores já ordenados)."""
+    if not valores:
+        return None
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+
+def estatisticas(dias: int = 7, recentes: int = 50) -> dict:
+    """Percentis por (tipo, modo) das execuções dos últimos `dias` e as
+    `recentes` últimas execuções."""
+    from extensions import db
+    from models import SyncRun
+    desde = datetime.utcnow() - timedelta(days=dias)
+    S = SyncRun
+    linhas = (db.session.query(S.tipo, S.modo, S.iniciado_em, S.ok, S.duracao_ms, S.api_ms, S.banco_ms,
+                               S.processamento_ms, S.registros, S.novos, S.memoria_mb)
+              .filter(S.iniciado_em >= desde).order_by(S.iniciado_em).all())
+
+    grupos: dict[tuple, list] = {}
+    for r in linhas:
+        grupos.setdefault((r.tipo, r.modo or ''), []).append(r)
+
+    resumo = []
+    for (tipo, modo), rs in sorted(grupos.items()):
+        col = {c: sorted(getattr(r, c) for r in rs)
+               for c in ('duracao_ms', 'api_ms', 'banco_ms', 'processamento_ms', 'registros')}
+        inicios = [r.iniciado_em for r in rs]
+        intervalos = sorted((b - a).total_seconds() / 60 for a, b in zip(inicios, inicios[1:]))
+        mem = [r.memoria_mb for r in rs if r.memoria_mb is not None]
+        resumo.append({
+            'tipo': tipo, 'modo': modo, 'execucoes': len(rs),
+            'falhas': sum(1 for r in rs if not r.ok),
+            'duracao': {p: _percentil(col['duracao_ms'], p) for p in (50, 90, 99)},
+            'api':     {p: _percentil(col['api_ms'], p) for p in (50, 90)},
+            'banco':   {p: _percentil(col['banco_ms'], p) for p in (50, 90)},
+            'processamento': {p: _percentil(col['processamento_ms'], p) for p in (50, 90)},
+            'registros': {p: _percentil(col['registros'], p) for p in (50, 90)},
+            'novos': sum(r.novos for r in rs),
+            'intervalo_min': {p: (round(_percentil(intervalos, p), 1) if intervalos else None) for p in (50, 90)},
+            'memoria_max_mb': max(mem) if mem else None,
+        })
+
+    ultimas = S.query.order_by(S.iniciado_em.desc()).limit(recentes).all()
+    return {
+        'dias': dias,
+        'resumo': resumo,
+        'recentes': [{
+            'id': r.id, 'tipo': r.tipo, 'modo': r.modo or '', 'origem': r.origem,
+            'iniciado_em': r.iniciado_em.isoformat(timespec='seconds') + 'Z',
+            'janela': ' → '.join(d.strftime('%d/%m %H:%M') for d in (r.janela_inicio, r.janela_fim) if d),
+            'duracao_ms': r.duracao_ms, 'api_ms': r.api_ms, 'banco_ms': r.banco_ms,
+            'processamento_ms': r.processamento_ms, 'consultas': r.consultas,
+            'registros': r.registros, 'novos': r.novos, 'atualizados': r.atualizados,
+            'ignorados': r.ignorados, 'ok': r.ok, 'erro': r.erro or '', 'memoria_mb': r.memoria_mb,
+        } for r in ultimas],
+    }
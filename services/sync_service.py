@@ -3,7 +3,11 @@ from datetime import datetime, date, timedelta
 from extensions import db
 from models import Funcionario, Batida, Configuracao
 from secullum_api import SecullumAPI
+from services.sync_runs import anotar, contexto_sync, execucao_sync, fase_api
 import os
+import logging
+
+logger = logging.getLogger('sync_service')
 
 _CHAVE_ULTIMA_SYNC = 'ultima_sync_batidas'
 
@@ -51,9 +55,11 @@ def parse_date(date_str):
     return None
 
 
+@execucao_sync('funcionarios')
 def sync_funcionarios():
     api = get_api()
-    data = api.listar_funcionarios()
+    with fase_api():
+        data = api.listar_funcionarios()
     if not data:
         return False, "Erro ao sincronizar dados da API Secullum ou nenhum dado retornado."
 
@@ -146,26 +152,94 @@ def sync_funcionarios():
                                     if not aloc:
                                         db.session.add(AlocacaoDiaria(funcionario_id=f.id, turno_id=t.id, data=d))
 
+        from services.facetas import invalidar_facetas
+        invalidar_facetas()
         db.session.commit()
+        _atualizar_snapshot_dashboard(None)
+        anotar(registros=len(data), novos=new_count, atualizados=updated_count)
         return True, f"Sync OK! {active_count} ativos, {new_count} novos, {updated_count} atualizados."
     except Exception as e:
         db.session.rollback()
         return False, f"Erro no banco de dados: {str(e)}"
 
 
-def sync_batidas(data_inicio, data_fim, hora_inicio=None, hora_fim=None):
+_MAX_BUSCAS_POR_FUNCIONARIO = 10   # acima disso, uma busca só do período inteiro
+
+
+def _buscar_batidas(api, data_inicio, data_fim, hora_inicio, hora_fim, funcionarios):
+    """Registros do período; com poucos `funcionarios`, uma busca por
+    funcionário (filtro por CPF, ou PIS) em vez do período de todos."""
+    if funcionarios is None or len(funcionarios) > _MAX_BUSCAS_POR_FUNCIONARIO:
+        with fase_api():
+            return api.buscar_batidas(data_inicio, data_fim, hora_inicio, hora_fim)
+    docs = (db.session.query(Funcionario.cpf, Funcionario.pis)
+            .filter(Funcionario.id.in_([str(f) for f in funcionarios])).all())
+    if len(docs) < len(funcionarios) or not all(cpf or pis for cpf, pis in docs):
+        with fase_api():
+            return api.buscar_batidas(data_inicio, data_fim, hora_inicio, hora_fim)
+    registros = []
+    for cpf, pis in docs:
+        with fase_api():
+            parte = api.buscar_batidas(data_inicio, data_fim, hora_inicio, hora_fim,
+                                       funcionario_cpf=cpf or None, funcionario_pis=None if cpf else pis)
+        if parte is None:
+            return None
+        registros.extend(parte)
+    return registros
+
+
+def _janela_batidas(data_inicio, data_fim, hora_inicio=None, hora_fim=None, funcionarios=None):
+    """(início, fim, modo) pedidos a sync_batidas, para o histórico de execuções."""
+    try:
+        ini = datetime.strptime(f"{data_inicio} {hora_inicio or '00:00'}", '%Y-%m-%d %H:%M')
+        fim = datetime.strptime(f"{data_fim} {hora_fim or '23:59'}", '%Y-%m-%d %H:%M')
+    except ValueError:
+        ini = fim = None
+    if funcionarios is not None:
+        return ini, fim, 'dirigida'
+    return ini, fim, 'janela' if hora_inicio or hora_fim else 'periodo'
+
+
+@execucao_sync('batidas', janela=_janela_batidas)
+def sync_batidas(data_inicio, data_fim, hora_inicio=None, hora_fim=None, funcionarios=None):
+    """Importa as batidas do período. `funcionarios` restringe a busca e a
+    gravação a esses ids (ressincronização dirigida).
+
+    Os (funcionário, dia) com batida nova ou alterada viram eventos em
+    eventos_batidas na mesma transação. Os consumidores (inconsistências,
+    banco de horas, regras EVENT_SYNC, dashboard) rodam depois, fora do sync
+    (services/eventos_batidas)."""
     api = get_api()
     agora_sync = datetime.now()
-    registros = api.buscar_batidas(data_inicio, data_fim, hora_inicio, hora_fim)
+    registros = _buscar_batidas(api, data_inicio, data_fim, hora_inicio, hora_fim, funcionarios)
     if registros is None:
         return False, "Erro ao buscar batidas da API."
+    anotar(registros=len(registros))
+    dia_completo = hora_inicio is None and hora_fim is None
+    if not registros and dia_completo:
+        # Período sem nada no Secullum: o lado Secullum dos digests fica vazio
+        try:
+            from services.reconciliacao_batidas import registrar_secullum
+            registrar_secullum({}, completo=True, periodo=(parse_date(data_inicio), parse_date(data_fim)),
+                               funcionarios=funcionarios)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'[reconciliacao] Erro ao gravar digests: {e}')
     if not registros:
         # Ainda assim salvamos a última sync para não repetir o período vazio
         set_ultima_sync_batidas(agora_sync)
+        _atualizar_snapshot_dashboard(None)
         return True, "Nenhuma batida encontrada no período."
 
     try:
-        func_ids = {f.id for f in Funcionario.query.filter_by(ativo=True).all()}
+        func_ids = {f_id for f_id, in db.session.query(Funcionario.id).filter(Funcionario.ativo == True)}
+        if funcionarios is not None:
+            func_ids &= {str(f) for f in funcionarios}
+        dias_tocados = set()    # (funcionario_id, data) com batidas no Secullum (digest local)
+        dias_alterados = set()  # (funcionario_id, data) com batida nova/alterada → eventos
+        vistos = {}             # (funcionario_id, data) → horários do Secullum (digest)
+        hoje = date.today()
         new_count = updated_count = skipped_count = 0
 
         ORIGEM_MAP = {0: 'REP', 1: 'Manual', 16: 'App', 32: 'Web'}
@@ -181,7 +255,6 @@ def sync_batidas(data_inicio, data_fim, hora_inicio=None, hora_fim=None):
             data_batida = parse_date(registro.get('Data'))
             if not data_batida:
                 continue
-
             batidas_do_dia = []
             for i in range(1, 6):
                 for tipo_str, campo_hora, campo_fonte in [
@@ -209,6 +282,9 @@ def sync_batidas(data_inicio, data_fim, hora_inicio=None, hora_fim=None):
 
                     batidas_do_dia.append({'hora': hora, 'tipo': tipo_str, 'origem': origem})
 
+            vistos.setdefault((func_id, data_batida), []).extend(batidas_do_dia)
+            if batidas_do_dia:
+                dias_tocados.add((func_id, data_batida))
             for b_info in batidas_do_dia:
                 hora_str = b_info['hora']
                 existente = Batida.query.filter_by(
@@ -220,10 +296,12 @@ def sync_batidas(data_inicio, data_fim, hora_inicio=None, hora_fim=None):
                 if existente:
                     batida = existente
                     updated_count += 1
+                    antes = (batida.tipo, batida.origem, batida.data_hora)
                 else:
                     batida = Batida(funcionario_id=func_id, data=data_batida, hora=hora_str)
                     db.session.add(batida)
                     new_count += 1
+                    antes = None
 
                 try:
                     h, m = hora_str.split(':')
@@ -236,11 +314,22 @@ def sync_batidas(data_inicio, data_fim, hora_inicio=None, hora_fim=None):
 
                 batida.tipo = b_info['tipo']
                 batida.origem = b_info['origem']
-                batida.inconsistente = False
                 batida.data_sincronizacao = datetime.utcnow()
-
+                if antes != (batida.tipo, batida.origem, batida.data_hora):
+                    dias_alterados.add((func_id, data_batida))
+
+        from services.reconciliacao_batidas import atualizar_locais, registrar_secullum
+        atualizar_locais(dias_tocados)
+        registrar_secullum(vistos, completo=dia_completo,
+                           periodo=(parse_date(data_inicio), parse_date(data_fim)), funcionarios=funcionarios)
+        from services.eventos_batidas import publicar
+        publicar(dias_alterados, origem='sync')     # por último: trava de publicação até o commit
         db.session.commit()
+        anotar(registros=len(registros), novos=new_count, atualizados=updated_count, ignorados=skipped_count)
         set_ultima_sync_batidas(agora_sync)
+        if not any(d == hoje for _, d in dias_alterados):
+            # Sem mudança hoje: atrasos/ausências ainda andam com o relógio
+            _atualizar_snapshot_dashboard(None)
         return True, (f"Batidas sincronizadas! {new_count} novas, "
                       f"{updated_count} atualizadas, {skipped_count} ignoradas.")
     except Exception as e:
@@ -248,6 +337,20 @@ def sync_batidas(data_inicio, data_fim, hora_inicio=None, hora_fim=None):
         return False, f"Erro ao sincronizar batidas: {str(e)}"
 
 
+def _atualizar_snapshot_dashboard(departamentos):
+    """Atualiza o snapshot do dashboard sem derrubar o sync em caso de erro.
+
+    departamentos=None recalcula todas as unidades (mantém atrasos/ausências
+    corretos mesmo quando o ciclo não trouxe batidas novas).
+    """
+    try:
+        from services.snapshot_service import atualizar_snapshot
+        atualizar_snapshot(date.today(), departamentos)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'[snapshot] Erro ao atualizar snapshot do dashboard: {e}')
+
+
 def sync_batidas_incremental():
     """Sincroniza batidas a partir da última sync registrada até agora.
 
@@ -270,10 +373,12 @@ def sync_batidas_incremental():
 
     data_fim = agora.strftime('%Y-%m-%d')
     hora_fim = agora.strftime('%H:%M')
-    
-    return sync_batidas(data_inicio, data_fim, hora_inicio, hora_fim)
 
+    with contexto_sync(modo='incremental'):
+        return sync_batidas(data_inicio, data_fim, hora_inicio, hora_fim)
 
+
+@execucao_sync('horarios')
 def sync_horarios():
     """Sincroniza horários da API Secullum → HorarioSecullum + cria/atualiza Turnos.
 
@@ -282,7 +387,8 @@ def sync_horarios():
     from models import HorarioSecullum, Turno
 
     api = get_api()
-    horarios = api.listar_horarios()
+    with fase_api():
+        horarios = api.listar_horarios()
     if horarios is None:
         return False, "Erro ao listar horários da API Secullum."
     if not horarios:
@@ -359,12 +465,23 @@ def sync_horarios():
 
     try:
         db.session.commit()
+        anotar(registros=len(horarios), novos=criados, atualizados=atualizados)
         return True, f"Horários: {criados} criados, {atualizados} atualizados."
     except Exception as e:
         db.session.rollback()
         return False, f"Erro ao salvar horários: {str(e)}"
 
 
+def _janela_alocacoes(data_inicio_str, data_fim_str):
+    try:
+        return (datetime.fromisoformat(data_inicio_str),
+                datetime.combine(date.fromisoformat(data_fim_str), datetime.max.time().replace(microsecond=0)),
+                None)
+    except ValueError:
+        return None, None, None
+
+
+@execucao_sync('alocacoes', janela=_janela_alocacoes)
 def sync_alocacoes(data_inicio_str: str, data_fim_str: str):
     """Gera AlocacaoDiaria a partir do HorarioSecullum de cada funcionário.
 
@@ -448,6 +565,8 @@ def sync_alocacoes(data_inicio_str: str, data_fim_str: str):
 
     try:
         db.session.commit()
+        anotar(registros=criadas + atualizadas + sem_turno, novos=criadas, atualizados=atualizadas,
+               ignorados=sem_turno)
         return True, (f"Alocações: {criadas} criadas, {atualizadas} atualizadas"
                       + (f", {sem_turno} sem turno" if sem_turno else "") + ".")
     except Exception as e:
@@ -17,6 +17,7 @@ import requests
 from datetime import datetime
 from extensions import db
 from models import WhatsappLog
+from services.metricas import medir_whatsapp
 
 
 MEGAAPI_HOST     = os.getenv('MEGAAPI_HOST', 'apistart01.megaapi.com.br')
@@ -74,12 +75,14 @@ def enviar_texto(celular: str, mensagem: str, func_id: str = None, tipo: str = '
                 'text': mensagem,
             }
         }
-        resp = requests.post(
-            f'{_base_url()}/text',
-            json=payload,
-            headers=_headers(),
-            timeout=10,
-        )
+        with medir_whatsapp('texto', tipo) as chamada:
+            resp = requests.post(
+                f'{_base_url()}/text',
+                json=payload,
+                headers=_headers(),
+                timeout=10,
+            )
+            chamada.status = resp.status_code
         ok = resp.status_code in (200, 201)
         if ok:
             log.status = 'enviado'
@@ -125,12 +128,14 @@ def enviar_documento(celular: str, pdf_bytes: bytes, filename: str,
                 'caption':  caption,
             }
         }
-        resp = requests.post(
-            f'{_base_url()}/mediaBase64',
-            json=payload,
-            headers=_headers(),
-            timeout=30,
-        )
+        with medir_whatsapp('documento', tipo) as chamada:
+            resp = requests.post(
+                f'{_base_url()}/mediaBase64',
+                json=payload,
+                headers=_headers(),
+                timeout=30,
+            )
+            chamada.status = resp.status_code
         ok = resp.status_code in (200, 201)
         log.status = 'enviado' if ok else f'erro_{resp.status_code}'
         db.session.commit()
@@ -46,17 +46,18 @@ def register_tasks(celery):
 
     @celery.task(name='tasks.bot_ausencia')
     def bot_ausencia():
-        from models import AlocacaoDiaria, Batida
+        from models import Batida, Funcionario
+        from services.escala_efetiva import escalados_no_dia
         from services.whatsapp_bot import enviar_texto
         hoje = date.today()
-        alocacoes = AlocacaoDiaria.query.filter_by(data=hoje).all()
-        func_com_batida = {b.funcionario_id for b in Batida.query.filter_by(data=hoje).all()}
+        escalados = escalados_no_dia(hoje)
+        func_com_batida = {fid for fid, in Batida.query.filter_by(data=hoje)
+                           .with_entities(Batida.funcionario_id).distinct()}
+        faltantes = [fid for fid in escalados if fid not in func_com_batida]
+        funcs = Funcionario.query.filter(Funcionario.id.in_(faltantes)).all() if faltantes else []
         enviados = 0
-        for aloc in alocacoes:
-            if aloc.funcionario_id in func_com_batida:
-                continue
-            func = aloc.funcionario
-            if not func or not func.celular:
+        for func in funcs:
+            if not func.celular:
                 continue
             msg = (f'Ola, {func.nome.split()[0]}! Voce ainda nao registrou ponto hoje. '
                    'Aconteceu algo? Responda esta mensagem.')
@@ -68,43 +69,48 @@ def register_tasks(celery):
     @celery.task(name='tasks.checkin_previo')
     def checkin_previo():
         from datetime import datetime
-        from models import AlocacaoDiaria
+        from models import AlocacaoDiaria, Funcionario
+        from services.escala_efetiva import escalados_no_dia
         from services.whatsapp_bot import enviar_texto
         agora = datetime.now()
         hoje = agora.date()
         hora_alvo = agora.hour + 1
-        for aloc in AlocacaoDiaria.query.filter_by(data=hoje).all():
-            if aloc.turno.hora_inicio.hour != hora_alvo:
-                continue
-            func = aloc.funcionario
-            if not func or not func.celular or aloc.pre_checkin:
+        alvo = {fid: cel for fid, cel in escalados_no_dia(hoje).items() if cel.inicio.hour == hora_alvo}
+        if not alvo:
+            return
+        # pre_checkin só existe em exceções (AlocacaoDiaria); horário base não tem linha
+        confirmados = {
+            a.funcionario_id for a in AlocacaoDiaria.query.filter(
+                AlocacaoDiaria.data == hoje, AlocacaoDiaria.pre_checkin == True,
+                AlocacaoDiaria.funcionario_id.in_(list(alvo)),
+            )
+        }
+        for func in Funcionario.query.filter(Funcionario.id.in_(list(alvo))).all():
+            if not func.celular or func.id in confirmados:
                 continue
+            cel = alvo[func.id]
             enviar_texto(
                 celular=func.celular,
-                mensagem=(f'Lembrete: turno "{aloc.turno.nome}" começa em 1 hora '
-                          f'({aloc.turno.hora_inicio.strftime("%H:%M")}). '
+                mensagem=(f'Lembrete: turno "{cel.turno.nome}" começa em 1 hora '
+                          f'({cel.inicio.strftime("%H:%M")}). '
                           'Responda SIM para confirmar presenca.'),
                 func_id=func.id, tipo='checkin',
             )
 
     @celery.task(name='tasks.calcular_banco_horas_todos')
     def calcular_banco_horas_todos():
-        """Recalcula e persiste saldos de banco de horas para todos os funcionários
-        com alocações nos últimos 30 dias. Executado diariamente às 01:00."""
+        """Recalcula e persiste saldos de banco de horas para os funcionários ativos
+        com escala (exceção ou horário base) nos últimos 30 dias. Executado diariamente às 01:00."""
         from datetime import date, timedelta
-        from models import AlocacaoDiaria
-        from services.banco_horas_service import salvar_saldos
+        from models import Funcionario
+        from services.banco_horas_service import recalcular_saldos
+        from services.escala_efetiva import resolver
         hoje = date.today()
         data_ini = hoje - timedelta(days=30)
-        ids = {a.funcionario_id for a in
-               AlocacaoDiaria.query.filter(AlocacaoDiaria.data >= data_ini).all()}
-        erros = 0
-        for fid in ids:
-            try:
-                salvar_saldos(fid, data_ini, hoje)
-            except Exception as e:
-                logger.error(f'[banco_horas] Erro para {fid}: {e}')
-                erros += 1
+        todos = [fid for fid, in Funcionario.query.with_entities(Funcionario.id)
+                 .filter(Funcionario.ativo == True)]
+        ids = {fid for fid, _ in resolver(todos, data_ini, hoje)}
+        erros = recalcular_saldos(ids, data_ini, hoje, logger=logger)
         logger.info(f'[banco_horas] {len(ids)} funcionários recalculados, {erros} erros.')
         return {'calculados': len(ids), 'erros': erros}
 
@@ -142,6 +148,56 @@ def register_tasks(celery):
         logger.info(f'[sync_alocacoes] {msg_a}')
         return {'horarios': msg_h, 'alocacoes': msg_a}
 
+    @celery.task(name='tasks.limpar_escala_alteracoes')
+    def limpar_escala_alteracoes():
+        """Poda o log de alterações da escala (mantém a versão corrente)."""
+        from services.escala_versao import limpar_alteracoes
+        removidas = limpar_alteracoes()
+        logger.info(f'[escala_alteracoes] {removidas} entradas removidas')
+        return {'removidas': removidas}
+
+    @celery.task(name='tasks.limpar_sync_runs')
+    def limpar_sync_runs():
+        """Poda o histórico de execuções de sync (mais antigas que 90 dias)."""
+        from services.sync_runs import limpar_execucoes
+        removidas = limpar_execucoes()
+        logger.info(f'[sync_runs] {removidas} execuções removidas')
+        return {'removidas': removidas}
+
+    @celery.task(name='tasks.consumir_eventos_batidas')
+    def consumir_eventos_batidas():
+        """Trata eventos de batidas pendentes (syncs e correções manuais). O sync só
+        publica; o consumo roda aqui e no job eventos_batidas do APScheduler."""
+        from services.eventos_batidas import consumir_todos
+        result = consumir_todos()
+        tratados = {nome: r['eventos'] for nome, r in result.items() if r['eventos'] or r['erro']}
+        if tratados:
+            logger.info(f'[eventos_batidas] {tratados}')
+        return result
+
+    @celery.task(name='tasks.limpar_eventos_batidas')
+    def limpar_eventos_batidas():
+        """Remove eventos de batidas já tratados por todos os consumidores (mais de 7 dias)."""
+        from services.eventos_batidas import limpar_eventos
+        removidos = limpar_eventos()
+        logger.info(f'[eventos_batidas] {removidos} eventos removidos')
+        return {'removidos': removidos}
+
+    @celery.task(name='tasks.previsao_demanda')
+    def previsao_demanda():
+        """Atualiza as curvas de presença (batidas) e recalcula a previsão de demanda."""
+        import time as _time
+        from services.previsao_demanda import atualizar_presencas, recalcular_previsao
+        t0 = _time.perf_counter()
+        presencas = atualizar_presencas()
+        t1 = _time.perf_counter()
+        previsao = recalcular_previsao()
+        t2 = _time.perf_counter()
+        logger.info(f'[previsao_demanda] presenças {presencas["de"]}..{presencas["ate"]}: '
+                    f'{presencas["linhas"]} linhas em {t1 - t0:.1f}s; '
+                    f'previsão: {previsao["linhas"]} linhas em {t2 - t1:.1f}s')
+        return {'presencas': presencas, 'previsao': previsao}
+
     @celery.task(name='tasks.alerta_documentos_vencendo')
     def alerta_documentos_vencendo():
         """RF5.4 – E-mail ao RH listando documentos que vencem em ≤ 30 dias."""
@@ -182,11 +238,19 @@ def register_tasks(celery):
 
     @celery.task(name='tasks.sync_batidas_rapida')
     def sync_batidas_rapida():
-        """Sync incremental. Roda a cada minuto mas self-limita pelo intervalo configurado."""
+        """Sync incremental. Roda a cada minuto mas self-limita pelo intervalo da
+        cadência (adaptativa ou fixa, services/cadencia_sync)."""
         if _get_cfg('sync_rapida_ativo', '1') != '1':
             return {'skipped': True, 'reason': 'desativado'}
 
-        intervalo = int(_get_cfg('sync_rapida_intervalo_min', '10'))
+        try:
+            from services.cadencia_sync import intervalo_rapida
+            intervalo, nivel = intervalo_rapida()
+        except Exception as e:
+            logger.error(f'[sync_rapida] Erro na cadência adaptativa: {e}')
+            from extensions import db
+            db.session.rollback()
+            intervalo, nivel = int(_get_cfg('sync_rapida_intervalo_min', '10')), 'fixo'
         ultimo_str = _get_cfg('sync_rapida_ultimo_run', '')
         if ultimo_str:
             try:
@@ -199,8 +263,8 @@ def register_tasks(celery):
         _set_cfg('sync_rapida_ultimo_run', datetime.now().isoformat())
         from services.sync_service import sync_batidas_incremental
         ok, msg = sync_batidas_incremental()
-        logger.info(f'[sync_rapida] {msg}')
-        return {'ok': ok, 'msg': msg}
+        logger.info(f'[sync_rapida] ({nivel}, {intervalo} min) {msg}')
+        return {'ok': ok, 'msg': msg, 'nivel': nivel, 'intervalo_min': intervalo}
 
     @celery.task(name='tasks.sync_batidas_completa')
     def sync_batidas_completa():